@@ -0,0 +1,191 @@
+"""
+Ahorro acumulado por grupo calculado desde el libro de AHORROS (hoja AHORROS).
+
+La hoja ACUMULADO del archivo son solo referencias (=AHORROS!J17, ...) a la columna
+ACUMULADO AHORRO del libro, que es una suma corrida de AHORRO INGRESADO
+(= TOTAL DEPOSITO - PAGO CONCILIADO) dentro de cada bloque ID/CICLO. Depender de
+esos valores exige que Excel haya recalculado el libro y que ninguna fórmula del
+bloque esté alterada. Aquí el acumulado se obtiene con un groupby sobre los
+movimientos, en centavos enteros:
+
+    ahorro_acumulado(id, ciclo) = Σ (total_deposito - pago_conciliado)
+
+Las filas ya creadas para semanas futuras (sin depósito) no suman; un grupo sin
+ningún depósito queda con ahorro nulo.
+
+Para actualizaciones semanales, el estado por grupo (total en centavos y última
+semana aplicada) se guarda en Parquet y acumular_ahorros() solo suma los
+depósitos de semanas posteriores a la última aplicada de cada grupo.
+
+Uso:
+    python ahorros_libro.py data/AHORROS.xlsx --estado ahorros_estado.parquet
+"""
+
+import pandas as pd
+import numpy as np
+import argparse
+import logging
+from pathlib import Path
+from cartera_generator import a_centavos
+from escritura_atomica import escritura_atomica
+
+logger = logging.getLogger(__name__)
+
+# Llave de cada bloque del libro
+COLUMNAS_CLAVE = ['id', 'ciclo']
+
+# Columnas del estado por grupo
+COLUMNAS_ESTADO = COLUMNAS_CLAVE + ['grupo', 'ahorro_centavos', 'ultima_sem']
+
+# Tolerancia (pesos) para reportar diferencias contra la hoja ACUMULADO
+TOLERANCIA_CONCILIACION = 0.005
+
+
+def movimientos_desde_libro(df_libro: pd.DataFrame) -> pd.DataFrame:
+    """
+    Movimientos del libro con la llave limpia y el ahorro ingresado de cada fila.
+
+    Args:
+        df_libro: Hoja AHORROS con columnas normalizadas (id, grupo, ciclo, sem,
+            total_deposito, pago_conciliado)
+
+    Returns:
+        DataFrame con id, ciclo, grupo, sem, ahorro_centavos (int64) y con_deposito
+    """
+    total = pd.to_numeric(df_libro['total_deposito'], errors='coerce')
+    pago = pd.to_numeric(df_libro['pago_conciliado'], errors='coerce')
+    return pd.DataFrame({
+        # '000018 ' y '000018' son el mismo grupo; ciclo sin valor queda como ''
+        'id': df_libro['id'].astype(str).str.strip().str.replace(r'\.0$', '', regex=True),
+        'ciclo': df_libro['ciclo'].astype(str).str.strip().str.replace(r'\.0$', '', regex=True)
+                 .str.zfill(2).where(df_libro['ciclo'].notna(), ''),
+        'grupo': df_libro['grupo'],
+        'sem': pd.to_numeric(df_libro['sem'], errors='coerce'),
+        # Igual que =G-H en Excel: celda vacía cuenta como 0
+        'ahorro_centavos': (a_centavos(total.fillna(0)) - a_centavos(pago.fillna(0))).to_numpy(dtype=np.int64),
+        'con_deposito': (total.notna() | pago.notna()).to_numpy(),
+    }, index=df_libro.index)
+
+
+def _agregar(movimientos: pd.DataFrame) -> pd.DataFrame:
+    """Total y última semana con depósito por ID/ciclo, en orden de aparición en el libro."""
+    con_deposito = movimientos['con_deposito']
+    agrupado = movimientos.assign(
+        ahorro_centavos=movimientos['ahorro_centavos'].where(con_deposito),
+        sem=movimientos['sem'].where(con_deposito),
+    ).groupby(COLUMNAS_CLAVE, sort=False)
+    estado = pd.DataFrame({
+        'grupo': agrupado['grupo'].first(),
+        'ahorro_centavos': agrupado['ahorro_centavos'].sum(min_count=1).astype('Int64'),
+        'ultima_sem': agrupado['sem'].max(),
+    })
+    return estado
+
+
+def acumular_ahorros(movimientos: pd.DataFrame, estado: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    Acumula los movimientos del libro por ID/ciclo.
+
+    Args:
+        movimientos: Resultado de movimientos_desde_libro (libro completo o solo filas nuevas)
+        estado: Estado previo (de una corrida anterior). Si se pasa, solo se suman los
+            depósitos de semanas posteriores a la última aplicada de cada grupo; las
+            semanas ya aplicadas no se vuelven a leer aunque se hayan corregido
+
+    Returns:
+        Estado por grupo (COLUMNAS_ESTADO): ahorro_centavos (Int64, nulo = sin depósitos)
+        y ultima_sem
+    """
+    if estado is None:
+        return _agregar(movimientos).reset_index()[COLUMNAS_ESTADO]
+
+    previo = estado.set_index(COLUMNAS_CLAVE)
+    ultima = previo['ultima_sem'].reindex(pd.MultiIndex.from_frame(movimientos[COLUMNAS_CLAVE])).to_numpy()
+    ya_aplicada = movimientos['con_deposito'].to_numpy() & (movimientos['sem'].to_numpy() <= ultima)
+    nuevos = _agregar(movimientos[~ya_aplicada])
+
+    comunes = nuevos.index.intersection(previo.index, sort=False)
+    altas = nuevos.index.difference(previo.index, sort=False)
+    actualizado = previo.copy()
+    actualizado.loc[comunes, 'ahorro_centavos'] = (
+        previo.loc[comunes, 'ahorro_centavos'].add(nuevos.loc[comunes, 'ahorro_centavos'], fill_value=0)
+    )
+    actualizado.loc[comunes, 'ultima_sem'] = np.fmax(
+        previo.loc[comunes, 'ultima_sem'].to_numpy(), nuevos.loc[comunes, 'ultima_sem'].to_numpy()
+    )
+    actualizado = pd.concat([actualizado, nuevos.loc[altas]])
+
+    logger.info(
+        f"Ahorros: {int(nuevos['ahorro_centavos'].notna().sum())} grupos con depósitos nuevos, "
+        f"{len(altas)} grupos nuevos, {int(ya_aplicada.sum())} filas ya aplicadas"
+    )
+    return actualizado.reset_index()[COLUMNAS_ESTADO]
+
+
+def tabla_acumulado(estado: pd.DataFrame) -> pd.DataFrame:
+    """Estado por grupo con la forma de la hoja ACUMULADO (id, grupo, ciclo, ahorro_acumulado en pesos)."""
+    return pd.DataFrame({
+        'id': estado['id'],
+        'grupo': estado['grupo'],
+        'ciclo': estado['ciclo'],
+        'ahorro_acumulado': estado['ahorro_centavos'].astype('float64') / 100,
+    })
+
+
+def conciliar_con_acumulado(df_libro: pd.DataFrame, df_acumulado: pd.DataFrame) -> pd.DataFrame:
+    """
+    Compara el acumulado calculado desde el libro con los valores en caché de la hoja ACUMULADO.
+
+    Returns:
+        DataFrame (id, ciclo, libro, acumulado, diferencia) con los grupos que no coinciden
+    """
+    def _llaves(df):
+        return pd.DataFrame({
+            'id': df['id'].astype(str).str.strip().str.replace(r'\.0$', '', regex=True).str.zfill(6),
+            'ciclo': df['ciclo'].astype(str).str.strip().str.replace(r'\.0$', '', regex=True).str.zfill(2),
+            'valor': pd.to_numeric(df['ahorro_acumulado'], errors='coerce').fillna(0).to_numpy(),
+        })
+
+    comparado = _llaves(df_libro).merge(_llaves(df_acumulado), on=COLUMNAS_CLAVE, how='outer', suffixes=('_libro', '_acumulado'))
+    # Un grupo que falta de un lado cuenta como 0 (sin depósitos)
+    comparado = comparado.rename(columns={'valor_libro': 'libro', 'valor_acumulado': 'acumulado'}).fillna({'libro': 0, 'acumulado': 0})
+    comparado['diferencia'] = comparado['libro'] - comparado['acumulado']
+    distinto = ~(comparado['diferencia'].abs() <= TOLERANCIA_CONCILIACION)
+    return comparado[distinto].reset_index(drop=True)
+
+
+def guardar_estado(estado: pd.DataFrame, ruta: str) -> str:
+    """Guarda el estado por grupo en Parquet."""
+    with escritura_atomica(ruta) as temporal:
+        estado.to_parquet(temporal, index=False)
+    logger.info(f"Estado de ahorros guardado: {ruta} ({len(estado)} grupos)")
+    return ruta
+
+
+def cargar_estado(ruta: str) -> pd.DataFrame:
+    """Carga el estado por grupo (None si no existe)."""
+    if not Path(ruta).exists():
+        return None
+    estado = pd.read_parquet(ruta)
+    estado['ahorro_centavos'] = estado['ahorro_centavos'].astype('Int64')
+    return estado
+
+
+def main():
+    """CLI: actualiza el estado de ahorros con los depósitos nuevos del libro."""
+    from analizar_y_automatizar import leer_libro_ahorros
+
+    parser = argparse.ArgumentParser(description="Ahorro acumulado por grupo desde el libro de AHORROS")
+    parser.add_argument('archivo', help="AHORROS.xlsx")
+    parser.add_argument('--estado', default='ahorros_estado.parquet', help="Estado por grupo (Parquet)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    movimientos = movimientos_desde_libro(leer_libro_ahorros(args.archivo))
+    estado = acumular_ahorros(movimientos, cargar_estado(args.estado))
+    guardar_estado(estado, args.estado)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,33 +4,58 @@ Carga los 4 archivos de entrada, llama a generar_cartera(), y guarda el resultad
 """
 
 import pandas as pd
-import openpyxl
+import numpy as np
 import logging
 from datetime import datetime
 from pathlib import Path
 import glob
-from cartera_generator import generar_cartera, generar_mora
-from formato_excel import guardar_con_formato, agregar_hoja_mora
+import argparse
+import tempfile
+from contextlib import ExitStack
+from concurrent.futures import ProcessPoolExecutor
+from cartera_generator import unir_fuentes, calcular_cartera, gerentes_ciclo_menor, gerente_vacio, registrar_hallazgos
+from resultado_cartera import ResultadoCartera, ResultadoParticionado
+from formato_excel import (
+    crear_libro_salida, escribir_hojas_cartera, guardar_libro,
+    agregar_hoja_mora, agregar_hojas_rangos_mora, agregar_hoja_resumen, agregar_hoja_calidad
+)
+from resumen_cartera import guardar_resumen_parquet
+from historico_cartera import guardar_snapshot, fecha_reporte_desde_archivo, huella_entradas
+from cartera_particionada import iterar_cartera_particionada
 from parche_promotores import obtener_parche
+from esquema_entradas import ESQUEMAS, validar_encabezados, posiciones_por_defecto
+from registro_layouts import buscar_layout, registrar_layout
+from checkpoints_cartera import ETAPAS, DIRECTORIO_CHECKPOINTS, etapa_checkpoint, guardar_checkpoint, cargar_checkpoint
+from linaje_cartera import guardar_linaje, ruta_linaje, linaje_descartados_carga, LLAVE_HUELLA, COLUMNA_FILA_ANTIGUEDAD, TABLA_DESCARTADOS
+from ahorros_libro import movimientos_desde_libro, acumular_ahorros, tabla_acumulado, conciliar_con_acumulado
+from comparacion_target import cargar_target, comparar_con_target, guardar_reporte, RUTA_REPORTE
+from lector_excel import leer_excel, abrir_libro, nombres_hojas
+from sqlite_cartera import exportar_sqlite, RUTA_SQLITE
+from escritura_atomica import bloqueo_salida
+from registro_logs import configurar_logging, argumentos_proceso, NIVELES_LOG, RUTA_LOG
+from subconjunto_cartera import crear_filtro, seleccionar_ids, restringir, gerentes_poblacion, filtrar_cartera, filtrar_hallazgos, rutas_subconjunto, RUTAS_SUBCONJUNTO
+from calidad_datos import reporte_calidad, tabla_calidad, guardar_reporte_calidad, tabla_hallazgos, hallazgos_desde_tabla, RUTA_REPORTE_CALIDAD, COLUMNAS_VERIFICACION
 
-# Configurar logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('cartera_automation.log'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
+# Columna con el archivo de origen de cada fila (modo consolidado)
+COLUMNA_ORIGEN = 'archivo_origen'
 
-def normalizar_columnas(df: pd.DataFrame) -> pd.DataFrame:
+# Patrón de búsqueda en data/ de cada archivo de entrada
+PATRONES_ENTRADA = {
+    'antiguedad': 'ReportedeAntiguedad*.xlsx',
+    'situacion': 'Situación*.xlsx',
+    'cobranza': 'Cobranza*.xlsx',
+    'ahorros': 'AHORROS.xlsx',
+}
+
+
+def normalizar_nombres(columnas) -> list:
     """
     Normaliza nombres de columnas a snake_case, eliminando saltos de línea y espacios.
     """
     nuevas_columnas = []
-    for col in df.columns:
+    for col in columnas:
         if isinstance(col, tuple):
             # Columnas multi-nivel: unir con guión bajo
             col_str = '_'.join(str(c) for c in col if str(c) != 'Unnamed')
@@ -51,25 +76,138 @@ def normalizar_columnas(df: pd.DataFrame) -> pd.DataFrame:
         
         nuevas_columnas.append(col_str)
     
-    df.columns = nuevas_columnas
+    return nuevas_columnas
+
+
+def normalizar_columnas(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Normaliza nombres de columnas a snake_case, eliminando saltos de línea y espacios.
+    """
+    df.columns = normalizar_nombres(df.columns)
     return df
 
 
-def cargar_antiguedad(ruta: str) -> pd.DataFrame:
-    """Carga y normaliza el archivo de Antigüedad."""
+def aplanar_nombres(columnas) -> list:
+    """
+    Aplana columnas multi-nivel uniendo los niveles con guión bajo y eliminando "Unnamed".
+    """
+    nuevas_columnas = []
+    for col in columnas:
+        if isinstance(col, tuple):
+            # Unir niveles, eliminar "Unnamed"
+            partes = [str(c) for c in col if 'Unnamed' not in str(c)]
+            if partes:
+                col_name = '_'.join(partes)
+            else:
+                col_name = str(col[0])
+        else:
+            col_name = str(col)
+        nuevas_columnas.append(col_name)
+    
+    return nuevas_columnas
+
+
+def primera_hoja(ruta: str) -> str:
+    """Retorna el nombre de la primera hoja del libro (sin leer datos)."""
+    return nombres_hojas(ruta)[0]
+
+
+def renombrar_posiciones(nombres: list, tipo: str, posiciones: dict) -> list:
+    """
+    Renombra los nombres que se toman por posición según {columna destino: índice}.
+    """
+    nuevas_columnas = list(nombres)
+    for destino, indice in posiciones.items():
+        if indice < len(nuevas_columnas) and nuevas_columnas[indice] != destino:
+            logger.info(f"Columna renombrada ({tipo}): {nuevas_columnas[indice]} -> {destino}")
+            nuevas_columnas[indice] = destino
+    return nuevas_columnas
+
+
+def resolver_columnas(tipo: str, columnas, posiciones: dict = None) -> list:
+    """
+    Retorna los nombres finales de las columnas de un reporte (normalizados + posicionales).
+    
+    Si el encabezado corresponde a un layout registrado, los nombres salen del registro
+    sin normalizar ni validar. Si es un layout nuevo, se resuelve contra el esquema y
+    se registra para las siguientes corridas.
+    
+    Args:
+        tipo: Tipo de reporte ('antiguedad', 'situacion', 'cobranza', 'ahorros')
+        columnas: Columnas tal como las entrega pd.read_excel
+        posiciones: {columna destino: índice} validado en el preflight. Si es None,
+            se valida aquí contra el esquema (con remapeo automático)
+    """
+    layout = buscar_layout(tipo, columnas)
+    if layout is not None:
+        logger.info(f"Layout conocido de {tipo}: versión {layout['version']}")
+        return layout['columnas']
+    
+    nombres = normalizar_nombres(aplanar_nombres(columnas))
+    resultado = validar_encabezados(tipo, nombres)
+    validado = posiciones is not None or not resultado['errores']
+    if posiciones is None:
+        for error in resultado['errores']:
+            logger.warning(error)
+        posiciones = {**posiciones_por_defecto(tipo), **resultado['posiciones']}
+    
+    nombres = renombrar_posiciones(nombres, tipo, posiciones)
+    
+    # Solo se registran layouts que cumplen el esquema
+    if validado:
+        registrar_layout(tipo, columnas, nombres, posiciones)
+    
+    return nombres
+
+
+def cargar_antiguedad(ruta: str, eliminar_duplicados: bool = True, calidad: dict = None,
+                      descartados: list = None) -> pd.DataFrame:
+    """
+    Carga y normaliza el archivo de Antigüedad.
+    
+    Args:
+        ruta: Ruta del archivo
+        eliminar_duplicados: Eliminar IDs duplicados (ciclo mayor). En modo consolidado
+            se hace una sola vez sobre la unión de todos los archivos.
+        calidad: Diccionario de hallazgos de calidad (ver eliminar_duplicados_antiguedad)
+        descartados: Lista a la que se agregan los registros eliminados (ver eliminar_duplicados_antiguedad)
+    """
     logger.info(f"Cargando ANTIGÜEDAD desde: {ruta}")
     
     # Detectar el nombre de la hoja automáticamente (la fecha cambia)
-    wb = openpyxl.load_workbook(ruta, read_only=True)
-    nombre_hoja = wb.sheetnames[0]  # Usar la primera hoja
-    wb.close()
+    nombre_hoja = primera_hoja(ruta)  # Usar la primera hoja
     logger.info(f"Hoja detectada: '{nombre_hoja}'")
     
-    df = pd.read_excel(ruta, sheet_name=nombre_hoja, header=0)
-    df = normalizar_columnas(df)
+    df = leer_excel(ruta, sheet_name=nombre_hoja, header=ESQUEMAS['antiguedad']['encabezado'])
+    df.columns = resolver_columnas('antiguedad', df.columns)
     logger.info(f"ANTIGÜEDAD cargado: {df.shape}")
     logger.info(f"Columnas: {list(df.columns[:10])}...")
     
+    if eliminar_duplicados:
+        df = eliminar_duplicados_antiguedad(df, calidad, descartados)
+    
+    return df
+
+
+def eliminar_duplicados_antiguedad(df: pd.DataFrame, calidad: dict = None, descartados: list = None) -> pd.DataFrame:
+    """
+    Elimina IDs duplicados de ANTIGÜEDAD manteniendo el registro con ciclo mayor.
+    Si el registro mantenido no tiene gerente, usa el del ciclo menor con gerente.
+    
+    Cada registro conserva su fila en la ANTIGÜEDAD cargada (COLUMNA_FILA_ANTIGUEDAD):
+    el resultado queda ordenado por ciclo y sin los duplicados, así que el linaje
+    usa esa columna y no la posición.
+    
+    Args:
+        df: ANTIGÜEDAD cargada
+        calidad: Si se pasa un diccionario, se registran los hallazgos 'duplicados_descartados'
+            (ciclo) y 'gerente_ciclo_menor' (gerente), como en unir_fuentes
+        descartados: Si se pasa una lista, se le agrega el DataFrame de los registros
+            eliminados (con COLUMNA_FILA_ANTIGUEDAD), para el linaje y el checkpoint 'carga'
+    """
+    if COLUMNA_FILA_ANTIGUEDAD not in df.columns:
+        df[COLUMNA_FILA_ANTIGUEDAD] = np.arange(len(df))
+    
     # Validar y eliminar duplicados por ID manteniendo el ciclo mayor
     if 'cod_grupo_solidario' in df.columns and 'ciclo' in df.columns:
         registros_antes = len(df)
@@ -83,32 +221,27 @@ def cargar_antiguedad(ruta: str) -> pd.DataFrame:
             df['ciclo'] = pd.to_numeric(df['ciclo'], errors='coerce')
             
             # Guardar nombre_de_gerente de registros con ciclo menor antes de eliminar duplicados
-            ids_duplicados = df[duplicados]['cod_grupo_solidario'].unique()
-            gerentes_ciclo_menor = {}
-            for id_dup in ids_duplicados:
-                registros_dup = df[df['cod_grupo_solidario'] == id_dup].copy()
-                # Ordenar por ciclo ascendente (menor primero)
-                registros_dup = registros_dup.sort_values('ciclo', ascending=True, na_position='last')
-                # Buscar el primer registro con nombre_de_gerente no vacío
-                for _, row in registros_dup.iterrows():
-                    nombre_gerente = row.get('nombre_de_gerente', None)
-                    if pd.notna(nombre_gerente) and str(nombre_gerente).strip() != '':
-                        gerentes_ciclo_menor[id_dup] = nombre_gerente
-                        break
+            gerente_menor_por_id = gerentes_ciclo_menor(df['cod_grupo_solidario'], df['ciclo'], df['nombre_de_gerente'])
             
             # Ordenar por ciclo descendente y eliminar duplicados manteniendo el primero (ciclo mayor)
             df = df.sort_values('ciclo', ascending=False)
-            df = df.drop_duplicates(subset=['cod_grupo_solidario'], keep='first')
+            repetidas = df.duplicated(subset=['cod_grupo_solidario'], keep='first')
+            # ID a 6 dígitos, como en los hallazgos de unir_fuentes
+            ids = df['cod_grupo_solidario'].astype(str).str.zfill(6)
+            if calidad is not None:
+                registrar_hallazgos(calidad, 'duplicados_descartados', ids, df['ciclo'], repetidas)
             
             # Si el registro mantenido tiene nombre_de_gerente vacío, usar el del ciclo menor
-            for id_dup, nombre_gerente_menor in gerentes_ciclo_menor.items():
-                mask = (df['cod_grupo_solidario'] == id_dup) & (
-                    df['nombre_de_gerente'].isna() | 
-                    (df['nombre_de_gerente'].astype(str).str.strip() == '')
-                )
-                if mask.any():
-                    df.loc[mask, 'nombre_de_gerente'] = nombre_gerente_menor
-                    logger.info(f"ID {id_dup}: Usado nombre_de_gerente del ciclo menor ({nombre_gerente_menor})")
+            gerente_menor = df['cod_grupo_solidario'].map(gerente_menor_por_id)
+            mask = ~repetidas & gerente_menor.notna() & gerente_vacio(df['nombre_de_gerente'])
+            if mask.any():
+                df['nombre_de_gerente'] = df['nombre_de_gerente'].where(~mask, gerente_menor)
+                logger.info(f"{int(mask.sum())} IDs duplicados con nombre_de_gerente del ciclo menor")
+                if calidad is not None:
+                    registrar_hallazgos(calidad, 'gerente_ciclo_menor', ids, gerente_menor, mask)
+            if descartados is not None:
+                descartados.append(df[repetidas])
+            df = df[~repetidas]
             
             registros_despues = len(df)
             eliminados = registros_antes - registros_despues
@@ -121,239 +254,742 @@ def cargar_antiguedad(ruta: str) -> pd.DataFrame:
     return df
 
 
-def cargar_situacion(ruta: str) -> pd.DataFrame:
-    """Carga y normaliza el archivo de Situación de Cartera."""
+def cargar_situacion(ruta: str, posiciones: dict = None, ids=None) -> pd.DataFrame:
+    """
+    Carga y normaliza el archivo de Situación de Cartera.
+    
+    Args:
+        ruta: Ruta del archivo
+        posiciones: Posiciones de columnas validadas en el preflight (opcional)
+        ids: Conservar solo estos IDs de grupo a 6 dígitos (modo subconjunto, opcional)
+    """
     logger.info(f"Cargando SITUACIÓN DE CARTERA desde: {ruta}")
+    esquema = ESQUEMAS['situacion']
     
     # Leer con headers multi-nivel
-    df = pd.read_excel(ruta, sheet_name='SITUACIÓN DE CARTERA', header=[11, 12])
-    
-    # Aplanar columnas multi-nivel
-    nuevas_columnas = []
-    for col in df.columns:
-        if isinstance(col, tuple):
-            # Unir niveles, eliminar "Unnamed"
-            partes = [str(c) for c in col if 'Unnamed' not in str(c)]
-            if partes:
-                col_name = '_'.join(partes)
-            else:
-                col_name = str(col[0])
-        else:
-            col_name = str(col)
-        nuevas_columnas.append(col_name)
+    df = leer_excel(ruta, sheet_name=esquema['hoja'], header=esquema['encabezado'])
     
-    df.columns = nuevas_columnas
-    df = normalizar_columnas(df)
+    # Aplanar columnas multi-nivel, normalizar y renombrar columnas clave para el join
+    # (ver ESQUEMAS['situacion']): 8: CODIGO del grupo, 10: ciclo, 24-26: cartera vencida
+    # importe/% y vigente importe, 29: cartera vigente parcialidad, 41: número de integrantes
+    df.columns = resolver_columnas('situacion', df.columns, posiciones)
+    if ids is not None:
+        df = restringir(df, 'situacion', ids)
     
     logger.info(f"SITUACIÓN DE CARTERA cargada: {df.shape}")
     logger.info(f"Columnas: {list(df.columns[:10])}...")
     
-    # Renombrar columnas clave para el join
-    # Columna 9 (índice 8): CODIGO del grupo
-    if len(df.columns) > 8:
-        columna_codigo = df.columns[8]
-        df.rename(columns={columna_codigo: 'codigo'}, inplace=True)
-        logger.info(f"Columna de código renombrada: {columna_codigo} -> codigo")
-    
-    # Renombrar otras columnas importantes
-    if 'nombre_ciclo' in df.columns:
-        df.rename(columns={'nombre_ciclo': 'ciclo_sit'}, inplace=True)
-    elif len(df.columns) > 10:
-        df.rename(columns={df.columns[10]: 'ciclo_sit'}, inplace=True)
-    
-    # Columna 25: Cartera vencida importe (índice 24)
-    if len(df.columns) > 24:
-        df.rename(columns={df.columns[24]: 'cartera_vencida_importe'}, inplace=True)
+    return df
+
+
+def cargar_cobranza(ruta: str, posiciones: dict = None, ids=None) -> pd.DataFrame:
+    """
+    Carga y normaliza el archivo de Cobranza.
     
-    # Columna 26: Cartera vencida % (índice 25)
-    if len(df.columns) > 25:
-        df.rename(columns={df.columns[25]: 'cartera_vencida_pct'}, inplace=True)
+    Args:
+        ruta: Ruta del archivo
+        posiciones: Posiciones de columnas validadas en el preflight (opcional)
+        ids: Conservar solo estos IDs de grupo a 6 dígitos (modo subconjunto, opcional)
+    """
+    logger.info(f"Cargando REPORTE DE COBRANZA desde: {ruta}")
+    esquema = ESQUEMAS['cobranza']
+    df = leer_excel(ruta, sheet_name=esquema['hoja'], header=esquema['encabezado'])
     
-    # Columna 27: Cartera vigente importe (índice 26) - CORRECCIÓN: Esta es la correcta
-    if len(df.columns) > 26:
-        df.rename(columns={df.columns[26]: 'cartera_vigente_importe'}, inplace=True)
+    # Normalizar y renombrar columnas clave (ver ESQUEMAS['cobranza']):
+    # 6: Gpo (ID del grupo), 39: próximo pago, 40: pagos por vencer, 41: total pagos
+    df.columns = resolver_columnas('cobranza', df.columns, posiciones)
+    if ids is not None:
+        df = restringir(df, 'cobranza', ids)
     
-    # Columna 30: Cartera vigente parcialidad (índice 29) - CORRECCIÓN: Para pagos_cubiertos
-    if len(df.columns) > 29:
-        df.rename(columns={df.columns[29]: 'cartera_vigente_parcialidad'}, inplace=True)
+    logger.info(f"REPORTE DE COBRANZA cargado: {df.shape}")
+    logger.info(f"Columnas: {list(df.columns[:10])}...")
     
-    # Columna 42: Número de integrantes (índice 41) - CORRECCIÓN
-    if len(df.columns) > 41:
-        df.rename(columns={df.columns[41]: 'numero_de_integrantes_sit'}, inplace=True)
+    return df
+
+
+def columnas_a_leer(tipo: str):
+    """Argumento usecols de pd.read_excel para un reporte (None = todas las columnas)."""
+    if ESQUEMAS[tipo].get('solo_con_encabezado'):
+        return lambda col: not str(col).startswith('Unnamed')
+    return None
+
+
+def leer_libro_ahorros(ruta) -> pd.DataFrame:
+    """
+    Lee el libro de movimientos (hoja AHORROS) con columnas normalizadas.
     
+    Se leen solo las columnas con encabezado (la de notas al final no tiene) y todo
+    como texto/valor crudo: los IDs '000018' no se convierten a número.
+    """
+    esquema = ESQUEMAS['ahorros']
+    df = leer_excel(
+        ruta,
+        sheet_name=esquema['hoja'],
+        header=esquema['encabezado'],
+        usecols=columnas_a_leer('ahorros'),
+        dtype=object
+    )
+    df.columns = resolver_columnas('ahorros', df.columns)
     return df
 
 
-def cargar_cobranza(ruta: str) -> pd.DataFrame:
-    """Carga y normaliza el archivo de Cobranza."""
-    logger.info(f"Cargando REPORTE DE COBRANZA desde: {ruta}")
-    df = pd.read_excel(ruta, sheet_name='REPORTE DE COBRANZA', header=8)
-    df = normalizar_columnas(df)
+def cargar_ahorros(ruta: str, ids=None) -> pd.DataFrame:
+    """
+    Carga AHORROS calculando el ahorro acumulado por grupo desde el libro de movimientos
+    (no usa los valores en caché de las fórmulas de la hoja ACUMULADO).
     
-    logger.info(f"REPORTE DE COBRANZA cargado: {df.shape}")
-    logger.info(f"Columnas: {list(df.columns[:10])}...")
+    Args:
+        ruta: Ruta del archivo
+        ids: Acumular solo los movimientos de estos IDs de grupo a 6 dígitos (modo subconjunto, opcional)
     
-    # Renombrar columnas clave - CORREGIDO
-    # Columna 7 (índice 6): Gpo (ID del grupo)
-    if 'gpo' in df.columns:
-        pass
-    elif len(df.columns) > 6:
-        df.rename(columns={df.columns[6]: 'gpo'}, inplace=True)
-    
-    # Columna 40 (índice 39): Próximo pago - CORRECCIÓN
-    if 'proximo_pago' in df.columns:
-        df.rename(columns={'proximo_pago': 'proximo_pago_cob'}, inplace=True)
-    elif len(df.columns) > 39:
-        df.rename(columns={df.columns[39]: 'proximo_pago_cob'}, inplace=True)
-    
-    # Columna 41 (índice 40): Pagos por vencer - CORRECCIÓN
-    if 'por_vencer' in df.columns:
-        pass
-    elif len(df.columns) > 40:
-        df.rename(columns={df.columns[40]: 'por_vencer'}, inplace=True)
-    
-    # Columna 42 (índice 41): Total pagos - CORRECCIÓN
-    if 'pagos' in df.columns:
-        pass
-    elif len(df.columns) > 41:
-        df.rename(columns={df.columns[41]: 'pagos'}, inplace=True)
+    Returns:
+        DataFrame con la forma de la hoja ACUMULADO: id, grupo, ciclo, ahorro_acumulado
+    """
+    logger.info(f"Cargando AHORROS (libro de movimientos) desde: {ruta}")
+    with abrir_libro(ruta) as libro:
+        df_libro = leer_libro_ahorros(libro)
+        movimientos = movimientos_desde_libro(df_libro)
+        if ids is not None:
+            movimientos = restringir(movimientos, 'ahorros', ids)
+        df = tabla_acumulado(acumular_ahorros(movimientos))
+        
+        # Avisar si la hoja ACUMULADO (fórmulas en caché) no coincide con el libro
+        if ESQUEMAS['ahorros_acumulado']['hoja'] in libro.sheet_names:
+            df_acumulado = leer_acumulado_ahorros(libro)
+            if ids is not None:
+                df_acumulado = restringir(df_acumulado, 'ahorros', ids)
+            diferencias = conciliar_con_acumulado(df, df_acumulado)
+            if len(diferencias):
+                logger.warning(
+                    f"AHORROS: {len(diferencias)} grupos con ahorro distinto en la hoja ACUMULADO "
+                    f"(se usa el libro): {diferencias[['id', 'ciclo']].head(10).values.tolist()}"
+                )
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"Diferencias contra ACUMULADO:\n{diferencias.to_string()}")
+    
+    logger.info(f"AHORROS cargado: {df.shape} ({len(movimientos)} movimientos)")
     
     return df
 
 
-def cargar_ahorros(ruta: str) -> pd.DataFrame:
-    """Carga y normaliza el archivo de Ahorros."""
+def leer_acumulado_ahorros(ruta) -> pd.DataFrame:
+    """Lee la hoja ACUMULADO (valores en caché de sus fórmulas) con columnas normalizadas."""
+    esquema = ESQUEMAS['ahorros_acumulado']
+    df = leer_excel(ruta, sheet_name=esquema['hoja'], header=esquema['encabezado'])
+    df.columns = resolver_columnas('ahorros_acumulado', df.columns)
+    return df
+
+
+def cargar_ahorros_acumulado(ruta: str) -> pd.DataFrame:
+    """Carga AHORROS desde la hoja ACUMULADO (carga anterior a cargar_ahorros)."""
     logger.info(f"Cargando AHORROS (ACUMULADO) desde: {ruta}")
-    df = pd.read_excel(ruta, sheet_name='ACUMULADO', header=0)
-    df = normalizar_columnas(df)
+    df = leer_acumulado_ahorros(ruta)
     
     logger.info(f"AHORROS cargado: {df.shape}")
-    logger.info(f"Columnas: {list(df.columns)}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Columnas: {list(df.columns)}")
     
     return df
 
 
-def buscar_archivo(patron: str) -> str:
+def buscar_archivos(patron: str) -> list:
     """
-    Busca un archivo en data/ que coincida con el patrón.
+    Busca todos los archivos en data/ que coincidan con el patrón, en orden alfabético.
     
     Args:
         patron: Patrón de búsqueda (ej: 'ReportedeAntiguedad*.xlsx')
         
     Returns:
-        Ruta del archivo encontrado
+        Lista ordenada de rutas
         
     Raises:
-        FileNotFoundError: Si no se encuentra el archivo
+        FileNotFoundError: Si no se encuentra ningún archivo
     """
-    archivos = glob.glob(f'data/{patron}')
+    archivos = sorted(glob.glob(f'data/{patron}'))
     
     if not archivos:
         raise FileNotFoundError(f"No se encontró archivo con patrón: data/{patron}")
     
+    return archivos
+
+
+def buscar_archivo(patron: str) -> str:
+    """
+    Busca un archivo en data/ que coincida con el patrón.
+    
+    Args:
+        patron: Patrón de búsqueda (ej: 'ReportedeAntiguedad*.xlsx')
+        
+    Returns:
+        Ruta del archivo encontrado (el primero en orden alfabético si hay varios)
+        
+    Raises:
+        FileNotFoundError: Si no se encuentra el archivo
+    """
+    archivos = buscar_archivos(patron)
+    
     if len(archivos) > 1:
-        logger.warning(f"Se encontraron {len(archivos)} archivos para '{patron}', usando el primero")
+        logger.warning(
+            f"Se encontraron {len(archivos)} archivos para '{patron}', usando el primero "
+            f"(usar --consolidar para procesarlos todos)"
+        )
     
     ruta = archivos[0]
     logger.info(f"Archivo encontrado: {ruta}")
     return ruta
 
 
-def validar_output(df_output: pd.DataFrame, ruta_machote: str):
-    """Valida el output generado contra el machote."""
-    logger.info("\n=== VALIDACIÓN ===")
+def _cargar_archivo(tipo: str, ruta: str, posiciones: dict = None, ids=None) -> pd.DataFrame:
+    """Carga un archivo de entrada sin eliminar duplicados y lo etiqueta con su origen."""
+    if tipo == 'antiguedad':
+        df = cargar_antiguedad(ruta, eliminar_duplicados=False)
+    elif tipo == 'situacion':
+        df = cargar_situacion(ruta, posiciones, ids)
+    elif tipo == 'cobranza':
+        df = cargar_cobranza(ruta, posiciones, ids)
+    elif tipo == 'ahorros':
+        df = cargar_ahorros(ruta, ids)
+    else:
+        raise ValueError(f"Tipo de reporte desconocido: {tipo}")
+    df[COLUMNA_ORIGEN] = Path(ruta).name
+    return df
+
+
+def cargar_consolidado(rutas: dict, posiciones: dict = None, max_procesos: int = None, ids=None,
+                       calidad: dict = None, descartados: list = None) -> dict:
+    """
+    Carga todos los archivos de cada tipo de reporte en paralelo y los concatena.
     
-    try:
-        # Cargar hoja CARTERA del machote
-        df_machote = pd.read_excel(ruta_machote, sheet_name='CARTERA', header=5)
-        
-        logger.info(f"Output generado: {df_output.shape}")
-        logger.info(f"Machote CARTERA: {df_machote.shape}")
-        
-        # Validar número de columnas
-        if df_output.shape[1] == 36:
-            logger.info("OK - Número de columnas correcto: 36")
-        else:
-            logger.warning(f"WARN - Número de columnas incorrecto: {df_output.shape[1]} (esperado: 36)")
-        
-        # Validar tipos de datos
-        logger.info("\nTipos de datos:")
-        logger.info(f"- Fechas: {df_output['fecha_de_inicio_del_credito'].dtype}")
-        logger.info(f"- Numéricos: {df_output['monto_del_credito'].dtype}")
-        logger.info(f"- Strings: {df_output['nombre_de_grupo'].dtype}")
+    Cada fila queda etiquetada con su archivo de origen (columna COLUMNA_ORIGEN).
+    Los IDs de ANTIGÜEDAD repetidos entre archivos se resuelven con la misma regla
+    de ciclo mayor que dentro de un archivo, aplicada una sola vez sobre la unión;
+    los repetidos en las demás fuentes los resuelve generar_cartera después de los joins.
+    
+    Args:
+        rutas: Diccionario {tipo: [rutas]} (de buscar_archivos)
+        posiciones: Diccionario {tipo: [posiciones por archivo]} (de preflight_entradas)
+        max_procesos: Procesos para leer archivos en paralelo (None = núm. de CPUs, 1 = secuencial)
+        ids: Conservar solo estos IDs de grupo en SITUACIÓN, COBRANZA y AHORROS (modo subconjunto)
+        calidad: Diccionario de hallazgos de calidad (IDs de ANTIGÜEDAD repetidos, opcional)
+        descartados: Lista a la que se agregan los registros de ANTIGÜEDAD eliminados
+            (su COLUMNA_FILA_ANTIGUEDAD es la fila en la unión de los archivos)
+    
+    Returns:
+        Diccionario {tipo: DataFrame consolidado}
+    """
+    posiciones = posiciones or {}
+    tareas = [
+        (tipo, ruta, (posiciones.get(tipo) or [None] * len(lista))[i], ids)
+        for tipo, lista in rutas.items()
+        for i, ruta in enumerate(lista)
+    ]
+    logger.info(f"Consolidando {len(tareas)} archivos de entrada")
+    
+    if max_procesos == 1 or len(tareas) == 1:
+        resultados = [_cargar_archivo(*tarea) for tarea in tareas]
+    else:
+        with ProcessPoolExecutor(max_workers=max_procesos, **argumentos_proceso()) as executor:
+            resultados = list(executor.map(_cargar_archivo, *zip(*tareas)))
+    
+    consolidado = {}
+    for tipo in rutas:
+        partes = [df for (tipo_tarea, *_), df in zip(tareas, resultados) if tipo_tarea == tipo]
+        df = pd.concat(partes, ignore_index=True)
+        logger.info(f"{tipo}: {len(partes)} archivos, {len(df)} registros")
+        if tipo == 'antiguedad':
+            df = eliminar_duplicados_antiguedad(df, calidad, descartados)
+        consolidado[tipo] = df
+    
+    return consolidado
+
+
+def cargar_subconjunto(
+    rutas: dict,
+    posiciones: dict,
+    filtro: dict,
+    consolidar: bool = False,
+    max_procesos: int = None,
+    calidad: dict = None
+) -> tuple:
+    """
+    Carga las entradas de un subconjunto de grupos (ver subconjunto_cartera).
+    
+    ANTIGÜEDAD se carga completa para elegir los IDs del filtro; las demás fuentes
+    se filtran a esos IDs (y a los repetidos en ANTIGÜEDAD) al leerlas.
+    
+    Args:
+        rutas: {tipo: ruta} o, si consolidar, {tipo: [rutas]}
+        posiciones: Posiciones de columnas de preflight_entradas
+        filtro: Filtro de crear_filtro
+        consolidar: Las rutas son listas de archivos (--consolidar)
+        max_procesos: Procesos para leer archivos en modo consolidado
+        calidad: Diccionario de hallazgos de calidad de la carga (opcional)
+    
+    Returns:
+        Tupla (entradas, gerentes_coordinacion): entradas {tipo: DataFrame} del
+        subconjunto y el diccionario de gerentes por coordinación de todos los grupos
+    """
+    if consolidar:
+        df_antiguedad = cargar_consolidado(
+            {'antiguedad': rutas['antiguedad']}, posiciones, max_procesos, calidad=calidad
+        )['antiguedad']
+    else:
+        df_antiguedad = cargar_antiguedad(rutas['antiguedad'], calidad=calidad)
+    ids_subconjunto, ids_repetidos = seleccionar_ids(df_antiguedad, filtro)
+    ids = ids_subconjunto.union(ids_repetidos)
+    
+    if consolidar:
+        otras = {tipo: lista for tipo, lista in rutas.items() if tipo != 'antiguedad'}
+        entradas = cargar_consolidado(otras, posiciones, max_procesos, ids=ids)
+    else:
+        entradas = {
+            'situacion': cargar_situacion(rutas['situacion'], posiciones['situacion'], ids),
+            'cobranza': cargar_cobranza(rutas['cobranza'], posiciones['cobranza'], ids),
+            'ahorros': cargar_ahorros(rutas['ahorros'], ids),
+        }
+    
+    gerentes_coordinacion = gerentes_poblacion(
+        df_antiguedad, entradas['situacion'], entradas['cobranza'], entradas['ahorros'], ids_repetidos
+    )
+    entradas = {
+        'antiguedad': restringir(df_antiguedad, 'antiguedad', ids_subconjunto),
+        **{tipo: restringir(df, tipo, ids_subconjunto) for tipo, df in entradas.items()},
+    }
+    return entradas, gerentes_coordinacion
+
+
+def leer_encabezado(ruta: str, tipo: str) -> list:
+    """
+    Lee solo las filas de encabezado de un reporte y retorna las columnas sin normalizar.
+    
+    Con nrows=0, el lector deja de iterar después de las filas de encabezado, así que el
+    costo no depende del tamaño del archivo.
+    Las columnas salen exactamente como las recibe el cargador (mismo usecols).
+    """
+    esquema = ESQUEMAS[tipo]
+    nombre_hoja = esquema['hoja'] if esquema['hoja'] is not None else primera_hoja(ruta)
+    df = leer_excel(
+        ruta, sheet_name=nombre_hoja, header=esquema['encabezado'], nrows=0, usecols=columnas_a_leer(tipo)
+    )
+    return list(df.columns)
+
+
+def preflight_entradas(rutas: dict, auto_remapear: bool = True) -> dict:
+    """
+    Valida los encabezados de los archivos de entrada antes de parsearlos completos.
+    
+    Los encabezados de layouts ya registrados no se vuelven a validar. Los layouts
+    nuevos que cumplen el esquema se registran con sus nombres finales.
+    
+    Args:
+        rutas: Diccionario {tipo: ruta} o {tipo: [rutas]} con tipo en ESQUEMAS
+        auto_remapear: Remapear columnas posicionales cuya etiqueta cambió de lugar
         
-        # Validar valores no nulos en columnas críticas
-        columnas_criticas = ['id_de_grupo', 'nombre_de_grupo', 'estatus']
-        for col in columnas_criticas:
-            nulos = df_output[col].isna().sum()
-            if nulos == 0:
-                logger.info(f"OK - {col}: sin valores nulos")
-            else:
-                logger.warning(f"WARN - {col}: {nulos} valores nulos")
+    Returns:
+        Diccionario {tipo: {columna destino: índice}} para pasar a los cargadores
+        (con una lista de rutas, {tipo: [posiciones por archivo]})
         
-        # Mostrar sample
-        logger.info("\nSample de primeros 3 registros:")
-        logger.info(f"\n{df_output.head(3)[['id_de_grupo', 'nombre_de_grupo', 'ciclo', 'monto_del_credito', 'estatus']].to_string()}")
+    Raises:
+        ValueError: Si algún archivo no cumple su esquema (lista todos los errores)
+    """
+    errores = []
+    posiciones = {}
+    for tipo, ruta_o_rutas in rutas.items():
+        lista = ruta_o_rutas if isinstance(ruta_o_rutas, list) else [ruta_o_rutas]
+        posiciones_tipo = []
+        for ruta in lista:
+            try:
+                columnas = leer_encabezado(ruta, tipo)
+            except (ValueError, KeyError) as e:
+                errores.append(f"{tipo}: no se pudo leer el encabezado de '{ruta}': {e}")
+                posiciones_tipo.append(None)
+                continue
+            
+            layout = buscar_layout(tipo, columnas)
+            if layout is not None:
+                posiciones_tipo.append(layout['posiciones'])
+                logger.info(f"Preflight {tipo}: layout conocido (versión {layout['version']})")
+                continue
+            
+            nombres = normalizar_nombres(aplanar_nombres(columnas))
+            resultado = validar_encabezados(tipo, nombres, auto_remapear=auto_remapear)
+            errores.extend(f"{Path(ruta).name}: {error}" for error in resultado['errores'])
+            posiciones_tipo.append(resultado['posiciones'])
+            logger.info(f"Preflight {tipo}: {len(columnas)} columnas, {len(resultado['remapeos'])} remapeos")
+            
+            if not resultado['errores']:
+                nombres = renombrar_posiciones(nombres, tipo, resultado['posiciones'])
+                registrar_layout(tipo, columnas, nombres, resultado['posiciones'])
         
+        posiciones[tipo] = posiciones_tipo if isinstance(ruta_o_rutas, list) else posiciones_tipo[0]
+    
+    if errores:
+        for error in errores:
+            logger.error(error)
+        raise ValueError("Archivos de entrada no cumplen el esquema:\n" + "\n".join(errores))
+    
+    return posiciones
+
+
+def validar_output(df_output: pd.DataFrame, ruta_machote: str, ruta_reporte: str = RUTA_REPORTE) -> dict:
+    """
+    Compara el output generado contra la hoja CARTERA del machote (target).
+
+    Returns:
+        Reporte de diferencias (también se guarda en JSON), o None si falla la comparación
+    """
+    logger.info("\n=== VALIDACIÓN ===")
+    
+    try:
+        df_target = cargar_target(ruta_machote)
+        reporte = comparar_con_target(df_output, df_target)
+        guardar_reporte(reporte, ruta_reporte)
+        return reporte
     except Exception as e:
         logger.error(f"Error en validación: {e}")
+        return None
+
+
+def parsear_argumentos(argv=None) -> argparse.Namespace:
+    """Argumentos de línea de comandos de la automatización."""
+    parser = argparse.ArgumentParser(description="Automatización de la hoja CARTERA")
+    parser.add_argument(
+        '--particiones', type=int, default=None,
+        help="Generar CARTERA fuera de memoria en N particiones por ID de grupo"
+    )
+    parser.add_argument(
+        '--procesos', type=int, default=None,
+        help="Procesos para leer archivos (--consolidar, por defecto núm. de CPUs) "
+             "o calcular particiones (--particiones, por defecto 1)"
+    )
+    parser.add_argument(
+        '--consolidar', action='store_true',
+        help="Procesar todos los archivos que coincidan con cada patrón (uno por región)"
+    )
+    parser.add_argument(
+        '--checkpoints', nargs='?', const=DIRECTORIO_CHECKPOINTS, default=None, metavar='DIRECTORIO',
+        help=f"Guardar checkpoints después de carga, union y calculo (por defecto en {DIRECTORIO_CHECKPOINTS}/)"
+    )
+    parser.add_argument(
+        '--resume-from', dest='reanudar_desde', choices=ETAPAS[1:], default=None,
+        help="Reanudar en una etapa usando el checkpoint de la etapa anterior"
+    )
+    parser.add_argument(
+        '--sqlite', nargs='?', const=RUTA_SQLITE, default=None, metavar='RUTA',
+        help=f"Agregar CARTERA y MORA a una base SQLite (por defecto {RUTA_SQLITE})"
+    )
+    parser.add_argument(
+        '--hoja-calidad', action='store_true',
+        help=f"Agregar la hoja CALIDAD al output (el reporte siempre se guarda en {RUTA_REPORTE_CALIDAD})"
+    )
+    parser.add_argument(
+        '--nivel-log', choices=NIVELES_LOG, default='INFO',
+        help=f"Nivel de logging (DEBUG agrega diagnósticos; el log rota en {RUTA_LOG})"
+    )
+    parser.add_argument(
+        '--gerente', nargs='+', metavar='NOMBRE',
+        help=f"Generar solo los grupos de estos gerentes (salida en {RUTAS_SUBCONJUNTO['output'].format(etiqueta='<filtro>')})"
+    )
+    parser.add_argument(
+        '--promotor', nargs='+', metavar='NOMBRE',
+        help="Generar solo los grupos de estos promotores"
+    )
+    parser.add_argument(
+        '--ids', nargs='+', metavar='ID',
+        help="Generar solo estos IDs de grupo"
+    )
+    args = parser.parse_args(argv)
+    if args.gerente or args.promotor or args.ids:
+        incompatibles = [
+            opcion for opcion, valor in (
+                ('--particiones', args.particiones), ('--checkpoints', args.checkpoints),
+                ('--resume-from', args.reanudar_desde), ('--sqlite', args.sqlite),
+            ) if valor is not None
+        ]
+        if incompatibles:
+            parser.error(f"--gerente/--promotor/--ids no se combinan con {', '.join(incompatibles)}")
+    if args.particiones and args.reanudar_desde == 'calculo':
+        # Por particiones los joins se hacen por partición: no hay checkpoint 'union' del cual reanudar
+        parser.error(
+            "--resume-from calculo no se combina con --particiones (no hay checkpoint 'union'); "
+            "usar --resume-from union o --resume-from salida"
+        )
+    return args
 
 
-def main():
+def main(argv=None):
     """Función principal."""
+    args = parsear_argumentos(argv)
+    configurar_logging(nivel=args.nivel_log)
+    filtro = crear_filtro(args.gerente, args.promotor, args.ids)
+    
     logger.info("=" * 80)
     logger.info("INICIO DE AUTOMATIZACIÓN DE CARTERA")
     logger.info("=" * 80)
     
+    # Bloqueo del directorio de salida: desde el primer guardado del libro hasta la
+    # última hoja agregada, para que otra corrida no intercale sus escrituras
+    salida = ExitStack()
+    # Directorios de trabajo (particiones de --particiones): se eliminan al terminar la corrida
+    temporales = ExitStack()
     try:
-        # Buscar archivos dinámicamente
-        logger.info("\n--- PASO 0: BÚSQUEDA DE ARCHIVOS ---")
-        RUTA_ANTIGUEDAD = buscar_archivo('ReportedeAntiguedad*.xlsx')
-        RUTA_SITUACION = buscar_archivo('Situación*.xlsx')
-        RUTA_COBRANZA = buscar_archivo('Cobranza*.xlsx')
-        RUTA_AHORROS = buscar_archivo('AHORROS.xlsx')
-        
         # Archivos fijos
         RUTA_PLANTILLA = 'plantilla/CARTERA_HEADERS.xlsx'
         RUTA_OUTPUT = 'output_automatizado.xlsx'
+        RUTA_RESUMEN = 'resumen_cartera.parquet'
+        ruta_calidad = RUTA_REPORTE_CALIDAD
+        gerentes_coordinacion = None
+        if filtro:
+            # Subconjunto: salidas propias para no reemplazar las de la corrida completa
+            logger.info(f"MODO SUBCONJUNTO: {filtro}")
+            salidas_subconjunto = rutas_subconjunto(filtro)
+            RUTA_OUTPUT = salidas_subconjunto['output']
+            RUTA_RESUMEN = salidas_subconjunto['resumen']
+            ruta_calidad = salidas_subconjunto['calidad']
+        
+        # Checkpoints: se guardan si se pidió --checkpoints; al reanudar se leen del mismo directorio
+        directorio_checkpoints = args.checkpoints
+        if args.reanudar_desde and directorio_checkpoints is None:
+            directorio_checkpoints = DIRECTORIO_CHECKPOINTS
+        guardar_checkpoints = args.checkpoints is not None
+        inicio = ETAPAS.index(args.reanudar_desde) if args.reanudar_desde else 0
+        
+        def ejecutar(etapa: str) -> bool:
+            return ETAPAS.index(etapa) >= inicio
+        
+        if ejecutar('carga'):
+            # Buscar archivos dinámicamente
+            logger.info("\n--- PASO 0: BÚSQUEDA DE ARCHIVOS ---")
+            if args.consolidar:
+                rutas = {tipo: buscar_archivos(patron) for tipo, patron in PATRONES_ENTRADA.items()}
+                for tipo, lista in rutas.items():
+                    logger.info(f"{tipo}: {len(lista)} archivos: {[Path(ruta).name for ruta in lista]}")
+                rutas_entrada = {
+                    f"{tipo}_{i}" if len(lista) > 1 else tipo: ruta
+                    for tipo, lista in rutas.items()
+                    for i, ruta in enumerate(lista, start=1)
+                }
+                RUTA_ANTIGUEDAD = rutas['antiguedad'][0]
+            else:
+                rutas = {tipo: buscar_archivo(patron) for tipo, patron in PATRONES_ENTRADA.items()}
+                rutas_entrada = rutas
+                RUTA_ANTIGUEDAD = rutas['antiguedad']
+            
+            # 0.1. Validar encabezados antes de parsear los archivos completos
+            logger.info("\n--- PASO 0.1: PREFLIGHT DE ENCABEZADOS ---")
+            posiciones = preflight_entradas(rutas)
+            
+            # 1. Cargar inputs
+            logger.info("\n--- PASO 1: CARGA DE ARCHIVOS ---")
+            # Hallazgos de la carga (IDs repetidos en ANTIGÜEDAD); se suman a los de unir_fuentes
+            calidad_carga = {}
+            # Registros de ANTIGÜEDAD eliminados como IDs duplicados al cargar (linaje)
+            descartados_carga = []
+            if filtro:
+                entradas, gerentes_coordinacion = cargar_subconjunto(
+                    rutas, posiciones, filtro, consolidar=args.consolidar, max_procesos=args.procesos,
+                    calidad=calidad_carga
+                )
+            elif args.consolidar:
+                entradas = cargar_consolidado(
+                    rutas, posiciones, max_procesos=args.procesos, calidad=calidad_carga, descartados=descartados_carga
+                )
+            else:
+                entradas = {
+                    'antiguedad': cargar_antiguedad(rutas['antiguedad'], calidad=calidad_carga, descartados=descartados_carga),
+                    'situacion': cargar_situacion(rutas['situacion'], posiciones['situacion']),
+                    'cobranza': cargar_cobranza(rutas['cobranza'], posiciones['cobranza']),
+                    'ahorros': cargar_ahorros(rutas['ahorros']),
+                }
+            df_descartados = (
+                pd.concat(descartados_carga, ignore_index=True) if descartados_carga
+                else entradas['antiguedad'].iloc[:0]
+            )
+            del descartados_carga
+            metadatos = {
+                'rutas_entrada': rutas_entrada,
+                'ruta_antiguedad': RUTA_ANTIGUEDAD,
+                # Identifica las entradas en el linaje y en los checkpoints (ver linaje_cartera)
+                LLAVE_HUELLA: huella_entradas(rutas_entrada),
+            }
+            if guardar_checkpoints:
+                metadatos['calidad'] = list(calidad_carga)
+                guardar_checkpoint(
+                    directorio_checkpoints, 'carga',
+                    {**entradas, TABLA_DESCARTADOS: df_descartados, 'calidad': tabla_hallazgos(calidad_carga)}, metadatos
+                )
+        else:
+            logger.info(f"\n--- REANUDANDO DESDE LA ETAPA '{args.reanudar_desde}' ---")
+            entradas, metadatos = cargar_checkpoint(directorio_checkpoints, etapa_checkpoint(args.reanudar_desde))
+            rutas_entrada = metadatos['rutas_entrada']
+            RUTA_ANTIGUEDAD = metadatos['ruta_antiguedad']
+            if ejecutar('union'):
+                calidad_carga = hallazgos_desde_tabla(entradas.pop('calidad', None), metadatos.get('calidad')) or {}
+                df_descartados = entradas.pop(TABLA_DESCARTADOS, None)
         
-        # 1. Cargar inputs
-        logger.info("\n--- PASO 1: CARGA DE ARCHIVOS ---")
-        df_antiguedad = cargar_antiguedad(RUTA_ANTIGUEDAD)
-        df_situacion = cargar_situacion(RUTA_SITUACION)
-        df_cobranza = cargar_cobranza(RUTA_COBRANZA)
-        df_ahorros = cargar_ahorros(RUTA_AHORROS)
         df_parche = obtener_parche()
         logger.info(f"PARCHE PROMOTORES cargado: {len(df_parche)} correcciones")
         
-        # 2. Generar cartera
-        logger.info("\n--- PASO 2: GENERACIÓN DE CARTERA ---")
-        df_cartera = generar_cartera(
-            df_antiguedad,
-            df_situacion,
-            df_cobranza,
-            df_ahorros,
-            df_parche
-        )
+        # Hallazgos de calidad de datos (no se registran al generar por particiones)
+        calidad = None
         
-        # 3. Guardar output con formato
-        logger.info("\n--- PASO 3: GUARDADO DE RESULTADO CON FORMATO ---")
-        guardar_con_formato(df_cartera, RUTA_PLANTILLA, RUTA_OUTPUT)
-        logger.info(f"OK - Archivo guardado con formato: {RUTA_OUTPUT}")
+        por_particiones = bool(args.particiones) and ejecutar('union')
+        if por_particiones:
+            # 2-3. Generar por particiones de ID de grupo; cada partición se pega
+            # en la hoja CARTERA en cuanto se calcula (los joins se hacen por
+            # partición, así que no hay checkpoint de la etapa union)
+            logger.info(f"\n--- PASO 2-3: GENERACIÓN POR PARTICIONES ({args.particiones}) Y GUARDADO ---")
+            # Cada partición se pega en cuanto se calcula: el bloqueo cubre también el cálculo
+            salida.enter_context(bloqueo_salida(Path(RUTA_OUTPUT).parent))
+            libro, ws_plantilla = crear_libro_salida(RUTA_PLANTILLA)
+            # La CARTERA de cada partición queda en disco hasta el final (paso 5 incluido):
+            # MORA, RESUMEN, histórico, SQLite y checkpoint se arman releyendo las
+            # particiones, sin unir la CARTERA en memoria
+            directorio_particiones = temporales.enter_context(
+                tempfile.TemporaryDirectory(prefix='cartera_particiones_')
+            )
+            # pop: las entradas se liberan en cuanto quedan particionadas en disco
+            escribir_hojas_cartera(
+                libro,
+                ws_plantilla,
+                iterar_cartera_particionada(
+                    entradas.pop('antiguedad'),
+                    entradas.pop('situacion'),
+                    entradas.pop('cobranza'),
+                    entradas.pop('ahorros'),
+                    num_particiones=args.particiones,
+                    max_procesos=args.procesos or 1,
+                    directorio=directorio_particiones
+                )
+            )
+            del entradas
+            resultado = ResultadoParticionado(directorio_particiones)
+            if guardar_checkpoints:
+                guardar_checkpoint(directorio_checkpoints, 'calculo', {'cartera': resultado.partes()}, metadatos)
+            logger.info("OK - Hoja CARTERA escrita con formato")
+        else:
+            # 2. Generar cartera
+            if ejecutar('calculo'):
+                logger.info("\n--- PASO 2: GENERACIÓN DE CARTERA ---")
+            if ejecutar('union'):
+                logger.info("Iniciando generación de cartera (VERSIÓN CORREGIDA)...")
+                logger.info(f"Registros en antiguedad: {len(entradas['antiguedad'])}")
+                # El linaje empieza con los registros eliminados al cargar ANTIGÜEDAD
+                linaje = linaje_descartados_carga(df_descartados)
+                del df_descartados
+                calidad = calidad_carga
+                df_unido = unir_fuentes(
+                    entradas.pop('antiguedad'),
+                    entradas.pop('situacion'),
+                    entradas.pop('cobranza'),
+                    entradas.pop('ahorros'),
+                    linaje=linaje,
+                    calidad=calidad
+                )
+                if not filtro:
+                    # Las posiciones de origen de un subconjunto no corresponden a los archivos completos
+                    guardar_linaje(linaje, ruta_linaje(RUTA_OUTPUT), metadatos.get(LLAVE_HUELLA))
+                del linaje
+                if guardar_checkpoints:
+                    metadatos['calidad'] = list(calidad)
+                    guardar_checkpoint(
+                        directorio_checkpoints, 'union',
+                        {'unido': df_unido, 'calidad': tabla_hallazgos(calidad)}, metadatos
+                    )
+            elif ejecutar('calculo'):
+                df_unido = entradas.pop('unido')
+                calidad = hallazgos_desde_tabla(entradas.pop('calidad', None), metadatos.get('calidad'))
+            
+            if ejecutar('calculo'):
+                df_cartera = calcular_cartera(
+                    df_unido, df_parche, gerentes_coordinacion=gerentes_coordinacion, calidad=calidad
+                )
+                del df_unido
+                if filtro:
+                    df_cartera = filtrar_cartera(df_cartera, filtro)
+                    calidad = filtrar_hallazgos(calidad, df_cartera['id_de_grupo'])
+                if guardar_checkpoints:
+                    if calidad is not None:
+                        metadatos['calidad'] = list(calidad)
+                    guardar_checkpoint(
+                        directorio_checkpoints, 'calculo',
+                        {'cartera': df_cartera, 'calidad': tabla_hallazgos(calidad)}, metadatos
+                    )
+            else:
+                df_cartera = entradas.pop('cartera')
+                calidad = hallazgos_desde_tabla(entradas.pop('calidad', None), metadatos.get('calidad'))
+            
+            # 3. Escribir CARTERA con formato (el libro se guarda al final, en el paso 4.4)
+            logger.info("\n--- PASO 3: GUARDADO DE RESULTADO CON FORMATO ---")
+            salida.enter_context(bloqueo_salida(Path(RUTA_OUTPUT).parent))
+            libro, ws_plantilla = crear_libro_salida(RUTA_PLANTILLA)
+            escribir_hojas_cartera(libro, ws_plantilla, df_cartera)
+            logger.info("OK - Hoja CARTERA escrita con formato")
+            
+            # Vistas derivadas (MORA, rangos, RESUMEN...) calculadas una vez para todas las salidas
+            resultado = ResultadoCartera(df_cartera)
         
         # 4. Generar y agregar hoja MORA
         logger.info("\n--- PASO 4: GENERACIÓN DE HOJA MORA ---")
-        df_mora = generar_mora(df_cartera)
-        agregar_hoja_mora(RUTA_OUTPUT, df_mora, RUTA_PLANTILLA)
-        logger.info(f"OK - Hoja MORA agregada con {len(df_mora)} registros")
+        agregar_hoja_mora(libro, resultado.mora, ws_plantilla)
+        logger.info(f"OK - Hoja MORA agregada con {len(resultado.mora)} registros")
+        
+        # 4.1. Rangos de antigüedad de mora (una hoja por rango + matriz resumen)
+        logger.info("\n--- PASO 4.1: RANGOS DE DÍAS DE MORA ---")
+        df_mora_base, indices_rangos = resultado.mora_por_rangos
+        agregar_hojas_rangos_mora(libro, df_mora_base, indices_rangos, resultado.resumen_rangos_mora, ws_plantilla)
+        logger.info(f"OK - Hojas de rangos agregadas ({len(df_mora_base)} grupos con días de mora)")
         
-        # 5. Validar (opcional - requiere machote)
+        # 4.2. Resumen jerárquico gerente → promotor
+        logger.info("\n--- PASO 4.2: RESUMEN POR GERENTE Y PROMOTOR ---")
+        agregar_hoja_resumen(libro, resultado.resumen)
+        guardar_resumen_parquet(resultado.resumen, RUTA_RESUMEN)
+        logger.info(f"OK - Hoja RESUMEN agregada y guardada en {RUTA_RESUMEN}")
+        
+        # 4.3. Agregar snapshot al histórico particionado por fecha de reporte
+        # (un subconjunto no es el snapshot de la fecha)
+        if not filtro:
+            logger.info("\n--- PASO 4.3: HISTÓRICO ---")
+            fecha_reporte = fecha_reporte_desde_archivo(RUTA_ANTIGUEDAD)
+            if por_particiones:
+                guardar_snapshot(
+                    resultado.partes(), fecha_reporte, rutas_entrada,
+                    esquema=resultado.esquema, registros=resultado.registros
+                )
+            else:
+                guardar_snapshot(resultado.cartera, fecha_reporte, rutas_entrada)
+            logger.info(f"OK - Snapshot del {fecha_reporte.isoformat()} agregado al histórico")
+        
+        if args.sqlite:
+            exportar_sqlite(
+                resultado.partes() if por_particiones else resultado.cartera,
+                resultado.mora, fecha_reporte, args.sqlite
+            )
+            logger.info(f"OK - CARTERA y MORA del {fecha_reporte.isoformat()} agregadas a {args.sqlite}")
+        
+        # 4.4. Calidad de datos (hallazgos de los joins y del cálculo + verificaciones de CARTERA)
+        logger.info("\n--- PASO 4.4: CALIDAD DE DATOS ---")
+        reporte = reporte_calidad(
+            calidad, resultado.columnas(COLUMNAS_VERIFICACION) if por_particiones else resultado.cartera
+        )
+        guardar_reporte_calidad(reporte, ruta_calidad)
+        if args.hoja_calidad:
+            agregar_hoja_calidad(libro, tabla_calidad(reporte))
+        guardar_libro(libro, RUTA_OUTPUT)
+        logger.info(f"OK - Archivo guardado con formato: {RUTA_OUTPUT}")
+        salida.close()
+        
+        # 5. Validar (opcional - requiere machote; el machote tiene todos los grupos)
         logger.info("\n--- PASO 5: VALIDACIÓN ---")
-        try:
-            RUTA_MACHOTE = buscar_archivo('*machote*.xlsm')
-            validar_output(df_cartera, RUTA_MACHOTE)
-        except FileNotFoundError:
-            logger.info("Machote no encontrado - validación omitida (no es necesario)")
+        if filtro:
+            logger.info("Subconjunto - validación contra el machote omitida")
+        else:
+            try:
+                RUTA_MACHOTE = buscar_archivo('*machote*.xlsm')
+                # Por particiones, aquí se une la CARTERA completa (el machote tiene todos los grupos)
+                validar_output(resultado.cartera, RUTA_MACHOTE)
+            except FileNotFoundError:
+                logger.info("Machote no encontrado - validación omitida (no es necesario)")
         
         logger.info("\n" + "=" * 80)
         logger.info("AUTOMATIZACIÓN COMPLETADA EXITOSAMENTE")
@@ -362,6 +998,9 @@ def main():
     except Exception as e:
         logger.error(f"\nERROR: {e}", exc_info=True)
         raise
+    finally:
+        salida.close()
+        temporales.close()
 
 
 if __name__ == '__main__':
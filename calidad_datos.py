@@ -0,0 +1,191 @@
+"""
+Reporte agregado de calidad de datos de una corrida.
+
+En lugar de una línea de log por grupo, unir_fuentes() y calcular_cartera()
+registran sus hallazgos en un diccionario (calidad={}) como Series
+{id_de_grupo: valor que activó la verificación}, calculadas con máscaras
+vectorizadas. Las verificaciones que solo dependen de CARTERA (integrantes en
+cero, validación negativa) se calculan aquí sobre el frame final.
+
+El reporte tiene el conteo y una muestra de IDs por verificación; se guarda en
+JSON (reporte_calidad.json) y opcionalmente como hoja CALIDAD del output.
+
+Para reanudar una corrida, los hallazgos viajan en los checkpoints como tabla
+larga (verificacion, id_de_grupo, valor en JSON) con tabla_hallazgos/hallazgos_desde_tabla.
+"""
+
+import pandas as pd
+import numpy as np
+import json
+import logging
+from pathlib import Path
+from escritura_atomica import escritura_atomica
+
+logger = logging.getLogger(__name__)
+
+# Ruta por defecto del reporte JSON
+RUTA_REPORTE_CALIDAD = 'reporte_calidad.json'
+
+# IDs de muestra por verificación
+MAX_MUESTRA = 10
+
+# Columnas de CARTERA que lee verificar_cartera
+COLUMNAS_VERIFICACION = ['id_de_grupo', 'numero_de_integrantes', 'diferencia_validacion_vigente']
+
+# Verificaciones del reporte, en orden: {clave: descripción}
+VERIFICACIONES = {
+    'sin_situacion': "Grupos sin registro en SITUACIÓN",
+    'sin_cobranza': "Grupos sin registro en COBRANZA",
+    'sin_ahorros': "Grupos sin registro en AHORROS",
+    'duplicados_descartados': "Filas descartadas por ID duplicado en ANTIGÜEDAD o después de los joins (valor: ciclo)",
+    'gerente_ciclo_menor': "Gerente vacío completado con el del ciclo menor del mismo ID",
+    'gerente_coordinacion': "Gerente vacío completado con el más común de la coordinación",
+    'situacion_desconocida': "situacion_credito desconocida (se asignó Vigente)",
+    'integrantes_cero': "Grupos con número de integrantes en cero o vacío (monto promedio sin dividir)",
+    'validacion_negativa': "Diferencia validación vigente negativa",
+    'fecha_inicio_invalida': "inicio_ciclo que no se pudo convertir a fecha",
+    'proximo_pago_invalido': "Próximo pago de COBRANZA que no se pudo convertir a fecha",
+}
+
+# Columnas de la tabla larga de hallazgos
+COLUMNAS_HALLAZGOS = ['verificacion', 'id_de_grupo', 'valor']
+
+
+def verificar_cartera(df_cartera: pd.DataFrame) -> dict:
+    """
+    Verificaciones que se calculan sobre la CARTERA final.
+
+    Returns:
+        {verificación: Series valor por id_de_grupo}
+    """
+    ids = pd.Index(df_cartera['id_de_grupo'].to_numpy(dtype=object), name='id_de_grupo')
+    integrantes = pd.Series(pd.to_numeric(df_cartera['numero_de_integrantes'], errors='coerce').to_numpy(), index=ids)
+    diferencia = pd.Series(df_cartera['diferencia_validacion_vigente'].to_numpy(dtype=float), index=ids)
+    return {
+        'integrantes_cero': integrantes[~(integrantes > 0)].astype(object),
+        'validacion_negativa': diferencia[diferencia < 0].astype(object),
+    }
+
+
+def _valor_json(valor):
+    """Valor de muestra serializable (texto para fechas y tipos no numéricos)."""
+    if valor is None or (not isinstance(valor, str) and pd.isna(valor)):
+        return None
+    if isinstance(valor, (np.integer, np.floating)):
+        return valor.item()
+    if isinstance(valor, (int, float, str)):
+        return valor
+    return str(valor)
+
+
+def reporte_calidad(calidad: dict, df_cartera: pd.DataFrame, max_muestra: int = MAX_MUESTRA) -> dict:
+    """
+    Arma el reporte de calidad con los hallazgos registrados y las verificaciones de CARTERA.
+
+    Args:
+        calidad: Hallazgos llenados por unir_fuentes/calcular_cartera (None si no se
+            registraron, ej. al generar por particiones)
+        df_cartera: DataFrame de CARTERA generado
+        max_muestra: IDs de muestra por verificación
+
+    Returns:
+        {'resumen': {...}, 'verificaciones': {clave: {descripcion, conteo, muestra}}}.
+        Solo incluye las verificaciones evaluadas en la corrida.
+    """
+    hallazgos = {**(calidad or {}), **verificar_cartera(df_cartera)}
+    verificaciones = {}
+    for clave, descripcion in VERIFICACIONES.items():
+        if clave not in hallazgos:
+            continue
+        serie = hallazgos[clave]
+        muestra = serie.iloc[:max_muestra]
+        verificaciones[clave] = {
+            'descripcion': descripcion,
+            'conteo': int(len(serie)),
+            'muestra': [
+                {'id_de_grupo': str(id_grupo), 'valor': _valor_json(valor)}
+                for id_grupo, valor in muestra.items()
+            ],
+        }
+
+    no_evaluadas = [clave for clave in VERIFICACIONES if clave not in verificaciones]
+    return {
+        'resumen': {
+            'grupos': int(len(df_cartera)),
+            'verificaciones': len(verificaciones),
+            'con_hallazgos': sum(1 for v in verificaciones.values() if v['conteo']),
+            'no_evaluadas': no_evaluadas,
+        },
+        'verificaciones': verificaciones,
+    }
+
+
+def tabla_calidad(reporte: dict) -> pd.DataFrame:
+    """Reporte como tabla (una fila por verificación) para la hoja CALIDAD."""
+    return pd.DataFrame([
+        {
+            'verificacion': clave,
+            'descripcion': datos['descripcion'],
+            'conteo': datos['conteo'],
+            'muestra_ids': ', '.join(m['id_de_grupo'] for m in datos['muestra']),
+        }
+        for clave, datos in reporte['verificaciones'].items()
+    ], columns=['verificacion', 'descripcion', 'conteo', 'muestra_ids'])
+
+
+def guardar_reporte_calidad(reporte: dict, ruta: str = RUTA_REPORTE_CALIDAD) -> Path:
+    """Guarda el reporte en JSON y registra una línea por verificación con hallazgos."""
+    ruta = Path(ruta)
+    with escritura_atomica(ruta) as temporal, open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(reporte, f, ensure_ascii=False, indent=2)
+
+    resumen = reporte['resumen']
+    logger.info(
+        f"Calidad de datos: {resumen['con_hallazgos']} de {resumen['verificaciones']} "
+        f"verificaciones con hallazgos ({resumen['grupos']} grupos) -> {ruta}"
+    )
+    for clave, datos in reporte['verificaciones'].items():
+        if datos['conteo']:
+            logger.info(f"  {clave}: {datos['conteo']}")
+    return ruta
+
+
+def tabla_hallazgos(calidad: dict) -> pd.DataFrame:
+    """Hallazgos como tabla larga (verificacion, id_de_grupo, valor en JSON) para checkpoints."""
+    partes = [
+        pd.DataFrame({
+            'verificacion': clave,
+            'id_de_grupo': serie.index.astype(str),
+            'valor': [json.dumps(_valor_json(valor), ensure_ascii=False) for valor in serie.to_numpy()],
+        })
+        for clave, serie in (calidad or {}).items()
+    ]
+    if not partes:
+        return pd.DataFrame(columns=COLUMNAS_HALLAZGOS)
+    return pd.concat(partes, ignore_index=True)[COLUMNAS_HALLAZGOS]
+
+
+def hallazgos_desde_tabla(df: pd.DataFrame, claves=None) -> dict:
+    """
+    Inverso de tabla_hallazgos (fechas y tipos no numéricos quedan como texto).
+
+    Args:
+        df: Tabla larga de hallazgos (None si el checkpoint no la tiene)
+        claves: Verificaciones evaluadas; las que no tengan filas quedan vacías.
+            Por defecto, las que aparecen en la tabla
+
+    Returns:
+        {verificación: Series valor por id_de_grupo}, o None si no hay tabla
+    """
+    if df is None:
+        return None
+    claves = list(claves) if claves is not None else list(dict.fromkeys(df['verificacion']))
+    calidad = {}
+    for clave in claves:
+        filas = df[df['verificacion'] == clave]
+        calidad[clave] = pd.Series(
+            [json.loads(valor) for valor in filas['valor']],
+            index=pd.Index(filas['id_de_grupo'].to_numpy(dtype=object), name='id_de_grupo'),
+            dtype=object,
+        )
+    return calidad
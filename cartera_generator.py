@@ -11,17 +11,151 @@ from datetime import datetime
 import logging
 from parche_promotores import aplicar_parche, aplicar_parche_gerentes
 from parche_grupos import aplicar_parche_grupos
+from grafo_columnas import registrar_nodo, registrar_directas, evaluar_columnas
+from linaje_cartera import COLUMNA_FILA_ANTIGUEDAD
 
 logger = logging.getLogger(__name__)
 
+# Columnas finales de la hoja CARTERA (A-AJ), en orden
+COLUMNAS_CARTERA = [
+    'nombre_del_gerente',           # A
+    'nombre_promotor',              # B
+    'id_de_grupo',                  # C
+    'nombre_de_grupo',              # D
+    'ciclo',                        # E
+    'monto_del_credito',            # F
+    'tipo_de_grupo',                # G
+    'fecha_de_inicio_del_credito',  # H
+    'plazo',                        # I
+    'dia_de_reunion',               # J
+    'hora_de_reunion',              # K
+    'periodicidad',                 # L
+    'pago_semanal',                 # M
+    'proximo_pago',                 # N
+    'cartera_vigente_sistema',      # O
+    'cartera_vigente_inicial',      # P
+    'cartera_vigente_calculada',    # Q
+    'cartera_insoluta',             # R
+    'diferencia_validacion_vigente', # S
+    'ahorro_consumido',             # T
+    'cartera_vencida_estadistica',  # U
+    'cartera_vencida_total',        # V
+    'pct_mora',                     # W
+    'saldo_en_riesgo',              # X
+    'saldo_ahorro_acumulado',       # Y
+    'monto_promedio_del_grupo',     # Z
+    'numero_de_integrantes',        # AA
+    'semana',                       # AB
+    'pagos_cubiertos',              # AC
+    'pagos_por_vencer',             # AD
+    'total_de_pagos',               # AE
+    'dias_de_mora',                 # AF
+    'ahorro_acumulado',             # AG
+    'pct_de_ahorro',                # AH
+    'estatus',                      # AI
+    'concepto_deposito'             # AJ
+]
+
+# Columnas de dinero de CARTERA: se calculan en centavos (enteros) y se entregan en pesos
+COLUMNAS_MONTO = [
+    'monto_del_credito',
+    'pago_semanal',
+    'cartera_vigente_sistema',
+    'cartera_vigente_inicial',
+    'cartera_vigente_calculada',
+    'cartera_insoluta',
+    'diferencia_validacion_vigente',
+    'ahorro_consumido',
+    'cartera_vencida_estadistica',
+    'cartera_vencida_total',
+    'saldo_en_riesgo',
+    'saldo_ahorro_acumulado',
+    'ahorro_acumulado',
+]
+
+# Umbral de %mora para la hoja MORA (fracción: 0.05 = 5%)
+UMBRAL_PCT_MORA = 0.05
+
+# Valores de situacion_credito con estatus definido (los demás se tratan como Vigente)
+SITUACIONES_CONOCIDAS = ["Entregado", "Autorizado por cartera", "Liquidado"]
+
+# Porcentaje (entero) del monto del crédito que se suma al ahorro en ahorro_consumido
+PCT_AHORRO_CONSUMIDO = 10
+
+# Semanas de pago semanal en cartera_vigente_inicial
+SEMANAS_VIGENTE_INICIAL = 16
+
+# Semanas de pago semanal en mora_potencial_mensual (hoja MORA)
+SEMANAS_MORA_MENSUAL = 4
+
+# Bandas de %mora para la matriz resumen de rangos
+UMBRALES_PCT_MORA = (0.05, 0.10, 0.25)
+
+# Rangos de antigüedad de mora sobre dias_de_mora: (etiqueta, límite superior inclusivo)
+RANGOS_DIAS_MORA = [
+    ('1-7', 7),
+    ('8-30', 30),
+    ('31-60', 60),
+    ('61-90', 90),
+    ('90+', np.inf),
+]
+
+# Columnas A-L de la hoja MORA (tomadas directamente de CARTERA)
+COLUMNAS_MORA_BASE = [
+    'nombre_del_gerente',
+    'nombre_promotor',
+    'id_de_grupo',
+    'nombre_de_grupo',
+    'ciclo',
+    'monto_del_credito',
+    'semana',
+    'pago_semanal',
+    'cartera_vencida_total',
+    'pct_mora',
+    'saldo_en_riesgo',
+    'dias_de_mora',
+]
+
+# Columnas completas de la hoja MORA (A-N)
+COLUMNAS_MORA = COLUMNAS_MORA_BASE + [
+    'mora_potencial_mensual',
+    'cartera_vencida_total_calculada',
+]
+
+
+def a_centavos(serie: pd.Series) -> pd.Series:
+    """Pesos (float) a centavos enteros (Int64; NaN queda como nulo)."""
+    return (serie.astype(float) * 100).round().astype('Int64')
+
+
+def a_pesos(centavos: pd.Series) -> pd.Series:
+    """Centavos (Int64) a pesos float64 (nulo queda como NaN)."""
+    return centavos.astype('float64') / 100
+
+
+def _por_factor(centavos: pd.Series, factor) -> pd.Series:
+    """
+    Centavos × factor (semanas, pagos), redondeado a centavos. Con factores enteros
+    el producto es exacto.
+    """
+    return (centavos.astype('float64') * factor).round().astype('Int64')
+
+
+def _porcentaje(centavos: pd.Series, divisor: int) -> pd.Series:
+    """Centavos / divisor en aritmética entera, redondeando la mitad hacia afuera de cero."""
+    return np.sign(centavos) * ((centavos.abs() + divisor // 2) // divisor)
+
 
 def generar_cartera(
     df_antiguedad: pd.DataFrame,
     df_situacion: pd.DataFrame,
     df_cobranza: pd.DataFrame,
     df_ahorros: pd.DataFrame,
-    df_parche: pd.DataFrame
-) -> pd.DataFrame:
+    df_parche: pd.DataFrame,
+    linaje: dict = None,
+    calidad: dict = None,
+    como_resultado: bool = False
+):
     """
     Genera el DataFrame de la hoja CARTERA aplicando la lógica de las fórmulas del machote.
     
@@ -31,21 +165,69 @@ def generar_cartera(
         df_cobranza: DataFrame de Reporte de cobranza
         df_ahorros: DataFrame de AHORROS (hoja ACUMULADO)
         df_parche: DataFrame de Parche Promotores
+        linaje: Si se pasa un diccionario, se llena con la fila de origen de cada
+            fila del resultado en cada fuente (ver unir_fuentes)
+        calidad: Si se pasa un diccionario, se llena con los hallazgos de calidad de
+            datos de ambas etapas (ver unir_fuentes y calcular_cartera)
+        como_resultado: Devolver un ResultadoCartera (vistas MORA, RESUMEN, totales y
+            búsquedas memoizadas) en lugar del DataFrame
         
     Returns:
-        DataFrame con la estructura de la hoja CARTERA (36 columnas)
+        DataFrame con la estructura de la hoja CARTERA (36 columnas), o su
+        ResultadoCartera si como_resultado=True
     """
     logger.info("Iniciando generación de cartera (VERSIÓN CORREGIDA)...")
     logger.info(f"Registros en antiguedad: {len(df_antiguedad)}")
     
-    # Crear DataFrame base desde ANTIGÜEDAD
-    df = df_antiguedad.copy()
+    df = unir_fuentes(df_antiguedad, df_situacion, df_cobranza, df_ahorros, linaje=linaje, calidad=calidad)
+    df_cartera = calcular_cartera(df, df_parche, calidad=calidad)
+    if como_resultado:
+        # Importación local: resultado_cartera importa este módulo
+        from resultado_cartera import ResultadoCartera
+        return ResultadoCartera(df_cartera)
+    return df_cartera
+
+
+def unir_fuentes(
+    df_antiguedad: pd.DataFrame,
+    df_situacion: pd.DataFrame,
+    df_cobranza: pd.DataFrame,
+    df_ahorros: pd.DataFrame,
+    linaje: dict = None,
+    calidad: dict = None
+) -> pd.DataFrame:
+    """
+    Etapa 1 de generar_cartera: columnas base de ANTIGÜEDAD, joins con SITUACIÓN,
+    COBRANZA y AHORROS por ID de grupo y eliminación de IDs duplicados.
+    
+    Todo lo que hace esta etapa depende solo de los registros de un mismo ID de
+    grupo, por lo que puede ejecutarse por partición de IDs.
+    
+    Args:
+        linaje: Si se pasa un diccionario, se llena con 'id_de_grupo' y la posición
+            (int32, -1 = sin registro) en cada fuente ('antiguedad', 'situacion',
+            'cobranza', 'ahorros') de cada fila del resultado; las mismas llaves con
+            prefijo 'descartados_' para las filas eliminadas como IDs duplicados (se
+            agregan a las que ya tenga, ej. las de la carga). En ANTIGÜEDAD la posición
+            es COLUMNA_FILA_ANTIGUEDAD si la tiene (fila antes de eliminar duplicados al cargar)
+        calidad: Si se pasa un diccionario, se llena con los hallazgos de esta etapa
+            ({verificación: Series valor por id_de_grupo}): 'sin_situacion',
+            'sin_cobranza', 'sin_ahorros', 'duplicados_descartados' (ciclo),
+            'gerente_ciclo_menor' (gerente) y 'fecha_inicio_invalida' (inicio_ciclo)
+    
+    Returns:
+        DataFrame unido (una fila por id_de_grupo) con las columnas de entrada
+    """
+    # Crear DataFrame base desde ANTIGÜEDAD (copia superficial: las columnas nuevas
+    # no tocan el frame del llamador y no se duplican los datos)
+    df = df_antiguedad.copy(deep=False)
     
     # ========== PASO 1: COLUMNAS BASE (extraídas directamente de ANTIGÜEDAD) ==========
     
     # C. ID de grupo - Formatear a 6 dígitos con ceros
     df['id_de_grupo'] = df['cod_grupo_solidario'].astype(str).str.zfill(6)
-    logger.info(f"ID de grupo generados: {df['id_de_grupo'].head()}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"ID de grupo generados: {df['id_de_grupo'].head().tolist()}")
     
     # D. Nombre de grupo
     df['nombre_de_grupo'] = df['grupo_solidario']
@@ -83,462 +265,766 @@ def generar_cartera(
     
     # ========== PASO 2: JOINS CON OTROS DATAFRAMES ==========
     
-    # Preparar claves para joins
-    df_situacion_join = df_situacion.copy()
-    df_situacion_join['id_grupo_join'] = df_situacion_join['codigo'].astype(str).str.zfill(6)
-    
-    df_cobranza_join = df_cobranza.copy()
-    df_cobranza_join['id_grupo_join'] = df_cobranza_join['gpo'].astype(str).str.zfill(6)
-    
-    df_ahorros_join = df_ahorros.copy()
-    df_ahorros_join['id_grupo_join'] = df_ahorros_join['id'].astype(str).str.zfill(6)
+    # Los joins se hacen sobre un frame angosto de llaves (ID + posición en ANTIGÜEDAD);
+    # el frame ancho se reindexa una sola vez al final, ya sin duplicados.
+    llaves = pd.DataFrame({
+        'id_de_grupo': df['id_de_grupo'].to_numpy(),
+        '_posicion': np.arange(len(df)),
+    })
+    if linaje is not None:
+        llaves[COLUMNA_FILA_ANTIGUEDAD] = (
+            df[COLUMNA_FILA_ANTIGUEDAD].to_numpy() if COLUMNA_FILA_ANTIGUEDAD in df.columns else np.arange(len(df))
+        )
     
-    # Realizar joins
     # CORRECCIÓN: Agregar columnas adicionales de SITUACIÓN
-    cols_sit = ['id_grupo_join', 'ciclo_sit', 'cartera_vencida_importe', 
+    cols_sit = ['ciclo_sit', 'cartera_vencida_importe', 
                 'cartera_vencida_pct', 'numero_de_integrantes_sit', 
                 'cartera_vigente_importe', 'cartera_vigente_parcialidad']
-    
-    df = df.merge(
-        df_situacion_join[cols_sit],
-        left_on='id_de_grupo',
-        right_on='id_grupo_join',
-        how='left',
-        suffixes=('', '_sit')
-    )
-    
     # CORRECCIÓN: Mapear columnas correctas de cobranza
-    df = df.merge(
-        df_cobranza_join[['id_grupo_join', 'proximo_pago_cob', 'por_vencer', 'pagos']],
-        left_on='id_de_grupo',
-        right_on='id_grupo_join',
-        how='left',
-        suffixes=('', '_cob')
-    )
+    cols_cob = ['proximo_pago_cob', 'por_vencer', 'pagos']
+    cols_aho = ['ahorro_acumulado']
     
-    df = df.merge(
-        df_ahorros_join[['id_grupo_join', 'ahorro_acumulado']],
-        left_on='id_de_grupo',
-        right_on='id_grupo_join',
-        how='left',
-        suffixes=('', '_aho')
-    )
+    # Nombre final de cada columna agregada (mismo sufijo que daría un merge sobre el frame ancho)
+    nombres_join = {}
+    for columnas, sufijo in ((cols_sit, '_sit'), (cols_cob, '_cob'), (cols_aho, '_aho')):
+        for col in columnas:
+            nombres_join[col] = f"{col}{sufijo}" if col in df.columns else col
     
-    # Log de joins
-    logger.info(f"Después de joins: {len(df)} registros")
-    logger.info(f"NaN en situacion: {df['ciclo_sit'].isna().sum()}")
-    logger.info(f"NaN en cobranza: {df['proximo_pago_cob'].isna().sum()}")
-    logger.info(f"NaN en ahorros: {df['ahorro_acumulado'].isna().sum()}")
+    # Realizar joins
+    for df_fuente, col_id, columnas, fuente in (
+        (df_situacion, 'codigo', cols_sit, 'situacion'),
+        (df_cobranza, 'gpo', cols_cob, 'cobranza'),
+        (df_ahorros, 'id', cols_aho, 'ahorros'),
+    ):
+        # Preparar clave del join sin copiar la fuente completa
+        derecha = pd.DataFrame({
+            'id_grupo_join': df_fuente[col_id].astype(str).str.zfill(6),
+            **{nombres_join[col]: df_fuente[col] for col in columnas},
+        })
+        if linaje is not None or calidad is not None:
+            derecha[f"_fila_{fuente}"] = np.arange(len(df_fuente))
+        llaves = llaves.merge(
+            derecha,
+            left_on='id_de_grupo',
+            right_on='id_grupo_join',
+            how='left'
+        ).drop(columns=['id_grupo_join'])
+    
+    # Log de joins (los conteos de NaN solo se calculan en DEBUG)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            f"Después de joins: {len(llaves)} registros (NaN en situacion: "
+            f"{llaves[nombres_join['ciclo_sit']].isna().sum()}, cobranza: "
+            f"{llaves[nombres_join['proximo_pago_cob']].isna().sum()}, ahorros: "
+            f"{llaves[nombres_join['ahorro_acumulado']].isna().sum()})"
+        )
     
     # Eliminar duplicados por ID después de los JOINS
-    registros_antes_joins = len(df)
-    duplicados_por_id = df.duplicated(subset=['id_de_grupo'], keep=False).sum()
+    registros_antes_joins = len(llaves)
+    duplicados_por_id = llaves.duplicated(subset=['id_de_grupo'], keep=False).sum()
+    gerente_menor_por_id = None
     if duplicados_por_id > 0:
         logger.warning(f"Se encontraron {duplicados_por_id} registros con ID duplicado después de los joins")
         # Usar ciclo para ordenar (ciclo_sit tiene prioridad, luego ciclo de ANTIGÜEDAD)
-        ciclo_para_ordenar = df['ciclo_sit'].fillna(df['ciclo'])
+        posiciones = llaves['_posicion'].to_numpy()
+        ciclo = df['ciclo'].take(posiciones).set_axis(llaves.index)
+        ciclo_para_ordenar = llaves[nombres_join['ciclo_sit']].fillna(ciclo)
         ciclo_para_ordenar = pd.to_numeric(ciclo_para_ordenar, errors='coerce')
-        df['_ciclo_temp'] = ciclo_para_ordenar
+        llaves['_ciclo_temp'] = ciclo_para_ordenar
+        llaves['nombre_de_gerente'] = df['nombre_de_gerente'].take(posiciones).set_axis(llaves.index)
         
         # Guardar nombre_de_gerente de registros con ciclo menor antes de eliminar duplicados
         # Para IDs duplicados, si el registro con ciclo mayor tiene nombre_de_gerente vacío,
         # usar el nombre_de_gerente del registro con ciclo menor
-        ids_duplicados = df[df.duplicated(subset=['id_de_grupo'], keep=False)]['id_de_grupo'].unique()
-        gerentes_ciclo_menor = {}
-        for id_dup in ids_duplicados:
-            registros_dup = df[df['id_de_grupo'] == id_dup].copy()
-            # Ordenar por ciclo ascendente (menor primero)
-            registros_dup = registros_dup.sort_values('_ciclo_temp', ascending=True, na_position='last')
-            # Buscar el primer registro con nombre_de_gerente no vacío
-            for _, row in registros_dup.iterrows():
-                nombre_gerente = row.get('nombre_de_gerente', None)
-                if pd.notna(nombre_gerente) and str(nombre_gerente).strip() != '':
-                    gerentes_ciclo_menor[id_dup] = nombre_gerente
-                    break
+        gerente_menor_por_id = gerentes_ciclo_menor(
+            llaves['id_de_grupo'], llaves['_ciclo_temp'], llaves['nombre_de_gerente']
+        )
         
         # Ordenar por ciclo descendente (mayor primero) y mantener solo el primero
-        df = df.sort_values(['_ciclo_temp', 'id_de_grupo'], ascending=[False, True], na_position='last')
-        df = df.drop_duplicates(subset=['id_de_grupo'], keep='first').reset_index(drop=True)
-        
+        llaves = llaves.sort_values(['_ciclo_temp', 'id_de_grupo'], ascending=[False, True], na_position='last')
+        repetidas = llaves.duplicated(subset=['id_de_grupo'], keep='first')
+        if linaje is not None:
+            _agregar_descartados(linaje, llaves[repetidas])
+        if calidad is not None:
+            registrar_hallazgos(calidad, 'duplicados_descartados', llaves['id_de_grupo'], llaves['_ciclo_temp'], repetidas)
+        llaves = llaves[~repetidas]
+        llaves = llaves.drop(columns=['_ciclo_temp', 'nombre_de_gerente'])
+    
+    if linaje is not None:
+        linaje.update(_filas_linaje(llaves))
+        _agregar_descartados(linaje, llaves.iloc[:0])
+    
+    if calidad is not None:
+        calidad.setdefault('duplicados_descartados', _hallazgos(llaves['id_de_grupo'], None, False))
+        for fuente in ('situacion', 'cobranza', 'ahorros'):
+            sin_registro = llaves[f"_fila_{fuente}"].isna()
+            calidad[f"sin_{fuente}"] = _hallazgos(llaves['id_de_grupo'], None, sin_registro)
+    
+    # Única copia del frame ancho: filas de ANTIGÜEDAD en el orden final (solo si cambió)
+    posiciones = llaves['_posicion'].to_numpy()
+    if len(posiciones) != len(df) or (posiciones != np.arange(len(df))).any():
+        df = df.take(posiciones)
+    df.index = pd.RangeIndex(len(df))
+    for col in nombres_join.values():
+        df[col] = llaves[col].array
+    
+    if gerente_menor_por_id is not None and len(gerente_menor_por_id):
         # Si el registro mantenido tiene nombre_de_gerente vacío, usar el del ciclo menor
-        for id_dup, nombre_gerente_menor in gerentes_ciclo_menor.items():
-            mask = (df['id_de_grupo'] == id_dup) & (
-                df['nombre_de_gerente'].isna() | 
-                (df['nombre_de_gerente'].astype(str).str.strip() == '')
-            )
-            if mask.any():
-                df.loc[mask, 'nombre_de_gerente'] = nombre_gerente_menor
-                logger.info(f"ID {id_dup}: Usado nombre_de_gerente del ciclo menor ({nombre_gerente_menor})")
-        
-        # Eliminar columna temporal
-        df = df.drop(columns=['_ciclo_temp'])
+        gerente_menor = df['id_de_grupo'].map(gerente_menor_por_id)
+        mask = gerente_menor.notna() & gerente_vacio(df['nombre_de_gerente'])
+        if mask.any():
+            df['nombre_de_gerente'] = df['nombre_de_gerente'].where(~mask, gerente_menor)
+            logger.info(f"{int(mask.sum())} IDs duplicados con nombre_de_gerente del ciclo menor")
+            if calidad is not None:
+                registrar_hallazgos(calidad, 'gerente_ciclo_menor', df['id_de_grupo'], gerente_menor, mask)
+    
+    if calidad is not None:
+        calidad.setdefault('gerente_ciclo_menor', _hallazgos(df['id_de_grupo'], None, False))
+        fecha_invalida = df['inicio_ciclo'].notna() & df['fecha_de_inicio_del_credito'].isna()
+        calidad['fecha_inicio_invalida'] = _hallazgos(df['id_de_grupo'], df['inicio_ciclo'], fecha_invalida)
+    
+    if duplicados_por_id > 0:
         registros_despues_joins = len(df)
         logger.info(f"Duplicados por ID eliminados después de joins: {registros_antes_joins - registros_despues_joins} registros")
         logger.info(f"Registros después de eliminar duplicados: {registros_despues_joins}")
     
-    # ========== PASO 3: COLUMNAS CON LÓGICA ESPECIAL ==========
+    return df
+
+
+def _hallazgos(ids: pd.Series, valores, mask) -> pd.Series:
+    """Hallazgos de una verificación de calidad: valor que la activó (o None) por id_de_grupo."""
+    mask = np.broadcast_to(np.asarray(mask, dtype=bool), len(ids))
+    valores = np.full(len(ids), None, dtype=object) if valores is None else np.asarray(valores, dtype=object)
+    return pd.Series(
+        valores[mask],
+        index=pd.Index(np.asarray(ids, dtype=object)[mask], name='id_de_grupo'),
+        dtype=object,
+    )
+
+
+def registrar_hallazgos(calidad: dict, clave: str, ids: pd.Series, valores, mask):
+    """Agrega hallazgos a calidad[clave], después de los de un paso anterior (ej. la carga de ANTIGÜEDAD)."""
+    nuevos = _hallazgos(ids, valores, mask)
+    previos = calidad.get(clave)
+    calidad[clave] = nuevos if previos is None or previos.empty else pd.concat([previos, nuevos])
+
+
+def gerente_vacio(gerente: pd.Series) -> pd.Series:
+    """nombre_de_gerente nulo o en blanco."""
+    return gerente.isna() | (gerente.astype(str).str.strip() == '')
+
+
+def gerentes_ciclo_menor(ids: pd.Series, ciclo: pd.Series, gerente: pd.Series) -> pd.Series:
+    """
+    Gerente del registro de ciclo menor con gerente de cada ID repetido.
+    
+    Args:
+        ids: ID de cada registro
+        ciclo: Ciclo numérico de cada registro (nulo = se revisa al final)
+        gerente: nombre_de_gerente de cada registro
+    
+    Returns:
+        Series nombre_de_gerente indexada por ID (solo IDs repetidos con algún gerente)
+    """
+    registros = pd.DataFrame({'id': ids.to_numpy(), 'ciclo': ciclo.to_numpy(), 'gerente': gerente.to_numpy()})
+    candidatos = registros[registros['id'].duplicated(keep=False) & ~gerente_vacio(registros['gerente'])]
+    # Ciclo menor primero; a igual ciclo, el primero en el archivo
+    candidatos = candidatos.sort_values('ciclo', kind='stable', na_position='last').drop_duplicates('id')
+    return pd.Series(candidatos['gerente'].to_numpy(), index=candidatos['id'].to_numpy(), dtype=object)
+
+
+def _filas_linaje(llaves: pd.DataFrame) -> dict:
+    """Posiciones de origen (int32, -1 = sin registro) de las filas de un frame de llaves."""
+    filas = {
+        'id_de_grupo': llaves['id_de_grupo'].to_numpy(dtype=str),
+        'antiguedad': llaves[COLUMNA_FILA_ANTIGUEDAD].to_numpy(dtype=np.int32),
+    }
+    for fuente in ('situacion', 'cobranza', 'ahorros'):
+        filas[fuente] = llaves[f"_fila_{fuente}"].fillna(-1).to_numpy(dtype=np.int32)
+    return filas
+
+
+def _agregar_descartados(linaje: dict, llaves: pd.DataFrame):
+    """Agrega las filas de `llaves` a las llaves 'descartados_' del linaje (después de las que ya tenga)."""
+    for llave, valores in _filas_linaje(llaves).items():
+        previos = linaje.get(f"descartados_{llave}")
+        linaje[f"descartados_{llave}"] = valores if previos is None else np.concatenate([previos, valores])
+
+
+def gerentes_por_coordinacion(df: pd.DataFrame) -> dict:
+    """
+    Gerente más común (moda) de cada coordinación entre los registros con
+    nombre_de_gerente no vacío. En empate gana el primero en orden alfabético,
+    igual que Series.mode().iloc[0].
+    
+    La versión original completaba los vacíos uno por uno, contando también los
+    gerentes ya completados. El resultado es el mismo que con la moda fija: el
+    primer vacío de la coordinación recibe la moda m, con lo que m queda con un
+    conteo estrictamente mayor que cualquier otro gerente y sigue siendo la moda
+    para los vacíos siguientes.
+    
+    Args:
+        df: DataFrame con columnas 'coordinacion' y 'nombre_de_gerente'
+            (resultado de unir_fuentes, completo o solo esas dos columnas)
     
+    Returns:
+        Diccionario {coordinacion: nombre_de_gerente}
+    """
+    gerente = df['nombre_de_gerente']
+    validos = (
+        df['coordinacion'].notna() &
+        gerente.notna() &
+        (gerente.astype(str).str.strip() != '')
+    )
+    conteos = df.loc[validos].groupby(['coordinacion', 'nombre_de_gerente'], sort=True).size()
+    if conteos.empty:
+        return {}
+    # groupby ya dejó los gerentes ordenados dentro de cada coordinación; el orden
+    # estable por conteo conserva el alfabético entre empatados
+    conteos = conteos.reset_index(name='_n').sort_values('_n', ascending=False, kind='stable')
+    conteos = conteos.drop_duplicates(subset=['coordinacion'], keep='first')
+    return dict(zip(conteos['coordinacion'], conteos['nombre_de_gerente']))
+
+
+# ========== GRAFO DE COLUMNAS DE CARTERA ==========
+#
+# Cada columna de CARTERA es un nodo con las columnas de entrada (de unir_fuentes)
+# y los nodos de los que depende; calcular_cartera() evalúa solo los que necesitan
+# las columnas pedidas. Los montos se calculan en nodos intermedios en centavos
+# enteros (Int64, con nulos, sufijo _c) para que sumas y diferencias sean exactas,
+# y se convierten a pesos una sola vez en el nodo de la columna final.
+
+GRAFO_CARTERA = {}
+
+# Columnas que pasan de la entrada sin cambios
+registrar_directas(GRAFO_CARTERA, [
+    'nombre_de_grupo',
+    'tipo_de_grupo',
+    'fecha_de_inicio_del_credito',
+    'plazo',
+    'dia_de_reunion',
+    'hora_de_reunion',
+    'periodicidad',
+    'dias_de_mora',
+])
+
+
+@registrar_nodo(GRAFO_CARTERA, 'id_de_grupo', entradas=['id_de_grupo'])
+def _id_de_grupo(entrada, valores, contexto):
+    # C. ID de grupo como texto de 6 dígitos (mismo formato que usa parche_grupos)
+    return entrada['id_de_grupo'].astype(str).str.zfill(6)
+
+
+@registrar_nodo(GRAFO_CARTERA, 'nombre_del_gerente',
+                entradas=['nombre_de_gerente', 'coordinacion'], dependencias=['id_de_grupo'])
+def _nombre_del_gerente(entrada, valores, contexto):
     # A. Nombre del gerente (ya viene de ANTIGÜEDAD)
-    df['nombre_del_gerente'] = df['nombre_de_gerente']
+    gerente = entrada['nombre_de_gerente'].copy()
     
     # Si hay registros con nombre_de_gerente vacío, usar el más común de la misma coordinación
-    mask_vacio = df['nombre_del_gerente'].isna() | (df['nombre_del_gerente'].astype(str).str.strip() == '')
+    mask_vacio = gerente.isna() | (gerente.astype(str).str.strip() == '')
     if mask_vacio.any():
-        # Para cada registro con nombre_de_gerente vacío, buscar el más común en su coordinación
-        for idx in df[mask_vacio].index:
-            coordinacion = df.loc[idx, 'coordinacion']
-            if pd.notna(coordinacion):
-                # Buscar otros registros con misma coordinación que tengan nombre_de_gerente
-                otros = df[
-                    (df['coordinacion'] == coordinacion) & 
-                    (df.index != idx) &
-                    (df['nombre_del_gerente'].notna()) &
-                    (df['nombre_del_gerente'].astype(str).str.strip() != '')
-                ]
-                if len(otros) > 0:
-                    # Usar el más común
-                    gerente_mas_comun = otros['nombre_del_gerente'].mode()
-                    if len(gerente_mas_comun) > 0:
-                        df.loc[idx, 'nombre_del_gerente'] = gerente_mas_comun.iloc[0]
-                        logger.info(f"ID {df.loc[idx, 'id_de_grupo']}: Usado nombre_de_gerente mas comun de coordinacion '{coordinacion}' ({gerente_mas_comun.iloc[0]})")
+        gerentes_coordinacion = contexto.get('gerentes_coordinacion')
+        if gerentes_coordinacion is None:
+            gerentes_coordinacion = gerentes_por_coordinacion(pd.DataFrame({
+                'coordinacion': entrada['coordinacion'],
+                'nombre_de_gerente': entrada['nombre_de_gerente'],
+            }))
+        gerente_mas_comun = entrada['coordinacion'][mask_vacio].map(gerentes_coordinacion).dropna()
+        gerente.loc[gerente_mas_comun.index] = gerente_mas_comun
+        logger.info(f"{len(gerente_mas_comun)} grupos con nombre_de_gerente más común de su coordinación")
+    else:
+        gerente_mas_comun = gerente.iloc[:0]
+    if contexto.get('calidad') is not None:
+        contexto['calidad']['gerente_coordinacion'] = _hallazgos(
+            valores['id_de_grupo'].loc[gerente_mas_comun.index], gerente_mas_comun, True
+        )
     
     # Aplicar parches de gerentes (corrección "JUAN EDMIUNDO" -> "JUAN EDMUNDO")
-    df = aplicar_parche_gerentes(df, 'nombre_del_gerente')
+    parcial = pd.DataFrame({'nombre_del_gerente': gerente})
+    aplicar_parche_gerentes(parcial, 'nombre_del_gerente', inplace=True)
     logger.info("Parche de gerentes aplicado")
-    
+    return parcial['nombre_del_gerente']
+
+
+@registrar_nodo(GRAFO_CARTERA, 'nombre_promotor', entradas=['nombre_promotor'], dependencias=['id_de_grupo'])
+def _nombre_promotor(entrada, valores, contexto):
     # B. Nombre promotor - Aplicar parche con coincidencia parcial
-    df['nombre_promotor'] = df['nombre_promotor']
-    df = aplicar_parche(df, 'nombre_promotor')
+    parcial = pd.DataFrame({'id_de_grupo': valores['id_de_grupo'], 'nombre_promotor': entrada['nombre_promotor']})
+    aplicar_parche(parcial, 'nombre_promotor', inplace=True)
     logger.info("Parche de promotores aplicado (con coincidencia parcial)")
     
     # Aplicar parche de grupos (corrección de nombre_promotor por ID de grupo)
-    df = aplicar_parche_grupos(df, 'id_de_grupo', 'nombre_promotor')
+    aplicar_parche_grupos(parcial, 'id_de_grupo', 'nombre_promotor', inplace=True)
     logger.info("Parche de grupos aplicado (nombre_promotor)")
-    
+    return parcial['nombre_promotor']
+
+
+@registrar_nodo(GRAFO_CARTERA, 'ciclo', entradas=['ciclo_sit', 'ciclo'])
+def _ciclo(entrada, valores, contexto):
     # E. Ciclo - Con fallback y formato: 2 dígitos con ceros a la izquierda, mantener como texto
-    df['ciclo'] = df['ciclo_sit'].fillna(df['ciclo'])
+    ciclo = entrada['ciclo_sit'].fillna(entrada['ciclo'])
     # Convertir a texto con formato de 2 dígitos (rellenar con ceros a la izquierda)
-    df['ciclo'] = df['ciclo'].astype(str).str.replace(r'\.0+$', '', regex=True)  # Eliminar .0 final
-    df['ciclo'] = df['ciclo'].str.zfill(2)  # Rellenar con ceros a la izquierda a 2 dígitos
-    
+    ciclo = ciclo.astype(str).str.replace(r'\.0+$', '', regex=True)  # Eliminar .0 final
+    return ciclo.str.zfill(2)  # Rellenar con ceros a la izquierda a 2 dígitos
+
+
+@registrar_nodo(GRAFO_CARTERA, 'proximo_pago', entradas=['proximo_pago_cob'], dependencias=['id_de_grupo'])
+def _proximo_pago(entrada, valores, contexto):
     # N. Próximo pago - CORRECCIÓN: Usar columna correcta de cobranza y convertir a fecha
-    df['proximo_pago'] = pd.to_datetime(df['proximo_pago_cob'], errors='coerce')
-    
-    # AG. Ahorro Acumulado
-    df['ahorro_acumulado'] = df['ahorro_acumulado'].fillna(0)
-    
-    # ========== PASO 4: ESTATUS (crítico, se calcula antes) ==========
-    
-    # AI. Estatus
-    def calcular_estatus(situacion_credito):
-        if pd.isna(situacion_credito):
-            return "Vigente"  # Por defecto, si no hay valor, asumir Vigente
-        situacion_str = str(situacion_credito).strip()
-        if situacion_str == "Entregado" or situacion_str == "Autorizado por cartera":
-            return "Vigente"
-        elif situacion_str == "Liquidado":
-            return "Desertor sin mora"
-        else:
-            # Si es un valor desconocido, por defecto asumir Vigente
-            logger.warning(f"Valor desconocido de situacion_credito: '{situacion_str}'. Asignando 'Vigente' por defecto")
-            return "Vigente"
-    
-    df['estatus'] = df['situacion_credito'].apply(calcular_estatus)
-    logger.info(f"Estatus calculados: {df['estatus'].value_counts().to_dict()}")
-    
-    # ========== PASO 5: COLUMNAS CONDICIONALES (dependen de Estatus) ==========
+    proximo_pago = pd.to_datetime(entrada['proximo_pago_cob'], errors='coerce')
+    if contexto.get('calidad') is not None:
+        fecha_invalida = entrada['proximo_pago_cob'].notna() & proximo_pago.isna()
+        contexto['calidad']['proximo_pago_invalido'] = _hallazgos(
+            valores['id_de_grupo'], entrada['proximo_pago_cob'], fecha_invalida
+        )
+    return proximo_pago
+
+
+@registrar_nodo(GRAFO_CARTERA, 'estatus', entradas=['situacion_credito'], dependencias=['id_de_grupo'])
+def _estatus(entrada, valores, contexto):
+    # AI. Estatus: Liquidado -> Desertor sin mora; Entregado, Autorizado por cartera,
+    # vacío o valor desconocido -> Vigente
+    situacion = entrada['situacion_credito'].astype(str).str.strip().where(entrada['situacion_credito'].notna())
+    estatus = pd.Series(np.where(situacion == "Liquidado", "Desertor sin mora", "Vigente"), index=situacion.index)
+    desconocida = situacion.notna() & ~situacion.isin(SITUACIONES_CONOCIDAS)
+    if desconocida.any():
+        logger.warning(
+            f"Valores desconocidos de situacion_credito (se asigna 'Vigente'): "
+            f"{situacion[desconocida].value_counts().to_dict()}"
+        )
+    if contexto.get('calidad') is not None:
+        contexto['calidad']['situacion_desconocida'] = _hallazgos(valores['id_de_grupo'], situacion, desconocida)
     
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Estatus calculados: {estatus.value_counts().to_dict()}")
+    return estatus
+
+
+@registrar_nodo(GRAFO_CARTERA, 'desertor', dependencias=['estatus'])
+def _desertor(entrada, valores, contexto):
+    # Las columnas condicionales dependen de Estatus
+    return valores['estatus'] == "Desertor sin mora"
+
+
+@registrar_nodo(GRAFO_CARTERA, 'monto_c', entradas=['monto_del_credito'])
+def _monto_c(entrada, valores, contexto):
+    return a_centavos(entrada['monto_del_credito'])
+
+
+@registrar_nodo(GRAFO_CARTERA, 'pago_c', entradas=['pago_semanal'])
+def _pago_c(entrada, valores, contexto):
+    return a_centavos(entrada['pago_semanal'])
+
+
+@registrar_nodo(GRAFO_CARTERA, 'ahorro_c', entradas=['ahorro_acumulado'])
+def _ahorro_c(entrada, valores, contexto):
+    # AG. Ahorro Acumulado (vacío = 0)
+    return a_centavos(entrada['ahorro_acumulado'].fillna(0))
+
+
+@registrar_nodo(GRAFO_CARTERA, 'vigente_sistema_c',
+                entradas=['saldo_total', 'cartera_vigente_importe'], dependencias=['desertor'])
+def _vigente_sistema_c(entrada, valores, contexto):
     # O. Cartera vigente sistema - CORRECCIÓN: Usar saldo_total de ANTIGÜEDAD
     # El valor esperado es directamente saldo_total de ANTIGÜEDAD
     # Ejemplos: 000089 -> 32,832.51, 000108 -> 106,395.49
-    if 'saldo_total' in df.columns:
-        df['cartera_vigente_sistema'] = np.where(
-            df['estatus'] == "Desertor sin mora",
-            0,
-            df['saldo_total'].fillna(0)
-        )
+    if 'saldo_total' in entrada:
         logger.info("Cartera vigente sistema calculada como: saldo_total (de ANTIGÜEDAD)")
-    else:
-        logger.warning("Columna 'saldo_total' no encontrada; se utilizará cartera_vigente_importe")
-        df['cartera_vigente_sistema'] = np.where(
-            df['estatus'] == "Desertor sin mora",
-            0,
-            df['cartera_vigente_importe'].fillna(0)
-        )
-    
+        return a_centavos(entrada['saldo_total'].fillna(0)).where(~valores['desertor'], 0)
+    logger.warning("Columna 'saldo_total' no encontrada; se utilizará cartera_vigente_importe")
+    return a_centavos(entrada['cartera_vigente_importe'].fillna(0)).where(~valores['desertor'], 0)
+
+
+@registrar_nodo(GRAFO_CARTERA, 'insoluta_c',
+                entradas=['saldo_capital', 'cartera_vigente_importe'], dependencias=['desertor'])
+def _insoluta_c(entrada, valores, contexto):
     # R. Cartera Insoluta - CORRECCIÓN: Usar saldo_capital de ANTIGÜEDAD
     # Debe ser exactamente igual a la columna "Saldo capital(y)" del archivo ANTIGÜEDAD
-    if 'saldo_capital' in df.columns:
-        df['cartera_insoluta'] = np.where(
-            df['estatus'] == "Desertor sin mora",
-            0,
-            df['saldo_capital'].fillna(0)
-        )
+    if 'saldo_capital' in entrada:
         logger.info("Cartera insoluta calculada como: saldo_capital (de ANTIGÜEDAD)")
-    else:
-        logger.warning("Columna 'saldo_capital' no encontrada; se utilizará cartera_vigente_importe")
-        df['cartera_insoluta'] = np.where(
-            df['estatus'] == "Desertor sin mora",
-            0,
-            df['cartera_vigente_importe'].fillna(0)
-        )
-    
+        return a_centavos(entrada['saldo_capital'].fillna(0)).where(~valores['desertor'], 0)
+    logger.warning("Columna 'saldo_capital' no encontrada; se utilizará cartera_vigente_importe")
+    return a_centavos(entrada['cartera_vigente_importe'].fillna(0)).where(~valores['desertor'], 0)
+
+
+@registrar_nodo(GRAFO_CARTERA, 'vencida_total_c', entradas=['cartera_vencida_importe'], dependencias=['desertor'])
+def _vencida_total_c(entrada, valores, contexto):
     # V. Cartera vencida Total
-    df['cartera_vencida_total'] = np.where(
-        df['estatus'] == "Desertor sin mora",
-        0,
-        df['cartera_vencida_importe'].fillna(0)
-    )
-    
+    return a_centavos(entrada['cartera_vencida_importe'].fillna(0)).where(~valores['desertor'], 0)
+
+
+@registrar_nodo(GRAFO_CARTERA, 'pct_mora', entradas=['cartera_vencida_pct'], dependencias=['desertor'])
+def _pct_mora(entrada, valores, contexto):
     # W. % Mora
-    df['pct_mora'] = np.where(
-        df['estatus'] == "Desertor sin mora",
+    return np.where(
+        valores['desertor'],
         0,
-        df['cartera_vencida_pct'].fillna(0) / 100
+        entrada['cartera_vencida_pct'].fillna(0) / 100
     )
-    
+
+
+@registrar_nodo(GRAFO_CARTERA, 'saldo_en_riesgo_c', entradas=['cartera_vigente_importe'], dependencias=['vencida_total_c'])
+def _saldo_en_riesgo_c(entrada, valores, contexto):
     # X. Saldo en riesgo
-    df['saldo_en_riesgo'] = np.where(
-        df['cartera_vencida_total'] > 0,
-        df['cartera_vigente_importe'].fillna(0),
-        0
-    )
-    
+    return a_centavos(entrada['cartera_vigente_importe'].fillna(0)).where(valores['vencida_total_c'] > 0, 0)
+
+
+@registrar_nodo(GRAFO_CARTERA, 'numero_de_integrantes',
+                entradas=['numero_integrantes', 'numero_de_integrantes_sit'], dependencias=['desertor'])
+def _numero_de_integrantes(entrada, valores, contexto):
     # AA. Número de Integrantes - CORRECCIÓN: Invertir orden de prioridad
-    df['numero_de_integrantes'] = np.where(
-        df['estatus'] == "Desertor sin mora",
-        df['numero_integrantes'].fillna(df['numero_de_integrantes_sit']),
-        df['numero_de_integrantes_sit'].fillna(df['numero_integrantes'])
+    return np.where(
+        valores['desertor'],
+        entrada['numero_integrantes'].fillna(entrada['numero_de_integrantes_sit']),
+        entrada['numero_de_integrantes_sit'].fillna(entrada['numero_integrantes'])
     )
-    
-    # Z. Monto promedio del grupo
-    df['monto_promedio_del_grupo'] = np.where(
-        df['estatus'] == "Desertor sin mora",
-        df['cantidad_prestada'] / df['numero_de_integrantes'],
-        df['monto_del_credito'] / df['numero_de_integrantes']
+
+
+@registrar_nodo(GRAFO_CARTERA, 'monto_promedio_del_grupo',
+                entradas=['cantidad_prestada', 'monto_del_credito'], dependencias=['desertor', 'numero_de_integrantes'])
+def _monto_promedio_del_grupo(entrada, valores, contexto):
+    # Z. Monto promedio del grupo (promedio por integrante, no es un saldo: queda en float)
+    return np.where(
+        valores['desertor'],
+        entrada['cantidad_prestada'] / valores['numero_de_integrantes'],
+        entrada['monto_del_credito'] / valores['numero_de_integrantes']
     )
-    
+
+
+@registrar_nodo(GRAFO_CARTERA, 'semana',
+                entradas=['fecha_de_inicio_del_credito', 'pagos', 'por_vencer'], dependencias=['desertor'])
+def _semana(entrada, valores, contexto):
     # AB. Semana - CORRECCIÓN: Usar columnas correctas
-    today = pd.Timestamp.now()
-    df['semana'] = np.where(
-        df['estatus'] == "Desertor sin mora",
-        ((today - df['fecha_de_inicio_del_credito']).dt.days / 7).fillna(0).astype(int),
-        df['pagos'].fillna(0) - df['por_vencer'].fillna(0)
+    today = contexto['hoy']
+    return np.where(
+        valores['desertor'],
+        ((today - entrada['fecha_de_inicio_del_credito']).dt.days / 7).fillna(0).astype(int),
+        entrada['pagos'].fillna(0) - entrada['por_vencer'].fillna(0)
     )
-    
+
+
+@registrar_nodo(GRAFO_CARTERA, 'pagos_por_vencer', entradas=['por_vencer'], dependencias=['desertor'])
+def _pagos_por_vencer(entrada, valores, contexto):
     # AD. Pagos por vencer
-    df['pagos_por_vencer'] = np.where(
-        df['estatus'] == "Desertor sin mora",
+    return np.where(
+        valores['desertor'],
         0,
-        df['por_vencer'].fillna(0)
+        entrada['por_vencer'].fillna(0)
     )
-    
+
+
+@registrar_nodo(GRAFO_CARTERA, 'total_de_pagos', entradas=['plazo', 'pagos'], dependencias=['desertor'])
+def _total_de_pagos(entrada, valores, contexto):
     # AE. Total de pagos
-    df['total_de_pagos'] = np.where(
-        df['estatus'] == "Desertor sin mora",
-        df['plazo'],
-        df['pagos'].fillna(0)
+    return np.where(
+        valores['desertor'],
+        entrada['plazo'],
+        entrada['pagos'].fillna(0)
     )
-    
+
+
+@registrar_nodo(GRAFO_CARTERA, 'pagos_cubiertos', dependencias=['total_de_pagos', 'pagos_por_vencer'])
+def _pagos_cubiertos(entrada, valores, contexto):
     # AC. Pagos cubiertos - CORRECCIÓN: Usar total_de_pagos - pagos_por_vencer
     # Similar a cómo se calculan las otras dos columnas (AD y AE)
     # Para Vigente: pagos (COBRANZA) - por_vencer (COBRANZA)
     # Para Desertor sin mora: plazo - 0 = plazo
     # Esta fórmula da el resultado correcto (ej: ID 000041 = 10.0)
     # vs la fórmula original (cartera_vigente_parcialidad / pago_semanal) que da 0.822361
-    df['pagos_cubiertos'] = df['total_de_pagos'] - df['pagos_por_vencer']
-    
-    # ========== PASO 6: COLUMNAS CALCULADAS ==========
-    
+    return valores['total_de_pagos'] - valores['pagos_por_vencer']
+
+
+@registrar_nodo(GRAFO_CARTERA, 'vigente_inicial_c', dependencias=['pago_c'])
+def _vigente_inicial_c(entrada, valores, contexto):
     # P. Cartera vigente inicial
-    df['cartera_vigente_inicial'] = df['pago_semanal'] * 16
-    
-    # Q. Cartera vigente calculada
-    calc_temp = -((df['semana'] * df['pago_semanal']) - df['cartera_vigente_inicial'])
-    df['cartera_vigente_calculada'] = np.maximum(calc_temp, df['cartera_vigente_sistema'])
-    
+    return valores['pago_c'] * SEMANAS_VIGENTE_INICIAL
+
+
+@registrar_nodo(GRAFO_CARTERA, 'semana_x_pago_c', dependencias=['pago_c', 'semana'])
+def _semana_x_pago_c(entrada, valores, contexto):
+    return _por_factor(valores['pago_c'], valores['semana'])
+
+
+@registrar_nodo(GRAFO_CARTERA, 'vigente_calculada_c',
+                dependencias=['vigente_inicial_c', 'semana_x_pago_c', 'vigente_sistema_c'])
+def _vigente_calculada_c(entrada, valores, contexto):
+    # Q. Cartera vigente calculada: max(inicial - semana × pago, vigente sistema); nulo si no hay pago
+    vigente_sistema_c = valores['vigente_sistema_c']
+    calc_temp = valores['vigente_inicial_c'] - valores['semana_x_pago_c']
+    return calc_temp.where(calc_temp.isna() | (calc_temp >= vigente_sistema_c), vigente_sistema_c)
+
+
+@registrar_nodo(GRAFO_CARTERA, 'diferencia_c', dependencias=['vigente_sistema_c', 'vigente_calculada_c'])
+def _diferencia_c(entrada, valores, contexto):
     # S. Diferencia Validación vigente
-    df['diferencia_validacion_vigente'] = df['cartera_vigente_sistema'] - df['cartera_vigente_calculada']
-    
-    # T. Ahorro Consumido
-    ahorro_mas_10pct = df['ahorro_acumulado'] + (df['monto_del_credito'] * 0.1)
-    df['ahorro_consumido'] = np.where(
-        df['cartera_vencida_total'] > 0,
-        np.where(
-            ahorro_mas_10pct > df['cartera_vencida_total'],
-            df['cartera_vencida_total'],
-            ahorro_mas_10pct
-        ),
-        0
-    )
-    
+    return valores['vigente_sistema_c'] - valores['vigente_calculada_c']
+
+
+@registrar_nodo(GRAFO_CARTERA, 'ahorro_consumido_c', dependencias=['ahorro_c', 'monto_c', 'vencida_total_c'])
+def _ahorro_consumido_c(entrada, valores, contexto):
+    # T. Ahorro Consumido: min(ahorro + 10% del monto, vencida total) si hay vencida
+    vencida_total_c = valores['vencida_total_c']
+    ahorro_mas_10pct = valores['ahorro_c'] + _porcentaje(valores['monto_c'] * PCT_AHORRO_CONSUMIDO, 100)
+    ahorro_consumido_c = ahorro_mas_10pct.where(~(ahorro_mas_10pct > vencida_total_c).fillna(False), vencida_total_c)
+    return ahorro_consumido_c.where(vencida_total_c > 0, 0)
+
+
+@registrar_nodo(GRAFO_CARTERA, 'vencida_estadistica_c', dependencias=['vencida_total_c', 'ahorro_consumido_c'])
+def _vencida_estadistica_c(entrada, valores, contexto):
     # U. Cartera Vencida Estadística
-    df['cartera_vencida_estadistica'] = df['cartera_vencida_total'] - df['ahorro_consumido']
-    
-    # Y. Saldo ahorro acumulado
-    df['saldo_ahorro_acumulado'] = df['ahorro_acumulado']
-    
+    return valores['vencida_total_c'] - valores['ahorro_consumido_c']
+
+
+@registrar_nodo(GRAFO_CARTERA, 'pct_de_ahorro', dependencias=['ahorro_c', 'semana_x_pago_c'])
+def _pct_de_ahorro(entrada, valores, contexto):
     # AH. % de Ahorro
-    denominador = df['pago_semanal'] * df['semana']
-    df['pct_de_ahorro'] = np.where(
+    denominador = valores['semana_x_pago_c'].astype('float64')
+    pct_de_ahorro = pd.Series(np.where(
         denominador != 0,
-        df['ahorro_acumulado'] / denominador,
+        valores['ahorro_c'].astype('float64') / denominador,
         0
+    ), index=denominador.index)
+    return pct_de_ahorro.replace([np.inf, -np.inf], 0).fillna(0)
+
+
+# Montos de vuelta a pesos (única conversión): {columna de CARTERA: nodo en centavos}
+for _columna, _centavos in (
+    ('monto_del_credito', 'monto_c'),
+    ('pago_semanal', 'pago_c'),
+    ('cartera_vigente_sistema', 'vigente_sistema_c'),
+    ('cartera_vigente_inicial', 'vigente_inicial_c'),
+    ('cartera_vigente_calculada', 'vigente_calculada_c'),
+    ('cartera_insoluta', 'insoluta_c'),
+    ('diferencia_validacion_vigente', 'diferencia_c'),
+    ('ahorro_consumido', 'ahorro_consumido_c'),
+    ('cartera_vencida_estadistica', 'vencida_estadistica_c'),
+    ('cartera_vencida_total', 'vencida_total_c'),
+    ('saldo_en_riesgo', 'saldo_en_riesgo_c'),
+    ('saldo_ahorro_acumulado', 'ahorro_c'),
+    ('ahorro_acumulado', 'ahorro_c'),
+):
+    registrar_nodo(GRAFO_CARTERA, _columna, dependencias=[_centavos])(
+        lambda entrada, valores, contexto, centavos=_centavos: a_pesos(valores[centavos])
     )
-    df['pct_de_ahorro'] = df['pct_de_ahorro'].replace([np.inf, -np.inf], 0).fillna(0)
-    
+
+
+@registrar_nodo(GRAFO_CARTERA, 'concepto_deposito', dependencias=['id_de_grupo', 'ciclo'])
+def _concepto_deposito(entrada, valores, contexto):
     # AJ. Concepto Depósito
-    df['concepto_deposito'] = (
+    return (
         "0" + 
-        df['id_de_grupo'].astype(str).str.zfill(6) + 
-        df['ciclo'].astype(int).astype(str).str.zfill(2)
+        valores['id_de_grupo'] + 
+        valores['ciclo'].astype(int).astype(str).str.zfill(2)
     )
+
+
+def calcular_cartera(
+    df: pd.DataFrame,
+    df_parche: pd.DataFrame = None,
+    gerentes_coordinacion: dict = None,
+    hoy: pd.Timestamp = None,
+    calidad: dict = None,
+    columnas: list = None,
+    memo: dict = None,
+    ruta_formulas: str = None
+) -> pd.DataFrame:
+    """
+    Etapa 2 de generar_cartera: gerente, parches, estatus y columnas calculadas.
     
-    # ========== PASO 7: SELECCIONAR Y ORDENAR COLUMNAS FINALES ==========
-    
-    columnas_finales = [
-        'nombre_del_gerente',           # A
-        'nombre_promotor',              # B
-        'id_de_grupo',                  # C
-        'nombre_de_grupo',              # D
-        'ciclo',                        # E
-        'monto_del_credito',            # F
-        'tipo_de_grupo',                # G
-        'fecha_de_inicio_del_credito',  # H
-        'plazo',                        # I
-        'dia_de_reunion',               # J
-        'hora_de_reunion',              # K
-        'periodicidad',                 # L
-        'pago_semanal',                 # M
-        'proximo_pago',                 # N
-        'cartera_vigente_sistema',      # O
-        'cartera_vigente_inicial',      # P
-        'cartera_vigente_calculada',    # Q
-        'cartera_insoluta',             # R
-        'diferencia_validacion_vigente', # S
-        'ahorro_consumido',             # T
-        'cartera_vencida_estadistica',  # U
-        'cartera_vencida_total',        # V
-        'pct_mora',                     # W
-        'saldo_en_riesgo',              # X
-        'saldo_ahorro_acumulado',       # Y
-        'monto_promedio_del_grupo',     # Z
-        'numero_de_integrantes',        # AA
-        'semana',                       # AB
-        'pagos_cubiertos',              # AC
-        'pagos_por_vencer',             # AD
-        'total_de_pagos',               # AE
-        'dias_de_mora',                 # AF
-        'ahorro_acumulado',             # AG
-        'pct_de_ahorro',                # AH
-        'estatus',                      # AI
-        'concepto_deposito'             # AJ
-    ]
-    
-    # Verificar que todas las columnas existen
-    columnas_faltantes = [col for col in columnas_finales if col not in df.columns]
-    if columnas_faltantes:
-        logger.error(f"Columnas faltantes: {columnas_faltantes}")
-        raise ValueError(f"Columnas faltantes en el DataFrame final: {columnas_faltantes}")
-    
-    df_final = df[columnas_finales].copy()
+    Solo se evalúan los nodos de GRAFO_CARTERA que necesitan `columnas` (ej. con
+    COLUMNAS_MORA_BASE no se calculan validación vigente, ahorro consumido ni
+    cartera vencida estadística). `df` no se modifica.
+    
+    Args:
+        df: DataFrame unido (de unir_fuentes)
+        df_parche: DataFrame de Parche Promotores (los parches se aplican desde sus módulos)
+        gerentes_coordinacion: {coordinacion: gerente} para completar gerentes vacíos.
+            Si es None se calcula con gerentes_por_coordinacion(df); al procesar por
+            particiones debe pasarse el calculado sobre todos los grupos.
+        hoy: Fecha de cálculo de la semana de los desertores (por defecto, ahora)
+        calidad: Si se pasa un diccionario, se llena con los hallazgos de los nodos
+            evaluados: 'gerente_coordinacion' (gerente), 'situacion_desconocida'
+            (situacion_credito) y 'proximo_pago_invalido' (proximo_pago de COBRANZA)
+        columnas: Columnas a generar, en ese orden (por defecto, COLUMNAS_CARTERA)
+        memo: Diccionario {nodo: Series} para reutilizar nodos ya evaluados en otra
+            llamada sobre el mismo `df`; se completa con los nodos de esta llamada
+        ruta_formulas: Configuración de fórmulas (por defecto, plantilla/formulas_cartera.json).
+            Con las columnas por defecto, sus columnas que no están en el grafo se agregan
+            al final de CARTERA (ver compilador_formulas.aplicar_formulas)
+    
+    Returns:
+        DataFrame con las columnas pedidas (por defecto, la hoja CARTERA de 36 columnas
+        más las de la configuración de fórmulas)
+    
+    Raises:
+        ValueError: Si se pide una columna que no está en el grafo
+    """
+    completa = columnas is None
+    columnas = COLUMNAS_CARTERA if completa else list(columnas)
+    contexto = {
+        'gerentes_coordinacion': gerentes_coordinacion,
+        'hoy': hoy if hoy is not None else pd.Timestamp.now(),
+        'calidad': calidad,
+    }
+    valores = evaluar_columnas(GRAFO_CARTERA, df, columnas, contexto, memo)
+    df_final = pd.DataFrame(valores, index=df.index)
+    if completa:
+        # Import local: compilador_formulas importa COLUMNAS_CARTERA de este módulo
+        from compilador_formulas import RUTA_FORMULAS, aplicar_formulas
+        df_final = aplicar_formulas(df_final, GRAFO_CARTERA, ruta_formulas or RUTA_FORMULAS)
     
     logger.info(f"Cartera generada exitosamente: {len(df_final)} filas x {len(df_final.columns)} columnas")
     
     return df_final
 
 
-def generar_mora(df_cartera: pd.DataFrame) -> pd.DataFrame:
+def _construir_mora(df_cartera: pd.DataFrame, mask) -> pd.DataFrame:
+    """
+    Construye las 14 columnas de la hoja MORA para las filas seleccionadas por `mask`.
+    Solo se copian las columnas que usa MORA, nunca el frame completo.
+    """
+    # Seleccionar columnas según especificación (A-L)
+    df_mora_final = pd.DataFrame({
+        col: df_cartera[col][mask] for col in COLUMNAS_MORA_BASE
+    })
+    
+    # En centavos, igual que en calcular_cartera (nulo si falta pago o semana)
+    pago_c = a_centavos(df_mora_final['pago_semanal'])
+    
+    # M. Mora potencial mensual = pago_semanal * 4
+    df_mora_final['mora_potencial_mensual'] = a_pesos(pago_c * SEMANAS_MORA_MENSUAL)
+    
+    # N. Cartera vencida total calculada = pago_semanal * semana
+    df_mora_final['cartera_vencida_total_calculada'] = a_pesos(_por_factor(pago_c, df_mora_final['semana']))
+    
+    return df_mora_final
+
+
+def generar_mora(df_cartera: pd.DataFrame, umbral_pct_mora: float = UMBRAL_PCT_MORA) -> pd.DataFrame:
     """
-    Genera el DataFrame de la hoja MORA filtrando grupos con %mora > 5%.
+    Genera el DataFrame de la hoja MORA filtrando grupos con %mora > umbral (5% por defecto).
     
     Args:
         df_cartera: DataFrame de CARTERA generado
+        umbral_pct_mora: Umbral de %mora (fracción, 0.05 = 5%)
         
     Returns:
         DataFrame con la estructura de la hoja MORA (14 columnas)
     """
     logger.info("\nIniciando generación de hoja MORA...")
     
-    # Filtrar registros con %mora > 5%
+    # Filtrar registros con %mora > umbral
     # La columna de %mora en CARTERA se llama 'pct_mora'
-    df_mora = df_cartera[df_cartera['pct_mora'] > 0.05].copy()
-    logger.info(f"Registros con %mora > 5%: {len(df_mora)} de {len(df_cartera)}")
+    mask = df_cartera['pct_mora'] > umbral_pct_mora
+    num_mora = int(mask.sum())
+    logger.info(f"Registros con %mora > {umbral_pct_mora:.0%}: {num_mora} de {len(df_cartera)}")
     
-    if len(df_mora) == 0:
-        logger.warning("No hay registros con %mora > 5%")
+    if num_mora == 0:
+        logger.warning(f"No hay registros con %mora > {umbral_pct_mora:.0%}")
         # Crear DataFrame vacío con las columnas esperadas
-        return pd.DataFrame(columns=[
-            'nombre_del_gerente',
-            'nombre_promotor',
-            'id_de_grupo',
-            'nombre_de_grupo',
-            'ciclo',
-            'monto_del_credito',
-            'semana',
-            'pago_semanal',
-            'cartera_vencida_total',
-            'pct_mora',
-            'saldo_en_riesgo',
-            'dias_de_mora',
-            'mora_potencial_mensual',
-            'cartera_vencida_total_calculada'
-        ])
-    
-    # Seleccionar y renombrar columnas según especificación
-    df_mora_final = pd.DataFrame({
-        # A. Nombre del gerente
-        'nombre_del_gerente': df_mora['nombre_del_gerente'],
-        
-        # B. Nombre del promotor
-        'nombre_promotor': df_mora['nombre_promotor'],
-        
-        # C. ID GRUPO
-        'id_de_grupo': df_mora['id_de_grupo'],
-        
-        # D. Nombre de grupo
-        'nombre_de_grupo': df_mora['nombre_de_grupo'],
-        
-        # E. Ciclo
-        'ciclo': df_mora['ciclo'],
-        
-        # F. Monto del crédito
-        'monto_del_credito': df_mora['monto_del_credito'],
-        
-        # G. Semana
-        'semana': df_mora['semana'],
-        
-        # H. Pago semanal
-        'pago_semanal': df_mora['pago_semanal'],
-        
-        # I. Cartera vencida total
-        'cartera_vencida_total': df_mora['cartera_vencida_total'],
-        
-        # J. %mora (con relleno amarillo)
-        'pct_mora': df_mora['pct_mora'],
+        return pd.DataFrame(columns=COLUMNAS_MORA)
+    
+    df_mora_final = _construir_mora(df_cartera, mask)
+    
+    logger.info(f"Hoja MORA generada con {len(df_mora_final)} registros y {len(df_mora_final.columns)} columnas")
+    
+    return df_mora_final
+
+
+def asignar_rangos_mora(df_cartera: pd.DataFrame) -> pd.Categorical:
+    """
+    Asigna a cada grupo su rango de antigüedad de mora según dias_de_mora.
+    Los grupos sin días de mora (0 o NaN) quedan sin rango (NaN).
+    
+    Args:
+        df_cartera: DataFrame de CARTERA generado
         
-        # K. Saldo en riesgo
-        'saldo_en_riesgo': df_mora['saldo_en_riesgo'],
+    Returns:
+        Categorical alineado con df_cartera, categorías en el orden de RANGOS_DIAS_MORA
+    """
+    dias = pd.to_numeric(df_cartera['dias_de_mora'], errors='coerce').to_numpy(dtype=float)
+    limites = [0] + [limite for _, limite in RANGOS_DIAS_MORA]
+    etiquetas = [etiqueta for etiqueta, _ in RANGOS_DIAS_MORA]
+    return pd.cut(dias, bins=limites, labels=etiquetas, right=True)
+
+
+def generar_mora_por_rangos(df_cartera: pd.DataFrame, umbral_pct_mora: float = None):
+    """
+    Genera la base MORA de todos los grupos con días de mora y los índices de cada rango.
+    
+    Los rangos se asignan en una sola pasada (pd.cut) y cada rango se entrega como un
+    arreglo de posiciones sobre la base MORA, sin copiar el frame por rango.
+    
+    Args:
+        df_cartera: DataFrame de CARTERA generado
+        umbral_pct_mora: Si se indica, solo considera grupos con %mora > umbral
         
-        # L. Días de mora (con relleno amarillo)
-        'dias_de_mora': df_mora['dias_de_mora'],
-    })
+    Returns:
+        Tupla (df_mora_base, indices) donde indices es {rango: posiciones en df_mora_base}
+    """
+    logger.info("\nIniciando generación de rangos de mora...")
+    
+    rangos = asignar_rangos_mora(df_cartera)
+    codigos = np.asarray(rangos.codes)
+    mask = codigos >= 0
+    if umbral_pct_mora is not None:
+        mask &= (df_cartera['pct_mora'] > umbral_pct_mora).to_numpy()
+    
+    df_mora_base = _construir_mora(df_cartera, mask)
+    
+    # Agrupar posiciones por rango con un solo argsort estable (conserva el orden original)
+    codigos = codigos[mask]
+    orden = np.argsort(codigos, kind='stable')
+    conteos = np.bincount(codigos, minlength=len(RANGOS_DIAS_MORA))
+    cortes = np.cumsum(conteos)[:-1]
+    indices = {
+        etiqueta: posiciones
+        for (etiqueta, _), posiciones in zip(RANGOS_DIAS_MORA, np.split(orden, cortes))
+    }
+    
+    conteo_rangos = {etiqueta: len(posiciones) for etiqueta, posiciones in indices.items()}
+    logger.info(f"Registros por rango de días de mora: {conteo_rangos}")
+    
+    return df_mora_base, indices
+
+
+def resumen_rangos_mora(df_cartera: pd.DataFrame, umbrales_pct_mora=UMBRALES_PCT_MORA) -> pd.DataFrame:
+    """
+    Matriz resumen de conteos y montos por rango de días de mora y banda de %mora.
     
-    # M. Mora potencial mensual = pago_semanal * 4
-    df_mora_final['mora_potencial_mensual'] = np.where(
-        df_mora_final['pago_semanal'].notna(),
-        df_mora_final['pago_semanal'] * 4,
-        np.nan
+    Args:
+        df_cartera: DataFrame de CARTERA generado
+        umbrales_pct_mora: Umbrales de %mora (fracciones) que definen las bandas
+        
+    Returns:
+        DataFrame indexado por rango de días, con columnas (medida, banda de %mora)
+    """
+    umbrales = sorted(umbrales_pct_mora)
+    pct_mora = df_cartera['pct_mora'].to_numpy()
+    # Bandas: <=5%, 5%-10%, 10%-25%, >25% (para los umbrales por defecto)
+    bandas = [f"<={umbrales[0]:.0%}"]
+    bandas += [f"{inferior:.0%}-{superior:.0%}" for inferior, superior in zip(umbrales, umbrales[1:])]
+    bandas += [f">{umbrales[-1]:.0%}"]
+    banda = np.select(
+        [pct_mora > umbral for umbral in reversed(umbrales)],
+        bandas[:0:-1],
+        default=bandas[0]
     )
     
-    # N. Cartera vencida total calculada = pago_semanal * semana
-    df_mora_final['cartera_vencida_total_calculada'] = np.where(
-        (df_mora_final['pago_semanal'].notna()) & (df_mora_final['semana'].notna()),
-        df_mora_final['pago_semanal'] * df_mora_final['semana'],
-        np.nan
-    )
+    df_rangos = pd.DataFrame({
+        'rango_dias_mora': asignar_rangos_mora(df_cartera),
+        'banda_pct_mora': pd.Categorical(banda, categories=bandas),
+        'cartera_vencida_total': df_cartera['cartera_vencida_total'].to_numpy(),
+        'saldo_en_riesgo': df_cartera['saldo_en_riesgo'].to_numpy(),
+    })
     
-    logger.info(f"Hoja MORA generada con {len(df_mora_final)} registros y {len(df_mora_final.columns)} columnas")
+    resumen = df_rangos.groupby(['rango_dias_mora', 'banda_pct_mora'], observed=False).agg(
+        grupos=('cartera_vencida_total', 'size'),
+        cartera_vencida_total=('cartera_vencida_total', 'sum'),
+        saldo_en_riesgo=('saldo_en_riesgo', 'sum'),
+    )
+    matriz = resumen.unstack('banda_pct_mora', fill_value=0)
+    matriz.index = matriz.index.astype(str)
     
-    return df_mora_final
-
+    return matriz
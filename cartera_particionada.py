@@ -0,0 +1,334 @@
+"""
+Generación de CARTERA fuera de memoria, por particiones de ID de grupo.
+
+Las 4 entradas se reparten por hash del ID de grupo (el mismo ID con ceros a la
+izquierda que usan los joins) en particiones en disco; cada partición contiene
+todos los registros de sus grupos en las 4 fuentes, así que los joins y la
+eliminación de duplicados se resuelven dentro de la partición.
+
+Se hacen dos pasadas:
+    1. Por partición: unir_fuentes() y se guarda el resultado unido. De cada
+       partición solo se retienen en memoria las columnas coordinación/gerente.
+    2. Con la moda global de gerente por coordinación (la misma que calcula el
+       modo en memoria sobre todos los grupos), calcular_cartera() por partición.
+       Las particiones pueden procesarse en paralelo (procesos).
+
+Las entradas se liberan en cuanto están en disco (antes de la pasada 1) si el
+llamador no conserva otras referencias. La CARTERA de cada partición también se
+guarda en disco: con un directorio propio (directorio=...), leer_particiones()
+la vuelve a leer una partición a la vez (ver resultado_cartera.ResultadoParticionado).
+
+Las particiones se guardan en pickle: conserva los tipos mixtos de las columnas
+de los reportes (ej. hora_junta con texto y números), que Parquet no admite.
+"""
+
+import pandas as pd
+import numpy as np
+import logging
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from cartera_generator import unir_fuentes, calcular_cartera, gerentes_por_coordinacion
+from registro_logs import argumentos_proceso
+
+logger = logging.getLogger(__name__)
+
+# Número de particiones por defecto
+NUM_PARTICIONES = 16
+
+# Columna de cada fuente con el ID de grupo (antes de formatear a 6 dígitos)
+COLUMNAS_ID = {
+    'antiguedad': 'cod_grupo_solidario',
+    'situacion': 'codigo',
+    'cobranza': 'gpo',
+    'ahorros': 'id',
+}
+
+# Columna auxiliar con la posición original en ANTIGÜEDAD (para reconstruir el orden)
+COLUMNA_FILA_ORIGEN = '_fila_origen'
+
+# Archivo con la CARTERA calculada de cada partición (pasada 2)
+ARCHIVO_CARTERA = 'cartera.pkl'
+
+
+def _ruta_particion(directorio, numero: int) -> Path:
+    return Path(directorio) / f"particion_{numero:04d}"
+
+
+def numero_particion(ids: pd.Series, num_particiones: int) -> np.ndarray:
+    """
+    Asigna cada ID de grupo a una partición por hash del ID formateado a 6 dígitos.
+
+    Args:
+        ids: Serie con el ID de grupo tal como viene en la fuente
+        num_particiones: Número de particiones
+
+    Returns:
+        Arreglo con el número de partición de cada fila
+    """
+    claves = ids.astype(str).str.zfill(6).to_numpy(dtype=object)
+    return (pd.util.hash_array(claves) % np.uint64(num_particiones)).astype(np.int64)
+
+
+def particionar_entradas(
+    df_antiguedad: pd.DataFrame,
+    df_situacion: pd.DataFrame,
+    df_cobranza: pd.DataFrame,
+    df_ahorros: pd.DataFrame,
+    directorio: str,
+    num_particiones: int = NUM_PARTICIONES
+) -> list:
+    """
+    Reparte las 4 entradas en particiones en disco por hash del ID de grupo.
+
+    Args:
+        df_antiguedad: DataFrame de ANTIGÜEDAD
+        df_situacion: DataFrame de SITUACIÓN
+        df_cobranza: DataFrame de COBRANZA
+        df_ahorros: DataFrame de AHORROS
+        directorio: Directorio donde se crean las particiones
+        num_particiones: Número de particiones
+
+    Returns:
+        Lista de rutas de las particiones con registros de ANTIGÜEDAD
+    """
+    if num_particiones < 1:
+        raise ValueError(f"num_particiones debe ser >= 1, se recibió {num_particiones}")
+
+    fuentes = {
+        'antiguedad': df_antiguedad,
+        'situacion': df_situacion,
+        'cobranza': df_cobranza,
+        'ahorros': df_ahorros,
+    }
+
+    for numero in range(num_particiones):
+        _ruta_particion(directorio, numero).mkdir(parents=True, exist_ok=True)
+
+    con_registros = set()
+    for fuente, df in fuentes.items():
+        particion = numero_particion(df[COLUMNAS_ID[fuente]], num_particiones)
+        # Un solo ordenamiento por fuente; cada partición es un rango contiguo
+        orden = np.argsort(particion, kind='stable')
+        limites = np.searchsorted(particion[orden], np.arange(num_particiones + 1))
+        for numero in range(num_particiones):
+            posiciones = orden[limites[numero]:limites[numero + 1]]
+            parte = df.take(posiciones)
+            if fuente == 'antiguedad':
+                # Posición en ANTIGÜEDAD, escrita por partición (sin copiar la entrada completa)
+                parte[COLUMNA_FILA_ORIGEN] = posiciones
+                if len(posiciones) > 0:
+                    con_registros.add(numero)
+            parte.to_pickle(_ruta_particion(directorio, numero) / f"{fuente}.pkl")
+            del parte
+
+    logger.info(
+        f"Entradas particionadas en {num_particiones} particiones "
+        f"({len(con_registros)} con registros de ANTIGÜEDAD): {directorio}"
+    )
+    return [_ruta_particion(directorio, numero) for numero in sorted(con_registros)]
+
+
+def _hay_ids_duplicados(fuentes: dict) -> bool:
+    """
+    Indica si los joins de unir_fuentes() producirán IDs duplicados: ID repetido en
+    ANTIGÜEDAD, o ID repetido en otra fuente que sí está en ANTIGÜEDAD.
+    """
+    ids = fuentes['antiguedad'][COLUMNAS_ID['antiguedad']].astype(str).str.zfill(6)
+    if ids.duplicated().any():
+        return True
+    for fuente in ('situacion', 'cobranza', 'ahorros'):
+        claves = fuentes[fuente][COLUMNAS_ID[fuente]].astype(str).str.zfill(6)
+        if claves[claves.duplicated()].isin(ids).any():
+            return True
+    return False
+
+
+def _unir_particion(ruta) -> tuple:
+    """
+    Pasada 1 sobre una partición: joins + duplicados, guarda el resultado unido.
+
+    Returns:
+        Tupla (coordinación/gerente de cada grupo, llaves de orden de cada grupo,
+        si la partición tuvo IDs duplicados después de los joins)
+    """
+    ruta = Path(ruta)
+    fuentes = {fuente: pd.read_pickle(ruta / f"{fuente}.pkl") for fuente in COLUMNAS_ID}
+    duplicados = _hay_ids_duplicados(fuentes)
+    df = unir_fuentes(*fuentes.values())
+    del fuentes
+    df.to_pickle(ruta / 'unido.pkl')
+
+    gerentes = df[['coordinacion', 'nombre_de_gerente']]
+    llaves = pd.DataFrame({
+        'id_de_grupo': df['id_de_grupo'],
+        COLUMNA_FILA_ORIGEN: df[COLUMNA_FILA_ORIGEN],
+        # Mismo ciclo que usa unir_fuentes para decidir entre IDs duplicados
+        '_ciclo_temp': pd.to_numeric(df['ciclo_sit'].fillna(df['ciclo']), errors='coerce'),
+    })
+    return gerentes, llaves, duplicados
+
+
+def _calcular_particion(ruta, gerentes_coordinacion: dict, hoy: pd.Timestamp) -> pd.DataFrame:
+    """Pasada 2 sobre una partición: columnas calculadas de CARTERA (también se guardan en la partición)."""
+    df = pd.read_pickle(Path(ruta) / 'unido.pkl')
+    df_cartera = calcular_cartera(df, gerentes_coordinacion=gerentes_coordinacion, hoy=hoy)
+    df_cartera.to_pickle(Path(ruta) / ARCHIVO_CARTERA)
+    return df_cartera
+
+
+def leer_particiones(directorio: str, columnas: list = None):
+    """
+    Vuelve a leer la CARTERA de cada partición (pasada 2) de un directorio de trabajo.
+
+    Args:
+        directorio: Directorio pasado a iterar_cartera_particionada
+        columnas: Columnas a conservar de cada partición (por defecto, todas)
+
+    Yields:
+        DataFrame de CARTERA de cada partición, en el mismo orden en que se entregaron
+    """
+    for ruta in sorted(Path(directorio).glob(f"particion_*/{ARCHIVO_CARTERA}")):
+        df = pd.read_pickle(ruta)
+        yield df if columnas is None else df[list(columnas)]
+
+
+def _mapear(funcion, rutas: list, max_procesos: int, *args):
+    """map() secuencial o en procesos, conservando el orden de las particiones."""
+    if max_procesos == 1 or len(rutas) <= 1:
+        for ruta in rutas:
+            yield funcion(ruta, *args)
+        return
+    with ProcessPoolExecutor(max_workers=max_procesos, **argumentos_proceso()) as executor:
+        yield from executor.map(funcion, rutas, *([arg] * len(rutas) for arg in args))
+
+
+def iterar_cartera_particionada(
+    df_antiguedad: pd.DataFrame,
+    df_situacion: pd.DataFrame,
+    df_cobranza: pd.DataFrame,
+    df_ahorros: pd.DataFrame,
+    num_particiones: int = NUM_PARTICIONES,
+    max_procesos: int = 1,
+    directorio: str = None,
+    orden: dict = None
+):
+    """
+    Genera CARTERA por particiones de ID de grupo, entregando una partición a la vez.
+
+    Cada grupo produce exactamente los mismos valores que generar_cartera(); el
+    orden de las filas es por partición (para el orden del modo en memoria usar
+    generar_cartera_particionada).
+
+    Args:
+        df_antiguedad, df_situacion, df_cobranza, df_ahorros: Entradas cargadas. Se
+            liberan en cuanto están en disco si el llamador no conserva otras referencias
+            (ej. entradas.pop('antiguedad'))
+        num_particiones: Número de particiones de ID de grupo
+        max_procesos: Procesos para la pasada de cálculo (1 = secuencial, None = núm. de CPUs)
+        directorio: Directorio de trabajo para las particiones (por defecto uno temporal,
+            que se elimina al terminar). Con un directorio propio, la CARTERA de cada
+            partición queda en disco para leer_particiones()
+        orden: Si se pasa un diccionario, al terminar la pasada 1 se llenan 'llaves'
+            (llaves de orden de cada partición) y 'duplicados' (si hubo IDs duplicados)
+
+    Yields:
+        DataFrame de CARTERA (36 columnas) de cada partición
+    """
+    temporal = directorio is None
+    if temporal:
+        directorio = tempfile.mkdtemp(prefix='cartera_particiones_')
+
+    try:
+        rutas = particionar_entradas(
+            df_antiguedad, df_situacion, df_cobranza, df_ahorros, directorio, num_particiones
+        )
+        # Las entradas ya están en disco: no se retienen durante las pasadas
+        del df_antiguedad, df_situacion, df_cobranza, df_ahorros
+
+        # Pasada 1: joins por partición; solo se retienen coordinación/gerente y llaves de orden
+        logger.info(f"Pasada 1: uniendo fuentes en {len(rutas)} particiones...")
+        gerentes = []
+        llaves = []
+        duplicados = False
+        for gerentes_particion, llaves_particion, duplicados_particion in _mapear(_unir_particion, rutas, max_procesos):
+            gerentes.append(gerentes_particion)
+            llaves.append(llaves_particion)
+            duplicados |= duplicados_particion
+        if orden is not None:
+            orden.update(llaves=llaves, duplicados=duplicados)
+        del llaves
+
+        # Moda global de gerente por coordinación (igual que en memoria)
+        gerentes_coordinacion = gerentes_por_coordinacion(pd.concat(gerentes, ignore_index=True))
+        del gerentes
+        logger.info(f"Gerentes por coordinación (global): {len(gerentes_coordinacion)} coordinaciones")
+
+        # Pasada 2: cálculo por partición, con una sola fecha de cálculo para todas
+        logger.info(f"Pasada 2: calculando CARTERA por partición (procesos: {max_procesos or 'auto'})...")
+        hoy = pd.Timestamp.now()
+        for numero, df_particion in enumerate(
+            _mapear(_calcular_particion, rutas, max_procesos, gerentes_coordinacion, hoy), start=1
+        ):
+            logger.info(f"Partición {numero}/{len(rutas)}: {len(df_particion)} grupos")
+            yield df_particion
+    finally:
+        if temporal:
+            shutil.rmtree(directorio, ignore_errors=True)
+
+
+def ordenar_como_en_memoria(partes: list, orden: dict) -> pd.DataFrame:
+    """
+    Une las particiones en el mismo orden de filas que genera generar_cartera().
+
+    En memoria, si hubo IDs duplicados después de los joins el frame queda
+    ordenado por ciclo descendente e ID; si no, conserva el orden de ANTIGÜEDAD.
+
+    Args:
+        partes: DataFrames de CARTERA por partición (en el orden de iterar_cartera_particionada)
+        orden: Diccionario 'llaves'/'duplicados' llenado por iterar_cartera_particionada
+
+    Returns:
+        DataFrame de CARTERA completo
+    """
+    if not partes:
+        raise ValueError("No hay particiones que unir")
+
+    df = pd.concat(partes, ignore_index=True)
+    llaves = pd.concat(orden['llaves'], ignore_index=True)
+
+    if orden['duplicados']:
+        llaves = llaves.sort_values(
+            ['_ciclo_temp', 'id_de_grupo'], ascending=[False, True], na_position='last'
+        )
+    else:
+        llaves = llaves.sort_values(COLUMNA_FILA_ORIGEN, kind='stable')
+
+    return df.take(llaves.index).reset_index(drop=True)
+
+
+def generar_cartera_particionada(
+    df_antiguedad: pd.DataFrame,
+    df_situacion: pd.DataFrame,
+    df_cobranza: pd.DataFrame,
+    df_ahorros: pd.DataFrame,
+    num_particiones: int = NUM_PARTICIONES,
+    max_procesos: int = 1,
+    directorio: str = None
+) -> pd.DataFrame:
+    """
+    Igual que generar_cartera(), pero procesando por particiones de ID de grupo.
+
+    Returns:
+        DataFrame de CARTERA con los mismos valores y orden de filas que generar_cartera()
+    """
+    orden = {}
+    partes = list(iterar_cartera_particionada(
+        df_antiguedad, df_situacion, df_cobranza, df_ahorros,
+        num_particiones=num_particiones,
+        max_procesos=max_procesos,
+        directorio=directorio,
+        orden=orden
+    ))
+    return ordenar_como_en_memoria(partes, orden)
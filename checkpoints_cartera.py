@@ -0,0 +1,147 @@
+"""
+Checkpoints entre etapas de la automatización, para reanudar una corrida.
+
+Etapas (en orden):
+    carga   - 4 entradas parseadas (checkpoint: antiguedad, situacion, cobranza, ahorros)
+    union   - joins + duplicados, unir_fuentes() (checkpoint: unido)
+    calculo - columnas de CARTERA, calcular_cartera() (checkpoint: cartera)
+    salida  - output Excel, MORA, rangos, RESUMEN, histórico y validación
+
+Cada checkpoint es un subdirectorio del directorio de la corrida con un archivo
+por DataFrame y un checkpoint.json (etapa, fecha, archivos y metadatos de la
+corrida). El JSON se escribe al final, así que un checkpoint interrumpido a la
+mitad no se considera válido.
+
+Los DataFrames se guardan en Parquet; si una columna tiene tipos mixtos que
+Parquet no admite (ej. hora_junta con texto y números en las entradas), ese
+DataFrame se guarda en pickle. Un frame que llega por partes (corrida por
+particiones) se guarda en un archivo por parte (cartera_0000.parquet, ...) y se
+une al cargarlo.
+"""
+
+import pandas as pd
+import pyarrow as pa
+import json
+import logging
+import shutil
+from datetime import datetime
+from pathlib import Path
+from escritura_atomica import escritura_atomica
+
+logger = logging.getLogger(__name__)
+
+# Directorio por defecto de los checkpoints
+DIRECTORIO_CHECKPOINTS = 'checkpoints'
+
+# Etapas de la corrida, en orden
+ETAPAS = ['carga', 'union', 'calculo', 'salida']
+
+# Archivo de control de cada checkpoint
+ARCHIVO_CONTROL = 'checkpoint.json'
+
+
+def etapa_checkpoint(etapa_inicio: str) -> str:
+    """
+    Etapa cuyo checkpoint se necesita para reanudar en `etapa_inicio`.
+
+    Raises:
+        ValueError: Si la etapa no existe o es la primera (no requiere checkpoint)
+    """
+    if etapa_inicio not in ETAPAS[1:]:
+        raise ValueError(f"Etapa de reanudación inválida: '{etapa_inicio}'. Opciones: {ETAPAS[1:]}")
+    return ETAPAS[ETAPAS.index(etapa_inicio) - 1]
+
+
+def _guardar_frame(ruta: Path, nombre: str, df: pd.DataFrame) -> str:
+    """Guarda `df` como ruta/nombre.parquet (o .pkl si Parquet no lo admite) y retorna el archivo."""
+    try:
+        df.to_parquet(ruta / f"{nombre}.parquet", index=False)
+        return f"{nombre}.parquet"
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+        logger.debug(f"{nombre} no es compatible con Parquet ({e}); se guarda en pickle")
+        (ruta / f"{nombre}.parquet").unlink(missing_ok=True)
+        df.to_pickle(ruta / f"{nombre}.pkl")
+        return f"{nombre}.pkl"
+
+
+def _cargar_frame(ruta: Path, archivo: str) -> pd.DataFrame:
+    """Lee un archivo guardado por _guardar_frame."""
+    if archivo.endswith('.parquet'):
+        return pd.read_parquet(ruta / archivo)
+    return pd.read_pickle(ruta / archivo)
+
+
+def guardar_checkpoint(directorio: str, etapa: str, frames: dict, metadatos: dict = None) -> Path:
+    """
+    Guarda el checkpoint de una etapa (reemplaza el anterior de esa etapa).
+
+    Args:
+        directorio: Directorio de la corrida
+        etapa: Etapa que acaba de terminar
+        frames: {nombre: DataFrame o iterable de partes de un DataFrame}
+        metadatos: Datos de la corrida necesarios para reanudar (rutas de entrada, etc.)
+
+    Returns:
+        Ruta del checkpoint
+    """
+    if etapa not in ETAPAS:
+        raise ValueError(f"Etapa inválida: '{etapa}'. Opciones: {ETAPAS}")
+
+    ruta = Path(directorio) / etapa
+    if ruta.exists():
+        shutil.rmtree(ruta)
+    ruta.mkdir(parents=True)
+
+    archivos = {}
+    for nombre, df in frames.items():
+        if isinstance(df, pd.DataFrame):
+            archivos[nombre] = _guardar_frame(ruta, nombre, df)
+        else:
+            archivos[nombre] = [
+                _guardar_frame(ruta, f"{nombre}_{numero:04d}", parte) for numero, parte in enumerate(df)
+            ]
+
+    control = {
+        'etapa': etapa,
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'archivos': archivos,
+        'metadatos': metadatos or {},
+    }
+    # El archivo de control se escribe al final y de forma atómica: un checkpoint
+    # sin control (corrida interrumpida) no se puede cargar
+    with escritura_atomica(ruta / ARCHIVO_CONTROL) as temporal, open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(control, f, ensure_ascii=False, indent=2)
+
+    resumen = [archivo if isinstance(archivo, str) else f"{len(archivo)} partes de {nombre}"
+               for nombre, archivo in archivos.items()]
+    logger.info(f"Checkpoint '{etapa}' guardado: {ruta} ({', '.join(resumen)})")
+    return ruta
+
+
+def cargar_checkpoint(directorio: str, etapa: str) -> tuple:
+    """
+    Carga el checkpoint de una etapa.
+
+    Returns:
+        Tupla ({nombre: DataFrame}, metadatos)
+
+    Raises:
+        FileNotFoundError: Si no hay checkpoint completo de la etapa
+    """
+    ruta = Path(directorio) / etapa
+    if not (ruta / ARCHIVO_CONTROL).exists():
+        raise FileNotFoundError(f"No hay checkpoint de la etapa '{etapa}' en {directorio}")
+
+    with open(ruta / ARCHIVO_CONTROL, encoding='utf-8') as f:
+        control = json.load(f)
+
+    frames = {}
+    for nombre, archivo in control['archivos'].items():
+        if isinstance(archivo, list):
+            # Guardado por partes: se une en el orden en que se guardó
+            frames[nombre] = pd.concat([_cargar_frame(ruta, parte) for parte in archivo], ignore_index=True)
+        else:
+            frames[nombre] = _cargar_frame(ruta, archivo)
+
+    logger.info(f"Checkpoint '{etapa}' cargado: {ruta} (guardado {control['fecha']})")
+    return frames, control['metadatos']
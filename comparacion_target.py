@@ -0,0 +1,307 @@
+"""
+Comparación vectorizada del output contra el target (hoja CARTERA del machote).
+
+Reemplaza la validación manual que produjo REPORTE_DIFERENCIAS.md y
+REPORTE_COMPARACION_TARGET.md: alinea ambos por id_de_grupo, compara las 36
+columnas con tolerancias por columna y genera un reporte JSON con conteos,
+peores diferencias y totales por columna.
+
+El target (.xlsm de ~1.5 MB) se parsea una sola vez: el resultado normalizado
+se guarda en Parquet con la huella SHA-256 del archivo en el nombre.
+
+Uso:
+    python comparacion_target.py OUTPUT TARGET [--reporte reporte_target.json]
+"""
+
+import pandas as pd
+import numpy as np
+import argparse
+import json
+import logging
+from pathlib import Path
+from cartera_generator import COLUMNAS_CARTERA
+from escritura_atomica import escritura_atomica
+
+logger = logging.getLogger(__name__)
+
+# Directorio del caché de targets parseados
+DIRECTORIO_CACHE = 'cache_target'
+
+# Reporte por defecto
+RUTA_REPORTE = 'reporte_target.json'
+
+# Peores diferencias que se reportan por columna
+MAX_PEORES = 10
+
+# Columnas de fecha (se comparan por día)
+COLUMNAS_FECHA = ['fecha_de_inicio_del_credito', 'proximo_pago']
+
+# Columnas numéricas y su tolerancia absoluta
+TOLERANCIAS = {
+    'monto_del_credito': 0.01,
+    'plazo': 0,
+    'pago_semanal': 0.01,
+    'cartera_vigente_sistema': 0.01,
+    'cartera_vigente_inicial': 0.01,
+    'cartera_vigente_calculada': 0.01,
+    'cartera_insoluta': 0.01,
+    'diferencia_validacion_vigente': 0.01,
+    'ahorro_consumido': 0.01,
+    'cartera_vencida_estadistica': 0.01,
+    'cartera_vencida_total': 0.01,
+    'pct_mora': 1e-4,
+    'saldo_en_riesgo': 0.01,
+    'saldo_ahorro_acumulado': 0.01,
+    'monto_promedio_del_grupo': 0.01,
+    'numero_de_integrantes': 0,
+    'semana': 0,
+    'pagos_cubiertos': 0,
+    'pagos_por_vencer': 0,
+    'total_de_pagos': 0,
+    'dias_de_mora': 0,
+    'ahorro_acumulado': 0.01,
+    'pct_de_ahorro': 1e-4,
+}
+
+# Columnas de texto con ceros a la izquierda (Excel puede guardarlas como número)
+ANCHO_TEXTO = {
+    'id_de_grupo': 6,
+    'ciclo': 2,
+    'concepto_deposito': 9,
+}
+
+# Columnas de texto: el resto de CARTERA
+COLUMNAS_TEXTO = [
+    col for col in COLUMNAS_CARTERA
+    if col not in TOLERANCIAS and col not in COLUMNAS_FECHA
+]
+
+
+def normalizar_cartera(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Lleva un frame de CARTERA (output o target) a tipos comparables:
+    números float, fechas al día y texto sin espacios ('10:00:00' -> '10:00', 5.0 -> '5').
+
+    Returns:
+        Nuevo DataFrame con las 36 columnas de CARTERA
+    """
+    faltantes = [col for col in COLUMNAS_CARTERA if col not in df.columns]
+    if faltantes:
+        raise ValueError(f"Columnas faltantes para comparar: {faltantes}")
+
+    columnas = {}
+    for col in TOLERANCIAS:
+        columnas[col] = pd.to_numeric(df[col], errors='coerce').astype(float)
+    for col in COLUMNAS_FECHA:
+        columnas[col] = pd.to_datetime(df[col], errors='coerce').dt.normalize()
+    for col in COLUMNAS_TEXTO:
+        columnas[col] = _normalizar_texto(df[col], ANCHO_TEXTO.get(col))
+
+    return pd.DataFrame(columnas, index=df.index)[COLUMNAS_CARTERA]
+
+
+def _normalizar_texto(serie: pd.Series, ancho: int = None) -> np.ndarray:
+    """
+    Normaliza una columna de texto trabajando solo sobre sus valores únicos
+    (gerentes, promotores, estatus, etc. se repiten en miles de grupos).
+    """
+    codigos, unicos = pd.factorize(serie)
+    texto = (
+        pd.Index(unicos).astype(str).str.strip()
+        .str.replace(r'\.0$', '', regex=True)
+        .str.replace(r'^(\d{1,2}:\d{2}):00$', r'\1', regex=True)
+    )
+    if ancho:
+        texto = texto.str.zfill(ancho)
+    # Nulos (código -1) como texto vacío
+    return np.append(texto.to_numpy(dtype=object), '')[codigos]
+
+
+def cargar_target(ruta_target: str, directorio_cache: str = DIRECTORIO_CACHE) -> pd.DataFrame:
+    """
+    Carga la hoja CARTERA del target normalizada, usando el caché Parquet si existe.
+
+    Args:
+        ruta_target: Machote .xlsm/.xlsx (o un .parquet ya normalizado)
+        directorio_cache: Directorio del caché
+
+    Returns:
+        DataFrame normalizado (ver normalizar_cartera)
+    """
+    from historico_cartera import huella_archivo
+    from diferencias_cartera import cargar_snapshot
+
+    if Path(ruta_target).suffix.lower() == '.parquet':
+        return normalizar_cartera(pd.read_parquet(ruta_target))
+
+    ruta_cache = Path(directorio_cache) / f"{Path(ruta_target).stem}_{huella_archivo(ruta_target)[:16]}.parquet"
+    if ruta_cache.exists():
+        logger.info(f"Target desde caché: {ruta_cache}")
+        return pd.read_parquet(ruta_cache)
+
+    logger.info(f"Parseando target: {ruta_target}")
+    df_target = normalizar_cartera(cargar_snapshot(ruta_target))
+    ruta_cache.parent.mkdir(parents=True, exist_ok=True)
+    with escritura_atomica(ruta_cache) as temporal:
+        df_target.to_parquet(temporal, index=False)
+    logger.info(f"Target guardado en caché: {ruta_cache} ({len(df_target)} grupos)")
+    return df_target
+
+
+def _indexar(df: pd.DataFrame, nombre: str) -> pd.DataFrame:
+    """Indexa por id_de_grupo; si hay IDs repetidos se compara el primero."""
+    df = df.set_index('id_de_grupo')
+    duplicados = df.index.duplicated(keep='first')
+    if duplicados.any():
+        logger.warning(f"{nombre}: {duplicados.sum()} IDs repetidos; se compara la primera fila de cada uno")
+        df = df[~duplicados]
+    return df
+
+
+def _valor_json(valor):
+    """Convierte escalares NumPy/pandas a tipos serializables en JSON."""
+    if valor is None or (isinstance(valor, float) and np.isnan(valor)) or valor is pd.NaT:
+        return None
+    if isinstance(valor, (pd.Timestamp, np.datetime64)):
+        return pd.Timestamp(valor).date().isoformat()
+    if isinstance(valor, np.generic):
+        return valor.item()
+    return valor
+
+
+def comparar_con_target(
+    df_output: pd.DataFrame,
+    df_target: pd.DataFrame,
+    tolerancias: dict = None,
+    max_peores: int = MAX_PEORES
+) -> dict:
+    """
+    Compara el output contra el target, columna por columna, alineando por id_de_grupo.
+
+    Args:
+        df_output: CARTERA generada (se normaliza aquí)
+        df_target: Target normalizado (de cargar_target)
+        tolerancias: Tolerancias absolutas por columna numérica (sobrescriben TOLERANCIAS)
+        max_peores: Número de peores diferencias a reportar por columna
+
+    Returns:
+        Reporte (dict serializable a JSON) con 'resumen' y 'columnas'
+    """
+    tolerancias = {**TOLERANCIAS, **(tolerancias or {})}
+    output = _indexar(normalizar_cartera(df_output), 'output')
+    target = _indexar(df_target, 'target')
+
+    comunes = output.index.intersection(target.index)
+    pos_output = output.index.get_indexer(comunes)
+    pos_target = target.index.get_indexer(comunes)
+    ids = comunes.to_numpy()
+
+    columnas = {}
+    filas_con_diferencia = np.zeros(len(comunes), dtype=bool)
+
+    for col in COLUMNAS_CARTERA:
+        if col == 'id_de_grupo':
+            continue
+        a = output[col].to_numpy()[pos_output]
+        b = target[col].to_numpy()[pos_target]
+
+        if col in tolerancias:
+            ausente_a, ausente_b = np.isnan(a), np.isnan(b)
+            diferencia = a - b
+            distinto = (ausente_a != ausente_b) | (~ausente_a & ~ausente_b & (np.abs(diferencia) > tolerancias[col] + 1e-9))
+            magnitud = np.where(ausente_a | ausente_b, np.inf, np.abs(diferencia))
+            resumen_col = {
+                'tipo': 'numero',
+                'tolerancia': tolerancias[col],
+                'total_output': float(np.nansum(output[col].to_numpy())),
+                'total_target': float(np.nansum(target[col].to_numpy())),
+            }
+            resumen_col['diferencia_total'] = resumen_col['total_output'] - resumen_col['total_target']
+        else:
+            if col in COLUMNAS_FECHA:
+                ausente_a, ausente_b = pd.isna(a), pd.isna(b)
+                distinto = (ausente_a != ausente_b) | (~ausente_a & ~ausente_b & (a != b))
+            else:
+                distinto = a != b
+            magnitud = None
+            resumen_col = {'tipo': 'fecha' if col in COLUMNAS_FECHA else 'texto'}
+
+        posiciones = np.flatnonzero(distinto)
+        filas_con_diferencia |= distinto
+        if magnitud is not None and len(posiciones) > max_peores:
+            peores = posiciones[np.argpartition(-magnitud[posiciones], max_peores)[:max_peores]]
+            peores = peores[np.argsort(-magnitud[peores], kind='stable')]
+        elif magnitud is not None:
+            peores = posiciones[np.argsort(-magnitud[posiciones], kind='stable')]
+        else:
+            peores = posiciones[:max_peores]
+
+        resumen_col['diferencias'] = int(len(posiciones))
+        resumen_col['peores'] = [
+            {
+                'id_de_grupo': ids[pos],
+                'output': _valor_json(a[pos]),
+                'target': _valor_json(b[pos]),
+                **({'diferencia': _valor_json(a[pos] - b[pos])} if magnitud is not None else {}),
+            }
+            for pos in peores
+        ]
+        columnas[col] = resumen_col
+
+    solo_output = output.index.difference(target.index)
+    solo_target = target.index.difference(output.index)
+    reporte = {
+        'resumen': {
+            'grupos_output': int(len(output)),
+            'grupos_target': int(len(target)),
+            'ids_comunes': int(len(comunes)),
+            'ids_solo_output': solo_output[:max_peores * 10].tolist(),
+            'ids_solo_target': solo_target[:max_peores * 10].tolist(),
+            'total_ids_solo_output': int(len(solo_output)),
+            'total_ids_solo_target': int(len(solo_target)),
+            'grupos_con_diferencias': int(filas_con_diferencia.sum()),
+            'diferencias_totales': int(sum(c['diferencias'] for c in columnas.values())),
+            'columnas_con_diferencias': [col for col, c in columnas.items() if c['diferencias']],
+        },
+        'columnas': columnas,
+    }
+
+    logger.info(
+        f"Comparación con target: {reporte['resumen']['ids_comunes']} IDs comunes, "
+        f"{reporte['resumen']['diferencias_totales']} diferencias en "
+        f"{reporte['resumen']['grupos_con_diferencias']} grupos, "
+        f"{len(solo_output)} solo en output, {len(solo_target)} solo en target"
+    )
+    for col in reporte['resumen']['columnas_con_diferencias']:
+        logger.info(f"  {col}: {columnas[col]['diferencias']} diferencias")
+
+    return reporte
+
+
+def guardar_reporte(reporte: dict, ruta: str = RUTA_REPORTE) -> str:
+    """Guarda el reporte de diferencias en JSON."""
+    with escritura_atomica(ruta) as temporal, open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(reporte, f, ensure_ascii=False, indent=2)
+    logger.info(f"Reporte de diferencias guardado: {ruta}")
+    return ruta
+
+
+def main():
+    """CLI: compara un output contra el target y guarda el reporte JSON."""
+    from diferencias_cartera import cargar_snapshot
+
+    parser = argparse.ArgumentParser(description="Compara el output de CARTERA contra el target")
+    parser.add_argument('output', help="Output (.xlsx, .parquet o fecha AAAA-MM-DD del histórico)")
+    parser.add_argument('target', help="Target: machote .xlsm/.xlsx o .parquet")
+    parser.add_argument('--reporte', default=RUTA_REPORTE, help="Archivo JSON del reporte")
+    parser.add_argument('--cache', default=DIRECTORIO_CACHE, help="Directorio del caché del target")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    reporte = comparar_con_target(cargar_snapshot(args.output), cargar_target(args.target, args.cache))
+    guardar_reporte(reporte, args.reporte)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,720 @@
+"""
+Compilador de fórmulas del machote (hoja CARTERA) a expresiones vectorizadas.
+
+Soporta el subconjunto de Excel que usa el machote:
+    IF, IFERROR, VLOOKUP (coincidencia exacta), MAX, MIN, AND, OR, TODAY,
+    aritmética (+ - * / ^ %), concatenación (&), comparaciones y referencias
+    a columnas de la misma fila (A7, $AI7, [@Estatus], [@[ID GRUPO]]).
+
+Cada fórmula se traduce una sola vez a una función que opera sobre columnas
+completas (NumPy/pandas); nunca se evalúa fila por fila. Los errores de Excel
+(#N/A, #DIV/0!, #VALUE!) se propagan como una máscara booleana por fila, así que
+IFERROR se comporta igual que en Excel. Los VLOOKUP se convierten en joins contra
+un índice de la tabla de búsqueda construido una sola vez.
+
+Las fórmulas se guardan como configuración ({columna: fórmula}, JSON): agregar
+una columna del machote es agregar una entrada, sin escribir código. Si existe
+plantilla/formulas_cartera.json, calcular_cartera() agrega al final de CARTERA
+las columnas del archivo que el grafo no genera (ver aplicar_formulas).
+
+Uso:
+    python compilador_formulas.py MACHOTE.xlsm [--salida plantilla/formulas_cartera.json]
+"""
+
+import pandas as pd
+import numpy as np
+import argparse
+import json
+import logging
+import os
+import re
+from collections import namedtuple
+from openpyxl.utils import column_index_from_string, get_column_letter
+from cartera_generator import COLUMNAS_CARTERA
+
+logger = logging.getLogger(__name__)
+
+# Archivo de configuración de fórmulas por defecto
+RUTA_FORMULAS = 'plantilla/formulas_cartera.json'
+
+# Fila de la primera fila de datos de la hoja CARTERA del machote
+FILA_FORMULAS = 7
+
+# Columna (letra) -> nombre de columna de CARTERA, en el orden A-AJ
+LETRAS_CARTERA = {get_column_letter(i): col for i, col in enumerate(COLUMNAS_CARTERA, start=1)}
+
+# Fecha base de los números de serie de Excel
+EPOCA_EXCEL = np.datetime64('1899-12-30')
+
+# Valor de una expresión: datos (arreglo o escalar) y máscara de error de Excel
+Valor = namedtuple('Valor', ['datos', 'error'])
+
+# Fórmula compilada: texto original, columnas de las que depende y función evaluar(df, tablas)
+FormulaCompilada = namedtuple('FormulaCompilada', ['formula', 'dependencias', 'evaluar'])
+
+
+# ========== TOKENIZADOR ==========
+
+_PATRON_TOKENS = re.compile(r'''
+    (?P<espacio>\s+)
+  | (?P<texto>"(?:[^"]|"")*")
+  | (?P<rango>(?:'(?:[^']|'')+'|[A-Za-z_][\w\.]*)!\$?[A-Z]{1,3}\$?\d*(?::\$?[A-Z]{1,3}\$?\d*)?)
+  | (?P<estructurada>(?:[A-Za-z_][\w\.]*)?\[@(?:\[(?P<nombre_largo>[^\]]+)\]|(?P<nombre_corto>[^\[\]]+))\])
+  | (?P<numero>\d+\.?\d*(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?)
+  | (?P<funcion>(?:_xlfn\.)?[A-Za-z][A-Za-z0-9\.]*(?=\())
+  | (?P<logico>TRUE|FALSE)
+  | (?P<celda>\$?[A-Z]{1,3}\$?\d+)
+  | (?P<operador><>|<=|>=|[-+*/^&=<>(),;%])
+''', re.VERBOSE)
+
+
+def tokenizar(formula: str) -> list:
+    """
+    Divide una fórmula en tokens (tipo, texto).
+
+    Raises:
+        ValueError: Si hay caracteres fuera del subconjunto soportado
+    """
+    texto = formula[1:] if formula.startswith('=') else formula
+    tokens = []
+    posicion = 0
+    while posicion < len(texto):
+        coincidencia = _PATRON_TOKENS.match(texto, posicion)
+        if coincidencia is None:
+            raise ValueError(f"Carácter no soportado en la posición {posicion}: '{texto[posicion:]}' ({formula})")
+        tipo = coincidencia.lastgroup
+        if tipo in ('nombre_largo', 'nombre_corto'):
+            tipo = 'estructurada'
+        if tipo != 'espacio':
+            tokens.append((tipo, coincidencia.group(0)))
+        posicion = coincidencia.end()
+    return tokens
+
+
+# ========== PARSER ==========
+
+class _Parser:
+    """
+    Parser descendente recursivo con la precedencia de Excel:
+    comparación < & < + - < * / < ^ < signo < %
+    """
+
+    def __init__(self, tokens: list, formula: str):
+        self.tokens = tokens
+        self.formula = formula
+        self.posicion = 0
+
+    def _actual(self):
+        return self.tokens[self.posicion] if self.posicion < len(self.tokens) else (None, None)
+
+    def _es(self, *textos) -> bool:
+        tipo, texto = self._actual()
+        return tipo == 'operador' and texto in textos
+
+    def _consumir(self, texto: str = None):
+        tipo, valor = self._actual()
+        if tipo is None or (texto is not None and valor != texto):
+            raise ValueError(f"Se esperaba '{texto}' en la fórmula {self.formula}")
+        self.posicion += 1
+        return tipo, valor
+
+    def parsear(self):
+        arbol = self._comparacion()
+        if self.posicion != len(self.tokens):
+            raise ValueError(f"Token inesperado '{self._actual()[1]}' en la fórmula {self.formula}")
+        return arbol
+
+    def _binario(self, siguiente, operadores):
+        izquierda = siguiente()
+        while self._es(*operadores):
+            _, operador = self._consumir()
+            izquierda = ('op', operador, izquierda, siguiente())
+        return izquierda
+
+    def _comparacion(self):
+        return self._binario(self._concatenacion, ('=', '<>', '<', '>', '<=', '>='))
+
+    def _concatenacion(self):
+        return self._binario(self._suma, ('&',))
+
+    def _suma(self):
+        return self._binario(self._producto, ('+', '-'))
+
+    def _producto(self):
+        return self._binario(self._potencia, ('*', '/'))
+
+    def _potencia(self):
+        return self._binario(self._signo, ('^',))
+
+    def _signo(self):
+        if self._es('-'):
+            self._consumir()
+            return ('neg', self._signo())
+        if self._es('+'):
+            self._consumir()
+            return self._signo()
+        return self._porcentaje()
+
+    def _porcentaje(self):
+        nodo = self._primario()
+        while self._es('%'):
+            self._consumir()
+            nodo = ('op', '/', nodo, ('num', 100.0))
+        return nodo
+
+    def _primario(self):
+        tipo, texto = self._actual()
+        if tipo is None:
+            raise ValueError(f"Fórmula incompleta: {self.formula}")
+        self.posicion += 1
+
+        if tipo == 'numero':
+            return ('num', float(texto))
+        if tipo == 'texto':
+            return ('str', texto[1:-1].replace('""', '"'))
+        if tipo == 'logico':
+            return ('bool', texto == 'TRUE')
+        if tipo == 'celda':
+            return ('celda', texto)
+        if tipo == 'estructurada':
+            nombre = re.search(r'\[@(?:\[([^\]]+)\]|([^\[\]]+))\]', texto)
+            return ('encabezado', (nombre.group(1) or nombre.group(2)).strip())
+        if tipo == 'rango':
+            return ('rango', texto)
+        if tipo == 'funcion':
+            nombre = texto.upper().replace('_XLFN.', '')
+            self._consumir('(')
+            argumentos = []
+            if not self._es(')'):
+                argumentos.append(self._comparacion())
+                while self._es(',', ';'):
+                    self._consumir()
+                    argumentos.append(self._comparacion())
+            self._consumir(')')
+            return ('func', nombre, argumentos)
+        if tipo == 'operador' and texto == '(':
+            nodo = self._comparacion()
+            self._consumir(')')
+            return nodo
+        raise ValueError(f"Token inesperado '{texto}' en la fórmula {self.formula}")
+
+
+def parsear_formula(formula: str):
+    """Convierte el texto de una fórmula en su árbol sintáctico (tuplas)."""
+    return _Parser(tokenizar(formula), formula).parsear()
+
+
+# ========== EVALUACIÓN VECTORIZADA ==========
+
+def _sin_error(datos) -> Valor:
+    return Valor(datos, False)
+
+
+def _es_escalar(datos) -> bool:
+    return np.ndim(datos) == 0
+
+
+def _a_numero(valor: Valor) -> Valor:
+    """Convierte a número como Excel: vacío = 0, texto no numérico = #VALUE!."""
+    datos = valor.datos
+    if _es_escalar(datos):
+        if datos is None or (isinstance(datos, float) and np.isnan(datos)) or datos == '':
+            return Valor(0.0, valor.error)
+        if isinstance(datos, (bool, np.bool_)):
+            return Valor(float(datos), valor.error)
+        try:
+            return Valor(float(datos), valor.error)
+        except (TypeError, ValueError):
+            return Valor(np.nan, True)
+
+    datos = np.asarray(datos)
+    if np.issubdtype(datos.dtype, np.datetime64):
+        serie = (datos - EPOCA_EXCEL) / np.timedelta64(1, 'D')
+        return Valor(np.nan_to_num(serie.astype(float)), valor.error)
+    if datos.dtype.kind in 'biuf':
+        return Valor(np.nan_to_num(datos.astype(float)), valor.error)
+
+    serie = pd.Series(datos, dtype=object)
+    vacio = serie.isna().to_numpy() | (serie == '').to_numpy()
+    numeros = pd.to_numeric(serie, errors='coerce').to_numpy(dtype=float)
+    error_texto = np.isnan(numeros) & ~vacio
+    return Valor(np.where(vacio | error_texto, 0.0, numeros), valor.error | error_texto)
+
+
+def _a_texto(valor: Valor) -> Valor:
+    """Convierte a texto como Excel: vacío = '', 5.0 -> '5'."""
+    datos = valor.datos
+    if _es_escalar(datos):
+        if datos is None or (isinstance(datos, float) and np.isnan(datos)):
+            return Valor('', valor.error)
+        if isinstance(datos, float) and datos.is_integer():
+            return Valor(str(int(datos)), valor.error)
+        return Valor(str(datos), valor.error)
+    serie = pd.Series(datos)
+    texto = serie.astype(str).str.replace(r'\.0$', '', regex=True)
+    texto = texto.where(serie.notna(), '')
+    return Valor(texto.to_numpy(dtype=object), valor.error)
+
+
+def _es_numerico(datos) -> bool:
+    if _es_escalar(datos):
+        return isinstance(datos, (int, float, np.number, bool, np.bool_)) or datos is None
+    return np.asarray(datos).dtype.kind in 'biufM'
+
+
+def _comparar(operador: str, a: Valor, b: Valor) -> Valor:
+    """Comparación de Excel: numérica si ambos lados son números; si no, texto sin distinguir mayúsculas."""
+    if _es_numerico(a.datos) and _es_numerico(b.datos):
+        izquierda, derecha = _a_numero(a), _a_numero(b)
+        x, y = izquierda.datos, derecha.datos
+    else:
+        izquierda, derecha = _a_texto(a), _a_texto(b)
+        x = np.char.upper(np.asarray(izquierda.datos, dtype=str))
+        y = np.char.upper(np.asarray(derecha.datos, dtype=str))
+    resultado = {
+        '=': np.equal, '<>': np.not_equal, '<': np.less,
+        '>': np.greater, '<=': np.less_equal, '>=': np.greater_equal,
+    }[operador](x, y)
+    return Valor(resultado, izquierda.error | derecha.error)
+
+
+def _aritmetica(operador: str, a: Valor, b: Valor) -> Valor:
+    x, y = _a_numero(a), _a_numero(b)
+    error = x.error | y.error
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        if operador == '+':
+            resultado = x.datos + y.datos
+        elif operador == '-':
+            resultado = x.datos - y.datos
+        elif operador == '*':
+            resultado = x.datos * y.datos
+        elif operador == '/':
+            division_cero = np.asarray(y.datos) == 0
+            resultado = np.where(division_cero, np.nan, x.datos / np.where(division_cero, 1.0, y.datos))
+            error = error | division_cero
+        else:  # '^'
+            resultado = np.power(x.datos, y.datos)
+            error = error | ~np.isfinite(resultado)
+    return Valor(resultado, error)
+
+
+def _donde(condicion, si: Valor, no: Valor) -> Valor:
+    datos_si, datos_no = np.asarray(si.datos), np.asarray(no.datos)
+    # Junto a números, np.where convertiría TRUE/FALSE a 1/0; Excel conserva el lógico
+    if 'b' in (datos_si.dtype.kind, datos_no.dtype.kind) and datos_si.dtype.kind != datos_no.dtype.kind:
+        datos_si, datos_no = datos_si.astype(object), datos_no.astype(object)
+    return Valor(np.where(condicion, datos_si, datos_no), np.where(condicion, si.error, no.error))
+
+
+def _a_logico(valor: Valor) -> Valor:
+    if _es_numerico(valor.datos):
+        numero = _a_numero(valor)
+        return Valor(np.asarray(numero.datos) != 0, numero.error)
+    texto = _a_texto(valor)
+    mayusculas = np.char.upper(np.asarray(texto.datos, dtype=str))
+    return Valor(mayusculas == 'TRUE', texto.error | ~np.isin(mayusculas, ['TRUE', 'FALSE']))
+
+
+# ========== COMPILADOR ==========
+
+def _letra_de_celda(referencia: str) -> tuple:
+    """'$AI7' -> ('AI', 7)."""
+    coincidencia = re.fullmatch(r'\$?([A-Z]{1,3})\$?(\d+)', referencia)
+    return coincidencia.group(1), int(coincidencia.group(2))
+
+
+def _parsear_rango(texto: str) -> tuple:
+    """"'SITUACIÓN DE CARTERA'!$I$14:$Z$900" -> (hoja, col_inicio, col_fin, fila_inicio, fila_fin)."""
+    hoja, referencia = texto.rsplit('!', 1)
+    if hoja.startswith("'"):
+        hoja = hoja[1:-1].replace("''", "'")
+    partes = referencia.replace('$', '').split(':')
+    inicio = re.fullmatch(r'([A-Z]{1,3})(\d*)', partes[0])
+    fin = re.fullmatch(r'([A-Z]{1,3})(\d*)', partes[-1])
+    return (
+        hoja,
+        inicio.group(1),
+        fin.group(1),
+        int(inicio.group(2)) if inicio.group(2) else None,
+        int(fin.group(2)) if fin.group(2) else None,
+    )
+
+
+def _literal(nodo):
+    """Valor de un argumento literal (número o lógico); None si no es literal."""
+    if nodo[0] == 'num':
+        return nodo[1]
+    if nodo[0] == 'bool':
+        return float(nodo[1])
+    if nodo[0] == 'neg' and nodo[1][0] == 'num':
+        return -nodo[1][1]
+    return None
+
+
+def _clave_busqueda(datos) -> np.ndarray:
+    """Normaliza claves de VLOOKUP: texto sin distinguir mayúsculas, números como float."""
+    serie = pd.Series(datos)
+    if serie.dtype.kind in 'biuf':
+        return serie.astype(float).to_numpy()
+    serie = serie.astype(object)
+    return serie.str.upper().fillna(serie).to_numpy(dtype=object)
+
+
+class _Compilador:
+    """Traduce el árbol sintáctico a funciones (df, tablas, índices) -> Valor."""
+
+    def __init__(self, formula: str, fila: int, columnas: dict, encabezados: dict):
+        self.formula = formula
+        self.fila = fila
+        self.columnas = columnas
+        self.encabezados = encabezados
+        self.dependencias = set()
+
+    def compilar(self, nodo):
+        tipo = nodo[0]
+
+        if tipo in ('num', 'str', 'bool'):
+            valor = Valor(nodo[1], False)
+            return lambda df, tablas, indices: valor
+
+        if tipo in ('celda', 'encabezado'):
+            columna = self._columna(nodo)
+            self.dependencias.add(columna)
+            return lambda df, tablas, indices: _sin_error(df[columna].to_numpy())
+
+        if tipo == 'neg':
+            argumento = self.compilar(nodo[1])
+
+            def negar(df, tablas, indices):
+                numero = _a_numero(argumento(df, tablas, indices))
+                return Valor(-np.asarray(numero.datos), numero.error)
+            return negar
+
+        if tipo == 'op':
+            _, operador, a, b = nodo
+            izquierda, derecha = self.compilar(a), self.compilar(b)
+            if operador in ('=', '<>', '<', '>', '<=', '>='):
+                return lambda df, tablas, indices: _comparar(
+                    operador, izquierda(df, tablas, indices), derecha(df, tablas, indices))
+            if operador == '&':
+                def concatenar(df, tablas, indices):
+                    x = _a_texto(izquierda(df, tablas, indices))
+                    y = _a_texto(derecha(df, tablas, indices))
+                    return Valor(np.char.add(np.asarray(x.datos, dtype=str), np.asarray(y.datos, dtype=str)).astype(object),
+                                 x.error | y.error)
+                return concatenar
+            return lambda df, tablas, indices: _aritmetica(
+                operador, izquierda(df, tablas, indices), derecha(df, tablas, indices))
+
+        if tipo == 'func':
+            return self._funcion(nodo[1], nodo[2])
+
+        if tipo == 'rango':
+            raise ValueError(f"Rango fuera de VLOOKUP no soportado: {nodo[1]} ({self.formula})")
+
+        raise ValueError(f"Nodo no soportado {tipo} ({self.formula})")
+
+    def _columna(self, nodo) -> str:
+        if nodo[0] == 'encabezado':
+            if nodo[1] not in self.encabezados:
+                raise ValueError(f"Encabezado desconocido [@{nodo[1]}] ({self.formula})")
+            return self.encabezados[nodo[1]]
+        letra, fila = _letra_de_celda(nodo[1])
+        if fila != self.fila:
+            raise ValueError(f"Referencia a otra fila no soportada: {nodo[1]} ({self.formula})")
+        if letra not in self.columnas:
+            raise ValueError(f"Columna {letra} sin nombre en la configuración ({self.formula})")
+        return self.columnas[letra]
+
+    def _funcion(self, nombre: str, argumentos: list):
+        compilados = lambda: [self.compilar(arg) for arg in argumentos]
+
+        if nombre == 'IF':
+            if len(argumentos) not in (2, 3):
+                raise ValueError(f"IF requiere 2 o 3 argumentos ({self.formula})")
+            condicion, si, *resto = compilados()
+            no = resto[0] if resto else (lambda df, tablas, indices: Valor(False, False))
+
+            def si_excel(df, tablas, indices):
+                prueba = _a_logico(condicion(df, tablas, indices))
+                resultado = _donde(prueba.datos, si(df, tablas, indices), no(df, tablas, indices))
+                return Valor(resultado.datos, prueba.error | resultado.error)
+            return si_excel
+
+        if nombre == 'IFERROR':
+            if len(argumentos) != 2:
+                raise ValueError(f"IFERROR requiere 2 argumentos ({self.formula})")
+            valor, alterno = compilados()
+
+            def si_error(df, tablas, indices):
+                principal = valor(df, tablas, indices)
+                if not np.any(principal.error):
+                    return principal
+                return _donde(principal.error, alterno(df, tablas, indices), Valor(principal.datos, False))
+            return si_error
+
+        if nombre in ('MAX', 'MIN'):
+            if not argumentos:
+                raise ValueError(f"{nombre} requiere argumentos ({self.formula})")
+            partes = compilados()
+            reducir = np.fmax if nombre == 'MAX' else np.fmin
+
+            def extremo(df, tablas, indices):
+                valores = [_a_numero(parte(df, tablas, indices)) for parte in partes]
+                resultado = valores[0].datos
+                error = valores[0].error
+                for valor in valores[1:]:
+                    resultado = reducir(resultado, valor.datos)
+                    error = error | valor.error
+                return Valor(resultado, error)
+            return extremo
+
+        if nombre in ('AND', 'OR'):
+            partes = compilados()
+            reducir = np.logical_and if nombre == 'AND' else np.logical_or
+
+            def logico(df, tablas, indices):
+                valores = [_a_logico(parte(df, tablas, indices)) for parte in partes]
+                resultado = valores[0].datos
+                error = valores[0].error
+                for valor in valores[1:]:
+                    resultado = reducir(resultado, valor.datos)
+                    error = error | valor.error
+                return Valor(resultado, error)
+            return logico
+
+        if nombre == 'TODAY':
+            return lambda df, tablas, indices: Valor(
+                float((np.datetime64('today', 'D') - EPOCA_EXCEL) / np.timedelta64(1, 'D')), False)
+
+        if nombre == 'VLOOKUP':
+            return self._buscarv(argumentos)
+
+        raise ValueError(f"Función no soportada: {nombre} ({self.formula})")
+
+    def _buscarv(self, argumentos: list):
+        """VLOOKUP exacto -> join contra un índice de la tabla (construido una vez por tabla/columna)."""
+        if len(argumentos) not in (3, 4) or argumentos[1][0] != 'rango':
+            raise ValueError(f"VLOOKUP requiere (valor, Hoja!rango, columna[, 0]) ({self.formula})")
+        numero_columna = _literal(argumentos[2])
+        exacto = _literal(argumentos[3]) if len(argumentos) == 4 else 1.0
+        if numero_columna is None or numero_columna < 1:
+            raise ValueError(f"VLOOKUP con número de columna no literal ({self.formula})")
+        if exacto != 0:
+            raise ValueError(f"VLOOKUP solo se soporta con coincidencia exacta (4o argumento 0/FALSE) ({self.formula})")
+
+        clave = self.compilar(argumentos[0])
+        hoja, col_inicio, col_fin, fila_inicio, fila_fin = _parsear_rango(argumentos[1][1])
+        posicion_clave = column_index_from_string(col_inicio) - 1
+        posicion_resultado = posicion_clave + int(numero_columna) - 1
+        if posicion_resultado > column_index_from_string(col_fin) - 1:
+            raise ValueError(f"VLOOKUP: columna {int(numero_columna)} fuera del rango ({self.formula})")
+
+        def buscarv(df, tablas, indices):
+            if hoja not in tablas:
+                raise KeyError(f"Tabla de búsqueda '{hoja}' no proporcionada")
+            llave_indice = (hoja, posicion_clave, fila_inicio, fila_fin)
+            if llave_indice not in indices:
+                tabla = tablas[hoja]
+                inicio = fila_inicio - 1 if fila_inicio else 0
+                claves_tabla = _clave_busqueda(tabla.iloc[inicio:fila_fin, posicion_clave])
+                # Coincidencia exacta de Excel: la primera fila con la clave
+                unicas = ~pd.Index(claves_tabla).duplicated(keep='first')
+                indices[llave_indice] = (pd.Index(claves_tabla[unicas]), np.flatnonzero(unicas) + inicio)
+            indice, filas = indices[llave_indice]
+
+            valor = clave(df, tablas, indices)
+            claves = np.broadcast_to(np.asarray(valor.datos, dtype=object), (len(df),))
+            posiciones = indice.get_indexer(_clave_busqueda(claves))
+            encontrado = posiciones >= 0
+
+            columna = tablas[hoja].iloc[:, posicion_resultado].to_numpy()
+            resultado = np.full(len(df), np.nan if columna.dtype.kind in 'biuf' else None,
+                                dtype=float if columna.dtype.kind in 'biuf' else object)
+            resultado[encontrado] = columna[filas[posiciones[encontrado]]]
+            return Valor(resultado, valor.error | ~encontrado)
+        return buscarv
+
+
+def compilar_formula(
+    formula: str,
+    columnas: dict = None,
+    encabezados: dict = None,
+    fila: int = FILA_FORMULAS
+) -> FormulaCompilada:
+    """
+    Compila una fórmula de una fila de CARTERA a una función vectorizada.
+
+    Args:
+        formula: Texto de la fórmula (ej. '=IF(AI7="Desertor sin mora",0,V7-T7)')
+        columnas: {letra: nombre de columna} (por defecto A-AJ de COLUMNAS_CARTERA)
+        encabezados: {encabezado de la tabla: nombre de columna} para referencias [@...]
+        fila: Fila de la hoja en la que está la fórmula (las referencias deben ser a esa fila)
+
+    Returns:
+        FormulaCompilada con la fórmula, sus dependencias (columnas) y evaluar(df, tablas)
+        que retorna una Serie (NaN donde Excel mostraría un error)
+
+    Raises:
+        ValueError: Si la fórmula usa algo fuera del subconjunto soportado
+    """
+    compilador = _Compilador(formula, fila, columnas or LETRAS_CARTERA, encabezados or {})
+    funcion = compilador.compilar(parsear_formula(formula))
+
+    def evaluar(df: pd.DataFrame, tablas: dict = None, indices: dict = None) -> pd.Series:
+        valor = funcion(df, tablas or {}, {} if indices is None else indices)
+        datos = np.broadcast_to(np.asarray(valor.datos), (len(df),))
+        error = np.broadcast_to(np.asarray(valor.error, dtype=bool), (len(df),))
+        if error.any():
+            datos = np.where(error, np.nan, datos.astype(float) if datos.dtype.kind in 'biuf' else datos)
+        return pd.Series(datos, index=df.index)
+
+    return FormulaCompilada(formula, sorted(compilador.dependencias), evaluar)
+
+
+def _orden_dependencias(compiladas: dict, disponibles) -> list:
+    """Orden topológico de las columnas con fórmula según sus dependencias."""
+    orden = []
+    estado = {}
+
+    def visitar(columna, camino):
+        if estado.get(columna) == 'listo':
+            return
+        if estado.get(columna) == 'visitando':
+            raise ValueError(f"Referencia circular entre fórmulas: {' -> '.join(camino + [columna])}")
+        estado[columna] = 'visitando'
+        for dependencia in compiladas[columna].dependencias:
+            if dependencia in compiladas and dependencia != columna:
+                visitar(dependencia, camino + [columna])
+            elif dependencia not in disponibles:
+                raise ValueError(f"La fórmula de '{columna}' usa '{dependencia}', que no existe ni tiene fórmula")
+        estado[columna] = 'listo'
+        orden.append(columna)
+
+    for columna in compiladas:
+        visitar(columna, [])
+    return orden
+
+
+def evaluar_formulas(
+    df: pd.DataFrame,
+    formulas: dict,
+    tablas: dict = None,
+    columnas: dict = None,
+    encabezados: dict = None
+) -> pd.DataFrame:
+    """
+    Evalúa un conjunto de fórmulas de columna en orden de dependencias.
+
+    Args:
+        df: DataFrame con las columnas de entrada (no se modifica)
+        formulas: {columna destino: fórmula} (ver cargar_formulas)
+        tablas: {nombre de hoja: DataFrame leído con header=None} para los VLOOKUP
+        columnas: {letra: nombre de columna} (por defecto A-AJ de COLUMNAS_CARTERA)
+        encabezados: {encabezado de la tabla: nombre de columna} para referencias [@...]
+
+    Returns:
+        Nuevo DataFrame con las columnas de `df` más las columnas calculadas
+    """
+    compiladas = {
+        columna: compilar_formula(formula, columnas, encabezados)
+        for columna, formula in formulas.items()
+    }
+    resultado = df.copy(deep=False)
+    indices = {}  # Índices de las tablas de VLOOKUP, compartidos entre fórmulas
+    for columna in _orden_dependencias(compiladas, set(df.columns)):
+        resultado[columna] = compiladas[columna].evaluar(resultado, tablas, indices)
+    logger.info(f"Fórmulas evaluadas: {len(compiladas)} columnas, {len(indices)} índices de búsqueda")
+    return resultado
+
+
+def cargar_formulas(ruta: str = RUTA_FORMULAS) -> dict:
+    """Carga la configuración {columna: fórmula}."""
+    with open(ruta, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def aplicar_formulas(
+    df_cartera: pd.DataFrame,
+    producidas,
+    ruta: str = RUTA_FORMULAS,
+    tablas: dict = None
+) -> pd.DataFrame:
+    """
+    Agrega a CARTERA las columnas de la configuración que el grafo no genera.
+
+    Las columnas nuevas ocupan las letras siguientes a AJ en el orden del archivo
+    (la primera es AK), así que sus fórmulas pueden usar A7-AJ7 y también AK7...
+
+    Args:
+        df_cartera: DataFrame de CARTERA (no se modifica)
+        producidas: Columnas que ya genera el grafo (sus fórmulas se ignoran)
+        ruta: Archivo de configuración; si no existe, no se agrega nada
+        tablas: {nombre de hoja: DataFrame} para los VLOOKUP
+
+    Returns:
+        DataFrame de CARTERA con las columnas nuevas al final (el mismo si no hay)
+    """
+    if not os.path.exists(ruta):
+        return df_cartera
+    nuevas = {columna: formula for columna, formula in cargar_formulas(ruta).items() if columna not in producidas}
+    if not nuevas:
+        return df_cartera
+
+    columnas = dict(LETRAS_CARTERA)
+    for posicion, columna in enumerate(nuevas, start=len(LETRAS_CARTERA) + 1):
+        columnas[get_column_letter(posicion)] = columna
+    logger.info(f"Columnas de {ruta}: {list(nuevas)}")
+    return evaluar_formulas(df_cartera, nuevas, tablas, columnas)
+
+
+def extraer_formulas(ruta_machote: str, hoja: str = 'CARTERA', fila: int = FILA_FORMULAS,
+                     columnas: dict = None) -> dict:
+    """
+    Lee las fórmulas de la primera fila de datos de la hoja CARTERA del machote.
+
+    Returns:
+        {columna: fórmula} solo para las celdas que contienen fórmula
+    """
+    import openpyxl
+
+    columnas = columnas or LETRAS_CARTERA
+    wb = openpyxl.load_workbook(ruta_machote, read_only=True, data_only=False, keep_vba=False)
+    ws = wb[hoja]
+    formulas = {}
+    for celda in next(ws.iter_rows(min_row=fila, max_row=fila, max_col=len(columnas))):
+        valor = getattr(celda.value, 'text', celda.value)  # ArrayFormula -> texto
+        letra = get_column_letter(celda.column)
+        if isinstance(valor, str) and valor.startswith('=') and letra in columnas:
+            formulas[columnas[letra]] = valor
+    wb.close()
+    return formulas
+
+
+def main():
+    """CLI: extrae las fórmulas del machote, verifica que compilen y las guarda como configuración."""
+    parser = argparse.ArgumentParser(description="Compila las fórmulas de la hoja CARTERA del machote")
+    parser.add_argument('machote', help="Archivo machote (.xlsm)")
+    parser.add_argument('--salida', default=RUTA_FORMULAS, help="Archivo JSON de configuración")
+    parser.add_argument('--fila', type=int, default=FILA_FORMULAS, help="Fila de datos con las fórmulas")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    formulas = extraer_formulas(args.machote, fila=args.fila)
+    soportadas = {}
+    for columna, formula in formulas.items():
+        try:
+            compilada = compilar_formula(formula, fila=args.fila)
+            soportadas[columna] = formula
+            logger.info(f"{columna}: OK (depende de {compilada.dependencias})")
+        except ValueError as e:
+            logger.warning(f"{columna}: no soportada - {e}")
+
+    with open(args.salida, 'w', encoding='utf-8') as f:
+        json.dump(soportadas, f, ensure_ascii=False, indent=2)
+    logger.info(f"{len(soportadas)}/{len(formulas)} fórmulas guardadas en {args.salida}")
+
+
+if __name__ == '__main__':
+    main()
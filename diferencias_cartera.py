@@ -0,0 +1,253 @@
+"""
+Diferencias semana contra semana entre dos snapshots de CARTERA.
+
+Alinea ambos snapshots por id_de_grupo (join por índice), clasifica las
+transiciones (grupo nuevo, baja, entra/sale de MORA, cambio de estatus) y
+calcula los deltas de las columnas numéricas de forma vectorizada.
+
+Uso:
+    python diferencias_cartera.py ANTERIOR ACTUAL [--salida cambios]
+
+ANTERIOR y ACTUAL pueden ser un output .xlsx, un .parquet, o una fecha
+AAAA-MM-DD del histórico (historico_cartera).
+"""
+
+import pandas as pd
+import numpy as np
+import argparse
+import logging
+import re
+from pathlib import Path
+from cartera_generator import COLUMNAS_CARTERA, UMBRAL_PCT_MORA
+from lector_excel import leer_excel, nombres_hojas
+from escritura_atomica import escritura_atomica
+
+logger = logging.getLogger(__name__)
+
+# Columnas numéricas con delta en el conjunto de cambios
+COLUMNAS_DELTA = [
+    'cartera_vigente_sistema',
+    'cartera_vencida_total',
+    'saldo_en_riesgo',
+    'ahorro_consumido',
+    'cartera_vencida_estadistica',
+    'ahorro_acumulado',
+    'pct_mora',
+    'dias_de_mora',
+]
+
+# Transiciones en orden de prioridad (la primera que aplica es la principal)
+TRANSICIONES = [
+    'nuevo',
+    'baja',
+    'liquidado',
+    'entra_mora',
+    'sale_mora',
+    'cambio_estatus',
+    'cambio_monto',
+]
+
+
+def _alinear(serie: pd.Series, posiciones: np.ndarray, dtype=float) -> np.ndarray:
+    """
+    Toma los valores de `serie` en las posiciones dadas (de get_indexer).
+    Las posiciones -1 (grupo ausente en el snapshot) quedan como NaN/None.
+    """
+    if dtype is float:
+        valores = pd.to_numeric(serie, errors='coerce').to_numpy(dtype=float)
+        alineado = np.full(len(posiciones), np.nan)
+    else:
+        valores = serie.to_numpy(dtype=object)
+        alineado = np.full(len(posiciones), None, dtype=object)
+    presente = posiciones >= 0
+    alineado[presente] = valores[posiciones[presente]]
+    return alineado
+
+
+def comparar_snapshots(
+    df_anterior: pd.DataFrame,
+    df_actual: pd.DataFrame,
+    umbral_pct_mora: float = UMBRAL_PCT_MORA,
+    solo_cambios: bool = True
+) -> pd.DataFrame:
+    """
+    Compara dos snapshots de CARTERA alineados por id_de_grupo.
+
+    Args:
+        df_anterior: CARTERA de la semana anterior
+        df_actual: CARTERA de la semana actual
+        umbral_pct_mora: Umbral de %mora que define "en MORA" (igual que la hoja MORA)
+        solo_cambios: Si es True, solo retorna grupos con alguna transición o delta distinto de 0
+
+    Returns:
+        DataFrame indexado por id_de_grupo con la transición principal, banderas por
+        transición, estatus anterior/actual y deltas (actual - anterior) por columna
+    """
+    logger.info(f"Comparando snapshots: {len(df_anterior)} (anterior) vs {len(df_actual)} (actual)")
+
+    anterior = df_anterior.set_index('id_de_grupo')
+    actual = df_actual.set_index('id_de_grupo')
+    for nombre, df in (('anterior', anterior), ('actual', actual)):
+        if not df.index.is_unique:
+            duplicados = df.index[df.index.duplicated()].unique()
+            raise ValueError(f"id_de_grupo duplicado en snapshot {nombre}: {list(duplicados[:10])}")
+
+    # Join por índice: posiciones de cada grupo del índice común en cada snapshot
+    indice = anterior.index.union(actual.index)
+    pos_anterior = anterior.index.get_indexer(indice)
+    pos_actual = actual.index.get_indexer(indice)
+    en_anterior = pos_anterior >= 0
+    en_actual = pos_actual >= 0
+
+    estatus_anterior = _alinear(anterior['estatus'], pos_anterior, dtype=object)
+    estatus_actual = _alinear(actual['estatus'], pos_actual, dtype=object)
+
+    pct_anterior = _alinear(anterior['pct_mora'], pos_anterior)
+    pct_actual = _alinear(actual['pct_mora'], pos_actual)
+    mora_anterior = en_anterior & (pct_anterior > umbral_pct_mora)
+    mora_actual = en_actual & (pct_actual > umbral_pct_mora)
+
+    # Deltas: un grupo ausente en un snapshot cuenta como 0 en ese snapshot
+    deltas = {}
+    for col in COLUMNAS_DELTA:
+        valor_anterior = np.nan_to_num(_alinear(anterior[col], pos_anterior))
+        valor_actual = np.nan_to_num(_alinear(actual[col], pos_actual))
+        deltas[f"delta_{col}"] = valor_actual - valor_anterior
+
+    ambos = en_anterior & en_actual
+    cambio_estatus = ambos & (estatus_anterior != estatus_actual)
+    banderas = {
+        'nuevo': en_actual & ~en_anterior,
+        'baja': en_anterior & ~en_actual,
+        'liquidado': cambio_estatus & (estatus_actual == "Desertor sin mora"),
+        'entra_mora': ambos & ~mora_anterior & mora_actual,
+        'sale_mora': ambos & mora_anterior & ~mora_actual,
+        'cambio_estatus': cambio_estatus,
+        'cambio_monto': ambos & np.any(
+            np.column_stack([np.abs(delta) > 0.005 for delta in deltas.values()]), axis=1
+        ),
+    }
+
+    transicion = np.select(
+        [banderas[nombre] for nombre in TRANSICIONES],
+        TRANSICIONES,
+        default='sin_cambio'
+    )
+
+    # Datos de referencia: del snapshot actual, o del anterior si el grupo fue dado de baja
+    gerente = _alinear(actual['nombre_del_gerente'], pos_actual, dtype=object)
+    promotor = _alinear(actual['nombre_promotor'], pos_actual, dtype=object)
+    solo_anterior = ~en_actual
+    gerente[solo_anterior] = _alinear(anterior['nombre_del_gerente'], pos_anterior[solo_anterior], dtype=object)
+    promotor[solo_anterior] = _alinear(anterior['nombre_promotor'], pos_anterior[solo_anterior], dtype=object)
+
+    df_cambios = pd.DataFrame({
+        'transicion': pd.Categorical(transicion, categories=TRANSICIONES + ['sin_cambio']),
+        'nombre_del_gerente': gerente,
+        'nombre_promotor': promotor,
+        'estatus_anterior': estatus_anterior,
+        'estatus_actual': estatus_actual,
+        **{f"es_{nombre}": valores for nombre, valores in banderas.items()},
+        **deltas,
+    }, index=indice)
+    df_cambios.index.name = 'id_de_grupo'
+
+    conteos = {nombre: int(valores.sum()) for nombre, valores in banderas.items()}
+    logger.info(f"Transiciones: {conteos}")
+
+    if solo_cambios:
+        df_cambios = df_cambios[df_cambios['transicion'] != 'sin_cambio']
+
+    logger.info(f"Conjunto de cambios: {len(df_cambios)} grupos")
+    return df_cambios
+
+
+def cargar_snapshot(origen: str, directorio_historico: str = None) -> pd.DataFrame:
+    """
+    Carga un snapshot de CARTERA desde un .parquet, un output .xlsx o una fecha del histórico.
+
+    Args:
+        origen: Ruta a .parquet/.xlsx, o fecha 'AAAA-MM-DD' del histórico
+        directorio_historico: Directorio del histórico (por defecto el de historico_cartera)
+
+    Returns:
+        DataFrame con las columnas de CARTERA
+    """
+    ruta = Path(origen)
+
+    if not ruta.exists() and re.fullmatch(r'\d{4}-\d{2}-\d{2}', origen):
+        from historico_cartera import leer_historico, DIRECTORIO_HISTORICO
+        df = leer_historico(fechas=[origen], directorio=directorio_historico or DIRECTORIO_HISTORICO)
+        if df.empty:
+            raise FileNotFoundError(f"No hay snapshot en el histórico para la fecha {origen}")
+        return df.drop(columns=['fecha_reporte'])
+
+    if ruta.suffix.lower() == '.parquet':
+        return pd.read_parquet(ruta)
+
+    # Output .xlsx: hoja CARTERA (o CARTERA_1, CARTERA_2, ... si no cupo en una hoja)
+    # con headers en la fila 6 y fila de totales al final de cada hoja
+    hojas = nombres_hojas(ruta)
+    partes = sorted(
+        (int(coincidencia.group(1)), hoja) for hoja in hojas
+        if (coincidencia := re.fullmatch(r'cartera_(\d+)', hoja.lower()))
+    )
+    nombres = [hoja for _, hoja in partes] or [
+        next((hoja for hoja in hojas if hoja.lower() == 'cartera'), 0)
+    ]
+    df = pd.concat(
+        [leer_excel(ruta, sheet_name=nombre, header=5).iloc[:, :len(COLUMNAS_CARTERA)] for nombre in nombres],
+        ignore_index=True
+    )
+    df.columns = COLUMNAS_CARTERA
+    df = df[df['id_de_grupo'].notna() & (df['nombre_del_gerente'] != 'Total')]
+    df['id_de_grupo'] = df['id_de_grupo'].astype(str).str.replace(r'\.0$', '', regex=True).str.zfill(6)
+    # En el machote la fila de totales no dice 'Total' y su ID queda en 000000
+    df = df[df['id_de_grupo'] != '000000']
+    return df.reset_index(drop=True)
+
+
+def guardar_cambios(df_cambios: pd.DataFrame, ruta_base: str) -> tuple:
+    """
+    Guarda el conjunto de cambios como Parquet y como hoja CAMBIOS en .xlsx.
+
+    Args:
+        df_cambios: DataFrame generado por comparar_snapshots
+        ruta_base: Ruta sin extensión (se generan .parquet y .xlsx)
+
+    Returns:
+        Tupla (ruta_parquet, ruta_xlsx)
+    """
+    from formato_excel import guardar_hoja_cambios
+
+    ruta_parquet = f"{ruta_base}.parquet"
+    ruta_xlsx = f"{ruta_base}.xlsx"
+
+    with escritura_atomica(ruta_parquet) as temporal:
+        df_cambios.to_parquet(temporal)
+    guardar_hoja_cambios(df_cambios, ruta_xlsx)
+
+    logger.info(f"Cambios guardados: {ruta_parquet}, {ruta_xlsx}")
+    return ruta_parquet, ruta_xlsx
+
+
+def main():
+    """CLI: compara dos snapshots de CARTERA y guarda el conjunto de cambios."""
+    parser = argparse.ArgumentParser(description="Diferencias entre dos snapshots de CARTERA")
+    parser.add_argument('anterior', help="Snapshot anterior (.xlsx, .parquet o fecha AAAA-MM-DD del histórico)")
+    parser.add_argument('actual', help="Snapshot actual (.xlsx, .parquet o fecha AAAA-MM-DD del histórico)")
+    parser.add_argument('--salida', default='cambios_cartera', help="Ruta base de salida (sin extensión)")
+    parser.add_argument('--umbral-mora', type=float, default=UMBRAL_PCT_MORA, help="Umbral de %%mora (fracción)")
+    parser.add_argument('--historico', default=None, help="Directorio del histórico")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    df_anterior = cargar_snapshot(args.anterior, args.historico)
+    df_actual = cargar_snapshot(args.actual, args.historico)
+    df_cambios = comparar_snapshots(df_anterior, df_actual, umbral_pct_mora=args.umbral_mora)
+    guardar_cambios(df_cambios, args.salida)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,274 @@
+"""
+Escenarios what-if sobre los parámetros fijos de CARTERA y MORA.
+
+Parámetros evaluables (valor actual entre paréntesis):
+    pct_ahorro_consumido     - % del monto del crédito que se suma al ahorro en
+                               ahorro_consumido (PCT_AHORRO_CONSUMIDO = 10)
+    semanas_vigente_inicial  - multiplicador de pago_semanal en cartera_vigente_inicial
+                               (SEMANAS_VIGENTE_INICIAL = 16)
+    umbral_pct_mora          - %mora mínimo (exclusivo) para entrar a MORA (UMBRAL_PCT_MORA = 0.05)
+    semanas_mora_mensual     - multiplicador de pago_semanal en mora_potencial_mensual
+                               (SEMANAS_MORA_MENSUAL = 4)
+
+Ninguno de estos parámetros afecta la carga, los joins ni la limpieza de
+duplicados, así que se parte de una CARTERA ya calculada: preparar_base() extrae
+una sola vez los arreglos por grupo (en centavos) y evaluar_escenarios() evalúa
+toda la rejilla como matrices escenarios × grupos con broadcasting de NumPy,
+en bloques de escenarios para acotar la memoria.
+
+Con los parámetros actuales, los totales coinciden al centavo con las sumas de
+las columnas de CARTERA y de la hoja MORA.
+
+Uso:
+    python escenarios_cartera.py --pct-ahorro 5 10 15 --semanas-vigente 14 16 \\
+        --umbral-mora 0.05 0.10 [--checkpoints checkpoints] [--desde-union] [--salida escenarios.xlsx]
+"""
+
+import pandas as pd
+import numpy as np
+import argparse
+import itertools
+import logging
+from cartera_generator import (
+    calcular_cartera,
+    a_centavos,
+    _por_factor,
+    PCT_AHORRO_CONSUMIDO,
+    SEMANAS_VIGENTE_INICIAL,
+    UMBRAL_PCT_MORA,
+    SEMANAS_MORA_MENSUAL,
+)
+
+logger = logging.getLogger(__name__)
+
+# Parámetros de un escenario con su valor actual en calcular_cartera/generar_mora
+PARAMETROS_BASE = {
+    'pct_ahorro_consumido': PCT_AHORRO_CONSUMIDO,
+    'semanas_vigente_inicial': SEMANAS_VIGENTE_INICIAL,
+    'umbral_pct_mora': UMBRAL_PCT_MORA,
+    'semanas_mora_mensual': SEMANAS_MORA_MENSUAL,
+}
+
+# Métricas de monto por escenario (en pesos)
+METRICAS_MONTO = [
+    'cartera_vigente_inicial',
+    'cartera_vigente_calculada',
+    'diferencia_validacion_vigente',
+    'ahorro_consumido',
+    'cartera_vencida_estadistica',
+    'mora_potencial_mensual',
+    'cartera_vencida_total_mora',
+]
+
+# Métricas por escenario (totales y por gerente)
+METRICAS_ESCENARIO = ['grupos_en_mora'] + METRICAS_MONTO
+
+# Columnas de CARTERA que lee preparar_base (al partir del checkpoint 'union' solo se calculan estas)
+COLUMNAS_BASE_ESCENARIOS = [
+    'nombre_del_gerente',
+    'monto_del_credito',
+    'pago_semanal',
+    'semana',
+    'ahorro_acumulado',
+    'cartera_vigente_sistema',
+    'cartera_vencida_total',
+    'pct_mora',
+]
+
+# Máximo de celdas (escenarios × grupos) por bloque de evaluación
+MAX_CELDAS_BLOQUE = 4_000_000
+
+
+def rejilla_parametros(**valores) -> pd.DataFrame:
+    """
+    Producto cartesiano de valores por parámetro; los no indicados toman su valor base.
+
+    Ejemplo: rejilla_parametros(pct_ahorro_consumido=[5, 10], umbral_pct_mora=[0.05, 0.1])
+    da 4 escenarios con semanas_vigente_inicial=16 y semanas_mora_mensual=4.
+
+    Returns:
+        DataFrame con una fila por escenario y una columna por parámetro
+
+    Raises:
+        ValueError: Si se indica un parámetro desconocido
+    """
+    desconocidos = set(valores) - set(PARAMETROS_BASE)
+    if desconocidos:
+        raise ValueError(f"Parámetros desconocidos: {sorted(desconocidos)}. Opciones: {list(PARAMETROS_BASE)}")
+
+    listas = [
+        list(np.atleast_1d(valores[nombre])) if valores.get(nombre) is not None else [base]
+        for nombre, base in PARAMETROS_BASE.items()
+    ]
+    return pd.DataFrame(list(itertools.product(*listas)), columns=list(PARAMETROS_BASE))
+
+
+def preparar_base(df_cartera: pd.DataFrame) -> dict:
+    """
+    Arreglos por grupo que necesitan los escenarios, extraídos una sola vez de CARTERA.
+
+    Los montos quedan en centavos como float64 (enteros exactos; NaN = nulo), con
+    las mismas conversiones que calcular_cartera.
+
+    Args:
+        df_cartera: DataFrame de CARTERA generado (calcular_cartera/generar_cartera)
+
+    Returns:
+        Diccionario de arreglos (N,) más 'gerentes' (etiquetas) y 'codigo_gerente' (N,)
+    """
+    pago_c = a_centavos(df_cartera['pago_semanal'])
+    codigos, gerentes = pd.factorize(df_cartera['nombre_del_gerente'], sort=True, use_na_sentinel=False)
+    return {
+        'pago': pago_c.to_numpy(dtype='float64', na_value=np.nan),
+        'semana_x_pago': _por_factor(pago_c, df_cartera['semana']).to_numpy(dtype='float64', na_value=np.nan),
+        'monto': a_centavos(df_cartera['monto_del_credito']).to_numpy(dtype='float64', na_value=np.nan),
+        'ahorro': a_centavos(df_cartera['ahorro_acumulado']).to_numpy(dtype='float64', na_value=np.nan),
+        'vigente_sistema': a_centavos(df_cartera['cartera_vigente_sistema']).to_numpy(dtype='float64', na_value=np.nan),
+        'vencida_total': a_centavos(df_cartera['cartera_vencida_total']).to_numpy(dtype='float64', na_value=np.nan),
+        'pct_mora': df_cartera['pct_mora'].to_numpy(dtype='float64', na_value=np.nan),
+        'codigo_gerente': codigos,
+        'gerentes': np.asarray(gerentes, dtype=object),
+    }
+
+
+def _porcentaje_matriz(centavos: np.ndarray, pct: np.ndarray) -> np.ndarray:
+    """centavos × pct / 100 redondeando la mitad hacia afuera de cero (como _porcentaje)."""
+    producto = centavos * pct
+    return np.sign(producto) * np.floor((np.abs(producto) + 50) / 100)
+
+
+def _metricas_bloque(base: dict, parametros: pd.DataFrame) -> dict:
+    """Matrices (escenarios del bloque × grupos) de cada métrica, en centavos."""
+    columna = lambda nombre: parametros[nombre].to_numpy(dtype='float64')[:, None]
+    pago = base['pago'][None, :]
+    vigente_sistema = base['vigente_sistema'][None, :]
+    vencida_total = base['vencida_total'][None, :]
+
+    # P y Q: max(inicial - semana × pago, vigente sistema); nulo si no hay pago
+    vigente_inicial = pago * columna('semanas_vigente_inicial')
+    calc_temp = vigente_inicial - base['semana_x_pago'][None, :]
+    vigente_calculada = np.where(np.isnan(calc_temp) | (calc_temp >= vigente_sistema), calc_temp, vigente_sistema)
+
+    # T y U: min(ahorro + pct del monto, vencida total) si hay vencida
+    ahorro_mas_pct = base['ahorro'][None, :] + _porcentaje_matriz(base['monto'][None, :], columna('pct_ahorro_consumido'))
+    with np.errstate(invalid='ignore'):
+        ahorro_consumido = np.where(ahorro_mas_pct > vencida_total, vencida_total, ahorro_mas_pct)
+    ahorro_consumido = np.where(vencida_total > 0, ahorro_consumido, 0.0)
+
+    # MORA: %mora > umbral
+    en_mora = base['pct_mora'][None, :] > columna('umbral_pct_mora')
+
+    return {
+        'grupos_en_mora': en_mora.astype('float64'),
+        'cartera_vigente_inicial': vigente_inicial,
+        'cartera_vigente_calculada': vigente_calculada,
+        'diferencia_validacion_vigente': vigente_sistema - vigente_calculada,
+        'ahorro_consumido': ahorro_consumido,
+        'cartera_vencida_estadistica': vencida_total - ahorro_consumido,
+        'mora_potencial_mensual': np.where(en_mora, pago * columna('semanas_mora_mensual'), 0.0),
+        'cartera_vencida_total_mora': np.where(en_mora, vencida_total, 0.0),
+    }
+
+
+def evaluar_escenarios(base: dict, escenarios: pd.DataFrame) -> tuple:
+    """
+    Evalúa una rejilla de escenarios sobre la base preparada.
+
+    Args:
+        base: Resultado de preparar_base
+        escenarios: Una fila por escenario con las columnas de PARAMETROS_BASE
+            (las faltantes toman su valor base), ej. rejilla_parametros(...)
+
+    Returns:
+        Tupla (totales, por_gerente):
+            totales: una fila por escenario con los parámetros y METRICAS_ESCENARIO
+            por_gerente: una fila por escenario y gerente con las mismas métricas
+        Los montos están en pesos; los nulos no suman (como SUBTOTAL en Excel).
+    """
+    escenarios = escenarios.reset_index(drop=True)
+    parametros = pd.DataFrame({
+        nombre: escenarios[nombre] if nombre in escenarios else valor
+        for nombre, valor in PARAMETROS_BASE.items()
+    }, index=escenarios.index)
+
+    num_grupos = len(base['pago'])
+    num_gerentes = len(base['gerentes'])
+    # Grupos ordenados por gerente para sumar por tramos con reduceat
+    orden = np.argsort(base['codigo_gerente'], kind='stable')
+    inicios = np.searchsorted(base['codigo_gerente'][orden], np.arange(num_gerentes))
+    por_bloque = max(1, MAX_CELDAS_BLOQUE // max(num_grupos, 1))
+
+    totales = {metrica: [] for metrica in METRICAS_ESCENARIO}
+    por_gerente = {metrica: [] for metrica in METRICAS_ESCENARIO}
+    for inicio in range(0, len(parametros), por_bloque):
+        bloque = parametros.iloc[inicio:inicio + por_bloque]
+        for metrica, matriz in _metricas_bloque(base, bloque).items():
+            matriz = np.nan_to_num(matriz, nan=0.0)
+            totales[metrica].append(matriz.sum(axis=1))
+            if num_grupos:
+                por_gerente[metrica].append(np.add.reduceat(matriz[:, orden], inicios, axis=1))
+            else:
+                por_gerente[metrica].append(np.zeros((len(bloque), num_gerentes)))
+
+    df_totales = parametros.copy()
+    df_gerentes = pd.DataFrame({
+        'escenario': np.repeat(parametros.index.to_numpy(), num_gerentes),
+        'nombre_del_gerente': np.tile(base['gerentes'], len(parametros)),
+    })
+    for metrica in METRICAS_ESCENARIO:
+        # Sumas de centavos enteros en float64: exactas, se pasan a pesos una sola vez
+        divisor = 1 if metrica == 'grupos_en_mora' else 100
+        total = np.concatenate(totales[metrica]) / divisor
+        gerente = np.concatenate(por_gerente[metrica]).ravel() / divisor
+        if metrica == 'grupos_en_mora':
+            total, gerente = total.astype(np.int64), gerente.astype(np.int64)
+        df_totales[metrica] = total
+        df_gerentes[metrica] = gerente
+    df_totales.index.name = 'escenario'
+
+    logger.info(f"Escenarios evaluados: {len(parametros)} × {num_grupos} grupos ({num_gerentes} gerentes)")
+    return df_totales, df_gerentes
+
+
+def main():
+    """CLI: evalúa una rejilla de escenarios sobre la CARTERA del checkpoint 'calculo' (o 'union')."""
+    from checkpoints_cartera import cargar_checkpoint, DIRECTORIO_CHECKPOINTS
+
+    parser = argparse.ArgumentParser(description="Escenarios what-if de parámetros de CARTERA y MORA")
+    parser.add_argument('--pct-ahorro', type=float, nargs='+', help="pct_ahorro_consumido (ej. 5 10 15)")
+    parser.add_argument('--semanas-vigente', type=int, nargs='+', help="semanas_vigente_inicial")
+    parser.add_argument('--umbral-mora', type=float, nargs='+', help="umbral_pct_mora (fracción)")
+    parser.add_argument('--semanas-mora', type=int, nargs='+', help="semanas_mora_mensual")
+    parser.add_argument('--checkpoints', default=DIRECTORIO_CHECKPOINTS, help="Directorio de checkpoints de la corrida")
+    parser.add_argument('--desde-union', action='store_true',
+                        help="Partir del checkpoint 'union' calculando solo las columnas que usan los escenarios")
+    parser.add_argument('--salida', help="Excel con hojas 'totales' y 'por_gerente'")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.desde_union:
+        frames, _ = cargar_checkpoint(args.checkpoints, 'union')
+        df_cartera = calcular_cartera(frames['unido'], columnas=COLUMNAS_BASE_ESCENARIOS)
+    else:
+        frames, _ = cargar_checkpoint(args.checkpoints, 'calculo')
+        df_cartera = frames['cartera']
+    escenarios = rejilla_parametros(
+        pct_ahorro_consumido=args.pct_ahorro,
+        semanas_vigente_inicial=args.semanas_vigente,
+        umbral_pct_mora=args.umbral_mora,
+        semanas_mora_mensual=args.semanas_mora,
+    )
+    totales, por_gerente = evaluar_escenarios(preparar_base(df_cartera), escenarios)
+
+    with pd.option_context('display.max_columns', None, 'display.width', 200):
+        print(totales.to_string())
+    if args.salida:
+        with pd.ExcelWriter(args.salida, engine='openpyxl') as writer:
+            totales.to_excel(writer, sheet_name='totales')
+            por_gerente.to_excel(writer, sheet_name='por_gerente', index=False)
+        logger.info(f"Escenarios guardados: {args.salida}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""
+Escritura atómica de archivos de salida y bloqueo del directorio de salida.
+
+escritura_atomica(ruta) entrega una ruta temporal en el mismo directorio; el
+escritor (wb.save, to_parquet, json.dump...) escribe ahí y, al salir del bloque
+sin error, el archivo se sincroniza a disco (fsync) y se renombra sobre `ruta`
+con os.replace. Un lector ve el archivo anterior o el nuevo completo, nunca uno
+a medio escribir; si el escritor falla, el temporal se borra y `ruta` queda
+intacta.
+
+    with escritura_atomica('output_automatizado.xlsx') as temporal:
+        wb.save(temporal)
+
+La hoja CARTERA y las hojas que se agregan después (MORA, rangos, RESUMEN...)
+se escriben en pasos sucesivos sobre el mismo libro. Para que dos corridas que
+comparten directorio de salida (ej. una por gerente) no intercalen esos pasos,
+la automatización toma bloqueo_salida(directorio) durante la etapa de salida:
+un bloqueo advisory (flock / msvcrt) sobre el archivo .cartera.lock. El cálculo
+sigue corriendo en paralelo; solo la escritura se serializa. El archivo de
+bloqueo no se borra al liberar (borrarlo abriría una carrera entre procesos).
+"""
+
+import logging
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+# Archivo de bloqueo dentro del directorio de salida
+ARCHIVO_BLOQUEO = '.cartera.lock'
+
+# Segundos máximos de espera por el bloqueo (None = sin límite)
+ESPERA_BLOQUEO = 600
+
+# Intervalo entre intentos de tomar el bloqueo
+INTERVALO_BLOQUEO = 0.2
+
+# umask del proceso: mkstemp crea el temporal con permisos 0600 y el archivo final
+# debe quedar con los permisos normales (como si se hubiera creado con open)
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def _sincronizar_directorio(directorio: Path):
+    """fsync del directorio para que el renombre sobreviva a un corte (no aplica en Windows)."""
+    try:
+        fd = os.open(directorio, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def escritura_atomica(ruta):
+    """
+    Ruta temporal (mismo directorio y extensión) que reemplaza a `ruta` al terminar el bloque.
+
+    La extensión se conserva porque algunos escritores la usan (np.savez agrega .npz).
+    El temporal empieza con '.' para que no coincida con los patrones de lectura
+    (ej. cartera_*.parquet del histórico).
+    """
+    ruta = Path(ruta)
+    directorio = ruta.parent if str(ruta.parent) else Path('.')
+    fd, temporal = tempfile.mkstemp(dir=directorio, prefix=f".{ruta.stem}.", suffix=f".tmp{ruta.suffix}")
+    os.close(fd)
+    temporal = Path(temporal)
+    os.chmod(temporal, 0o666 & ~_UMASK)
+    try:
+        yield temporal
+        with open(temporal, 'rb') as f:
+            os.fsync(f.fileno())
+        os.replace(temporal, ruta)
+    except BaseException:
+        temporal.unlink(missing_ok=True)
+        raise
+    _sincronizar_directorio(directorio)
+
+
+def _intentar_bloqueo(fd) -> bool:
+    """Toma el bloqueo exclusivo sin esperar; False si lo tiene otro proceso."""
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _liberar_bloqueo(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def bloqueo_salida(directorio='.', espera: float = ESPERA_BLOQUEO, archivo: str = ARCHIVO_BLOQUEO):
+    """
+    Bloqueo exclusivo del directorio de salida mientras dura el bloque.
+
+    Args:
+        directorio: Directorio de salida compartido
+        espera: Segundos máximos de espera (None = esperar indefinidamente)
+        archivo: Archivo de bloqueo dentro del directorio (uno distinto por recurso,
+            ej. el registro de layouts, para no esperar a la escritura del output)
+
+    Raises:
+        TimeoutError: Si otro proceso conserva el bloqueo más de `espera` segundos
+    """
+    ruta = Path(directorio) / archivo
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(ruta, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        inicio = time.monotonic()
+        avisado = False
+        while not _intentar_bloqueo(fd):
+            if not avisado:
+                logger.info(f"Esperando el bloqueo de salida {ruta} (otra corrida está escribiendo)")
+                avisado = True
+            if espera is not None and time.monotonic() - inicio > espera:
+                raise TimeoutError(f"No se obtuvo el bloqueo de salida {ruta} en {espera} s")
+            time.sleep(INTERVALO_BLOQUEO)
+
+        # Quién tiene el bloqueo, para diagnóstico (el contenido no afecta al bloqueo)
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{os.getpid()} {datetime.now().isoformat(timespec='seconds')}\n".encode())
+        try:
+            yield ruta
+        finally:
+            _liberar_bloqueo(fd)
+    finally:
+        os.close(fd)
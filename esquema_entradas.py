@@ -0,0 +1,162 @@
+"""
+Esquema declarado de los 4 archivos de entrada y validación de encabezados (preflight).
+
+Cada reporte declara su hoja, sus filas de encabezado, las columnas requeridas por
+nombre y las columnas que se toman por posición (con la etiqueta esperada en esa
+posición cuando se conoce). La validación trabaja solo sobre la lista de nombres
+de columna normalizados, sin leer datos.
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Esquema por tipo de reporte.
+# 'posicionales': {columna destino: (índice, etiqueta normalizada esperada o None)}
+#   None = la etiqueta no se conoce; solo se valida que exista la posición.
+# 'solo_con_encabezado' (opcional): se descartan las columnas sin encabezado ('Unnamed: n')
+#   al leer, tanto en el preflight como en la carga.
+ESQUEMAS = {
+    'antiguedad': {
+        'hoja': None,  # Primera hoja (el nombre cambia con la fecha)
+        'encabezado': 0,
+        'requeridas': [
+            'cod_grupo_solidario',
+            'grupo_solidario',
+            'ciclo',
+            'coordinacion',
+            'nombre_de_gerente',
+            'nombre_promotor',
+            'cantidad_prestada',
+            'cantidad_entregada',
+            'tipo_de_grupo',
+            'inicio_ciclo',
+            'plazo_del_credito',
+            'dia_junta',
+            'hora_junta',
+            'periodicidad',
+            'parcialidad_+_parcialidad_comision',
+            'dias_de_mora',
+            'situacion_credito',
+            'numero_integrantes',
+        ],
+        'posicionales': {},
+    },
+    'situacion': {
+        'hoja': 'SITUACIÓN DE CARTERA',
+        'encabezado': [11, 12],
+        'requeridas': [],
+        'posicionales': {
+            'codigo': (8, 'nombre_codigo'),
+            'ciclo_sit': (10, 'nombre_ciclo'),
+            'cartera_vencida_importe': (24, None),
+            'cartera_vencida_pct': (25, None),
+            'cartera_vigente_importe': (26, None),
+            'cartera_vigente_parcialidad': (29, None),
+            'numero_de_integrantes_sit': (41, None),
+        },
+    },
+    'cobranza': {
+        'hoja': 'REPORTE DE COBRANZA',
+        'encabezado': 8,
+        'requeridas': [],
+        'posicionales': {
+            'gpo': (6, 'gpo'),
+            'proximo_pago_cob': (39, 'proximo_pago'),
+            'por_vencer': (40, 'por_vencer'),
+            'pagos': (41, 'pagos'),
+        },
+    },
+    # Libro de movimientos (el acumulado por grupo se calcula en ahorros_libro.py)
+    'ahorros': {
+        'hoja': 'AHORROS',
+        'encabezado': 0,
+        'requeridas': ['id', 'grupo', 'ciclo', 'sem', 'total_deposito', 'pago_conciliado'],
+        'posicionales': {},
+        'solo_con_encabezado': True,  # La columna de notas al final no tiene encabezado
+    },
+    # Hoja ACUMULADO (referencias al libro; solo para conciliar)
+    'ahorros_acumulado': {
+        'hoja': 'ACUMULADO',
+        'encabezado': 0,
+        'requeridas': ['id', 'ahorro_acumulado'],
+        'posicionales': {},
+    },
+}
+
+
+def posiciones_por_defecto(tipo: str) -> dict:
+    """Retorna {columna destino: índice} declarado en el esquema del reporte."""
+    return {destino: indice for destino, (indice, _) in ESQUEMAS[tipo]['posicionales'].items()}
+
+
+def validar_encabezados(tipo: str, columnas: list, auto_remapear: bool = True) -> dict:
+    """
+    Valida los nombres de columna normalizados de un reporte contra su esquema.
+
+    Si una etiqueta esperada no está en su posición pero aparece una sola vez en
+    otra, se remapea (si auto_remapear=True). Cuando todas las etiquetas conocidas
+    se desplazaron lo mismo (columna insertada/eliminada), ese desplazamiento se
+    aplica también a las posiciones sin etiqueta conocida.
+
+    Args:
+        tipo: Tipo de reporte ('antiguedad', 'situacion', 'cobranza', 'ahorros')
+        columnas: Nombres de columna normalizados (como los deja normalizar_columnas)
+        auto_remapear: Si es False, una etiqueta fuera de posición es un error
+
+    Returns:
+        Diccionario con 'posiciones' ({destino: índice}), 'remapeos'
+        ({destino: (índice declarado, índice nuevo)}) y 'errores' (lista de mensajes)
+    """
+    esquema = ESQUEMAS[tipo]
+    columnas = list(columnas)
+    errores = []
+    remapeos = {}
+    posiciones = {}
+
+    faltantes = [col for col in esquema['requeridas'] if col not in columnas]
+    if faltantes:
+        errores.append(f"{tipo}: columnas requeridas faltantes: {faltantes}")
+
+    # 1. Posiciones con etiqueta conocida (anclas)
+    desplazamientos = set()
+    for destino, (indice, etiqueta) in esquema['posicionales'].items():
+        if etiqueta is None:
+            continue
+        if indice < len(columnas) and columnas[indice] == etiqueta:
+            posiciones[destino] = indice
+            desplazamientos.add(0)
+            continue
+        encontradas = [i for i, col in enumerate(columnas) if col == etiqueta]
+        if len(encontradas) == 1 and auto_remapear:
+            posiciones[destino] = encontradas[0]
+            remapeos[destino] = (indice, encontradas[0])
+            desplazamientos.add(encontradas[0] - indice)
+        else:
+            actual = columnas[indice] if indice < len(columnas) else None
+            errores.append(
+                f"{tipo}: se esperaba '{etiqueta}' en la columna {indice + 1} (índice {indice}) "
+                f"para '{destino}', se encontró '{actual}'"
+                + (f" (aparece {len(encontradas)} veces)" if encontradas else "")
+            )
+
+    # 2. Posiciones sin etiqueta conocida: aplicar el desplazamiento común de las anclas
+    desplazamiento = desplazamientos.pop() if len(desplazamientos) == 1 else 0
+    for destino, (indice, etiqueta) in esquema['posicionales'].items():
+        if etiqueta is not None:
+            continue
+        nuevo = indice + desplazamiento
+        if nuevo >= len(columnas):
+            errores.append(
+                f"{tipo}: falta la columna {nuevo + 1} (índice {nuevo}) para '{destino}'; "
+                f"el reporte tiene {len(columnas)} columnas"
+            )
+            continue
+        posiciones[destino] = nuevo
+        if desplazamiento:
+            remapeos[destino] = (indice, nuevo)
+
+    for destino, (anterior, nuevo) in remapeos.items():
+        logger.warning(f"{tipo}: '{destino}' remapeada de índice {anterior} a {nuevo} ('{columnas[nuevo]}')")
+
+    return {'posiciones': posiciones, 'remapeos': remapeos, 'errores': errores}
@@ -1,252 +1,266 @@
 """
 Módulo para guardar DataFrames en Excel con formato visual del machote.
 Copia el formato exacto de la hoja CARTERA y convierte los datos en Tabla de Excel con totales automáticos.
+
+El libro de salida se arma en modo write_only: crear_libro_salida() lo abre, las
+funciones escribir_*/agregar_* le agregan hojas fila por fila (cada hoja va a un
+archivo temporal, no se guardan las celdas en memoria) y guardar_libro() lo
+escribe una sola vez al final. La memoria no crece con el número de filas.
+
+Si CARTERA no cabe en una hoja (MAX_FILAS_HOJA filas de datos entre los
+encabezados de las filas 1-6 y la fila de totales), se reparte en CARTERA_1,
+CARTERA_2, ... cada una con los encabezados de la plantilla, su propia tabla y
+su fila de totales, y se agrega la hoja TOTALES CARTERA con los totales por hoja
+y generales calculados sobre el DataFrame.
 """
 
 import openpyxl
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.utils import get_column_letter
 from openpyxl.worksheet.table import Table, TableStyleInfo, TableColumn
-from openpyxl.styles import Font, Fill, Border, Alignment, Protection, PatternFill
+from openpyxl.styles import Font, PatternFill
 from copy import copy
+import numpy as np
 import pandas as pd
 import logging
 import os
+import warnings
+from escritura_atomica import escritura_atomica
 
 logger = logging.getLogger(__name__)
 
+# Última fila de una hoja de Excel
+MAX_FILAS_EXCEL = 1_048_576
+
+# Filas 1-6: encabezados de la plantilla (nombres de columna en la 6); datos desde la 7
+FILA_ENCABEZADOS = 6
+FILA_INICIO_DATOS = 7
+
+# Filas de datos por hoja de CARTERA (la fila siguiente a los datos es la de totales)
+MAX_FILAS_HOJA = MAX_FILAS_EXCEL - FILA_INICIO_DATOS
+
+# Nombre de la hoja CARTERA si cabe en una hoja; si no, CARTERA_1, CARTERA_2, ...
+HOJA_CARTERA = 'cartera'
+PREFIJO_HOJAS_CARTERA = 'CARTERA_'
+HOJA_TOTALES_CARTERA = 'TOTALES CARTERA'
+
+# Filas que se convierten a la vez al pegar un DataFrame (acota la memoria de la conversión)
+FILAS_POR_BLOQUE = 10_000
+
+# Formato de dinero: $#,##0.00
+FORMATO_DINERO = '_($* #,##0.00_);_($* (#,##0.00);_($* "-"??_);_(@_)'
 
-def copiar_headers(ws_origen, ws_destino):
+# Mismo formato de dinero pero con signo menos en negativos (sin paréntesis)
+FORMATO_DINERO_SIN_PARENTESIS = '_($* #,##0.00_);_($* -#,##0.00_);_($* "-"??_);_(@_)'
+
+FORMATO_FECHA_CORTA = 'd/mm/yyyy'
+FORMATO_PORCENTAJE = '0.00%'
+
+# Formatos de número de las columnas de CARTERA (índice basado en 1)
+FORMATOS_CARTERA = {
+    5: '@',                             # E. Ciclo: texto para mantener ceros a la izquierda
+    6: FORMATO_DINERO,                  # F. Monto del crédito
+    8: FORMATO_FECHA_CORTA,             # H. Fecha inicio del crédito
+    13: FORMATO_DINERO,                 # M. Pago semanal
+    14: FORMATO_FECHA_CORTA,            # N. Próximo pago
+    **{col: FORMATO_DINERO for col in range(15, 23)},  # O-V. Columnas de cartera
+    18: FORMATO_DINERO_SIN_PARENTESIS,  # R. Diferencia validación vigente
+    23: FORMATO_PORCENTAJE,             # W. %mora
+    **{col: FORMATO_DINERO for col in range(24, 27)},  # X-Z. Saldo en riesgo, ahorro, monto promedio
+    33: FORMATO_DINERO,                 # AG. Ahorro acumulado
+    34: FORMATO_PORCENTAJE,             # AH. %ahorro
+}
+
+# Columnas de CARTERA con total (índices basados en 0)
+COLUMNAS_TOTALES_CARTERA = {
+    5: "sum",   # Monto del crédito
+    12: "sum",  # Pago semanal
+    14: "sum",  # Cartera vigente sistema
+    15: "sum",  # Cartera vigente inicial
+    16: "sum",  # Cartera vigente calculada
+    17: "sum",  # Cartera insoluta
+    18: "sum",  # Diferencia validación vigente
+    19: "sum",  # Ahorro consumido
+    20: "sum",  # Cartera vencida estadística
+    21: "sum",  # Cartera vencida total
+    23: "sum",  # Saldo en riesgo
+    24: "sum",  # Saldo ahorro acumulado
+    25: "sum",  # Monto promedio del grupo
+    32: "sum",  # Ahorro acumulado
+}
+
+
+def crear_libro_salida(ruta_plantilla: str) -> tuple:
     """
-    Copia las filas 1-6 (headers) del machote al destino con formato completo.
+    Abre un libro write_only para la salida y carga la plantilla de headers.
     
     Args:
-        ws_origen: Worksheet origen (machote CARTERA)
-        ws_destino: Worksheet destino (nuevo archivo)
+        ruta_plantilla: Ruta a la plantilla de headers (plantilla/CARTERA_HEADERS.xlsx)
+    
+    Returns:
+        Tupla (wb, ws_plantilla)
+    
+    Raises:
+        FileNotFoundError: Si no existe la plantilla
     """
-    logger.info("Copiando headers (filas 1-6) con formato...")
+    if not os.path.exists(ruta_plantilla):
+        raise FileNotFoundError(
+            f"Plantilla no encontrada: {ruta_plantilla}\n"
+            f"Ejecuta 'python crear_plantilla.py' para generarla."
+        )
     
-    for row_idx in range(1, 7):
-        for col_idx in range(1, ws_origen.max_column + 1):
-            celda_origen = ws_origen.cell(row_idx, col_idx)
-            celda_destino = ws_destino.cell(row_idx, col_idx)
-            
-            # Copiar valor
-            celda_destino.value = celda_origen.value
-            
-            # Copiar formato completo
-            if celda_origen.has_style:
-                celda_destino.font = copy(celda_origen.font)
-                celda_destino.border = copy(celda_origen.border)
-                celda_destino.fill = copy(celda_origen.fill)
-                celda_destino.number_format = copy(celda_origen.number_format)
-                celda_destino.protection = copy(celda_origen.protection)
-                celda_destino.alignment = copy(celda_origen.alignment)
-    
-    # Copiar anchos de columna
-    for col_idx in range(1, ws_origen.max_column + 1):
+    wb_plantilla = openpyxl.load_workbook(ruta_plantilla, data_only=True)
+    ws_plantilla = wb_plantilla.active
+    tamaño_kb = os.path.getsize(ruta_plantilla) / 1024
+    logger.info(f"Plantilla cargada: {ws_plantilla.max_row} filas x {ws_plantilla.max_column} columnas ({tamaño_kb:.1f} KB)")
+    
+    # Modo write_only: cada hoja se escribe fila por fila a un temporal
+    return Workbook(write_only=True), ws_plantilla
+
+
+def guardar_libro(wb, ruta_output: str) -> str:
+    """Guarda el libro de salida (una sola vez, con escritura atómica)."""
+    logger.info(f"Guardando archivo: {ruta_output} ({len(wb.sheetnames)} hojas)")
+    with escritura_atomica(ruta_output) as temporal:
+        wb.save(temporal)
+    return ruta_output
+
+
+def _celda(ws, valor=None, origen=None, number_format=None, fill=None, font=None, proteccion=True):
+    """Celda write_only con el estilo de la celda `origen` (de la plantilla) y los formatos indicados."""
+    celda = WriteOnlyCell(ws, value=valor)
+    if origen is not None and origen.has_style:
+        celda.font = copy(origen.font)
+        celda.border = copy(origen.border)
+        celda.fill = copy(origen.fill)
+        celda.number_format = copy(origen.number_format)
+        if proteccion:
+            celda.protection = copy(origen.protection)
+        celda.alignment = copy(origen.alignment)
+    if number_format is not None:
+        celda.number_format = number_format
+    if fill is not None:
+        celda.fill = fill
+    if font is not None:
+        celda.font = font
+    return celda
+
+
+def copiar_anchos(ws_origen, ws_destino, num_cols: int):
+    """
+    Copia los anchos de columna de la plantilla.
+    
+    En modo write_only los anchos y los paneles congelados se escriben al inicio de
+    la hoja: deben fijarse antes de la primera fila.
+    """
+    for col_idx in range(1, num_cols + 1):
         col_letter = get_column_letter(col_idx)
         if col_letter in ws_origen.column_dimensions:
             ws_destino.column_dimensions[col_letter].width = ws_origen.column_dimensions[col_letter].width
-    
-    # Copiar alturas de fila
-    for row_idx in range(1, 7):
-        if row_idx in ws_origen.row_dimensions:
-            ws_destino.row_dimensions[row_idx].height = ws_origen.row_dimensions[row_idx].height
-    
-    logger.info(f"Headers copiados: {ws_origen.max_column} columnas")
 
 
-def copiar_formato_fila(ws_origen, ws_destino, fila_origen, filas_destino):
+def copiar_headers(ws_origen, ws_destino, num_cols: int = None, encabezados: list = None,
+                   copiar_alturas: bool = True, proteccion: bool = True):
     """
-    Copia el formato de una fila del origen y lo replica a múltiples filas del destino.
+    Escribe las filas 1-6 (headers) de la plantilla al inicio de la hoja destino con formato completo.
     
     Args:
-        ws_origen: Worksheet origen
-        ws_destino: Worksheet destino
-        fila_origen: Número de fila origen (ej. 7)
-        filas_destino: Lista de números de fila destino (ej. [7, 8, 9, ...])
+        ws_origen: Worksheet de la plantilla
+        ws_destino: Worksheet destino (write_only, sin filas todavía)
+        num_cols: Columnas a copiar (por defecto, todas las de la plantilla)
+        encabezados: Valores que reemplazan a los de la fila 6 (opcional)
+        copiar_alturas: Copiar también las alturas de las filas 1-6
+        proteccion: Copiar también la protección (bloqueo) de las celdas
     """
-    logger.info(f"Copiando formato de fila {fila_origen} a {len(filas_destino)} filas...")
+    num_cols = num_cols or ws_origen.max_column
+    logger.info(f"Copiando headers (filas 1-{FILA_ENCABEZADOS}) con formato: {num_cols} columnas")
     
-    # Obtener número de columnas
-    num_cols = ws_origen.max_column
-    
-    for fila_destino in filas_destino:
+    for row_idx in range(1, FILA_ENCABEZADOS + 1):
+        if copiar_alturas and row_idx in ws_origen.row_dimensions:
+            ws_destino.row_dimensions[row_idx].height = ws_origen.row_dimensions[row_idx].height
+        fila = []
         for col_idx in range(1, num_cols + 1):
-            celda_origen = ws_origen.cell(fila_origen, col_idx)
-            celda_destino = ws_destino.cell(fila_destino, col_idx)
-            
-            # Copiar formato (NO valor)
-            if celda_origen.has_style:
-                celda_destino.font = copy(celda_origen.font)
-                celda_destino.border = copy(celda_origen.border)
-                celda_destino.fill = copy(celda_origen.fill)
-                celda_destino.number_format = copy(celda_origen.number_format)
-                celda_destino.protection = copy(celda_origen.protection)
-                celda_destino.alignment = copy(celda_origen.alignment)
-        
-        # Copiar altura de fila
-        if fila_origen in ws_origen.row_dimensions:
-            ws_destino.row_dimensions[fila_destino].height = ws_origen.row_dimensions[fila_origen].height
+            celda_origen = ws_origen.cell(row_idx, col_idx)
+            valor = celda_origen.value
+            if encabezados is not None and row_idx == FILA_ENCABEZADOS:
+                valor = encabezados[col_idx - 1]
+            fila.append(_celda(ws_destino, valor, origen=celda_origen, proteccion=proteccion))
+        ws_destino.append(fila)
 
 
-def pegar_dataframe(ws, df, fila_inicio=7):
+def nombres_columnas(ws_plantilla, num_cols: int, columnas: list = None) -> list:
     """
-    Pega los valores del DataFrame en el worksheet a partir de fila_inicio.
+    Nombres de columna de la tabla: fila 6 de la plantilla (ColumnaN si está vacía).
     
-    Args:
-        ws: Worksheet destino
-        df: DataFrame con los datos
-        fila_inicio: Fila donde empezar a pegar (default: 7)
-    
-    Returns:
-        int: Última fila con datos
+    Las columnas después de la última de la plantilla (ej. las de formulas_cartera.json)
+    toman su nombre de `columnas` (los nombres del DataFrame), si se pasa.
     """
-    logger.info(f"Pegando DataFrame ({df.shape[0]} filas x {df.shape[1]} columnas) desde fila {fila_inicio}...")
-    
-    # Pegar datos fila por fila
-    for idx, row in df.iterrows():
-        fila_actual = fila_inicio + idx
-        
-        for col_idx, valor in enumerate(row, start=1):
-            celda = ws.cell(fila_actual, col_idx)
-            
-            # Manejar valores NaN/None
-            if pd.isna(valor):
-                celda.value = None
-            else:
-                celda.value = valor
-    
-    ultima_fila = fila_inicio + len(df) - 1
-    logger.info(f"Datos pegados hasta fila {ultima_fila}")
-    
-    return ultima_fila
+    nombres = []
+    for col_idx in range(1, num_cols + 1):
+        if columnas is not None and col_idx > ws_plantilla.max_column:
+            nombres.append(str(columnas[col_idx - 1]))
+            continue
+        valor = ws_plantilla.cell(FILA_ENCABEZADOS, col_idx).value
+        nombres.append(str(valor) if valor else f"Columna{col_idx}")
+    return nombres
 
 
-def aplicar_formatos_columnas(ws, fila_inicio, fila_fin):
+def pegar_dataframe(ws, df, formatos: dict = None) -> int:
     """
-    Aplica formatos de número a las columnas según especificación.
-    
-    Args:
-        ws: Worksheet
-        fila_inicio: Primera fila de datos (ej. 7)
-        fila_fin: Última fila de datos
-    """
-    logger.info(f"Aplicando formatos de columnas desde fila {fila_inicio} hasta {fila_fin}...")
-    
-    # Formato de dinero: $#,##0.00
-    formato_dinero = '_($* #,##0.00_);_($* (#,##0.00);_($* "-"??_);_(@_)'
-    
-    # Formato de dinero sin paréntesis (para negativos usa signo menos)
-    # Usar el mismo formato que las otras columnas pero cambiar solo la sección de negativos
-    # Formato estándar: '_($* #,##0.00_);_($* (#,##0.00);_($* "-"??_);_(@_)'
-    # Cambiar la segunda sección de: (#,##0.00) a: -#,##0.00 (sin paréntesis, con signo menos)
-    formato_dinero_sin_parentesis = '_($* #,##0.00_);_($* -#,##0.00_);_($* "-"??_);_(@_)'
+    Agrega las filas del DataFrame al final de la hoja (write_only).
     
-    # Formato de fecha corta: d/mm/aaaa
-    formato_fecha_corta = 'd/mm/yyyy'
+    Se convierte un bloque de FILAS_POR_BLOQUE filas a la vez, no el frame completo.
     
-    # Formato de porcentaje: 0.00%
-    formato_porcentaje = '0.00%'
-    
-    # Formato de texto (para mantener ceros a la izquierda)
-    formato_texto = '@'
-    
-    # Aplicar formatos según columna (índice basado en 1)
-    for fila in range(fila_inicio, fila_fin + 1):
-        # E. Ciclo (columna 5): formato texto para mantener ceros a la izquierda
-        ws.cell(fila, 5).number_format = formato_texto
-        
-        # F. Monto del crédito (columna 6): dinero
-        ws.cell(fila, 6).number_format = formato_dinero
-        
-        # H. Fecha inicio del crédito (columna 8): fecha corta
-        ws.cell(fila, 8).number_format = formato_fecha_corta
-        
-        # K. Hora de reunión (columna 11): ya está formateada como texto en el DataFrame
-        
-        # M. Pago semanal (columna 13): dinero
-        ws.cell(fila, 13).number_format = formato_dinero
-        
-        # N. Próximo pago (columna 14): fecha corta
-        ws.cell(fila, 14).number_format = formato_fecha_corta
-        
-        # O-V. Columnas de cartera (15-22): dinero
-        for col in range(15, 23):
-            if col == 18:  # Columna 18: Diferencia validación vigente (sin paréntesis)
-                ws.cell(fila, col).number_format = formato_dinero_sin_parentesis
-            else:
-                ws.cell(fila, col).number_format = formato_dinero
-        
-        # W. %mora (columna 23): porcentaje
-        ws.cell(fila, 23).number_format = formato_porcentaje
-        
-        # X-Z. Saldo en riesgo, saldo ahorro acumulado, monto promedio (24-26): dinero
-        for col in range(24, 27):
-            ws.cell(fila, col).number_format = formato_dinero
-        
-        # AG. Ahorro acumulado (columna 33): dinero
-        ws.cell(fila, 33).number_format = formato_dinero
-        
-        # AH. %ahorro (columna 34): porcentaje
-        ws.cell(fila, 34).number_format = formato_porcentaje
+    Args:
+        ws: Worksheet destino
+        df: DataFrame con los datos
+        formatos: {columna (base 1): formato de número}
     
-    logger.info(f"Formatos aplicados a {fila_fin - fila_inicio + 1} filas")
+    Returns:
+        int: Filas agregadas
+    """
+    logger.info(f"Pegando DataFrame ({df.shape[0]} filas x {df.shape[1]} columnas)...")
+    formatos = formatos or {}
+    
+    for inicio in range(0, len(df), FILAS_POR_BLOQUE):
+        valores = df.iloc[inicio:inicio + FILAS_POR_BLOQUE].to_numpy(dtype=object)
+        # Manejar valores NaN/NaT/None
+        valores[pd.isna(valores)] = None
+        for fila in valores:
+            ws.append([
+                _celda(ws, valor, number_format=formatos[col_idx]) if col_idx in formatos else valor
+                for col_idx, valor in enumerate(fila, start=1)
+            ])
+    
+    return len(df)
 
 
-def crear_tabla_excel(ws, fila_inicio, fila_fin, num_cols, nombre_tabla="TablaCartera"):
+def crear_tabla_excel(ws, fila_inicio, fila_fin, nombres_columnas, nombre_tabla="TablaCartera"):
     """
     Convierte el rango de datos en una Tabla de Excel con totales automáticos.
     
+    Agrega la fila de totales al final de la hoja: debe llamarse justo después de
+    pegar la última fila de datos.
+    
     Args:
         ws: Worksheet
         fila_inicio: Primera fila de headers de tabla (ej. 6)
         fila_fin: Última fila con datos
-        num_cols: Número de columnas
-        nombre_tabla: Nombre de la tabla (default: "TablaCartera")
+        nombres_columnas: Encabezados de la tabla (de nombres_columnas)
+        nombre_tabla: Nombre de la tabla, único en el libro (default: "TablaCartera")
     """
     logger.info(f"Creando tabla Excel '{nombre_tabla}' desde fila {fila_inicio} hasta {fila_fin}...")
     
     # Agregar una fila extra para totales
     fila_totales = fila_fin + 1
+    num_cols = len(nombres_columnas)
     
     # Definir rango de la tabla (incluye fila de totales)
     col_inicio = "A"
     col_fin = get_column_letter(num_cols)
     rango_tabla = f"{col_inicio}{fila_inicio}:{col_fin}{fila_totales}"
-    
     logger.info(f"Rango de tabla: {rango_tabla}")
-    logger.info(f"Fila de totales: {fila_totales}")
-    
-    # Obtener nombres de columnas desde la fila de headers (fila 6)
-    nombres_columnas = []
-    for col_idx in range(1, num_cols + 1):
-        valor = ws.cell(fila_inicio, col_idx).value
-        if valor:
-            nombres_columnas.append(str(valor))
-        else:
-            nombres_columnas.append(f"Columna{col_idx}")
-    
-    logger.info(f"Nombres de columnas extraídos: {len(nombres_columnas)}")
-    
-    # Definir columnas con totales (índices basados en 0)
-    columnas_con_totales = {
-        5: "sum",   # Monto del crédito
-        12: "sum",  # Pago semanal
-        14: "sum",  # Cartera vigente sistema
-        15: "sum",  # Cartera vigente inicial
-        16: "sum",  # Cartera vigente calculada
-        17: "sum",  # Cartera insoluta
-        18: "sum",  # Diferencia validación vigente
-        19: "sum",  # Ahorro consumido
-        20: "sum",  # Cartera vencida estadística
-        21: "sum",  # Cartera vencida total
-        23: "sum",  # Saldo en riesgo
-        24: "sum",  # Saldo ahorro acumulado
-        25: "sum",  # Monto promedio del grupo
-        32: "sum",  # Ahorro acumulado
-    }
     
     # Crear columnas de tabla explícitamente
     table_columns = []
@@ -256,10 +270,9 @@ def crear_tabla_excel(ws, fila_inicio, fila_fin, num_cols, nombre_tabla="TablaCa
         if idx == 0:
             # Primera columna: label "Total"
             tc = TableColumn(id=col_id, name=nombre, totalsRowLabel="Total")
-        elif idx in columnas_con_totales:
+        elif idx in COLUMNAS_TOTALES_CARTERA:
             # Columnas con suma
-            tc = TableColumn(id=col_id, name=nombre, totalsRowFunction=columnas_con_totales[idx])
-            logger.info(f"  Columna {idx + 1} '{nombre}': SUM")
+            tc = TableColumn(id=col_id, name=nombre, totalsRowFunction=COLUMNAS_TOTALES_CARTERA[idx])
         else:
             # Columnas sin totales
             tc = TableColumn(id=col_id, name=nombre)
@@ -270,298 +283,361 @@ def crear_tabla_excel(ws, fila_inicio, fila_fin, num_cols, nombre_tabla="TablaCa
     tabla = Table(displayName=nombre_tabla, ref=rango_tabla, tableColumns=table_columns)
     
     # Aplicar estilo de tabla
-    estilo = TableStyleInfo(
+    tabla.tableStyleInfo = TableStyleInfo(
         name="TableStyleMedium2",
         showFirstColumn=False,
         showLastColumn=False,
         showRowStripes=True,
         showColumnStripes=False
     )
-    tabla.tableStyleInfo = estilo
     
     # Habilitar fila de totales
     tabla.totalsRowShown = True
-    
-    # Agregar tabla al worksheet
-    ws.add_table(tabla)
+    _agregar_tabla(ws, tabla)
     
     # Habilitar filtros automáticos en la fila de encabezados (fila 6)
     # Esto mostrará los iconos de filtro (triangulitos) en cada columna
-    col_fin_letter = get_column_letter(num_cols)
-    ws.auto_filter.ref = f"{col_inicio}{fila_inicio}:{col_fin_letter}{fila_inicio}"
-    logger.info(f"Filtros automáticos habilitados en rango: {ws.auto_filter.ref}")
-    
-    # Escribir fórmulas SUBTOTAL directamente en la fila de totales
-    logger.info(f"Escribiendo fórmulas en fila de totales...")
-    
-    # Primera columna: texto "Total"
-    ws.cell(fila_totales, 1).value = "Total"
+    ws.auto_filter.ref = f"{col_inicio}{fila_inicio}:{col_fin}{fila_inicio}"
     
-    # Para cada columna con totales, escribir fórmula SUBTOTAL
-    for col_idx, funcion in columnas_con_totales.items():
+    # Fila de totales: texto "Total" y una fórmula SUBTOTAL por columna con totales
+    totales = [None] * num_cols
+    totales[0] = "Total"
+    for col_idx in COLUMNAS_TOTALES_CARTERA:
+        if col_idx >= num_cols:
+            continue
         col_letter = get_column_letter(col_idx + 1)
         # SUBTOTAL(9, ...) es la función SUM (igual que en el archivo target)
         # Usar referencias absolutas para las filas como en el target: S$7:S$216
-        # Rango desde fila inicio datos hasta última fila de datos
-        formula = f"=SUBTOTAL(9,{col_letter}${fila_inicio + 1}:{col_letter}${fila_fin})"
-        ws.cell(fila_totales, col_idx + 1).value = formula
-        logger.info(f"  Fórmula en columna {col_idx + 1}: {formula}")
-    
-    logger.info(f"Tabla creada exitosamente con {fila_fin - fila_inicio} filas de datos + fila totales")
-    logger.info(f"Totales configurados en {len(columnas_con_totales)} columnas con fórmulas SUBTOTAL")
+        totales[col_idx] = f"=SUBTOTAL(9,{col_letter}${fila_inicio + 1}:{col_letter}${fila_fin})"
+    # La tabla puede sobrescribir formatos: la diferencia validación vigente (columna 18)
+    # lleva el formato sin paréntesis también en la fila de totales
+    if num_cols >= 18:
+        totales[17] = _celda(ws, totales[17], number_format=FORMATO_DINERO_SIN_PARENTESIS)
+    ws.append(totales)
+    
+    logger.info(f"Tabla creada con {fila_fin - fila_inicio} filas de datos + fila totales "
+                f"({len(COLUMNAS_TOTALES_CARTERA)} columnas con fórmulas SUBTOTAL)")
 
 
-def guardar_con_formato(df, ruta_plantilla, ruta_output):
-    """
-    Función principal: Guarda el DataFrame en Excel con formato de la plantilla.
-    
-    Args:
-        df: DataFrame con los datos de CARTERA
-        ruta_plantilla: Ruta a la plantilla de headers (plantilla/CARTERA_HEADERS.xlsx)
-        ruta_output: Ruta del archivo de salida (.xlsx)
-    
-    Returns:
-        str: Ruta del archivo generado
-    """
-    logger.info("=" * 80)
-    logger.info("GUARDANDO DATAFRAME CON FORMATO")
-    logger.info("=" * 80)
-    
-    # 1. Cargar plantilla ligera (solo headers, ~5KB)
-    logger.info(f"\n1. Cargando plantilla de headers: {ruta_plantilla}")
-    
-    if not os.path.exists(ruta_plantilla):
-        raise FileNotFoundError(
-            f"Plantilla no encontrada: {ruta_plantilla}\n"
-            f"Ejecuta 'python crear_plantilla.py' para generarla."
-        )
-    
-    wb_plantilla = openpyxl.load_workbook(ruta_plantilla, data_only=True)
-    ws_plantilla = wb_plantilla.active
-    
-    tamaño_kb = os.path.getsize(ruta_plantilla) / 1024
-    logger.info(f"Plantilla cargada: {ws_plantilla.max_row} filas x {ws_plantilla.max_column} columnas ({tamaño_kb:.1f} KB)")
-    
-    # 2. Crear nuevo workbook
-    logger.info("\n2. Creando nuevo workbook...")
-    wb_nuevo = Workbook()
-    wb_nuevo.remove(wb_nuevo.active)  # Eliminar hoja por defecto
-    ws_nuevo = wb_nuevo.create_sheet("cartera")
-    
-    # 3. Copiar headers (filas 1-6) desde la plantilla
-    logger.info("\n3. Copiando headers desde plantilla...")
-    copiar_headers(ws_plantilla, ws_nuevo)
-    
-    # 3.1. Ajustar anchos de columnas específicas
-    logger.info("\n3.1. Ajustando anchos de columnas específicas...")
-    # Q (17): Cartera vigente calculada
-    ws_nuevo.column_dimensions['Q'].width = 20.0
-    # R (18): Cartera insoluta
-    ws_nuevo.column_dimensions['R'].width = 20.0
-    # S (19): Diferencia validación vigente
-    ws_nuevo.column_dimensions['S'].width = 20.0
-    # T (20): Ahorro consumido
-    ws_nuevo.column_dimensions['T'].width = 20.0
-    logger.info("Anchos ajustados: Q=20, R=20, S=20, T=20")
-    
-    # 4. Pegar datos del DataFrame
-    logger.info("\n4. Pegando datos del DataFrame...")
-    fila_inicio_datos = 7
-    ultima_fila = pegar_dataframe(ws_nuevo, df, fila_inicio_datos)
-    
-    # 5. Aplicar formatos de columnas (dinero, fechas, porcentajes)
-    logger.info("\n5. Aplicando formatos de columnas...")
-    aplicar_formatos_columnas(ws_nuevo, fila_inicio_datos, ultima_fila)
-    
-    # 6. Crear tabla de Excel con totales
-    logger.info("\n6. Creando tabla de Excel con totales...")
+def _agregar_tabla(ws, tabla):
+    """Agrega la tabla a la hoja (las columnas ya van en tableColumns; se omite el aviso de write_only)."""
+    with warnings.catch_warnings():
+        warnings.filterwarnings('ignore', message='In write-only mode you must add table columns manually')
+        ws.add_table(tabla)
+
+
+def _crear_hoja_cartera(wb, ws_plantilla, titulo: str, nombres: list):
+    """Hoja de CARTERA con anchos, paneles congelados y headers de la plantilla (sin datos)."""
+    ws = wb.create_sheet(titulo)
+    copiar_anchos(ws_plantilla, ws, ws_plantilla.max_column)
+    # Q-T (17-20): Cartera vigente calculada, insoluta, diferencia validación vigente, ahorro consumido
+    for col_letter in 'QRST':
+        ws.column_dimensions[col_letter].width = 20.0
+    # Congela hasta la fila 6, fila 7 en adelante se desplaza
+    ws.freeze_panes = f"A{FILA_INICIO_DATOS}"
+    num_plantilla = ws_plantilla.max_column
+    if len(nombres) > num_plantilla:
+        # Columnas que no están en la plantilla: encabezado con su nombre en la fila 6
+        encabezados = [ws_plantilla.cell(FILA_ENCABEZADOS, col_idx).value for col_idx in range(1, num_plantilla + 1)]
+        copiar_headers(ws_plantilla, ws, len(nombres), encabezados=encabezados + nombres[num_plantilla:])
+    else:
+        copiar_headers(ws_plantilla, ws)
+    return ws
+
+
+def _cerrar_hoja_cartera(ws, filas: int, nombres: list, nombre_tabla: str):
+    """Agrega la tabla y la fila de totales de una hoja de CARTERA."""
     try:
-        crear_tabla_excel(
-            ws_nuevo,
-            fila_inicio=6,  # Headers de columna
-            fila_fin=ultima_fila,
-            num_cols=df.shape[1],
-            nombre_tabla="TablaCartera"
-        )
-        
-        # La fila de totales ya tiene formato por la tabla
-        logger.info(f"Fila de totales: Formato aplicado automáticamente por la tabla")
-        
-        # 6.0. Re-aplicar formato a la columna 18 después de crear la tabla (la tabla puede sobrescribir formatos)
-        # También aplicar a la fila de totales
-        logger.info("\n6.0. Re-aplicando formato sin paréntesis a columna 18...")
-        # Usar el mismo formato que las otras columnas pero sin paréntesis en negativos
-        formato_dinero_sin_parentesis = '_($* #,##0.00_);_($* -#,##0.00_);_($* "-"??_);_(@_)'
-        for fila in range(fila_inicio_datos, ultima_fila + 2):  # +2 para incluir fila de totales
-            celda = ws_nuevo.cell(fila, 18)
-            celda.number_format = formato_dinero_sin_parentesis
-        logger.info(f"Formato re-aplicado a columna 18 (Diferencia validación vigente) desde fila {fila_inicio_datos} hasta {ultima_fila + 1}")
-        
+        crear_tabla_excel(ws, FILA_ENCABEZADOS, FILA_ENCABEZADOS + filas, nombres, nombre_tabla)
     except Exception as e:
         logger.warning(f"No se pudo crear tabla Excel: {e}")
         logger.warning("Continuando sin tabla (datos y formato están completos)")
+
+
+def escribir_hojas_cartera(wb, ws_plantilla, df, filas_por_hoja: int = MAX_FILAS_HOJA) -> list:
+    """
+    Escribe CARTERA en el libro, repartida en varias hojas si no cabe en una.
     
-    # 6.1. Congelar paneles para mantener encabezados visibles (filas 1-6)
-    logger.info("\n6.1. Congelando paneles para mantener encabezados visibles...")
-    ws_nuevo.freeze_panes = 'A7'  # Congela hasta la fila 6, fila 7 en adelante se desplaza
-    logger.info("Paneles congelados: Filas 1-6 siempre visibles")
-    
-    # 7. Guardar archivo
-    logger.info(f"\n7. Guardando archivo: {ruta_output}")
-    wb_nuevo.save(ruta_output)
-    
-    logger.info("\n" + "=" * 80)
-    logger.info("ARCHIVO GUARDADO EXITOSAMENTE")
-    logger.info("=" * 80)
-    logger.info(f"\nArchivo: {ruta_output}")
-    logger.info(f"Filas de datos: {len(df)}")
-    logger.info(f"Columnas: {df.shape[1]}")
-    logger.info(f"Formato: Idéntico al machote")
-    logger.info(f"Tabla Excel: Con totales automáticos y filtros")
-    logger.info(f"Encabezados: Siempre visibles (paneles congelados)")
-    logger.info("=" * 80)
+    Con una sola hoja el resultado es la hoja 'cartera' con la tabla TablaCartera.
+    Si hay más filas que `filas_por_hoja`, las hojas se llaman CARTERA_1, CARTERA_2, ...
+    (tablas TablaCartera1, TablaCartera2, ...) y se agrega la hoja TOTALES CARTERA.
     
-    return ruta_output
+    Args:
+        wb: Libro de crear_libro_salida
+        ws_plantilla: Plantilla de headers
+        df: DataFrame de CARTERA, o iterable de DataFrames (particiones) que se pegan conforme llegan
+        filas_por_hoja: Máximo de filas de datos por hoja
+    
+    Returns:
+        Lista de (nombre de hoja, filas de datos)
+    """
+    partes = [df] if isinstance(df, pd.DataFrame) else df
+    num_columnas = ws_plantilla.max_column
+    posiciones_totales = list(COLUMNAS_TOTALES_CARTERA)
+    hojas = []  # [worksheet, filas, sumas de las columnas con total]
+    
+    def abrir_hoja():
+        if hojas:
+            # CARTERA no cabe en una hoja: se cierra la anterior con su número
+            if len(hojas) == 1:
+                hojas[0][0].title = f"{PREFIJO_HOJAS_CARTERA}1"
+            anterior = hojas[-1]
+            _cerrar_hoja_cartera(anterior[0], anterior[1], nombres, f"TablaCartera{len(hojas)}")
+            logger.info(f"Hoja '{anterior[0].title}' completa ({anterior[1]} filas)")
+        titulo = HOJA_CARTERA if not hojas else f"{PREFIJO_HOJAS_CARTERA}{len(hojas) + 1}"
+        hojas.append([_crear_hoja_cartera(wb, ws_plantilla, titulo, nombres), 0, np.zeros(len(posiciones_totales))])
+    
+    nombres = nombres_columnas(ws_plantilla, num_columnas)
+    for parte in partes:
+        if num_columnas != parte.shape[1]:
+            num_columnas = parte.shape[1]
+            nombres = nombres_columnas(ws_plantilla, num_columnas, list(parte.columns))
+        inicio = 0
+        while inicio < len(parte):
+            if not hojas or hojas[-1][1] == filas_por_hoja:
+                abrir_hoja()
+            hoja = hojas[-1]
+            bloque = parte.iloc[inicio:inicio + filas_por_hoja - hoja[1]]
+            pegar_dataframe(hoja[0], bloque, FORMATOS_CARTERA)
+            # Totales de la hoja calculados sobre el DataFrame (para TOTALES CARTERA)
+            montos = bloque.iloc[:, [pos for pos in posiciones_totales if pos < num_columnas]].to_numpy(dtype=float)
+            # inf (división entre cero) no es un número válido en Excel: no suma, igual que un nulo
+            hoja[2][:montos.shape[1]] += np.where(np.isfinite(montos), montos, 0).sum(axis=0)
+            hoja[1] += len(bloque)
+            inicio += len(bloque)
+    
+    if not hojas:
+        abrir_hoja()
+    ultima = hojas[-1]
+    _cerrar_hoja_cartera(ultima[0], ultima[1], nombres, "TablaCartera" if len(hojas) == 1 else f"TablaCartera{len(hojas)}")
+    
+    if len(hojas) > 1:
+        escribir_hoja_totales_cartera(wb, [(ws.title, filas, sumas) for ws, filas, sumas in hojas], nombres)
+    
+    logger.info(f"CARTERA escrita: {sum(filas for _, filas, _ in hojas)} filas en {len(hojas)} hoja(s)")
+    return [(ws.title, filas) for ws, filas, _ in hojas]
 
 
-def agregar_hoja_mora(ruta_output: str, df_mora: pd.DataFrame, ruta_plantilla: str):
+def escribir_hoja_totales_cartera(wb, hojas: list, nombres: list):
     """
-    Agrega la hoja MORA al archivo Excel existente con formato idéntico a CARTERA.
+    Hoja TOTALES CARTERA: grupos y montos de cada hoja de CARTERA y el total general.
     
     Args:
-        ruta_output: Ruta del archivo Excel a modificar
-        df_mora: DataFrame con datos de MORA
-        ruta_plantilla: Ruta de la plantilla con headers
+        wb: Libro de salida
+        hojas: Lista de (nombre de hoja, filas, sumas de COLUMNAS_TOTALES_CARTERA)
+        nombres: Nombres de columna de CARTERA
     """
-    logger.info("\n" + "=" * 80)
-    logger.info("AGREGANDO HOJA MORA")
-    logger.info("=" * 80)
-    
-    # 1. Abrir workbook existente
-    logger.info(f"\n1. Abriendo archivo: {ruta_output}")
-    wb = openpyxl.load_workbook(ruta_output)
+    ws = wb.create_sheet(HOJA_TOTALES_CARTERA)
+    columnas = [nombres[pos] for pos in COLUMNAS_TOTALES_CARTERA if pos < len(nombres)]
+    ws.column_dimensions['A'].width = 16.0
+    ws.column_dimensions['B'].width = 12.0
+    for col_idx in range(3, len(columnas) + 3):
+        ws.column_dimensions[get_column_letter(col_idx)].width = 22.0
+    ws.freeze_panes = 'A2'
+    
+    negrita = Font(bold=True)
+    ws.append([_celda(ws, valor, font=negrita) for valor in ['Hoja', 'Grupos'] + columnas])
+    
+    def fila(etiqueta, filas, sumas, font=None):
+        return [_celda(ws, etiqueta, font=font), _celda(ws, int(filas), font=font)] + [
+            _celda(ws, float(valor), number_format=FORMATO_DINERO, font=font) for valor in sumas[:len(columnas)]
+        ]
+    
+    for titulo, filas, sumas in hojas:
+        ws.append(fila(titulo, filas, sumas))
+    
+    # Totales generales: suma vectorizada de los totales por hoja
+    sumas = np.vstack([sumas for _, _, sumas in hojas]).sum(axis=0)
+    ws.append(fila('Total', sum(filas for _, filas, _ in hojas), sumas, font=negrita))
+    logger.info(f"Hoja {HOJA_TOTALES_CARTERA} agregada ({len(hojas)} hojas de CARTERA)")
+
+
+def guardar_con_formato(df, ruta_plantilla, ruta_output, filas_por_hoja: int = MAX_FILAS_HOJA):
+    """
+    Guarda CARTERA sola en un libro con el formato de la plantilla.
     
-    # 2. Crear nueva hoja "Mora"
-    logger.info("\n2. Creando hoja 'Mora'")
-    ws_mora = wb.create_sheet("Mora")
+    Args:
+        df: DataFrame con los datos de CARTERA, o iterable de DataFrames (particiones)
+            que se pegan conforme llegan
+        ruta_plantilla: Ruta a la plantilla de headers (plantilla/CARTERA_HEADERS.xlsx)
+        ruta_output: Ruta del archivo de salida (.xlsx)
+        filas_por_hoja: Máximo de filas de datos por hoja de CARTERA
     
-    # 3. Copiar headers de la plantilla (filas 1-6)
-    logger.info("\n3. Copiando formato de headers desde plantilla")
-    wb_plantilla = openpyxl.load_workbook(ruta_plantilla)
-    ws_plantilla = wb_plantilla.active
+    Returns:
+        str: Ruta del archivo generado
+    """
+    wb, ws_plantilla = crear_libro_salida(ruta_plantilla)
+    escribir_hojas_cartera(wb, ws_plantilla, df, filas_por_hoja)
+    return guardar_libro(wb, ruta_output)
+
+
+# Headers de la hoja MORA (fila 6)
+HEADERS_MORA = [
+    'Nombre del gerente',
+    'Nombre del promotor',
+    'ID GRUPO',
+    'Nombre de grupo',
+    'Ciclo',
+    'Monto del crédito',
+    'Semana',
+    'Pago semanal',
+    'Cartera vencida total',
+    '%mora',
+    'Saldo en riesgo',
+    'Días de mora',
+    'Mora potencial mensual',
+    'Cartera vencida total'
+]
+
+# Formatos de número de las columnas de MORA (índice basado en 1)
+FORMATOS_MORA = {
+    1: '@', 2: '@', 3: '@', 4: '@',     # Texto
+    5: '0',                             # Ciclo (número entero)
+    6: FORMATO_DINERO,                  # Monto del crédito
+    7: '0',                             # Semana (número entero)
+    8: FORMATO_DINERO,                  # Pago semanal
+    9: FORMATO_DINERO,                  # Cartera vencida total
+    10: FORMATO_PORCENTAJE,             # %mora
+    11: FORMATO_DINERO,                 # Saldo en riesgo
+    12: '0',                            # Días de mora (número entero)
+    13: FORMATO_DINERO,                 # Mora potencial mensual
+    14: FORMATO_DINERO,                 # Cartera vencida total calculada
+}
+
+# Columnas de MORA con fondo amarillo: %mora y días de mora
+COLUMNAS_AMARILLAS_MORA = {10, 12}
+RELLENO_AMARILLO = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
+
+
+def escribir_hoja_mora(wb, ws_plantilla, nombre_hoja, filas, num_filas, nombre_tabla="TablaMora"):
+    """
+    Escribe una hoja con el formato de MORA (headers de plantilla, datos, tabla con totales).
     
-    # Copiar solo primeras 14 columnas de las 6 filas
-    for row_idx in range(1, 7):
-        for col_idx in range(1, 15):  # Solo 14 columnas
-            celda_origen = ws_plantilla.cell(row_idx, col_idx)
-            celda_nueva = ws_mora.cell(row_idx, col_idx)
-            
-            celda_nueva.value = celda_origen.value
-            if celda_origen.has_style:
-                celda_nueva.font = copy(celda_origen.font)
-                celda_nueva.border = copy(celda_origen.border)
-                celda_nueva.fill = copy(celda_origen.fill)
-                celda_nueva.number_format = copy(celda_origen.number_format)
-                celda_nueva.alignment = copy(celda_origen.alignment)
-    
-    # Copiar dimensiones de columnas
-    for col_idx in range(1, 15):
-        col_letter = get_column_letter(col_idx)
-        if col_letter in ws_plantilla.column_dimensions:
-            ws_mora.column_dimensions[col_letter].width = ws_plantilla.column_dimensions[col_letter].width
+    Args:
+        wb: Libro de salida (write_only)
+        ws_plantilla: Worksheet de la plantilla con headers
+        nombre_hoja: Nombre de la hoja a crear
+        filas: Iterable de filas (secuencias de 14 valores)
+        num_filas: Número de filas en `filas`
+        nombre_tabla: Nombre de la tabla Excel (debe ser único en el workbook)
     
-    # 4. Sobrescribir headers con los nombres correctos (fila 6)
-    logger.info("\n4. Estableciendo headers de MORA")
-    headers_mora = [
-        'Nombre del gerente',
-        'Nombre del promotor',
-        'ID GRUPO',
-        'Nombre de grupo',
-        'Ciclo',
-        'Monto del crédito',
-        'Semana',
-        'Pago semanal',
-        'Cartera vencida total',
-        '%mora',
-        'Saldo en riesgo',
-        'Días de mora',
-        'Mora potencial mensual',
-        'Cartera vencida total'
-    ]
+    Returns:
+        Worksheet creado
+    """
+    ws_mora = wb.create_sheet(nombre_hoja)
+    num_cols = len(HEADERS_MORA)
+    
+    # Copiar solo primeras 14 columnas de las 6 filas, con los nombres de MORA en la fila 6
+    copiar_anchos(ws_plantilla, ws_mora, num_cols)
+    # Congelar paneles para mantener encabezados visibles (filas 1-6)
+    ws_mora.freeze_panes = f"A{FILA_INICIO_DATOS}"
+    copiar_headers(ws_plantilla, ws_mora, num_cols, encabezados=HEADERS_MORA, copiar_alturas=False, proteccion=False)
+    
+    # Pegar datos con el formato de cada columna
+    for row in filas:
+        ws_mora.append([
+            _celda(
+                ws_mora, valor,
+                number_format=FORMATOS_MORA.get(col_idx),
+                fill=RELLENO_AMARILLO if col_idx in COLUMNAS_AMARILLAS_MORA else None
+            )
+            for col_idx, valor in enumerate(row, start=1)
+        ])
     
-    for col_idx, header in enumerate(headers_mora, start=1):
-        ws_mora.cell(6, col_idx).value = header
-    
-    # 5. Pegar datos
-    logger.info(f"\n5. Pegando {len(df_mora)} filas de datos")
-    fila_inicio_datos = 7
-    
-    for row_idx, (_, row) in enumerate(df_mora.iterrows(), start=fila_inicio_datos):
-        for col_idx, valor in enumerate(row, start=1):
-            celda = ws_mora.cell(row_idx, col_idx)
-            celda.value = valor
-            
-            # Aplicar formatos según tipo de columna
-            if col_idx in [1, 2, 3, 4]:  # Texto
-                celda.number_format = '@'
-            elif col_idx == 5:  # Ciclo (número entero)
-                celda.number_format = '0'
-            elif col_idx in [6, 8, 9, 11, 13, 14]:  # Montos
-                celda.number_format = '_($* #,##0.00_);_($* (#,##0.00);_($* "-"??_);_(@_)'
-            elif col_idx == 7:  # Semana (número entero)
-                celda.number_format = '0'
-            elif col_idx == 10:  # %mora (porcentaje)
-                celda.number_format = '0.00%'
-                # Fondo amarillo
-                celda.fill = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-            elif col_idx == 12:  # Días de mora (número entero)
-                celda.number_format = '0'
-                # Fondo amarillo
-                celda.fill = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-    
-    # 6. Crear tabla Excel
-    logger.info("\n6. Creando tabla Excel con totales")
-    
-    if len(df_mora) > 0:
-        ultima_fila = fila_inicio_datos + len(df_mora) - 1
+    # Crear tabla Excel
+    if num_filas > 0:
+        ultima_fila = FILA_INICIO_DATOS + num_filas - 1
         
         try:
             crear_tabla_mora(
                 ws=ws_mora,
-                fila_inicio=6,
+                fila_inicio=FILA_ENCABEZADOS,
                 fila_fin=ultima_fila,
-                num_cols=14,
-                nombre_tabla="TablaMora"
+                num_cols=num_cols,
+                nombre_tabla=nombre_tabla
             )
         except Exception as e:
             logger.warning(f"No se pudo crear tabla Excel: {e}")
     
-    # 6.1. Congelar paneles para mantener encabezados visibles (filas 1-6)
-    logger.info("\n6.1. Congelando paneles para mantener encabezados visibles...")
-    ws_mora.freeze_panes = 'A7'  # Congela hasta la fila 6, fila 7 en adelante se desplaza
-    logger.info("Paneles congelados: Filas 1-6 siempre visibles")
+    return ws_mora
+
+
+def agregar_hoja_mora(wb, df_mora: pd.DataFrame, ws_plantilla):
+    """
+    Agrega la hoja MORA al libro de salida con formato idéntico a CARTERA.
     
-    # 7. Guardar
-    logger.info(f"\n7. Guardando archivo con hoja MORA")
-    wb.save(ruta_output)
+    Args:
+        wb: Libro de salida (de crear_libro_salida)
+        df_mora: DataFrame con datos de MORA
+        ws_plantilla: Plantilla de headers (de crear_libro_salida)
+    """
+    logger.info(f"Creando hoja 'Mora' con {len(df_mora)} filas de datos (filtro: %mora > 5%)")
+    escribir_hoja_mora(
+        wb,
+        ws_plantilla,
+        "Mora",
+        df_mora.itertuples(index=False, name=None),
+        len(df_mora),
+        nombre_tabla="TablaMora"
+    )
+    logger.info(f"Hoja MORA agregada: {len(df_mora)} registros, tabla con totales, paneles congelados")
+
+
+def agregar_hojas_rangos_mora(wb, df_mora_base: pd.DataFrame, indices: dict,
+                              df_resumen: pd.DataFrame, ws_plantilla):
+    """
+    Agrega una hoja por rango de días de mora y una hoja RESUMEN MORA con la matriz de conteos/montos.
     
-    logger.info("\n" + "=" * 80)
-    logger.info("HOJA MORA AGREGADA EXITOSAMENTE")
-    logger.info("=" * 80)
-    logger.info(f"\nRegistros en MORA: {len(df_mora)}")
-    logger.info(f"Filtro: %mora > 5%")
-    logger.info(f"Columnas amarillas: %mora, Días de mora")
-    logger.info(f"Tabla Excel: Con totales automáticos y filtros")
-    logger.info(f"Encabezados: Siempre visibles (paneles congelados)")
-    logger.info("=" * 80)
+    Args:
+        wb: Libro de salida (de crear_libro_salida)
+        df_mora_base: DataFrame MORA con todos los grupos con días de mora
+        indices: Diccionario {rango: posiciones en df_mora_base} (de generar_mora_por_rangos)
+        df_resumen: Matriz resumen (de resumen_rangos_mora)
+        ws_plantilla: Plantilla de headers (de crear_libro_salida)
+    """
+    logger.info("Agregando hojas por rango de mora")
+    
+    # Convertir una sola vez a arreglo; cada rango toma sus filas por posición
+    valores = df_mora_base.to_numpy(dtype=object)
+    
+    for num_rango, (rango, posiciones) in enumerate(indices.items(), start=1):
+        escribir_hoja_mora(
+            wb,
+            ws_plantilla,
+            f"Mora {rango}",
+            (valores[pos] for pos in posiciones),
+            len(posiciones),
+            nombre_tabla=f"TablaMoraRango{num_rango}"
+        )
+        logger.info(f"Hoja 'Mora {rango}': {len(posiciones)} registros")
+    
+    # Hoja RESUMEN MORA: rango de días x (medida, banda de %mora)
+    ws_resumen = wb.create_sheet("RESUMEN MORA")
+    ws_resumen.column_dimensions['A'].width = 20.0
+    for col_idx in range(2, len(df_resumen.columns) + 2):
+        ws_resumen.column_dimensions[get_column_letter(col_idx)].width = 22.0
+    ws_resumen.freeze_panes = 'B2'
+    
+    negrita = Font(bold=True)
+    encabezados = ['Rango días de mora'] + [f"{medida} {banda}" for medida, banda in df_resumen.columns]
+    ws_resumen.append([_celda(ws_resumen, valor, font=negrita) for valor in encabezados])
+    es_monto = [medida != 'grupos' for medida, _ in df_resumen.columns]
+    for rango, fila in zip(df_resumen.index, df_resumen.itertuples(index=False, name=None)):
+        ws_resumen.append([rango] + [
+            _celda(ws_resumen, valor, number_format=FORMATO_DINERO) if monto else valor
+            for valor, monto in zip((v.item() if hasattr(v, 'item') else v for v in fila), es_monto)
+        ])
+    
+    logger.info(f"Hojas por rango agregadas: {len(indices)} + RESUMEN MORA")
 
 
 def crear_tabla_mora(ws, fila_inicio, fila_fin, num_cols, nombre_tabla="TablaMora"):
     """
     Crea una tabla Excel en la hoja Mora con totales automáticos.
-    """
-    from openpyxl.worksheet.table import Table, TableStyleInfo, TableColumn
     
+    Agrega la fila de totales al final de la hoja: debe llamarse justo después de
+    pegar la última fila de datos.
+    """
     # Definir rango de la tabla
     col_inicio = get_column_letter(1)
     col_fin = get_column_letter(num_cols)
@@ -569,24 +645,6 @@ def crear_tabla_mora(ws, fila_inicio, fila_fin, num_cols, nombre_tabla="TablaMor
     
     logger.info(f"   Creando tabla: {rango_tabla}")
     
-    # Nombres de columnas
-    nombres_columnas = [
-        'Nombre del gerente',
-        'Nombre del promotor',
-        'ID GRUPO',
-        'Nombre de grupo',
-        'Ciclo',
-        'Monto del crédito',
-        'Semana',
-        'Pago semanal',
-        'Cartera vencida total',
-        '%mora',
-        'Saldo en riesgo',
-        'Días de mora',
-        'Mora potencial mensual',
-        'Cartera vencida total'
-    ]
-    
     # Columnas con totales (índices basados en 0)
     columnas_con_totales = {
         5: "sum",   # Monto del crédito (columna F)
@@ -599,7 +657,7 @@ def crear_tabla_mora(ws, fila_inicio, fila_fin, num_cols, nombre_tabla="TablaMor
     
     # Crear columnas de tabla
     table_columns = []
-    for idx, nombre in enumerate(nombres_columnas):
+    for idx, nombre in enumerate(HEADERS_MORA[:num_cols]):
         col_id = idx + 1
         if idx == 0:
             tc = TableColumn(id=col_id, name=nombre, totalsRowLabel="Total")
@@ -620,24 +678,118 @@ def crear_tabla_mora(ws, fila_inicio, fila_fin, num_cols, nombre_tabla="TablaMor
     )
     tabla.totalsRowShown = True
     
-    ws.add_table(tabla)
+    _agregar_tabla(ws, tabla)
     
     # Habilitar filtros automáticos en la fila de encabezados (fila 6)
     # Esto mostrará los iconos de filtro (triangulitos) en cada columna
-    col_inicio = get_column_letter(1)
-    col_fin = get_column_letter(num_cols)
     ws.auto_filter.ref = f"{col_inicio}{fila_inicio}:{col_fin}{fila_inicio}"
     logger.info(f"   Tabla '{nombre_tabla}' creada con totales automáticos")
-    logger.info(f"   Filtros automáticos habilitados en rango: {ws.auto_filter.ref}")
     
     # Escribir fórmulas SUBTOTAL en la fila de totales
-    fila_totales = fila_fin + 1
-    ws.cell(fila_totales, 1).value = "Total"
-    
-    for col_idx, funcion in columnas_con_totales.items():
+    totales = [None] * num_cols
+    totales[0] = "Total"
+    for col_idx in columnas_con_totales:
         col_letter = get_column_letter(col_idx + 1)
-        formula = f"=SUBTOTAL(109,{col_letter}{fila_inicio + 1}:{col_letter}{fila_fin})"
-        ws.cell(fila_totales, col_idx + 1).value = formula
+        totales[col_idx] = f"=SUBTOTAL(109,{col_letter}{fila_inicio + 1}:{col_letter}{fila_fin})"
+    ws.append(totales)
     
     logger.info(f"   Fórmulas SUBTOTAL escritas en {len(columnas_con_totales)} columnas")
 
+
+def agregar_hoja_resumen(wb, df_resumen: pd.DataFrame):
+    """
+    Agrega la hoja RESUMEN (gerente → promotor) al libro de salida.
+    
+    Args:
+        wb: Libro de salida (de crear_libro_salida)
+        df_resumen: DataFrame generado por resumen_cartera.generar_resumen
+    """
+    ws = wb.create_sheet("RESUMEN")
+    
+    headers_resumen = [
+        'Nivel',
+        'Nombre del gerente',
+        'Nombre del promotor',
+        'Grupos',
+        'Grupos en mora',
+        'Cartera vigente sistema',
+        'Cartera vencida Total',
+        'Saldo en riesgo',
+        'Ahorro Consumido',
+        'Cartera Vencida Estadistica',
+        '%mora ponderado',
+    ]
+    anchos = [10, 30, 30, 10, 14, 22, 22, 22, 22, 22, 16]
+    for col_idx, ancho in enumerate(anchos, start=1):
+        ws.column_dimensions[get_column_letter(col_idx)].width = ancho
+    ws.freeze_panes = 'A2'
+    ws.auto_filter.ref = f"A1:{get_column_letter(len(headers_resumen))}1"
+    
+    fuente_subtotal = Font(bold=True)
+    ws.append([_celda(ws, valor, font=fuente_subtotal) for valor in headers_resumen])
+    
+    # Columnas F-J: montos, K: porcentaje
+    formatos = {col_idx: FORMATO_DINERO for col_idx in range(6, 11)}
+    formatos[11] = FORMATO_PORCENTAJE
+    
+    for fila in df_resumen.itertuples(index=False, name=None):
+        # Subtotales de gerente y total general en negritas
+        font = fuente_subtotal if fila[0] != 'Promotor' else None
+        valores = [None if pd.isna(valor) else (valor.item() if hasattr(valor, 'item') else valor) for valor in fila]
+        ws.append([
+            _celda(ws, valor, number_format=formatos.get(col_idx), font=font)
+            if font is not None or col_idx in formatos else valor
+            for col_idx, valor in enumerate(valores, start=1)
+        ])
+    
+    logger.info(f"Hoja RESUMEN agregada con {len(df_resumen)} filas")
+
+
+def agregar_hoja_calidad(wb, df_calidad: pd.DataFrame):
+    """
+    Agrega la hoja CALIDAD (una fila por verificación de calidad de datos) al libro de salida.
+    
+    Args:
+        wb: Libro de salida (de crear_libro_salida)
+        df_calidad: DataFrame generado por calidad_datos.tabla_calidad
+    """
+    ws = wb.create_sheet("CALIDAD")
+    for col_idx, ancho in enumerate([24, 70, 10, 80], start=1):
+        ws.column_dimensions[get_column_letter(col_idx)].width = ancho
+    ws.freeze_panes = 'A2'
+    
+    negrita = Font(bold=True)
+    ws.append([_celda(ws, valor, font=negrita) for valor in ['Verificación', 'Descripción', 'Conteo', 'IDs de muestra']])
+    for fila in df_calidad.itertuples(index=False, name=None):
+        ws.append([valor.item() if hasattr(valor, 'item') else valor for valor in fila])
+    
+    logger.info(f"Hoja CALIDAD agregada con {len(df_calidad)} verificaciones")
+
+
+
+
+def guardar_hoja_cambios(df_cambios: pd.DataFrame, ruta_output: str):
+    """
+    Guarda el conjunto de cambios entre dos snapshots en la hoja CAMBIOS de un nuevo .xlsx.
+    
+    Args:
+        df_cambios: DataFrame generado por diferencias_cartera.comparar_snapshots
+        ruta_output: Ruta del archivo .xlsx de salida
+    """
+    logger.info(f"Guardando hoja CAMBIOS ({len(df_cambios)} grupos): {ruta_output}")
+    
+    # Modo write_only: escribe fila por fila sin mantener todas las celdas en memoria
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("CAMBIOS")
+    ws.freeze_panes = 'B2'
+    
+    ws.append([df_cambios.index.name or 'id_de_grupo'] + list(df_cambios.columns))
+    for id_grupo, fila in zip(df_cambios.index, df_cambios.itertuples(index=False, name=None)):
+        ws.append([id_grupo] + [
+            None if pd.isna(valor) else (valor.item() if hasattr(valor, 'item') else valor)
+            for valor in fila
+        ])
+    
+    with escritura_atomica(ruta_output) as temporal:
+        wb.save(temporal)
+    logger.info(f"Hoja CAMBIOS guardada: {ruta_output}")
@@ -0,0 +1,129 @@
+"""
+Grafo de columnas derivadas con evaluación perezosa.
+
+Cada columna calculada es un nodo con sus dependencias declaradas:
+
+    entradas      - columnas del DataFrame de entrada que lee el nodo
+    dependencias  - otros nodos del grafo (columnas de salida o intermedias)
+
+evaluar_columnas() recibe las columnas pedidas, recorre solo su cierre
+transitivo en orden topológico y guarda cada resultado en `memo`, de modo que
+un nodo compartido (ej. estatus) se calcula una sola vez y un segundo pedido
+sobre el mismo DataFrame reutiliza lo ya calculado.
+
+Los nombres de entradas y nodos viven en espacios separados: un nodo puede
+llamarse igual que la columna de entrada que transforma (ej. 'ciclo').
+
+Ejemplo:
+    GRAFO = {}
+
+    @registrar_nodo(GRAFO, 'doble', entradas=['monto'])
+    def _doble(entrada, valores, contexto):
+        return entrada['monto'] * 2
+
+    evaluar_columnas(GRAFO, df, ['doble'])
+"""
+
+import pandas as pd
+import numpy as np
+import logging
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+# Nodo del grafo: calcular(entrada, valores, contexto) -> Series o arreglo
+#   entrada  - {columna: Series} con las entradas declaradas presentes en el DataFrame
+#   valores  - {nodo: Series} con las dependencias ya evaluadas
+#   contexto - parámetros de la corrida (fecha de cálculo, diccionario de calidad...)
+Nodo = namedtuple('Nodo', ['nombre', 'entradas', 'dependencias', 'calcular'])
+
+
+def registrar_nodo(grafo: dict, nombre: str, entradas=(), dependencias=()):
+    """
+    Decorador que registra una función como nodo de `grafo`.
+
+    Raises:
+        ValueError: Si ya hay un nodo con ese nombre
+    """
+    def decorador(calcular):
+        if nombre in grafo:
+            raise ValueError(f"Nodo duplicado en el grafo de columnas: '{nombre}'")
+        grafo[nombre] = Nodo(nombre, tuple(entradas), tuple(dependencias), calcular)
+        return calcular
+    return decorador
+
+
+def registrar_directas(grafo: dict, columnas):
+    """Registra nodos que copian la columna de entrada del mismo nombre sin cambios."""
+    for columna in columnas:
+        registrar_nodo(grafo, columna, entradas=[columna])(
+            lambda entrada, valores, contexto, columna=columna: entrada[columna]
+        )
+
+
+def orden_evaluacion(grafo: dict, columnas) -> list:
+    """
+    Orden topológico del cierre transitivo de `columnas` (dependencias primero).
+
+    Raises:
+        ValueError: Si se pide o se depende de un nodo que no existe, o hay un ciclo
+    """
+    orden = []
+    estado = {}
+
+    def visitar(nombre, camino):
+        if estado.get(nombre) == 'listo':
+            return
+        if estado.get(nombre) == 'visitando':
+            raise ValueError(f"Dependencia circular entre columnas: {' -> '.join(camino + [nombre])}")
+        if nombre not in grafo:
+            origen = f" (dependencia de '{camino[-1]}')" if camino else ""
+            raise ValueError(f"Columna sin nodo en el grafo: '{nombre}'{origen}")
+        estado[nombre] = 'visitando'
+        for dependencia in grafo[nombre].dependencias:
+            visitar(dependencia, camino + [nombre])
+        estado[nombre] = 'listo'
+        orden.append(nombre)
+
+    for columna in columnas:
+        visitar(columna, [])
+    return orden
+
+
+def evaluar_columnas(
+    grafo: dict,
+    df: pd.DataFrame,
+    columnas,
+    contexto: dict = None,
+    memo: dict = None
+) -> dict:
+    """
+    Evalúa solo los nodos que necesitan `columnas`.
+
+    Args:
+        grafo: {nombre: Nodo}
+        df: DataFrame de entrada (no se modifica)
+        columnas: Nodos pedidos
+        contexto: Parámetros que reciben los nodos
+        memo: Resultados ya calculados sobre este mismo `df` ({nodo: Series}); se
+            completa con los nodos evaluados. Por defecto, uno nuevo por llamada
+
+    Returns:
+        {columna: Series} para las columnas pedidas, con el índice de `df`
+    """
+    memo = {} if memo is None else memo
+    contexto = contexto or {}
+    orden = orden_evaluacion(grafo, columnas)
+    pendientes = [nombre for nombre in orden if nombre not in memo]
+    logger.debug(f"Grafo de columnas: {len(pendientes)} nodos por evaluar, {len(orden) - len(pendientes)} en memo")
+
+    for nombre in pendientes:
+        nodo = grafo[nombre]
+        entrada = {col: df[col] for col in nodo.entradas if col in df.columns}
+        valores = {dep: memo[dep] for dep in nodo.dependencias}
+        resultado = nodo.calcular(entrada, valores, contexto)
+        if not isinstance(resultado, pd.Series):
+            resultado = pd.Series(np.asarray(resultado), index=df.index)
+        memo[nombre] = resultado.rename(nombre)
+
+    return {columna: memo[columna] for columna in columnas}
@@ -0,0 +1,289 @@
+"""
+Histórico de carteras generadas: dataset Parquet particionado por fecha de reporte.
+
+Cada corrida agrega su resultado de generar_cartera() en
+historico/fecha_reporte=AAAA-MM-DD/cartera_<corrida>.parquet, con la versión de
+esquema y las huellas (SHA-256) de los archivos de entrada en los metadatos.
+Las consultas leen solo las fechas y columnas pedidas.
+"""
+
+import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import hashlib
+import json
+import logging
+import re
+from datetime import datetime, date, timedelta
+from pathlib import Path
+from escritura_atomica import escritura_atomica
+
+logger = logging.getLogger(__name__)
+
+# Versión del esquema de los snapshots (incrementar si cambian las columnas de CARTERA)
+VERSION_ESQUEMA = 1
+
+# Directorio por defecto del dataset histórico
+DIRECTORIO_HISTORICO = 'historico'
+
+# Prefijo de las particiones (estilo Hive, legible por pyarrow.dataset)
+PREFIJO_PARTICION = 'fecha_reporte='
+
+# Clave de metadatos Parquet donde se guarda la información de la corrida
+CLAVE_METADATOS = b'cartera_historico'
+
+
+def huella_archivo(ruta: str, tam_bloque: int = 1 << 20) -> str:
+    """
+    Calcula la huella SHA-256 de un archivo leyendo por bloques.
+
+    Args:
+        ruta: Ruta del archivo
+        tam_bloque: Tamaño de bloque de lectura en bytes
+
+    Returns:
+        Huella hexadecimal
+    """
+    sha = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(tam_bloque), b''):
+            sha.update(bloque)
+    return sha.hexdigest()
+
+
+def huella_entradas(rutas_entrada: dict) -> str:
+    """
+    Huella SHA-256 de un conjunto de archivos de entrada: cambia si cambia
+    cualquier archivo o su nombre en `rutas_entrada`.
+
+    Args:
+        rutas_entrada: Diccionario {nombre: ruta} de los archivos de entrada
+    """
+    huellas = {nombre: huella_archivo(ruta) for nombre, ruta in rutas_entrada.items()}
+    return hashlib.sha256(json.dumps(huellas, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def fecha_reporte_desde_archivo(ruta: str) -> date:
+    """
+    Obtiene la fecha de reporte del nombre del archivo (ej: ..._12112025.xlsx -> 2025-11-12).
+    Si el nombre no contiene una fecha DDMMAAAA válida, usa la fecha de hoy.
+    """
+    coincidencia = re.search(r'(\d{2})(\d{2})(\d{4})', Path(ruta).stem)
+    if coincidencia:
+        dia, mes, anio = (int(parte) for parte in coincidencia.groups())
+        try:
+            return date(anio, mes, dia)
+        except ValueError:
+            pass
+    logger.warning(f"No se encontró fecha DDMMAAAA en '{ruta}', usando la fecha de hoy")
+    return date.today()
+
+
+def _a_fecha(valor) -> date:
+    """Convierte str/datetime/date a date."""
+    return pd.Timestamp(valor).date()
+
+
+def _particiones(directorio: str) -> dict:
+    """Retorna {fecha: ruta de la partición} para todas las particiones existentes."""
+    base = Path(directorio)
+    if not base.exists():
+        return {}
+    particiones = {}
+    for ruta in base.iterdir():
+        if ruta.is_dir() and ruta.name.startswith(PREFIJO_PARTICION):
+            try:
+                particiones[_a_fecha(ruta.name[len(PREFIJO_PARTICION):])] = ruta
+            except ValueError:
+                logger.warning(f"Partición con fecha inválida ignorada: {ruta}")
+    return particiones
+
+
+def _archivos_particion(ruta_particion: Path, solo_ultima_corrida: bool) -> list:
+    """Archivos de una partición en orden de corrida; el nombre incluye el timestamp de la corrida."""
+    archivos = sorted(ruta_particion.glob('cartera_*.parquet'))
+    if solo_ultima_corrida:
+        return archivos[-1:]
+    return archivos
+
+
+def guardar_snapshot(
+    df_cartera,
+    fecha_reporte,
+    rutas_entrada: dict,
+    directorio: str = DIRECTORIO_HISTORICO,
+    esquema: pa.Schema = None,
+    registros: int = None
+) -> str:
+    """
+    Agrega el resultado de generar_cartera() al histórico.
+
+    Args:
+        df_cartera: DataFrame de CARTERA generado, o un iterable de partes de CARTERA
+            (corrida por particiones), que se escriben una a la vez en el mismo archivo
+        fecha_reporte: Fecha del reporte (date, datetime o 'AAAA-MM-DD')
+        rutas_entrada: Diccionario {nombre: ruta} de los archivos de entrada
+        directorio: Directorio raíz del histórico
+        esquema: Con partes, esquema Arrow común (ver ResultadoParticionado.esquema)
+        registros: Con partes, total de filas (para los metadatos)
+
+    Returns:
+        str: Ruta del archivo Parquet escrito
+    """
+    fecha = _a_fecha(fecha_reporte)
+    corrida = datetime.now().strftime('%Y%m%dT%H%M%S%f')
+
+    ruta_particion = Path(directorio) / f"{PREFIJO_PARTICION}{fecha.isoformat()}"
+    ruta_particion.mkdir(parents=True, exist_ok=True)
+    ruta_archivo = ruta_particion / f"cartera_{corrida}.parquet"
+
+    metadatos = {
+        'version_esquema': VERSION_ESQUEMA,
+        'fecha_reporte': fecha.isoformat(),
+        'corrida': corrida,
+        'registros': len(df_cartera) if isinstance(df_cartera, pd.DataFrame) else registros,
+        'entradas': {
+            nombre: {'archivo': Path(ruta).name, 'sha256': huella_archivo(ruta)}
+            for nombre, ruta in rutas_entrada.items()
+        },
+    }
+
+    if isinstance(df_cartera, pd.DataFrame):
+        tabla = pa.Table.from_pandas(df_cartera, preserve_index=False)
+        tabla = tabla.replace_schema_metadata({
+            **(tabla.schema.metadata or {}),
+            CLAVE_METADATOS: json.dumps(metadatos).encode('utf-8'),
+        })
+        with escritura_atomica(ruta_archivo) as temporal:
+            pq.write_table(tabla, temporal)
+    else:
+        if esquema is None or registros is None:
+            raise ValueError("Para guardar CARTERA por partes se requieren esquema y registros")
+        esquema = esquema.with_metadata({
+            **(esquema.metadata or {}),
+            CLAVE_METADATOS: json.dumps(metadatos).encode('utf-8'),
+        })
+        with escritura_atomica(ruta_archivo) as temporal, pq.ParquetWriter(temporal, esquema) as escritor:
+            for parte in df_cartera:
+                tabla = pa.Table.from_pandas(parte, preserve_index=False)
+                escritor.write_table(tabla.cast(esquema))
+
+    logger.info(f"Snapshot agregado al histórico: {ruta_archivo} ({metadatos['registros']} registros)")
+    return str(ruta_archivo)
+
+
+def fechas_disponibles(directorio: str = DIRECTORIO_HISTORICO) -> list:
+    """Lista ordenada de fechas de reporte en el histórico."""
+    return sorted(_particiones(directorio))
+
+
+def leer_metadatos(fecha_reporte, directorio: str = DIRECTORIO_HISTORICO) -> list:
+    """
+    Retorna los metadatos (versión de esquema, huellas de entrada) de cada corrida de una fecha.
+    Solo lee el footer de los archivos Parquet, no los datos.
+    """
+    particiones = _particiones(directorio)
+    fecha = _a_fecha(fecha_reporte)
+    if fecha not in particiones:
+        raise KeyError(f"No hay snapshots para la fecha {fecha.isoformat()}")
+
+    metadatos = []
+    for archivo in _archivos_particion(particiones[fecha], solo_ultima_corrida=False):
+        esquema = pq.read_schema(archivo)
+        metadatos.append(json.loads(esquema.metadata[CLAVE_METADATOS]))
+    return metadatos
+
+
+def leer_historico(
+    columnas: list = None,
+    desde=None,
+    hasta=None,
+    fechas: list = None,
+    directorio: str = DIRECTORIO_HISTORICO,
+    solo_ultima_corrida: bool = True
+) -> pd.DataFrame:
+    """
+    Lee snapshots del histórico, solo para las fechas y columnas pedidas.
+
+    Args:
+        columnas: Columnas de CARTERA a leer (None = todas)
+        desde: Fecha mínima (inclusiva)
+        hasta: Fecha máxima (inclusiva)
+        fechas: Lista explícita de fechas (tiene prioridad sobre desde/hasta)
+        directorio: Directorio raíz del histórico
+        solo_ultima_corrida: Si hay varias corridas para una fecha, leer solo la más reciente
+
+    Returns:
+        DataFrame con la columna 'fecha_reporte' más las columnas pedidas
+    """
+    particiones = _particiones(directorio)
+
+    if fechas is not None:
+        seleccion = sorted({_a_fecha(f) for f in fechas} & particiones.keys())
+    else:
+        inicio = _a_fecha(desde) if desde is not None else date.min
+        fin = _a_fecha(hasta) if hasta is not None else date.max
+        seleccion = sorted(f for f in particiones if inicio <= f <= fin)
+
+    tablas = []
+    for fecha in seleccion:
+        for archivo in _archivos_particion(particiones[fecha], solo_ultima_corrida):
+            tabla = pq.read_table(archivo, columns=columnas)
+            tabla = tabla.append_column(
+                'fecha_reporte',
+                pa.array(np.full(tabla.num_rows, np.datetime64(fecha, 'D')), type=pa.date32())
+            )
+            tablas.append(tabla.replace_schema_metadata(None))
+
+    if not tablas:
+        logger.warning("No se encontraron snapshots para el rango pedido")
+        return pd.DataFrame(columns=['fecha_reporte'] + list(columnas or []))
+
+    df = pa.concat_tables(tablas, promote_options='default').to_pandas()
+    df['fecha_reporte'] = pd.to_datetime(df['fecha_reporte'])
+    logger.info(f"Histórico leído: {len(seleccion)} fechas, {len(df)} registros")
+
+    return df[['fecha_reporte'] + [col for col in df.columns if col != 'fecha_reporte']]
+
+
+def tendencia(
+    columna: str = 'cartera_vencida_total',
+    por: str = 'nombre_del_gerente',
+    semanas: int = 26,
+    hasta=None,
+    directorio: str = DIRECTORIO_HISTORICO
+) -> pd.DataFrame:
+    """
+    Tendencia semanal de una columna sumada por gerente (u otra llave).
+
+    Ejemplo: tendencia('cartera_vencida_total', por='nombre_del_gerente', semanas=26)
+
+    Args:
+        columna: Columna numérica de CARTERA a sumar
+        por: Columna de agrupación
+        semanas: Número de semanas a incluir, contando la de `hasta` (con reportes
+            semanales, `semanas` fechas)
+        hasta: Fecha final (por defecto la fecha más reciente del histórico)
+        directorio: Directorio raíz del histórico
+
+    Returns:
+        DataFrame con índice fecha_reporte y una columna por valor de `por`
+    """
+    fechas = fechas_disponibles(directorio)
+    if not fechas:
+        return pd.DataFrame()
+
+    fin = _a_fecha(hasta) if hasta is not None else fechas[-1]
+    # Límite inferior inclusivo: `fin` es la primera de las `semanas` semanas
+    inicio = fin - timedelta(weeks=semanas - 1)
+
+    df = leer_historico(columnas=[por, columna], desde=inicio, hasta=fin, directorio=directorio)
+    return df.pivot_table(
+        index='fecha_reporte',
+        columns=por,
+        values=columna,
+        aggfunc='sum',
+        fill_value=0,
+        observed=True
+    )
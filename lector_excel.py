@@ -0,0 +1,181 @@
+"""
+Lectura de los archivos .xlsx de entrada con el motor más rápido disponible.
+
+Todos los cargar_* leen con leer_excel()/abrir_libro() en lugar de llamar a
+pd.read_excel directamente. El motor se elige en este orden:
+
+    calamine - lector en Rust (paquete opcional python-calamine, pandas >= 2.2)
+    openpyxl - lector por defecto de pandas (siempre disponible)
+
+Si calamine no está instalado se usa openpyxl; si calamine falla por algo
+propio del motor (no se puede importar, o no soporta una parte del XML del
+libro), se reintenta con openpyxl. Los demás errores (hoja o usecols
+inexistentes, archivo dañado) se propagan sin reintentar. Para forzar un motor se usa la variable de
+entorno CARTERA_MOTOR_EXCEL (la heredan los procesos de --consolidar).
+
+Ambos motores pasan por el mismo parseo de pandas (encabezados multi-fila,
+fechas, dtype, usecols), así que los DataFrames normalizados son iguales. El CLI
+lo verifica sobre los archivos de data/ y muestra los tiempos de cada motor:
+
+    python lector_excel.py [--directorio data]
+"""
+
+import pandas as pd
+import argparse
+import importlib.util
+import logging
+import os
+import time
+from functools import lru_cache
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+MOTOR_CALAMINE = 'calamine'
+MOTOR_OPENPYXL = 'openpyxl'
+
+# Motores soportados, en orden de preferencia
+MOTORES = [MOTOR_CALAMINE, MOTOR_OPENPYXL]
+
+# Variable de entorno para forzar un motor
+VARIABLE_MOTOR = 'CARTERA_MOTOR_EXCEL'
+
+
+@lru_cache(maxsize=None)
+def motor_disponible(motor: str) -> bool:
+    """True si el motor está instalado y la versión de pandas lo soporta."""
+    if motor == MOTOR_OPENPYXL:
+        return True
+    if motor == MOTOR_CALAMINE:
+        version = tuple(int(parte) for parte in pd.__version__.split('.')[:2])
+        return version >= (2, 2) and importlib.util.find_spec('python_calamine') is not None
+    return False
+
+
+@lru_cache(maxsize=None)
+def errores_reintentables() -> tuple:
+    """
+    Excepciones de calamine con las que se reintenta con openpyxl: el motor no se
+    puede importar o no soporta una parte del libro. Un archivo dañado o una hoja
+    inexistente fallan igual con openpyxl, así que no se reintentan.
+    """
+    errores = (ImportError, NotImplementedError)
+    try:
+        import python_calamine
+    except ImportError:
+        return errores
+    return errores + (python_calamine.XmlError, python_calamine.TablesNotSupported)
+
+
+def motor_excel() -> str:
+    """
+    Motor de lectura a usar: el de CARTERA_MOTOR_EXCEL si está definido, si no el
+    primero disponible de MOTORES.
+
+    Raises:
+        ValueError: Si el motor forzado no existe o no está instalado
+    """
+    forzado = os.environ.get(VARIABLE_MOTOR)
+    if forzado:
+        if forzado not in MOTORES:
+            raise ValueError(f"Motor de Excel inválido en {VARIABLE_MOTOR}: '{forzado}'. Opciones: {MOTORES}")
+        if not motor_disponible(forzado):
+            raise ValueError(f"El motor de Excel '{forzado}' no está instalado")
+        return forzado
+    return next(motor for motor in MOTORES if motor_disponible(motor))
+
+
+def leer_excel(fuente, **kwargs) -> pd.DataFrame:
+    """
+    pd.read_excel con el motor elegido por motor_excel().
+
+    Args:
+        fuente: Ruta del archivo o pd.ExcelFile ya abierto (se usa su motor)
+        **kwargs: Argumentos de pd.read_excel (sheet_name, header, usecols, dtype, nrows...)
+    """
+    if isinstance(fuente, pd.ExcelFile):
+        return pd.read_excel(fuente, **kwargs)
+
+    motor = motor_excel()
+    try:
+        return pd.read_excel(fuente, engine=motor, **kwargs)
+    except errores_reintentables() as e:
+        if motor == MOTOR_OPENPYXL:
+            raise
+        logger.warning(f"{motor} no pudo leer {fuente} ({e}); se reintenta con {MOTOR_OPENPYXL}")
+        return pd.read_excel(fuente, engine=MOTOR_OPENPYXL, **kwargs)
+
+
+def abrir_libro(ruta) -> pd.ExcelFile:
+    """Abre un libro para leer varias hojas sin volver a parsear el archivo."""
+    motor = motor_excel()
+    try:
+        return pd.ExcelFile(ruta, engine=motor)
+    except errores_reintentables() as e:
+        if motor == MOTOR_OPENPYXL:
+            raise
+        logger.warning(f"{motor} no pudo abrir {ruta} ({e}); se reintenta con {MOTOR_OPENPYXL}")
+        return pd.ExcelFile(ruta, engine=MOTOR_OPENPYXL)
+
+
+def nombres_hojas(ruta) -> list:
+    """Nombres de las hojas del libro, sin leer datos."""
+    with abrir_libro(ruta) as libro:
+        return libro.sheet_names
+
+
+def main():
+    """CLI: compara los DataFrames normalizados de cada motor y muestra los tiempos."""
+    import analizar_y_automatizar as automatizacion
+
+    parser = argparse.ArgumentParser(description="Paridad y tiempos de los motores de lectura de Excel")
+    parser.add_argument('--directorio', default='data', help="Directorio con los archivos de entrada")
+    parser.add_argument('--repeticiones', type=int, default=3, help="Lecturas por archivo y motor (se toma la mejor)")
+    args = parser.parse_args()
+
+    cargadores = {
+        'antiguedad': automatizacion.cargar_antiguedad,
+        'situacion': automatizacion.cargar_situacion,
+        'cobranza': automatizacion.cargar_cobranza,
+        'ahorros': automatizacion.cargar_ahorros,
+    }
+    motores = [motor for motor in MOTORES if motor_disponible(motor)]
+    if len(motores) < 2:
+        logger.warning(f"Solo está disponible {motores[0]}; no hay paridad que comparar")
+
+    logging.getLogger().setLevel(logging.WARNING)
+    anterior = os.environ.get(VARIABLE_MOTOR)
+    filas = []
+    try:
+        for tipo, cargar in cargadores.items():
+            patron = automatizacion.PATRONES_ENTRADA[tipo]
+            rutas = sorted(str(ruta) for ruta in Path(args.directorio).glob(patron))
+            if not rutas:
+                logger.warning(f"No hay archivo de {tipo} en {args.directorio}")
+                continue
+            frames = {}
+            fila = {'tipo': tipo}
+            for motor in motores:
+                os.environ[VARIABLE_MOTOR] = motor
+                tiempos = []
+                for _ in range(args.repeticiones):
+                    inicio = time.perf_counter()
+                    frames[motor] = cargar(rutas[0])
+                    tiempos.append(time.perf_counter() - inicio)
+                fila[f"{motor}_s"] = round(min(tiempos), 3)
+            for motor in motores[1:]:
+                pd.testing.assert_frame_equal(frames[motores[0]], frames[motor])
+            fila['filas'] = len(frames[motores[0]])
+            fila['paridad'] = 'OK' if len(motores) > 1 else '-'
+            filas.append(fila)
+    finally:
+        if anterior is None:
+            os.environ.pop(VARIABLE_MOTOR, None)
+        else:
+            os.environ[VARIABLE_MOTOR] = anterior
+
+    print(pd.DataFrame(filas).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+"""
+Linaje por fila de CARTERA: de qué fila de cada reporte de entrada salió cada grupo.
+
+generar_cartera(..., linaje={}) registra, para cada fila del output, la posición
+de su registro en ANTIGÜEDAD, SITUACIÓN, COBRANZA y AHORROS (-1 = sin registro),
+y también las filas descartadas como IDs duplicados, tanto al cargar ANTIGÜEDAD
+como después de los joins. Las posiciones de ANTIGÜEDAD son filas de la
+ANTIGÜEDAD cargada, antes de eliminar duplicados (COLUMNA_FILA_ANTIGUEDAD). El
+linaje se guarda junto al output como arreglos int32 en un .npz
+(output_automatizado.linaje.npz).
+
+La auditoría de un grupo toma las filas directamente de las entradas ya
+parseadas del checkpoint 'carga' (--checkpoints), sin volver a leer los Excel;
+el checkpoint guarda también los registros de ANTIGÜEDAD eliminados al cargar
+(TABLA_DESCARTADOS).
+El linaje y el checkpoint guardan la huella de los archivos de entrada
+(huella_entradas); si no coinciden (ej. el linaje es de una corrida sin
+--checkpoints de otra semana) la auditoría se rechaza, porque las posiciones
+apuntarían a filas de otras entradas.
+
+Uso:
+    python linaje_cartera.py 000123 [--linaje output_automatizado.linaje.npz] [--checkpoints checkpoints]
+"""
+
+import pandas as pd
+import numpy as np
+import argparse
+import logging
+from pathlib import Path
+from escritura_atomica import escritura_atomica
+
+logger = logging.getLogger(__name__)
+
+# Fuentes registradas en el linaje, en el orden de los joins
+FUENTES = ['antiguedad', 'situacion', 'cobranza', 'ahorros']
+
+# Posición que indica que el grupo no tiene registro en la fuente
+SIN_FILA = -1
+
+# Prefijo de las llaves de las filas descartadas como duplicados
+PREFIJO_DESCARTADOS = 'descartados_'
+
+# Llave del linaje (y de los metadatos del checkpoint 'carga') con la huella de las entradas
+LLAVE_HUELLA = 'huella_entradas'
+
+# Columna de ANTIGÜEDAD con la fila del registro antes de eliminar duplicados al cargar
+COLUMNA_FILA_ANTIGUEDAD = '_fila_antiguedad'
+
+# Tabla del checkpoint 'carga' con los registros de ANTIGÜEDAD eliminados al cargar
+TABLA_DESCARTADOS = 'antiguedad_descartados'
+
+
+def ruta_linaje(ruta_output: str) -> Path:
+    """Ruta del linaje junto al output (output.xlsx -> output.linaje.npz)."""
+    return Path(ruta_output).with_suffix('.linaje.npz')
+
+
+def linaje_descartados_carga(df_descartados: pd.DataFrame = None) -> dict:
+    """
+    Linaje inicial con los registros de ANTIGÜEDAD eliminados como IDs duplicados al cargar.
+
+    unir_fuentes agrega después sus propias filas descartadas a las mismas llaves.
+
+    Args:
+        df_descartados: Registros eliminados por eliminar_duplicados_antiguedad (con
+            COLUMNA_FILA_ANTIGUEDAD); None o vacío si no hubo
+
+    Returns:
+        {'descartados_<llave>': arreglo} para 'id_de_grupo' y cada fuente (las demás
+        fuentes sin fila: su registro se une al del ciclo mayor)
+    """
+    if df_descartados is None or df_descartados.empty:
+        return {}
+    linaje = {
+        PREFIJO_DESCARTADOS + 'id_de_grupo':
+            df_descartados['cod_grupo_solidario'].astype(str).str.zfill(6).to_numpy(dtype=str),
+        PREFIJO_DESCARTADOS + 'antiguedad': df_descartados[COLUMNA_FILA_ANTIGUEDAD].to_numpy(dtype=np.int32),
+    }
+    for fuente in FUENTES[1:]:
+        linaje[PREFIJO_DESCARTADOS + fuente] = np.full(len(df_descartados), SIN_FILA, dtype=np.int32)
+    return linaje
+
+
+def guardar_linaje(linaje: dict, ruta: str, huella: str = None) -> Path:
+    """
+    Guarda el linaje (llenado por generar_cartera/unir_fuentes) en un .npz comprimido.
+
+    Args:
+        linaje: Linaje de unir_fuentes
+        ruta: Ruta del .npz
+        huella: Huella de las entradas de la corrida (historico_cartera.huella_entradas)
+
+    Returns:
+        Ruta del archivo escrito
+    """
+    ruta = Path(ruta)
+    if huella is not None:
+        linaje = {**linaje, LLAVE_HUELLA: np.array(huella)}
+    with escritura_atomica(ruta) as temporal:
+        np.savez_compressed(temporal, **linaje)
+    logger.info(
+        f"Linaje guardado: {ruta} ({len(linaje['id_de_grupo'])} grupos, "
+        f"{len(linaje[PREFIJO_DESCARTADOS + 'id_de_grupo'])} filas descartadas)"
+    )
+    return ruta
+
+
+def cargar_linaje(ruta: str) -> dict:
+    """
+    Carga un linaje guardado con guardar_linaje.
+
+    Raises:
+        FileNotFoundError: Si no existe el archivo
+    """
+    if not Path(ruta).exists():
+        raise FileNotFoundError(f"No existe el linaje: {ruta}")
+    with np.load(ruta, allow_pickle=False) as datos:
+        return {llave: datos[llave] for llave in datos.files}
+
+
+def verificar_huella(linaje: dict, huella: str):
+    """
+    Verifica que el linaje sea de las mismas entradas que el checkpoint 'carga'.
+
+    Args:
+        linaje: Linaje del output (cargar_linaje)
+        huella: Huella de las entradas guardada en los metadatos del checkpoint
+
+    Raises:
+        ValueError: Si alguna de las dos huellas falta o no coinciden
+    """
+    huella_linaje = str(linaje[LLAVE_HUELLA]) if LLAVE_HUELLA in linaje else None
+    if huella_linaje is None or huella is None:
+        raise ValueError(
+            "El linaje o el checkpoint 'carga' no tienen huella de entradas; "
+            "volver a correr con --checkpoints para auditar"
+        )
+    if huella_linaje != huella:
+        raise ValueError(
+            "El linaje y el checkpoint 'carga' son de entradas distintas; "
+            "volver a correr con --checkpoints para auditar"
+        )
+
+
+def auditar_grupo(id_de_grupo: str, linaje: dict, entradas: dict) -> dict:
+    """
+    Filas de las entradas que aportaron a un grupo de CARTERA.
+
+    Args:
+        id_de_grupo: ID del grupo (se completa a 6 dígitos)
+        linaje: Linaje del output (cargar_linaje)
+        entradas: {fuente: DataFrame} con las mismas entradas que recibió generar_cartera
+            (checkpoint 'carga', con TABLA_DESCARTADOS si se eliminaron registros al cargar)
+
+    Returns:
+        {fuente: DataFrame} con las filas de cada fuente, con columnas '_fila' (posición
+        en la entrada) y '_descartada' (True si la fila se eliminó como ID duplicado)
+
+    Raises:
+        ValueError: Si el ID no está en el linaje
+    """
+    id_de_grupo = str(id_de_grupo).zfill(6)
+    usadas = np.flatnonzero(linaje['id_de_grupo'] == id_de_grupo)
+    descartadas = np.flatnonzero(linaje[PREFIJO_DESCARTADOS + 'id_de_grupo'] == id_de_grupo)
+    if len(usadas) == 0 and len(descartadas) == 0:
+        raise ValueError(f"El ID {id_de_grupo} no está en el linaje")
+
+    resultado = {}
+    for fuente in FUENTES:
+        filas = np.concatenate([
+            linaje[fuente][usadas],
+            linaje[PREFIJO_DESCARTADOS + fuente][descartadas],
+        ])
+        descartada = np.repeat([False, True], [len(usadas), len(descartadas)])
+        con_registro = filas != SIN_FILA
+        # Un mismo registro puede aparecer en la fila usada y en las descartadas
+        filas, primera = np.unique(filas[con_registro], return_index=True)
+        if fuente == 'antiguedad' and COLUMNA_FILA_ANTIGUEDAD in entradas[fuente].columns:
+            # Filas de la ANTIGÜEDAD cargada: incluye los registros eliminados al cargar
+            tabla = pd.concat([entradas[fuente], entradas.get(TABLA_DESCARTADOS)])
+            df = tabla.set_index(COLUMNA_FILA_ANTIGUEDAD).loc[filas].reset_index(drop=True)
+        else:
+            df = entradas[fuente].iloc[filas].copy()
+        df.insert(0, '_fila', filas)
+        df.insert(1, '_descartada', descartada[con_registro][primera])
+        resultado[fuente] = df.reset_index(drop=True)
+    return resultado
+
+
+def main():
+    """CLI: muestra las filas de entrada de un grupo."""
+    from checkpoints_cartera import cargar_checkpoint, DIRECTORIO_CHECKPOINTS
+
+    parser = argparse.ArgumentParser(description="Filas de entrada que aportaron a un grupo de CARTERA")
+    parser.add_argument('id_de_grupo', help="ID del grupo")
+    parser.add_argument('--linaje', default=str(ruta_linaje('output_automatizado.xlsx')), help="Archivo .linaje.npz")
+    parser.add_argument('--checkpoints', default=DIRECTORIO_CHECKPOINTS, help="Directorio de checkpoints de la corrida")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    entradas, metadatos = cargar_checkpoint(args.checkpoints, 'carga')
+    linaje = cargar_linaje(args.linaje)
+    verificar_huella(linaje, metadatos.get(LLAVE_HUELLA))
+    auditoria = auditar_grupo(args.id_de_grupo, linaje, entradas)
+    with pd.option_context('display.max_columns', None, 'display.width', 200):
+        for fuente, df in auditoria.items():
+            print(f"\n=== {fuente.upper()} ({len(df)} filas) ===")
+            print(df.to_string(index=False) if len(df) else "(sin registros)")
+
+
+if __name__ == '__main__':
+    main()
@@ -12,7 +12,8 @@ CORRECCIONES_GRUPOS = {
 }
 
 
-def aplicar_parche_grupos(df: pd.DataFrame, columna_id: str, columna_promotor: str) -> pd.DataFrame:
+def aplicar_parche_grupos(df: pd.DataFrame, columna_id: str, columna_promotor: str,
+                          inplace: bool = False) -> pd.DataFrame:
     """
     Aplica el parche de grupos a un DataFrame.
     Modifica el nombre_promotor para grupos específicos.
@@ -21,20 +22,23 @@ def aplicar_parche_grupos(df: pd.DataFrame, columna_id: str, columna_promotor: s
         df: DataFrame a modificar
         columna_id: Nombre de la columna que contiene el ID del grupo (normalmente 'id_de_grupo')
         columna_promotor: Nombre de la columna que contiene el nombre del promotor (normalmente 'nombre_promotor')
+        inplace: Si es True, reemplaza las columnas en `df` en lugar de trabajar sobre una copia
         
     Returns:
-        DataFrame con correcciones aplicadas
+        DataFrame con correcciones aplicadas (el mismo `df` si inplace=True)
     """
-    df = df.copy()
+    if not inplace:
+        df = df.copy()
     
     # Normalizar IDs a string con ceros a la izquierda
     df[columna_id] = df[columna_id].astype(str).str.zfill(6)
     
-    # Aplicar correcciones
-    for id_grupo, nombre_correcto in CORRECCIONES_GRUPOS.items():
-        mask = df[columna_id] == id_grupo
-        if mask.any():
-            df.loc[mask, columna_promotor] = nombre_correcto
+    # Aplicar correcciones (se reemplaza la columna completa; no se escribe sobre
+    # el arreglo existente, que puede ser compartido con otro frame)
+    nombre_correcto = df[columna_id].map(CORRECCIONES_GRUPOS)
+    mask = nombre_correcto.notna()
+    if mask.any():
+        df[columna_promotor] = df[columna_promotor].where(~mask, nombre_correcto)
     
     return df
 
@@ -30,7 +30,7 @@ def obtener_parche() -> pd.DataFrame:
     return pd.DataFrame(data)
 
 
-def aplicar_parche(df: pd.DataFrame, columna: str) -> pd.DataFrame:
+def aplicar_parche(df: pd.DataFrame, columna: str, inplace: bool = False) -> pd.DataFrame:
     """
     Aplica el parche de promotores a una columna del DataFrame.
     Usa coincidencia parcial (regex) para encontrar y reemplazar.
@@ -38,11 +38,13 @@ def aplicar_parche(df: pd.DataFrame, columna: str) -> pd.DataFrame:
     Args:
         df: DataFrame a modificar
         columna: Nombre de la columna a corregir
+        inplace: Si es True, reemplaza la columna en `df` en lugar de trabajar sobre una copia
         
     Returns:
-        DataFrame con correcciones aplicadas
+        DataFrame con correcciones aplicadas (el mismo `df` si inplace=True)
     """
-    df = df.copy()
+    if not inplace:
+        df = df.copy()
     for original, correcto in CORRECCIONES_PROMOTORES.items():
         # Usar regex para coincidencia parcial (ej: "Ponce Galindo Alicia" -> "Contreras Martinez Jose Luis")
         df[columna] = df[columna].astype(str).str.replace(
@@ -54,7 +56,7 @@ def aplicar_parche(df: pd.DataFrame, columna: str) -> pd.DataFrame:
     return df
 
 
-def aplicar_parche_gerentes(df: pd.DataFrame, columna: str) -> pd.DataFrame:
+def aplicar_parche_gerentes(df: pd.DataFrame, columna: str, inplace: bool = False) -> pd.DataFrame:
     """
     Aplica el parche de gerentes a una columna del DataFrame.
     Usa coincidencia parcial (regex) para encontrar y reemplazar.
@@ -62,11 +64,13 @@ def aplicar_parche_gerentes(df: pd.DataFrame, columna: str) -> pd.DataFrame:
     Args:
         df: DataFrame a modificar
         columna: Nombre de la columna a corregir (normalmente 'nombre_de_gerente' o 'nombre_del_gerente')
+        inplace: Si es True, reemplaza la columna en `df` en lugar de trabajar sobre una copia
         
     Returns:
-        DataFrame con correcciones aplicadas
+        DataFrame con correcciones aplicadas (el mismo `df` si inplace=True)
     """
-    df = df.copy()
+    if not inplace:
+        df = df.copy()
     for original, correcto in CORRECCIONES_GERENTES.items():
         # Usar regex para coincidencia parcial (ej: "JUAN EDMIUNDO LUNA" -> "JUAN EDMUNDO LUNA")
         df[columna] = df[columna].astype(str).str.replace(
@@ -0,0 +1,132 @@
+"""
+Registro de layouts conocidos de los reportes de entrada.
+
+Cada layout se identifica por la huella (SHA-1) de su fila de encabezado tal como
+la entrega pandas, y guarda los nombres de columna finales ya resueltos
+(normalizados + renombres posicionales). Un layout nuevo se valida y resuelve
+una sola vez; las corridas siguientes con el mismo encabezado toman los nombres
+del registro sin normalizar ni validar posiciones.
+
+Varias corridas pueden registrar layouts a la vez (trabajos en paralelo por
+gerente, procesos de --consolidar): registrar_layout relee el archivo bajo un
+bloqueo (ARCHIVO_BLOQUEO junto al registro), agrega el layout nuevo y escribe
+el resultado, así que ninguna corrida borra los layouts que registró otra.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime
+from escritura_atomica import escritura_atomica, bloqueo_salida
+
+logger = logging.getLogger(__name__)
+
+# Archivo del registro (se distribuye junto con la plantilla)
+RUTA_REGISTRO = 'plantilla/layouts_entradas.json'
+
+# Archivo de bloqueo del registro (en el mismo directorio)
+ARCHIVO_BLOQUEO = '.layouts_entradas.lock'
+
+# Registro en memoria: {ruta: {huella: layout}}
+_CACHE = {}
+
+
+def huella_encabezado(tipo: str, columnas) -> str:
+    """
+    Huella del encabezado de un reporte.
+
+    Args:
+        tipo: Tipo de reporte ('antiguedad', 'situacion', 'cobranza', 'ahorros')
+        columnas: Columnas tal como las entrega pd.read_excel (str o tuplas si es multi-nivel)
+
+    Returns:
+        Huella hexadecimal
+    """
+    texto = '\x1f'.join([tipo] + [repr(col) for col in columnas])
+    return hashlib.sha1(texto.encode('utf-8')).hexdigest()
+
+
+def _leer_registro(ruta: str) -> dict:
+    """Contenido actual del archivo del registro ({} si no existe)."""
+    if not os.path.exists(ruta):
+        return {}
+    with open(ruta, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def cargar_registro(ruta: str = RUTA_REGISTRO) -> dict:
+    """Carga el registro desde disco (una sola vez por proceso)."""
+    if ruta not in _CACHE:
+        _CACHE[ruta] = _leer_registro(ruta)
+        if _CACHE[ruta]:
+            logger.info(f"Registro de layouts cargado: {len(_CACHE[ruta])} layouts ({ruta})")
+    return _CACHE[ruta]
+
+
+def guardar_registro(ruta: str = RUTA_REGISTRO):
+    """
+    Guarda el registro en memoria en disco, reemplazando el archivo (sin combinar con
+    lo que hayan registrado otros procesos; para agregar un layout usar registrar_layout).
+    """
+    registro = cargar_registro(ruta)
+    directorio = os.path.dirname(ruta)
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+    with escritura_atomica(ruta) as temporal, open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(registro, f, ensure_ascii=False, indent=2)
+
+
+def buscar_layout(tipo: str, columnas, ruta: str = RUTA_REGISTRO) -> dict:
+    """
+    Busca un layout registrado para el encabezado dado.
+
+    Returns:
+        Layout ({'tipo', 'version', 'columnas', 'posiciones', 'registrado'}) o None
+    """
+    return cargar_registro(ruta).get(huella_encabezado(tipo, columnas))
+
+
+def registrar_layout(tipo: str, columnas, columnas_finales: list, posiciones: dict,
+                     ruta: str = RUTA_REGISTRO) -> dict:
+    """
+    Registra un layout nuevo con sus nombres de columna finales y lo guarda en disco.
+
+    Bajo el bloqueo del registro se relee el archivo, se combina con el layout nuevo
+    y se escribe; la versión se cuenta sobre el contenido combinado. Si otra corrida
+    ya registró el mismo encabezado, se usa su layout.
+
+    Args:
+        tipo: Tipo de reporte
+        columnas: Columnas originales (las que definen la huella)
+        columnas_finales: Nombres finales, uno por columna original
+        posiciones: {columna destino: índice} usado para los renombres posicionales
+        ruta: Archivo del registro
+
+    Returns:
+        Layout registrado
+    """
+    huella = huella_encabezado(tipo, columnas)
+    directorio = os.path.dirname(ruta) or '.'
+    with bloqueo_salida(directorio, archivo=ARCHIVO_BLOQUEO):
+        registro = _leer_registro(ruta)
+        _CACHE[ruta] = registro
+        if huella in registro:
+            logger.info(f"Layout de {tipo} ya registrado por otra corrida (huella {huella[:12]})")
+            return registro[huella]
+
+        version = 1 + sum(1 for layout in registro.values() if layout['tipo'] == tipo)
+        layout = {
+            'tipo': tipo,
+            'version': version,
+            'columnas': list(columnas_finales),
+            'posiciones': dict(posiciones),
+            'registrado': datetime.now().isoformat(timespec='seconds'),
+        }
+        registro[huella] = layout
+        guardar_registro(ruta)
+
+    # Una versión > 1 significa que el sistema origen cambió el layout del reporte
+    nivel = logging.WARNING if version > 1 else logging.INFO
+    logger.log(nivel, f"Layout nuevo de {tipo} registrado: versión {version} ({len(columnas_finales)} columnas, huella {huella[:12]})")
+    return layout
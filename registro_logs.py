@@ -0,0 +1,123 @@
+"""
+Configuración de logging de la automatización sin bloquear el cálculo.
+
+Los módulos solo emiten registros (logger = logging.getLogger(__name__)). El
+logger raíz tiene un único QueueHandler que deja cada registro en una cola, y un
+QueueListener en un hilo aparte los escribe en consola y en
+cartera_automation.log, que rota por tamaño (MAX_BYTES_LOG, con RESPALDOS_LOG
+archivos .1, .2, ...) en lugar de crecer sin límite.
+
+La cola es de multiprocessing: los procesos de --consolidar y --particiones
+heredan el QueueHandler (fork) o lo instalan con inicializar_proceso() (spawn),
+así que sus registros pasan por el mismo listener y un solo proceso escribe y
+rota el archivo.
+
+Los diagnósticos costosos (conteos, muestras de IDs, listas de columnas) se
+calculan solo si su nivel está habilitado:
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"... {df['columna'].value_counts().to_dict()}")
+
+Con --nivel-log DEBUG se activan; con WARNING se omiten también los de INFO.
+"""
+
+import atexit
+import logging
+import multiprocessing
+import os
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Archivo de log de la automatización
+RUTA_LOG = 'cartera_automation.log'
+
+# Tamaño máximo del log antes de rotar, y respaldos que se conservan
+MAX_BYTES_LOG = 10 * 1024 * 1024
+RESPALDOS_LOG = 5
+
+FORMATO_LOG = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Niveles aceptados por --nivel-log
+NIVELES_LOG = ['DEBUG', 'INFO', 'WARNING', 'ERROR']
+
+# Cola y listener del proceso que configuró el logging (None si no se configuró)
+_cola = None
+_listener = None
+_pid = None
+
+
+def _instalar_cola(cola, nivel):
+    """Deja un único QueueHandler sobre `cola` en el logger raíz."""
+    raiz = logging.getLogger()
+    for handler in raiz.handlers[:]:
+        raiz.removeHandler(handler)
+    raiz.addHandler(QueueHandler(cola))
+    raiz.setLevel(nivel)
+
+
+def configurar_logging(
+    ruta: str = RUTA_LOG,
+    nivel: str = 'INFO',
+    max_bytes: int = MAX_BYTES_LOG,
+    respaldos: int = RESPALDOS_LOG
+) -> bool:
+    """
+    Configura el logger raíz con la cola y arranca el listener (consola + archivo rotado).
+
+    Igual que logging.basicConfig, no hace nada si el logger raíz ya tiene handlers
+    (ej. si la automatización se llama desde otro script que configuró su logging).
+
+    Args:
+        ruta: Archivo de log
+        nivel: Nivel mínimo ('DEBUG', 'INFO', ...)
+        max_bytes: Tamaño a partir del cual se rota el archivo
+        respaldos: Archivos rotados que se conservan
+
+    Returns:
+        True si se configuró en esta llamada
+    """
+    global _cola, _listener, _pid
+    if _listener is not None or logging.getLogger().handlers:
+        return False
+
+    formato = logging.Formatter(FORMATO_LOG)
+    archivo = RotatingFileHandler(ruta, maxBytes=max_bytes, backupCount=respaldos, encoding='utf-8')
+    consola = logging.StreamHandler()
+    for handler in (archivo, consola):
+        handler.setFormatter(formato)
+
+    _cola = multiprocessing.Queue()
+    _listener = QueueListener(_cola, archivo, consola)
+    _listener.start()
+    _pid = os.getpid()
+    _instalar_cola(_cola, nivel)
+    atexit.register(detener_logging)
+    return True
+
+
+def detener_logging():
+    """
+    Vacía la cola, detiene el listener y deja los handlers escribiendo directo
+    (los registros posteriores, ej. durante el cierre del intérprete, no se pierden).
+    """
+    global _cola, _listener
+    if _listener is None or os.getpid() != _pid:
+        return
+    _listener.stop()
+    raiz = logging.getLogger()
+    for handler in raiz.handlers[:]:
+        raiz.removeHandler(handler)
+    for handler in _listener.handlers:
+        raiz.addHandler(handler)
+    _cola.close()
+    _cola, _listener = None, None
+
+
+def inicializar_proceso(cola, nivel):
+    """Initializer de los procesos de trabajo: sus registros van a la cola del proceso principal."""
+    if cola is not None:
+        _instalar_cola(cola, nivel)
+
+
+def argumentos_proceso() -> dict:
+    """Argumentos de ProcessPoolExecutor para que los procesos usen la cola de logging."""
+    return {'initializer': inicializar_proceso, 'initargs': (_cola, logging.getLogger().level)}
@@ -0,0 +1,309 @@
+"""
+Resultado de una corrida: el DataFrame de CARTERA y sus vistas derivadas.
+
+ResultadoCartera es dueño del frame de CARTERA y calcula cada vista (MORA,
+rangos de mora, RESUMEN, totales, agregados por gerente, búsquedas por ID,
+gerente y promotor) la primera vez que se pide; las demás lecturas (hojas del
+libro, Parquet, SQLite...) reutilizan la misma vista en lugar de volver a
+filtrar y sumar la cartera.
+
+    resultado = ResultadoCartera(df_cartera)
+    agregar_hoja_mora(libro, resultado.mora, ws_plantilla)
+    exportar_sqlite(resultado.cartera, resultado.mora, fecha)   # misma MORA
+    resultado.grupos_de_gerente('ROSA DIAZ')
+
+Si el frame base se modifica (asignar una columna, .loc[...] = ..., cambiar el
+índice), las vistas se descartan y se recalculan en el siguiente acceso. La
+detección es O(columnas): con copy-on-write, el resultado conserva una copia
+superficial del frame, así que cualquier escritura sobre el frame base reemplaza
+el arreglo de la columna y cambia su firma (dirección del buffer o identidad del
+arreglo de extensión). El frame no se copia mientras no se modifique.
+
+ResultadoParticionado ofrece las mismas hojas derivadas para una corrida por
+particiones (--particiones): la CARTERA de cada partición queda en disco y cada
+vista se arma volviendo a leer las particiones, una a la vez.
+
+Copy-on-write siempre está activo desde pandas 3.0; con pandas 2.x, crear un
+ResultadoCartera activa la opción mode.copy_on_write (para todo el proceso),
+porque sin ella una escritura con .loc modifica el arreglo en su lugar y las
+vistas quedarían desactualizadas.
+"""
+
+import pandas as pd
+import numpy as np
+import pyarrow as pa
+import logging
+from cartera_generator import (
+    COLUMNAS_MORA_BASE, UMBRAL_PCT_MORA, asignar_rangos_mora,
+    generar_mora, generar_mora_por_rangos, resumen_rangos_mora
+)
+from cartera_particionada import leer_particiones
+from resumen_cartera import COLUMNAS_ENTRADA_RESUMEN, generar_resumen
+
+logger = logging.getLogger(__name__)
+
+# Antes de pandas 3.0 copy-on-write es opcional (desactivado por defecto)
+COPY_ON_WRITE_OPCIONAL = int(pd.__version__.split('.')[0]) < 3
+
+
+def _firma(df: pd.DataFrame) -> tuple:
+    """Identidad de las columnas e índice de `df` (cambia con cualquier escritura bajo copy-on-write)."""
+    arreglos = []
+    for posicion in range(df.shape[1]):
+        serie = df.iloc[:, posicion]
+        if isinstance(serie.dtype, np.dtype):
+            arreglos.append(serie.to_numpy().__array_interface__['data'][0])
+        else:
+            arreglos.append(id(serie.array))
+    return tuple(df.columns), id(df.index), tuple(arreglos)
+
+
+class ResultadoCartera:
+    """
+    CARTERA generada con vistas derivadas memoizadas.
+
+    Args:
+        df_cartera: DataFrame de CARTERA (de calcular_cartera o generar_cartera); no se copia
+    """
+
+    def __init__(self, df_cartera: pd.DataFrame):
+        if COPY_ON_WRITE_OPCIONAL and not pd.get_option('mode.copy_on_write'):
+            logger.info("pandas < 3.0: se activa mode.copy_on_write para detectar cambios en CARTERA")
+            pd.set_option('mode.copy_on_write', True)
+        self._cartera = df_cartera
+        self._vistas = {}
+        self._referencia = None
+        self._firma = None
+
+    @property
+    def cartera(self) -> pd.DataFrame:
+        """Frame base de CARTERA (modificarlo invalida las vistas)."""
+        return self._cartera
+
+    def invalidar(self):
+        """Descarta todas las vistas calculadas."""
+        self._vistas.clear()
+        self._referencia = None
+        self._firma = None
+
+    def _vista(self, nombre: str, calcular):
+        """Vista `nombre`, calculada con calcular(df_cartera) si no está en memo o el frame cambió."""
+        if self._firma is not None and _firma(self._cartera) != self._firma:
+            logger.info("CARTERA modificada: se recalculan sus vistas derivadas")
+            self.invalidar()
+        if nombre not in self._vistas:
+            if self._firma is None:
+                # Copia superficial: mantiene vivos los arreglos actuales (sus direcciones no
+                # se reutilizan) y hace que una escritura sobre el frame base copie la columna
+                self._referencia = self._cartera.copy(deep=False)
+                self._firma = _firma(self._cartera)
+            self._vistas[nombre] = calcular(self._cartera)
+        return self._vistas[nombre]
+
+    # Hojas derivadas
+
+    @property
+    def mora(self) -> pd.DataFrame:
+        """Hoja MORA (generar_mora)."""
+        return self._vista('mora', generar_mora)
+
+    @property
+    def mora_por_rangos(self) -> tuple:
+        """Tupla (df_mora_base, indices por rango) de generar_mora_por_rangos."""
+        return self._vista('mora_por_rangos', generar_mora_por_rangos)
+
+    @property
+    def resumen_rangos_mora(self) -> pd.DataFrame:
+        """Matriz de rangos de días × bandas de %mora (resumen_rangos_mora)."""
+        return self._vista('resumen_rangos_mora', resumen_rangos_mora)
+
+    @property
+    def resumen(self) -> pd.DataFrame:
+        """RESUMEN gerente → promotor con subtotales y total (generar_resumen)."""
+        return self._vista('resumen', generar_resumen)
+
+    # Agregados (se leen del RESUMEN, sin otra pasada sobre los grupos)
+
+    @property
+    def totales(self) -> pd.Series:
+        """Fila 'Total' del RESUMEN: grupos, grupos en mora, montos y %mora ponderado."""
+        def calcular(df):
+            total = self.resumen[self.resumen['nivel'] == 'Total']
+            return total.drop(columns=['nivel', 'nombre_del_gerente', 'nombre_promotor']).iloc[0]
+        return self._vista('totales', calcular)
+
+    @property
+    def por_gerente(self) -> pd.DataFrame:
+        """Subtotales del RESUMEN por gerente, indexados por nombre_del_gerente."""
+        def calcular(df):
+            gerentes = self.resumen[self.resumen['nivel'] == 'Gerente']
+            return gerentes.drop(columns=['nivel', 'nombre_promotor']).set_index('nombre_del_gerente')
+        return self._vista('por_gerente', calcular)
+
+    # Búsquedas
+
+    @property
+    def indice_id(self) -> pd.Index:
+        """Índice id_de_grupo → posición en CARTERA."""
+        return self._vista('indice_id', lambda df: pd.Index(df['id_de_grupo'], name='id_de_grupo'))
+
+    @property
+    def posiciones_gerente(self) -> dict:
+        """{nombre_del_gerente: posiciones en CARTERA}."""
+        return self._vista('posiciones_gerente', lambda df: _posiciones_por_valor(df['nombre_del_gerente']))
+
+    @property
+    def posiciones_promotor(self) -> dict:
+        """{nombre_promotor: posiciones en CARTERA}."""
+        return self._vista('posiciones_promotor', lambda df: _posiciones_por_valor(df['nombre_promotor']))
+
+    def grupos(self, ids) -> pd.DataFrame:
+        """
+        Filas de CARTERA de los IDs de grupo pedidos, en el orden pedido.
+
+        Raises:
+            ValueError: Si algún ID no está en CARTERA
+        """
+        ids = pd.Index(pd.Series(list(ids), dtype=object).astype(str).str.zfill(6))
+        posiciones = self.indice_id.get_indexer_for(ids)
+        if (posiciones < 0).any():
+            faltantes = ids[posiciones < 0].tolist()
+            raise ValueError(f"IDs de grupo no encontrados en CARTERA: {faltantes[:10]}")
+        return self._cartera.iloc[posiciones]
+
+    def grupos_de_gerente(self, nombre: str) -> pd.DataFrame:
+        """Filas de CARTERA de un gerente (vacío si no tiene grupos)."""
+        return self._cartera.iloc[self.posiciones_gerente.get(nombre, np.array([], dtype=np.intp))]
+
+    def grupos_de_promotor(self, nombre: str) -> pd.DataFrame:
+        """Filas de CARTERA de un promotor (vacío si no tiene grupos)."""
+        return self._cartera.iloc[self.posiciones_promotor.get(nombre, np.array([], dtype=np.intp))]
+
+
+def _tipo_comun(tipos: set):
+    """Tipo de una columna al unir partes con `tipos` (como pd.concat: números al tipo común, si no object)."""
+    if len(tipos) == 1:
+        return next(iter(tipos))
+    if all(isinstance(tipo, np.dtype) and tipo.kind in 'iuf' for tipo in tipos):
+        return np.result_type(*tipos)
+    return np.dtype(object)
+
+
+def _posiciones_por_valor(serie: pd.Series) -> dict:
+    """{valor: posiciones} en una sola pasada (factorize + argsort estable)."""
+    codigos, valores = pd.factorize(serie)
+    orden = np.argsort(codigos, kind='stable')
+    cortes = np.cumsum(np.bincount(codigos[codigos >= 0], minlength=len(valores)))[:-1]
+    # Los nulos (código -1) quedan al inicio del orden y no tienen valor
+    orden = orden[(codigos < 0).sum():]
+    return dict(zip(valores, np.split(orden, cortes)))
+
+
+class ResultadoParticionado:
+    """
+    CARTERA generada por particiones, con las hojas derivadas de ResultadoCartera
+    (MORA, rangos de mora y RESUMEN) memoizadas, sin unir la CARTERA completa.
+
+    MORA y los rangos se calculan sobre las columnas de MORA de los grupos con
+    %mora sobre el umbral o con días de mora (los únicos que usan); el RESUMEN,
+    sobre el frame angosto de cada partición. El orden de filas es el de
+    iterar_cartera_particionada, igual que al unir las particiones.
+
+    Args:
+        directorio: Directorio de trabajo de iterar_cartera_particionada, con la
+            CARTERA calculada de cada partición
+    """
+
+    def __init__(self, directorio: str):
+        self._directorio = directorio
+        self._vistas = {}
+
+    def partes(self, columnas: list = None):
+        """
+        CARTERA de cada partición, leída del disco una a la vez (solo `columnas`, si se
+        indican), con los tipos que tendría la CARTERA unida (ej. una columna entera en
+        una partición y decimal en otra queda decimal en todas).
+        """
+        tipos, _, _ = self._tipos
+        for parte in leer_particiones(self._directorio, columnas):
+            distintos = {col: tipos[col] for col, tipo in parte.dtypes.items() if tipo != tipos[col]}
+            yield parte.astype(distintos) if distintos else parte
+
+    def columnas(self, columnas: list) -> pd.DataFrame:
+        """Columnas pedidas de toda la CARTERA (un frame angosto)."""
+        return pd.concat(list(self.partes(columnas)))
+
+    @property
+    def cartera(self) -> pd.DataFrame:
+        """CARTERA completa (une todas las particiones en memoria; no se memoiza)."""
+        return pd.concat(list(self.partes()))
+
+    def _vista(self, nombre: str, calcular):
+        """Vista `nombre`, calculada con calcular() la primera vez que se pide."""
+        if nombre not in self._vistas:
+            self._vistas[nombre] = calcular()
+        return self._vistas[nombre]
+
+    @property
+    def _tipos(self) -> tuple:
+        """(tipos pandas comunes, esquema Arrow común, filas) de las particiones, en una pasada de lectura."""
+        def calcular():
+            tipos = {}
+            esquemas = []
+            registros = 0
+            for parte in leer_particiones(self._directorio):
+                for col, tipo in parte.dtypes.items():
+                    tipos.setdefault(col, set()).add(tipo)
+                esquemas.append(pa.Schema.from_pandas(parte, preserve_index=False))
+                registros += len(parte)
+            comunes = {col: _tipo_comun(tipos_col) for col, tipos_col in tipos.items()}
+            return comunes, pa.unify_schemas(esquemas, promote_options='permissive'), registros
+        return self._vista('tipos', calcular)
+
+    @property
+    def esquema(self) -> pa.Schema:
+        """Esquema Arrow común a las particiones (ej. para escribirlas en un solo Parquet)."""
+        return self._tipos[1]
+
+    @property
+    def registros(self) -> int:
+        """Filas de la CARTERA (todas las particiones)."""
+        return self._tipos[2]
+
+    # Hojas derivadas
+
+    @property
+    def _base_mora(self) -> pd.DataFrame:
+        """Columnas de MORA de los grupos con %mora > umbral o con rango de días de mora."""
+        def calcular():
+            filas = []
+            for parte in self.partes(COLUMNAS_MORA_BASE):
+                mask = (
+                    (parte['pct_mora'] > UMBRAL_PCT_MORA).to_numpy() |
+                    (np.asarray(asignar_rangos_mora(parte).codes) >= 0)
+                )
+                filas.append(parte[mask])
+            # Sin las partes vacías, que no aportan filas (evita avisos de concat por tipos)
+            return pd.concat([df for df in filas if len(df)] or filas[:1])
+        return self._vista('base_mora', calcular)
+
+    @property
+    def mora(self) -> pd.DataFrame:
+        """Hoja MORA (generar_mora)."""
+        return self._vista('mora', lambda: generar_mora(self._base_mora))
+
+    @property
+    def mora_por_rangos(self) -> tuple:
+        """Tupla (df_mora_base, indices por rango) de generar_mora_por_rangos."""
+        return self._vista('mora_por_rangos', lambda: generar_mora_por_rangos(self._base_mora))
+
+    @property
+    def resumen_rangos_mora(self) -> pd.DataFrame:
+        """Matriz de rangos de días × bandas de %mora (resumen_rangos_mora)."""
+        # Los grupos sin rango (fuera de la base) no cuentan en la matriz
+        return self._vista('resumen_rangos_mora', lambda: resumen_rangos_mora(self._base_mora))
+
+    @property
+    def resumen(self) -> pd.DataFrame:
+        """RESUMEN gerente → promotor con subtotales y total (generar_resumen por partes)."""
+        return self._vista('resumen', lambda: generar_resumen(self.partes(COLUMNAS_ENTRADA_RESUMEN)))
@@ -0,0 +1,163 @@
+"""
+Módulo para generar el resumen jerárquico de cartera (gerente → promotor → grupo).
+Reemplaza las tablas dinámicas que se armaban a mano sobre output_automatizado.xlsx.
+"""
+
+import pandas as pd
+import numpy as np
+import logging
+from cartera_generator import a_centavos
+from escritura_atomica import escritura_atomica
+
+logger = logging.getLogger(__name__)
+
+# Columnas de monto que se suman en el resumen
+COLUMNAS_MONTOS_RESUMEN = [
+    'cartera_vigente_sistema',
+    'cartera_vencida_total',
+    'saldo_en_riesgo',
+    'ahorro_consumido',
+    'cartera_vencida_estadistica',
+]
+
+# Orden de columnas del resumen
+COLUMNAS_RESUMEN = [
+    'nivel',
+    'nombre_del_gerente',
+    'nombre_promotor',
+    'grupos',
+    'grupos_en_mora',
+] + COLUMNAS_MONTOS_RESUMEN + ['pct_mora_ponderado']
+
+# Columnas de CARTERA que lee generar_resumen
+COLUMNAS_ENTRADA_RESUMEN = ['nombre_del_gerente', 'nombre_promotor', 'pct_mora'] + COLUMNAS_MONTOS_RESUMEN
+
+
+def _como_categoria(serie: pd.Series) -> pd.Series:
+    """Reutiliza la columna si ya es categórica; si no, la convierte una sola vez."""
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie
+    return serie.astype('category')
+
+
+def _pct_mora_ponderado(df: pd.DataFrame) -> np.ndarray:
+    """%mora ponderado por cartera vigente sistema: Σ(%mora × vigente) / Σ(vigente)."""
+    vigente = df['cartera_vigente_sistema'].to_numpy(dtype=float)
+    ponderado = df['_pct_mora_x_vigente'].to_numpy(dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(vigente != 0, ponderado / vigente, 0.0)
+
+
+def _base_resumen(df_cartera: pd.DataFrame) -> pd.DataFrame:
+    """
+    Frame angosto con solo lo necesario (no copia el frame de 36 columnas).
+    Los montos se suman en centavos enteros para que subtotales y total sean exactos.
+    """
+    montos = {
+        col: a_centavos(df_cartera[col]).fillna(0).to_numpy(dtype=np.int64)
+        for col in COLUMNAS_MONTOS_RESUMEN
+    }
+    return pd.DataFrame({
+        'nombre_del_gerente': _como_categoria(df_cartera['nombre_del_gerente']),
+        'nombre_promotor': _como_categoria(df_cartera['nombre_promotor']),
+        'grupos_en_mora': (montos['cartera_vencida_total'] > 0).astype(np.int64),
+        **montos,
+        '_pct_mora_x_vigente': (
+            df_cartera['pct_mora'].to_numpy(dtype=float) *
+            df_cartera['cartera_vigente_sistema'].to_numpy(dtype=float)
+        ),
+    }, index=df_cartera.index)
+
+
+def generar_resumen(df_cartera) -> pd.DataFrame:
+    """
+    Genera el resumen de cartera por gerente y promotor en una sola pasada de groupby.
+
+    Incluye una fila por promotor (nivel 'Promotor'), un subtotal por gerente
+    (nivel 'Gerente') y el total general (nivel 'Total').
+
+    Args:
+        df_cartera: DataFrame de CARTERA generado, o un iterable de partes de CARTERA
+            (ej. leer_particiones); de cada parte solo se conserva el frame angosto
+
+    Returns:
+        DataFrame con las columnas de COLUMNAS_RESUMEN
+    """
+    logger.info("\nIniciando generación de RESUMEN de cartera...")
+
+    if isinstance(df_cartera, pd.DataFrame):
+        df_base = _base_resumen(df_cartera)
+    else:
+        df_base = pd.concat([_base_resumen(parte) for parte in df_cartera], ignore_index=True)
+        # Con categorías distintas por parte, concat deja los nombres como texto
+        for col in ['nombre_del_gerente', 'nombre_promotor']:
+            df_base[col] = _como_categoria(df_base[col])
+
+    columnas_suma = ['grupos_en_mora'] + COLUMNAS_MONTOS_RESUMEN + ['_pct_mora_x_vigente']
+
+    # Única pasada sobre los grupos: nivel promotor
+    agrupado = df_base.groupby(
+        ['nombre_del_gerente', 'nombre_promotor'],
+        observed=True,
+        dropna=False,
+        sort=True
+    )
+    por_promotor = agrupado[columnas_suma].sum()
+    por_promotor.insert(0, 'grupos', agrupado.size())
+
+    # Subtotales por gerente y total general (sobre el resultado agregado, no sobre los grupos)
+    por_gerente = por_promotor.groupby(level='nombre_del_gerente', observed=True, dropna=False, sort=True).sum()
+    total = por_promotor.sum().to_frame().T
+
+    por_promotor = por_promotor.reset_index()
+    por_promotor.insert(0, 'nivel', 'Promotor')
+    por_gerente = por_gerente.reset_index()
+    por_gerente.insert(0, 'nivel', 'Gerente')
+    por_gerente['nombre_promotor'] = None
+    total.insert(0, 'nivel', 'Total')
+    total['nombre_del_gerente'] = None
+    total['nombre_promotor'] = None
+
+    # Orden jerárquico: subtotal del gerente seguido de sus promotores, total al final
+    por_gerente['_orden'] = 0
+    por_promotor['_orden'] = 1
+    df_resumen = pd.concat([por_gerente, por_promotor], ignore_index=True)
+    df_resumen['nombre_del_gerente'] = df_resumen['nombre_del_gerente'].astype(object)
+    df_resumen['nombre_promotor'] = df_resumen['nombre_promotor'].astype(object)
+    df_resumen = df_resumen.sort_values(
+        ['nombre_del_gerente', '_orden', 'nombre_promotor'],
+        na_position='last',
+        kind='stable'
+    )
+    df_resumen = pd.concat([df_resumen.drop(columns=['_orden']), total], ignore_index=True)
+
+    for col in COLUMNAS_MONTOS_RESUMEN:
+        df_resumen[col] = df_resumen[col].astype(np.int64) / 100
+    df_resumen['pct_mora_ponderado'] = _pct_mora_ponderado(df_resumen)
+    df_resumen['grupos'] = df_resumen['grupos'].astype(np.int64)
+    df_resumen['grupos_en_mora'] = df_resumen['grupos_en_mora'].astype(np.int64)
+    df_resumen = df_resumen[COLUMNAS_RESUMEN]
+
+    logger.info(
+        f"Resumen generado: {(df_resumen['nivel'] == 'Gerente').sum()} gerentes, "
+        f"{(df_resumen['nivel'] == 'Promotor').sum()} promotores, {len(df_base)} grupos"
+    )
+
+    return df_resumen
+
+
+def guardar_resumen_parquet(df_resumen: pd.DataFrame, ruta: str) -> str:
+    """
+    Guarda el resumen en formato Parquet.
+
+    Args:
+        df_resumen: DataFrame generado por generar_resumen
+        ruta: Ruta del archivo .parquet
+
+    Returns:
+        str: Ruta del archivo generado
+    """
+    with escritura_atomica(ruta) as temporal:
+        df_resumen.to_parquet(temporal, index=False)
+    logger.info(f"Resumen guardado en Parquet: {ruta}")
+    return ruta
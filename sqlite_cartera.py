@@ -0,0 +1,309 @@
+"""
+Exportación de CARTERA y MORA a una base SQLite local para consultas SQL.
+
+Cada corrida agrega sus filas a las tablas `cartera` y `mora` con la fecha de
+reporte y el identificador de la corrida; una nueva corrida de la misma fecha
+reemplaza a la anterior, así que las tablas guardan la historia por fecha.
+
+La base está en modo WAL con synchronous=NORMAL (lecturas concurrentes entre
+corridas; una caída a mitad de una carga solo pierde esa transacción). Cada
+tabla se carga en una sola transacción: executemany con tuplas armadas por zip
+de los arreglos de cada columna (lotes de TAM_LOTE filas). Los índices sobre
+id_de_grupo, nombre_del_gerente, nombre_promotor, estatus y fecha_reporte se
+crean después de los INSERT cuando la tabla estaba vacía; con historia se
+mantienen (volver a construirlos costaría en proporción a todas las fechas
+guardadas). Los valores se convierten por columna (cada fecha distinta se
+formatea una sola vez).
+
+Solo la primera carga en un archivo nuevo y el benchmark usan carga_masiva
+(synchronous=OFF y journal en memoria): ahí una caída no puede dañar historia.
+
+Ejemplo de consulta:
+    SELECT fecha_reporte, SUM(cartera_vencida_total) FROM cartera
+    WHERE nombre_del_gerente = 'ROSA DIAZ' GROUP BY fecha_reporte
+
+Uso:
+    python sqlite_cartera.py [--checkpoints checkpoints] [--db cartera.sqlite]
+    python sqlite_cartera.py --benchmark 500000
+"""
+
+import pandas as pd
+import numpy as np
+import argparse
+import itertools
+import logging
+import sqlite3
+import tempfile
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Ruta por defecto de la base
+RUTA_SQLITE = 'cartera.sqlite'
+
+# Columnas indexadas (si la tabla las tiene)
+COLUMNAS_INDICE = ['id_de_grupo', 'nombre_del_gerente', 'nombre_promotor', 'estatus', 'fecha_reporte']
+
+# Filas por llamada a executemany
+TAM_LOTE = 50_000
+
+# Columnas que agrega la exportación a cada fila
+COLUMNAS_CORRIDA = ['fecha_reporte', 'corrida']
+
+
+def conectar(ruta: str = RUTA_SQLITE) -> sqlite3.Connection:
+    """Abre la base en modo WAL (lecturas concurrentes mientras se carga)."""
+    conexion = sqlite3.connect(ruta)
+    # page_size solo aplica al crear la base (antes de activar WAL)
+    conexion.execute('PRAGMA page_size=16384')
+    conexion.execute('PRAGMA journal_mode=WAL')
+    conexion.execute('PRAGMA synchronous=NORMAL')
+    conexion.execute('PRAGMA cache_size=-65536')
+    return conexion
+
+
+def _tipo_sql(serie: pd.Series) -> str:
+    """Tipo SQLite de una columna."""
+    if pd.api.types.is_bool_dtype(serie) or pd.api.types.is_integer_dtype(serie):
+        return 'INTEGER'
+    if pd.api.types.is_float_dtype(serie):
+        return 'REAL'
+    return 'TEXT'
+
+
+def _valores(serie: pd.Series) -> np.ndarray:
+    """Columna como arreglo object de valores nativos de Python (nulos = None, fechas en ISO)."""
+    nulos = serie.isna().to_numpy()
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        # Se formatea cada fecha distinta una sola vez (hay pocas en una cartera)
+        codigos, unicas = pd.factorize(serie.to_numpy(dtype='datetime64[s]'))
+        # Solo fecha si ninguna tiene hora (fecha_de_inicio_del_credito, proximo_pago)
+        solo_fecha = (unicas == unicas.astype('datetime64[D]')).all()
+        texto = np.datetime_as_string(unicas, unit='D' if solo_fecha else 's').astype(object)
+        valores = np.append(texto, None)[codigos]
+    elif pd.api.types.is_bool_dtype(serie) or pd.api.types.is_numeric_dtype(serie):
+        valores = serie.to_numpy(dtype=object, na_value=None)
+    else:
+        valores = serie.to_numpy(dtype=object, na_value=None)
+        if serie.dtype == object and pd.api.types.infer_dtype(serie, skipna=True) != 'string':
+            # Columnas de texto con tipos mezclados (ej. hora_de_reunion de varias fuentes)
+            valores = serie.astype(str).to_numpy(dtype=object)
+    valores[nulos] = None
+    return valores
+
+
+def _preparar_tabla(conexion: sqlite3.Connection, tabla: str, df: pd.DataFrame):
+    """Crea la tabla, o agrega las columnas nuevas si ya existe."""
+    existentes = [fila[1] for fila in conexion.execute(f'PRAGMA table_info("{tabla}")')]
+    if not existentes:
+        definicion = ', '.join(
+            ['"fecha_reporte" TEXT NOT NULL', '"corrida" TEXT NOT NULL'] +
+            [f'"{col}" {_tipo_sql(df[col])}' for col in df.columns]
+        )
+        conexion.execute(f'CREATE TABLE "{tabla}" ({definicion})')
+    else:
+        for col in df.columns:
+            if col not in existentes:
+                conexion.execute(f'ALTER TABLE "{tabla}" ADD COLUMN "{col}" {_tipo_sql(df[col])}')
+
+
+def _crear_indices(conexion: sqlite3.Connection, tabla: str, df: pd.DataFrame):
+    """Índices de COLUMNAS_INDICE (los que ya existen no se tocan)."""
+    for col in COLUMNAS_INDICE:
+        if col in COLUMNAS_CORRIDA or col in df.columns:
+            conexion.execute(f'CREATE INDEX IF NOT EXISTS "idx_{tabla}_{col}" ON "{tabla}" ("{col}")')
+
+
+def _eliminar_indices(conexion: sqlite3.Connection, tabla: str):
+    """Elimina los índices de COLUMNAS_INDICE (se recrean con _crear_indices)."""
+    for col in COLUMNAS_INDICE:
+        conexion.execute(f'DROP INDEX IF EXISTS "idx_{tabla}_{col}"')
+
+
+@contextmanager
+def carga_masiva(conexion: sqlite3.Connection):
+    """
+    Ejecuta el bloque con synchronous=OFF y el journal en memoria, y al salir
+    regresa la base a WAL con synchronous=NORMAL. Una caída dentro del bloque
+    puede dañar la base: solo para una base sin historia (ver cargar_tabla).
+
+    Si otra conexión tiene la base abierta, SQLite no permite salir de WAL y la
+    carga sigue en WAL (solo con synchronous=OFF).
+    """
+    conexion.execute('PRAGMA synchronous=OFF')
+    try:
+        conexion.execute('PRAGMA journal_mode=MEMORY')
+    except sqlite3.OperationalError as e:
+        logger.warning(f"Carga SQLite en modo WAL ({e})")
+    try:
+        yield conexion
+    finally:
+        conexion.execute('PRAGMA journal_mode=WAL')
+        conexion.execute('PRAGMA synchronous=NORMAL')
+
+
+def cargar_tabla(
+    conexion: sqlite3.Connection,
+    tabla: str,
+    df,
+    fecha_reporte,
+    corrida: str = None,
+    tam_lote: int = TAM_LOTE,
+    masiva: bool = False
+) -> int:
+    """
+    Agrega un DataFrame a una tabla en una sola transacción, reemplazando las filas
+    de la misma fecha de reporte.
+
+    Args:
+        conexion: Conexión de conectar()
+        tabla: Nombre de la tabla ('cartera', 'mora')
+        df: Filas a cargar: un DataFrame o un iterable de partes con las mismas columnas
+            y tipos (ej. ResultadoParticionado.partes()), que se cargan una a la vez
+        fecha_reporte: Fecha del reporte (date, datetime o 'AAAA-MM-DD')
+        corrida: Identificador de la corrida (por defecto, timestamp actual)
+        tam_lote: Filas por llamada a executemany
+        masiva: Cargar con carga_masiva(); solo para una base nueva (sin historia
+            que perder si la carga se interrumpe)
+
+    Returns:
+        Filas cargadas
+    """
+    fecha = pd.Timestamp(fecha_reporte).date().isoformat()
+    corrida = corrida or datetime.now().strftime('%Y%m%dT%H%M%S%f')
+    partes = iter([df] if isinstance(df, pd.DataFrame) else df)
+    df = next(partes)
+    columnas = COLUMNAS_CORRIDA + list(df.columns)
+    nombres = ', '.join(f'"{col}"' for col in columnas)
+    sql = f'INSERT INTO "{tabla}" ({nombres}) VALUES ({", ".join("?" * len(columnas))})'
+
+    filas = 0
+    with carga_masiva(conexion) if masiva else nullcontext(), conexion:
+        _preparar_tabla(conexion, tabla, df)
+        conexion.execute(f'DELETE FROM "{tabla}" WHERE fecha_reporte = ?', (fecha,))
+        # En una tabla vacía los índices se construyen una vez al final (más rápido que
+        # mantenerlos fila por fila); con historia se mantienen
+        if conexion.execute(f'SELECT NOT EXISTS (SELECT 1 FROM "{tabla}")').fetchone()[0]:
+            _eliminar_indices(conexion, tabla)
+        for df in itertools.chain([df], partes):
+            valores = [_valores(df[col]) for col in df.columns]
+            for inicio in range(0, len(df), tam_lote):
+                conexion.executemany(sql, zip(
+                    itertools.repeat(fecha), itertools.repeat(corrida),
+                    *(columna[inicio:inicio + tam_lote] for columna in valores)
+                ))
+            filas += len(df)
+        _crear_indices(conexion, tabla, df)
+    return filas
+
+
+def exportar_sqlite(
+    df_cartera,
+    df_mora: pd.DataFrame,
+    fecha_reporte,
+    ruta: str = RUTA_SQLITE
+) -> dict:
+    """
+    Agrega CARTERA y MORA de una corrida a la base SQLite.
+
+    Args:
+        df_cartera: DataFrame de CARTERA generado, o un iterable de partes (ver cargar_tabla)
+        df_mora: DataFrame de la hoja MORA (generar_mora)
+        fecha_reporte: Fecha del reporte
+        ruta: Ruta de la base
+
+    Returns:
+        {tabla: filas cargadas}
+    """
+    corrida = datetime.now().strftime('%Y%m%dT%H%M%S%f')
+    # Las pragmas inseguras solo en la primera carga: después la base guarda la historia
+    base_nueva = not Path(ruta).exists() or Path(ruta).stat().st_size == 0
+    conexion = conectar(ruta)
+    try:
+        filas = {
+            'cartera': cargar_tabla(conexion, 'cartera', df_cartera, fecha_reporte, corrida, masiva=base_nueva),
+            'mora': cargar_tabla(conexion, 'mora', df_mora, fecha_reporte, corrida, masiva=base_nueva),
+        }
+    finally:
+        conexion.close()
+    logger.info(f"Exportado a SQLite: {ruta} ({filas['cartera']} filas CARTERA, {filas['mora']} filas MORA)")
+    return filas
+
+
+def benchmark(df_base: pd.DataFrame, num_filas: int, tabla: str = 'cartera', consultas: int = 1000) -> dict:
+    """
+    Mide la carga y las consultas indexadas por id_de_grupo sobre `df_base` (CARTERA
+    o MORA) replicado a `num_filas` filas con IDs únicos, en una base temporal: la
+    primera carga (carga_masiva) y una segunda fecha agregada sobre esa historia
+    (WAL con synchronous=NORMAL e índices existentes, como en las corridas semanales).
+
+    Returns:
+        {'tabla', 'columnas', 'filas', 'carga_s', 'filas_por_s', 'historia_s',
+        'historia_filas_por_s', 'consulta_ms'}
+    """
+    repeticiones = -(-num_filas // len(df_base))
+    df = pd.concat([df_base] * repeticiones, ignore_index=True).iloc[:num_filas]
+    df['id_de_grupo'] = pd.Series(np.arange(num_filas)).astype(str).str.zfill(7)
+
+    with tempfile.TemporaryDirectory() as directorio:
+        conexion = conectar(str(Path(directorio) / 'benchmark.sqlite'))
+        inicio = time.perf_counter()
+        cargar_tabla(conexion, tabla, df, '2025-01-01', masiva=True)
+        carga = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        cargar_tabla(conexion, tabla, df, '2025-01-08')
+        historia = time.perf_counter() - inicio
+
+        ids = np.random.default_rng(0).choice(df['id_de_grupo'].to_numpy(), consultas)
+        inicio = time.perf_counter()
+        for id_grupo in ids:
+            conexion.execute(f'SELECT * FROM "{tabla}" WHERE id_de_grupo = ?', (id_grupo,)).fetchall()
+        consulta = (time.perf_counter() - inicio) / consultas
+        conexion.close()
+
+    return {
+        'tabla': tabla,
+        'columnas': len(df.columns),
+        'filas': num_filas,
+        'carga_s': round(carga, 3),
+        'filas_por_s': int(num_filas / carga),
+        'historia_s': round(historia, 3),
+        'historia_filas_por_s': int(num_filas / historia),
+        'consulta_ms': round(consulta * 1000, 4),
+    }
+
+
+def main():
+    """CLI: exporta la CARTERA del checkpoint 'calculo' o mide la carga con --benchmark."""
+    from checkpoints_cartera import cargar_checkpoint, DIRECTORIO_CHECKPOINTS
+    from cartera_generator import generar_mora
+    from historico_cartera import fecha_reporte_desde_archivo
+
+    parser = argparse.ArgumentParser(description="Exportación de CARTERA y MORA a SQLite")
+    parser.add_argument('--checkpoints', default=DIRECTORIO_CHECKPOINTS, help="Directorio de checkpoints de la corrida")
+    parser.add_argument('--db', default=RUTA_SQLITE, help="Base SQLite")
+    parser.add_argument('--benchmark', type=int, metavar='FILAS', help="Medir carga y consultas con N filas")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    frames, metadatos = cargar_checkpoint(args.checkpoints, 'calculo')
+    df_cartera = frames['cartera']
+    if args.benchmark:
+        resultados = [
+            benchmark(df_cartera, args.benchmark, 'cartera'),
+            benchmark(generar_mora(df_cartera), args.benchmark, 'mora'),
+        ]
+        print(pd.DataFrame(resultados).to_string(index=False))
+        return
+
+    fecha_reporte = fecha_reporte_desde_archivo(metadatos['ruta_antiguedad'])
+    exportar_sqlite(df_cartera, generar_mora(df_cartera), fecha_reporte, args.db)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+"""
+CARTERA de un subconjunto de grupos (por gerente, promotor o ID) sin procesar todos.
+
+El filtro se aplica en la carga:
+    1. ANTIGÜEDAD se carga completa y se seleccionan los IDs candidatos:
+       - ids: el ID de grupo a 6 dígitos
+       - gerente: nombre_de_gerente con el parche de gerentes, más los grupos sin
+         gerente (se completan después con el ciclo menor o la coordinación)
+       - promotor: nombre_promotor con el parche de promotores y el de grupos
+       Un ID es candidato si alguna de sus filas cumple (los filtros se combinan con Y).
+    2. SITUACIÓN, COBRANZA y AHORROS solo conservan las filas de esos IDs (y de los
+       IDs repetidos en ANTIGÜEDAD, ver abajo) antes de los joins.
+    3. Después de calcular CARTERA, filtrar_cartera() aplica el filtro exacto sobre
+       las columnas finales (nombre_del_gerente, nombre_promotor, id_de_grupo).
+
+Los gerentes vacíos se completan con el gerente más común de la coordinación
+entre TODOS los grupos. gerentes_poblacion() calcula ese diccionario sin unir
+todas las fuentes: en un ID no repetido el grupo unido conserva la fila de
+ANTIGÜEDAD; solo para los IDs repetidos (donde el ciclo de SITUACIÓN decide qué
+fila queda) se ejecuta unir_fuentes(). Así las filas del subconjunto son
+iguales a las de la corrida completa.
+
+Las salidas van a archivos propios (rutas_subconjunto) para no reemplazar las de
+la corrida completa, con el filtro en el nombre (ej.
+output_subconjunto_gerente-rosa-diaz_32562f80.xlsx), así que corridas de
+distintos gerentes o promotores no se pisan; el histórico, el linaje y SQLite
+no se actualizan.
+
+Uso:
+    python analizar_y_automatizar.py --gerente "ROSA DIAZ"
+    python analizar_y_automatizar.py --promotor "ANA LOPEZ" --ids 000089 108
+"""
+
+import pandas as pd
+import hashlib
+import logging
+import re
+import unicodedata
+from cartera_generator import unir_fuentes, gerentes_por_coordinacion
+from cartera_particionada import COLUMNAS_ID
+from parche_promotores import aplicar_parche, aplicar_parche_gerentes
+from parche_grupos import aplicar_parche_grupos
+
+logger = logging.getLogger(__name__)
+
+# Salidas del modo subconjunto ({etiqueta} = etiqueta_subconjunto del filtro)
+RUTAS_SUBCONJUNTO = {
+    'output': 'output_subconjunto_{etiqueta}.xlsx',
+    'resumen': 'resumen_subconjunto_{etiqueta}.parquet',
+    'calidad': 'reporte_calidad_subconjunto_{etiqueta}.json',
+}
+
+# Largo máximo de la parte legible de la etiqueta (ej. listas largas de IDs)
+LARGO_MAXIMO_ETIQUETA = 40
+
+# Columna final de CARTERA de cada filtro
+COLUMNAS_FILTRO = {
+    'gerente': 'nombre_del_gerente',
+    'promotor': 'nombre_promotor',
+    'ids': 'id_de_grupo',
+}
+
+
+def ids_de_grupo(serie: pd.Series) -> pd.Series:
+    """ID de grupo a 6 dígitos, igual que en los joins de unir_fuentes."""
+    return serie.astype(str).str.zfill(6)
+
+
+def _nombres(serie: pd.Series) -> pd.Series:
+    """Nombre normalizado para comparar (sin espacios extremos, mayúsculas)."""
+    return serie.astype(str).str.strip().str.upper()
+
+
+def crear_filtro(gerentes=None, promotores=None, ids=None) -> dict:
+    """
+    Filtro de subconjunto a partir de las listas de valores (None o vacía = sin filtrar).
+
+    Returns:
+        {filtro: set de valores normalizados}, o None si no se filtra por nada
+    """
+    filtro = {}
+    if gerentes:
+        filtro['gerente'] = set(_nombres(pd.Series(list(gerentes))))
+    if promotores:
+        filtro['promotor'] = set(_nombres(pd.Series(list(promotores))))
+    if ids:
+        filtro['ids'] = set(ids_de_grupo(pd.Series(list(ids))))
+    return filtro or None
+
+
+def _slug(texto: str) -> str:
+    """Texto sin acentos, en minúsculas y con guiones en lugar de otros caracteres."""
+    texto = unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'[^a-z0-9]+', '-', texto.lower()).strip('-')
+
+
+def etiqueta_subconjunto(filtro: dict) -> str:
+    """
+    Etiqueta de un filtro para los nombres de sus salidas: los valores de cada
+    filtro en forma legible (recortada a LARGO_MAXIMO_ETIQUETA) y un hash del
+    filtro completo, que distingue filtros con la misma parte legible.
+
+    Ejemplo: {'gerente': {'ROSA DIAZ'}} -> 'gerente-rosa-diaz_32562f80'
+    """
+    canonico = '|'.join(f"{nombre}={','.join(sorted(filtro[nombre]))}" for nombre in sorted(filtro))
+    huella = hashlib.sha1(canonico.encode('utf-8')).hexdigest()[:8]
+    legible = '_'.join(
+        '-'.join([nombre] + [_slug(valor) for valor in sorted(filtro[nombre])])
+        for nombre in sorted(filtro)
+    )
+    return f"{legible[:LARGO_MAXIMO_ETIQUETA].rstrip('-_')}_{huella}"
+
+
+def rutas_subconjunto(filtro: dict) -> dict:
+    """RUTAS_SUBCONJUNTO con la etiqueta del filtro ({salida: ruta})."""
+    etiqueta = etiqueta_subconjunto(filtro)
+    return {salida: ruta.format(etiqueta=etiqueta) for salida, ruta in RUTAS_SUBCONJUNTO.items()}
+
+
+def seleccionar_ids(df_antiguedad: pd.DataFrame, filtro: dict) -> tuple:
+    """
+    IDs candidatos del subconjunto y IDs repetidos en ANTIGÜEDAD.
+
+    Returns:
+        Tupla (ids_subconjunto, ids_repetidos) como pd.Index de IDs a 6 dígitos
+    """
+    ids = ids_de_grupo(df_antiguedad[COLUMNAS_ID['antiguedad']])
+    cumple = pd.Series(True, index=df_antiguedad.index)
+
+    if 'ids' in filtro:
+        cumple &= ids.isin(filtro['ids'])
+
+    if 'gerente' in filtro:
+        gerente = df_antiguedad['nombre_de_gerente']
+        vacio = gerente.isna() | (gerente.astype(str).str.strip() == '')
+        corregido = aplicar_parche_gerentes(pd.DataFrame({'gerente': gerente}), 'gerente')['gerente']
+        cumple &= vacio | _nombres(corregido).isin(filtro['gerente'])
+
+    if 'promotor' in filtro:
+        promotores = aplicar_parche(pd.DataFrame({
+            'id_de_grupo': ids,
+            'nombre_promotor': df_antiguedad['nombre_promotor'],
+        }), 'nombre_promotor')
+        aplicar_parche_grupos(promotores, 'id_de_grupo', 'nombre_promotor', inplace=True)
+        cumple &= _nombres(promotores['nombre_promotor']).isin(filtro['promotor'])
+
+    ids_subconjunto = pd.Index(ids[cumple].unique())
+    ids_repetidos = pd.Index(ids[ids.duplicated()].unique())
+    logger.info(
+        f"Subconjunto: {len(ids_subconjunto)} grupos candidatos de {ids.nunique()} "
+        f"({len(ids_repetidos)} IDs repetidos en ANTIGÜEDAD)"
+    )
+    return ids_subconjunto, ids_repetidos
+
+
+def restringir(df: pd.DataFrame, fuente: str, ids) -> pd.DataFrame:
+    """Filas de una fuente cuyos IDs de grupo están en `ids`."""
+    return df[ids_de_grupo(df[COLUMNAS_ID[fuente]]).isin(ids)]
+
+
+def gerentes_poblacion(
+    df_antiguedad: pd.DataFrame,
+    df_situacion: pd.DataFrame,
+    df_cobranza: pd.DataFrame,
+    df_ahorros: pd.DataFrame,
+    ids_repetidos
+) -> dict:
+    """
+    gerentes_por_coordinacion() de todos los grupos, igual al de la corrida completa.
+
+    Args:
+        df_antiguedad: ANTIGÜEDAD completa
+        df_situacion, df_cobranza, df_ahorros: Fuentes con al menos las filas de `ids_repetidos`
+        ids_repetidos: IDs repetidos en ANTIGÜEDAD (de seleccionar_ids)
+
+    Returns:
+        Diccionario {coordinacion: nombre_de_gerente}
+    """
+    repetido = ids_de_grupo(df_antiguedad[COLUMNAS_ID['antiguedad']]).isin(ids_repetidos)
+    grupos = [df_antiguedad.loc[~repetido, ['coordinacion', 'nombre_de_gerente']]]
+    if repetido.any():
+        unido = unir_fuentes(
+            df_antiguedad[repetido],
+            restringir(df_situacion, 'situacion', ids_repetidos),
+            restringir(df_cobranza, 'cobranza', ids_repetidos),
+            restringir(df_ahorros, 'ahorros', ids_repetidos),
+        )
+        grupos.append(unido[['coordinacion', 'nombre_de_gerente']])
+    return gerentes_por_coordinacion(pd.concat(grupos, ignore_index=True))
+
+
+def filtrar_cartera(df_cartera: pd.DataFrame, filtro: dict) -> pd.DataFrame:
+    """Filtro exacto sobre las columnas finales de CARTERA (índice reiniciado)."""
+    cumple = pd.Series(True, index=df_cartera.index)
+    for nombre, valores in filtro.items():
+        columna = df_cartera[COLUMNAS_FILTRO[nombre]]
+        cumple &= (columna if nombre == 'ids' else _nombres(columna)).isin(valores)
+    logger.info(f"Subconjunto: {int(cumple.sum())} grupos cumplen el filtro")
+    return df_cartera[cumple].reset_index(drop=True)
+
+
+def filtrar_hallazgos(calidad: dict, ids) -> dict:
+    """Hallazgos de calidad ({verificacion: Series por id_de_grupo}) de los IDs de `ids`."""
+    return {clave: hallazgos[hallazgos.index.isin(ids)] for clave, hallazgos in calidad.items()}
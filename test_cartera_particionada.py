@@ -0,0 +1,127 @@
+"""
+CARTERA por particiones (user-032): las hojas derivadas se arman releyendo las
+particiones del disco, sin unir la CARTERA en memoria, con el mismo resultado
+que sobre la CARTERA unida; y el gerente por coordinación (moda global) da lo
+mismo que el llenado uno por uno de la versión original.
+
+Uso:
+    python -m pytest -q test_cartera_particionada.py
+"""
+
+import logging
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from cartera_generator import gerentes_por_coordinacion
+from cartera_particionada import iterar_cartera_particionada, leer_particiones
+from resultado_cartera import ResultadoCartera, ResultadoParticionado
+from test_memoria_cartera import _frames_sinteticos, _tamano
+
+# Pico máximo del cálculo por particiones con sus hojas derivadas, en múltiplos
+# del tamaño de las entradas (incluidas: se liberan al particionar). Reteniendo
+# las entradas y uniendo las partes en una CARTERA completa se llegaba a ~1.6 veces.
+MULTIPLO_PICO_MAXIMO = 1.35
+
+
+def _entradas(grupos: int) -> dict:
+    """Entradas sintéticas con grupos en mora (cartera vencida > 0)."""
+    df_antiguedad, df_situacion, df_cobranza, df_ahorros = _frames_sinteticos(grupos, duplicados=grupos // 100)
+    rng = np.random.default_rng(1)
+    df_situacion['cartera_vencida_importe'] = rng.choice([0.0, 2_000.0, 9_000.0, 30_000.0], len(df_situacion))
+    df_situacion['cartera_vencida_pct'] = rng.choice([0.0, 3.0, 8.0, 30.0], len(df_situacion))
+    return {'antiguedad': df_antiguedad, 'situacion': df_situacion, 'cobranza': df_cobranza, 'ahorros': df_ahorros}
+
+
+def _calcular_por_particiones(entradas: dict, directorio, num_particiones: int) -> ResultadoParticionado:
+    for _ in iterar_cartera_particionada(
+        entradas.pop('antiguedad'), entradas.pop('situacion'), entradas.pop('cobranza'), entradas.pop('ahorros'),
+        num_particiones=num_particiones, directorio=str(directorio)
+    ):
+        pass
+    return ResultadoParticionado(str(directorio))
+
+
+def test_vistas_iguales_a_la_cartera_unida(tmp_path):
+    logging.disable(logging.CRITICAL)
+    try:
+        resultado = _calcular_por_particiones(_entradas(3_000), tmp_path, 5)
+        unido = ResultadoCartera(pd.concat(list(leer_particiones(str(tmp_path)))))
+
+        assert len(resultado.mora) > 0
+        pd.testing.assert_frame_equal(resultado.mora, unido.mora)
+        base, indices = resultado.mora_por_rangos
+        base_unida, indices_unidos = unido.mora_por_rangos
+        pd.testing.assert_frame_equal(base, base_unida)
+        for rango, posiciones in indices_unidos.items():
+            np.testing.assert_array_equal(indices[rango], posiciones)
+        pd.testing.assert_frame_equal(resultado.resumen_rangos_mora, unido.resumen_rangos_mora)
+        pd.testing.assert_frame_equal(resultado.resumen, unido.resumen)
+        pd.testing.assert_frame_equal(resultado.cartera, unido.cartera)
+        assert resultado.registros == len(unido.cartera)
+    finally:
+        logging.disable(logging.NOTSET)
+
+
+def test_pico_de_memoria_sin_unir_particiones(tmp_path):
+    nivel = logging.root.manager.disable
+    logging.disable(logging.CRITICAL)
+    tracemalloc.start()
+    try:
+        entradas = _entradas(50_000)
+        tamano_entradas = _tamano(*entradas.values())
+        tracemalloc.reset_peak()
+        resultado = _calcular_por_particiones(entradas, tmp_path, 8)
+        resultado.mora, resultado.mora_por_rangos, resultado.resumen_rangos_mora, resultado.resumen
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        logging.disable(nivel)
+
+    assert pico <= MULTIPLO_PICO_MAXIMO * tamano_entradas, (
+        f"Pico de {pico / 1e6:.1f} MB para {tamano_entradas / 1e6:.1f} MB de entradas "
+        f"({pico / tamano_entradas:.2f}x, máximo {MULTIPLO_PICO_MAXIMO}x)"
+    )
+
+
+def _gerentes_version_original(df: pd.DataFrame) -> pd.Series:
+    """Llenado uno por uno de la versión original: cuenta los gerentes ya completados."""
+    df = df.copy()
+    vacio = df['nombre_de_gerente'].isna() | (df['nombre_de_gerente'].astype(str).str.strip() == '')
+    for idx in df[vacio].index:
+        coordinacion = df.loc[idx, 'coordinacion']
+        if pd.notna(coordinacion):
+            otros = df[
+                (df['coordinacion'] == coordinacion) &
+                (df.index != idx) &
+                (df['nombre_de_gerente'].notna()) &
+                (df['nombre_de_gerente'].astype(str).str.strip() != '')
+            ]
+            if len(otros) > 0:
+                gerente_mas_comun = otros['nombre_de_gerente'].mode()
+                if len(gerente_mas_comun) > 0:
+                    df.loc[idx, 'nombre_de_gerente'] = gerente_mas_comun.iloc[0]
+    return df['nombre_de_gerente']
+
+
+@pytest.mark.parametrize('semilla', range(20))
+def test_moda_global_igual_al_llenado_uno_por_uno(semilla):
+    rng = np.random.default_rng(semilla)
+    filas = 60
+    df = pd.DataFrame({
+        'coordinacion': pd.Series(rng.choice(['COORD A', 'COORD B', 'COORD C', None], filas), dtype=object),
+        # Pocos gerentes por coordinación: empates frecuentes y coordinaciones sin gerente
+        'nombre_de_gerente': pd.Series(rng.choice(['ROSA DIAZ', 'MARIA PEREZ', '', ' ', None], filas), dtype=object),
+    })
+
+    esperado = _gerentes_version_original(df)
+
+    gerentes = gerentes_por_coordinacion(df)
+    vacio = df['nombre_de_gerente'].isna() | (df['nombre_de_gerente'].astype(str).str.strip() == '')
+    obtenido = df['nombre_de_gerente'].copy()
+    completados = df['coordinacion'][vacio].map(gerentes).dropna()
+    obtenido[completados.index] = completados
+
+    pd.testing.assert_series_equal(obtenido, esperado)
@@ -0,0 +1,66 @@
+"""
+Columnas de plantilla/formulas_cartera.json en la hoja CARTERA (user-035): una
+fórmula nueva en la configuración aparece como columna de CARTERA sin escribir
+código, con el valor que daría Excel.
+
+Uso:
+    python -m pytest -q test_compilador_formulas.py
+"""
+
+import json
+import logging
+from pathlib import Path
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+from cartera_generator import COLUMNAS_CARTERA, generar_cartera
+from compilador_formulas import RUTA_FORMULAS, compilar_formula
+from formato_excel import crear_libro_salida, escribir_hojas_cartera
+from test_memoria_cartera import _frames_sinteticos
+
+DIRECTORIO = Path(__file__).resolve().parent
+
+# Fórmulas de la configuración: una columna que el grafo ya genera (se ignora)
+# y dos nuevas; la segunda usa a la primera (AK)
+FORMULAS = {
+    'estatus': '=1',
+    'vencida_mas_ahorro': '=V7+AG7',
+    'con_ahorro': '=IF(AK7>V7,"SI","NO")',
+}
+
+
+def test_columna_nueva_de_la_configuracion_en_cartera(tmp_path, monkeypatch):
+    ruta = tmp_path / RUTA_FORMULAS
+    ruta.parent.mkdir(parents=True)
+    ruta.write_text(json.dumps(FORMULAS), encoding='utf-8')
+    monkeypatch.chdir(tmp_path)
+
+    logging.disable(logging.CRITICAL)
+    try:
+        df_cartera = generar_cartera(*_frames_sinteticos(200), None)
+    finally:
+        logging.disable(logging.NOTSET)
+
+    assert list(df_cartera.columns) == COLUMNAS_CARTERA + ['vencida_mas_ahorro', 'con_ahorro']
+    assert df_cartera['estatus'].ne(1).all()
+    esperado = df_cartera['cartera_vencida_total'] + df_cartera['ahorro_acumulado']
+    np.testing.assert_allclose(df_cartera['vencida_mas_ahorro'], esperado)
+    assert df_cartera['con_ahorro'].tolist() == np.where(
+        df_cartera['ahorro_acumulado'] > 0, 'SI', 'NO').tolist()
+
+    # En el libro, la columna nueva va después de AJ con su nombre como encabezado
+    wb, ws_plantilla = crear_libro_salida(str(DIRECTORIO / 'plantilla' / 'CARTERA_HEADERS.xlsx'))
+    escribir_hojas_cartera(wb, ws_plantilla, df_cartera)
+    wb.save(tmp_path / 'salida.xlsx')
+    ws = openpyxl.load_workbook(tmp_path / 'salida.xlsx', read_only=True)['cartera']
+    encabezados = next(ws.iter_rows(min_row=6, max_row=6, values_only=True))
+    assert encabezados[36:38] == ('vencida_mas_ahorro', 'con_ahorro')
+
+
+def test_if_sin_rama_falsa_retorna_false():
+    df = pd.DataFrame({'cartera_vencida_total': [5.0, 0.0]})
+    resultado = compilar_formula('=IF(V7>0,V7)').evaluar(df)
+    assert resultado.tolist() == [5.0, False]
+    assert resultado.iloc[1] is False
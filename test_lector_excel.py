@@ -0,0 +1,77 @@
+"""
+Paridad de los motores de lectura de Excel (user-042): los libros de ejemplo
+leídos con calamine y con openpyxl deben dar DataFrames iguales.
+
+Se omite si python-calamine no está instalado (o pandas < 2.2). Con los
+archivos de entrada completos en data/ también compara la salida de cada
+cargar_*; los tipos sin archivo se omiten.
+
+Uso:
+    python -m pytest -q test_lector_excel.py
+"""
+
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+pytest.importorskip('python_calamine')
+
+import analizar_y_automatizar as automatizacion
+from lector_excel import MOTOR_CALAMINE, MOTOR_OPENPYXL, VARIABLE_MOTOR, motor_disponible, leer_excel
+
+if not motor_disponible(MOTOR_CALAMINE):
+    pytest.skip("calamine requiere pandas >= 2.2", allow_module_level=True)
+
+DIRECTORIO = Path(__file__).resolve().parent
+
+# Libros de ejemplo del repositorio (entradas de data/ y plantilla)
+LIBROS_EJEMPLO = sorted((DIRECTORIO / 'data').glob('*.xlsx')) + [DIRECTORIO / 'plantilla' / 'CARTERA_HEADERS.xlsx']
+
+CARGADORES = {
+    'antiguedad': automatizacion.cargar_antiguedad,
+    'situacion': automatizacion.cargar_situacion,
+    'cobranza': automatizacion.cargar_cobranza,
+    'ahorros': automatizacion.cargar_ahorros,
+}
+
+
+@pytest.mark.parametrize('ruta', LIBROS_EJEMPLO, ids=lambda ruta: ruta.name)
+def test_hojas_iguales_con_ambos_motores(ruta):
+    hojas = {
+        motor: pd.read_excel(ruta, sheet_name=None, header=None, engine=motor)
+        for motor in (MOTOR_CALAMINE, MOTOR_OPENPYXL)
+    }
+    assert list(hojas[MOTOR_CALAMINE]) == list(hojas[MOTOR_OPENPYXL])
+    for hoja, df in hojas[MOTOR_CALAMINE].items():
+        pd.testing.assert_frame_equal(df, hojas[MOTOR_OPENPYXL][hoja], obj=f"{ruta.name} [{hoja}]")
+
+
+@pytest.mark.parametrize('tipo', list(CARGADORES))
+def test_cargadores_iguales_con_ambos_motores(tipo, monkeypatch):
+    rutas = sorted((DIRECTORIO / 'data').glob(automatizacion.PATRONES_ENTRADA[tipo]))
+    if not rutas:
+        pytest.skip(f"No hay archivo de {tipo} en data/")
+
+    frames = {}
+    for motor in (MOTOR_CALAMINE, MOTOR_OPENPYXL):
+        monkeypatch.setenv(VARIABLE_MOTOR, motor)
+        frames[motor] = CARGADORES[tipo](str(rutas[0]))
+    pd.testing.assert_frame_equal(frames[MOTOR_CALAMINE], frames[MOTOR_OPENPYXL])
+
+
+@pytest.mark.parametrize('kwargs', [{'sheet_name': 'NO EXISTE'}, {'usecols': ['no_existe']}], ids=['hoja', 'usecols'])
+def test_errores_del_archivo_no_se_reintentan(kwargs, monkeypatch, caplog):
+    monkeypatch.setenv(VARIABLE_MOTOR, MOTOR_CALAMINE)
+    with pytest.raises(ValueError):
+        leer_excel(DIRECTORIO / 'data' / 'AHORROS.xlsx', **kwargs)
+    assert 'se reintenta' not in caplog.text
+
+
+def test_archivo_danado_no_se_reintenta(tmp_path, monkeypatch, caplog):
+    ruta = tmp_path / 'danado.xlsx'
+    ruta.write_bytes(b'PK\x03\x04 no es un libro')
+    monkeypatch.setenv(VARIABLE_MOTOR, MOTOR_CALAMINE)
+    with pytest.raises(Exception):
+        leer_excel(ruta)
+    assert 'se reintenta' not in caplog.text
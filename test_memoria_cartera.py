@@ -0,0 +1,120 @@
+"""
+Prueba de memoria de generar_cartera: los joins y los parches no deben copiar el
+frame ancho completo (user-033).
+
+Con frames sintéticos del tamaño de una semana grande, el pico de memoria medido
+con tracemalloc dentro de generar_cartera debe quedar por debajo de
+MULTIPLO_PICO_MAXIMO veces el tamaño de las entradas. La implementación con una
+copia por join y por parche llegaba a ~2.6 veces.
+
+Uso:
+    python -m pytest -q test_memoria_cartera.py
+"""
+
+import logging
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from cartera_generator import generar_cartera
+
+# Pico máximo permitido dentro de generar_cartera, en múltiplos del tamaño de las
+# entradas: el resultado de 36 columnas más, como mucho, una copia de ANTIGÜEDAD
+# (la que se toma por posición cuando hay IDs duplicados)
+MULTIPLO_PICO_MAXIMO = 2.0
+
+# Tamaño de los frames sintéticos (grupos y columnas extra de ANTIGÜEDAD)
+GRUPOS = 50_000
+COLUMNAS_EXTRA = 35
+
+
+def _frames_sinteticos(grupos: int, duplicados: int = 0):
+    """
+    Construye ANTIGÜEDAD, SITUACIÓN, COBRANZA y AHORROS con las columnas que
+    usa generar_cartera (y los tipos que dejan los cargadores).
+
+    Args:
+        grupos: Filas de ANTIGÜEDAD
+        duplicados: Últimas filas de ANTIGÜEDAD que repiten el ID de las primeras
+
+    Returns:
+        Tupla (antiguedad, situacion, cobranza, ahorros)
+    """
+    rng = np.random.default_rng(0)
+    ids = np.arange(1, grupos + 1)
+    if duplicados:
+        ids[-duplicados:] = ids[:duplicados]
+    unicos = ids[:grupos - duplicados]
+
+    df_antiguedad = pd.DataFrame({
+        'coordinacion': rng.choice(['COORD A', 'COORD B', 'COORD C'], grupos),
+        'nombre_de_gerente': rng.choice(['MARIA PEREZ', 'JUAN EDMIUNDO', ''], grupos),
+        'nombre_promotor': rng.choice(['Ponce Galindo Alicia', 'Ruiz Jose'], grupos),
+        'cod_grupo_solidario': ids,
+        'ciclo': rng.integers(1, 10, grupos),
+        'grupo_solidario': [f"GRUPO {i}" for i in ids],
+        'cantidad_prestada': rng.uniform(1e4, 2e5, grupos).round(2),
+        'cantidad_entregada': rng.integers(10_000, 200_000, grupos),
+        'tipo_de_grupo': 'SOLIDARIO',
+        'inicio_ciclo': pd.Timestamp('2025-09-01') + pd.to_timedelta(rng.integers(0, 120, grupos), unit='D'),
+        'plazo_del_credito': 16,
+        'dia_junta': 'LUNES',
+        'hora_junta': '10:00',
+        'periodicidad': 'SEMANAL',
+        'parcialidad_+_parcialidad_comision': rng.uniform(1e3, 2e4, grupos).round(2),
+        'dias_de_mora': rng.integers(0, 200, grupos),
+        'situacion_credito': 'Autorizado por cartera',
+        'saldo_total': rng.uniform(0, 2e5, grupos).round(2),
+        'saldo_capital': rng.uniform(0, 2e5, grupos).round(2),
+        'numero_integrantes': rng.integers(3, 15, grupos),
+        **{f"extra_{i}": rng.uniform(0, 1, grupos) for i in range(COLUMNAS_EXTRA)},
+    })
+    df_situacion = pd.DataFrame({
+        'codigo': unicos,
+        'ciclo_sit': rng.integers(1, 10, len(unicos)),
+        'cartera_vencida_importe': 0.0,
+        'cartera_vencida_pct': 0.0,
+        'cartera_vigente_importe': 100_000,
+        'cartera_vigente_parcialidad': 100,
+        'numero_de_integrantes_sit': 8,
+    })
+    df_cobranza = pd.DataFrame({
+        'gpo': unicos,
+        'proximo_pago_cob': pd.Timestamp('2025-10-20'),
+        'por_vencer': 5,
+        'pagos': 11,
+    })
+    df_ahorros = pd.DataFrame({
+        'id': pd.Series(unicos).astype(str),
+        'ahorro_acumulado': 1500.0,
+    })
+    return df_antiguedad, df_situacion, df_cobranza, df_ahorros
+
+
+def _tamano(*frames) -> int:
+    """Bytes de los DataFrames, contando el contenido de las columnas de texto."""
+    return sum(int(df.memory_usage(deep=True).sum()) for df in frames)
+
+
+@pytest.mark.parametrize('duplicados', [0, 500])
+def test_pico_de_memoria_acotado(duplicados):
+    entradas = _frames_sinteticos(GRUPOS, duplicados=duplicados)
+    tamano_entradas = _tamano(*entradas)
+
+    nivel = logging.root.manager.disable
+    logging.disable(logging.CRITICAL)
+    tracemalloc.start()
+    try:
+        df_cartera = generar_cartera(*entradas, None)
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        logging.disable(nivel)
+
+    assert df_cartera.shape == (GRUPOS - duplicados, 36)
+    assert pico <= MULTIPLO_PICO_MAXIMO * tamano_entradas, (
+        f"Pico de {pico / 1e6:.1f} MB para {tamano_entradas / 1e6:.1f} MB de entradas "
+        f"({pico / tamano_entradas:.2f}x, máximo {MULTIPLO_PICO_MAXIMO}x)"
+    )